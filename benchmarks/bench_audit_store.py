@@ -0,0 +1,131 @@
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from erp.audit_store import DURABILITY_MODES, AuditStore
+from streamlit_app import AuditLog
+
+# ============================================================
+# BENCHMARK – ARQUIVO DE AUDITORIA: CARGA, CONSULTAS E DURABILIDADE
+# ============================================================
+# python -m benchmarks.bench_audit_store --rows 20000000
+#
+# 1) Carga semeada de --rows registros (extend, um fsync por segmento) e
+#    reabertura do diretório (índices laterais via mmap).
+# 2) Consultas por usuário, entidade+id, tipo de entidade, intervalo de
+#    datas e combinações: contagem + primeira página (50 mais recentes).
+# 3) Vazão de append por modo de durabilidade, com 1 e N threads.
+
+USERS = [f"usuario{i:03d}" for i in range(200)]
+ENTITY_TYPES = ["FinancialTitle", "LedgerEntry", "Customer", "Company", "Product", "TaxRule", "User"]
+ACTIONS = ["CREATE", "UPDATE", "DELETE", "APPROVE", "LOGIN", "EXPORT"]
+T0 = 1_600_000_000  # set/2020
+
+
+def records(n: int, seed: int, chunk: int = 100_000):
+    rng = np.random.default_rng(seed)
+    span = 4 * 365 * 86_400  # quatro anos de histórico
+    for start in range(0, n, chunk):
+        k = min(chunk, n - start)
+        ts = T0 + (np.arange(start, start + k) * (span / n)).astype(np.int64)
+        users = rng.integers(0, len(USERS), k).tolist()
+        etypes = rng.integers(0, len(ENTITY_TYPES), k).tolist()
+        actions = rng.integers(0, len(ACTIONS), k).tolist()
+        eids = rng.integers(1, 1_000_000, k).tolist()
+        for i in range(k):
+            yield AuditLog(id=start + i + 1, timestamp=int(ts[i]), user_name=USERS[users[i]],
+                           action=ACTIONS[actions[i]], entity_type=ENTITY_TYPES[etypes[i]], entity_id=eids[i])
+
+
+def timed_ms(fn, repeat: int = 5) -> tuple[float, object]:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+def bench_queries(directory: str, rows: int):
+    t0 = time.perf_counter()
+    store = AuditStore(directory, AuditLog, durability="buffered")
+    print(f"reabertura: {(time.perf_counter() - t0) * 1000:.0f} ms, {len(store.sealed)} segmentos, "
+          f"{store.disk_bytes() / 2**20:,.0f} MiB em disco, {store.nbytes() / 2**20:.1f} MiB em memória")
+    probe = store.query(limit=1, offset=rows // 2)[0]
+    day = 86_400
+    queries = [
+        ("usuário", dict(user_name=probe.user_name)),
+        ("entidade + id", dict(entity_type=probe.entity_type, entity_id=probe.entity_id)),
+        ("tipo de entidade", dict(entity_type="TaxRule")),
+        ("1 dia", dict(start_ts=probe.timestamp, end_ts=probe.timestamp + day)),
+        ("usuário + 30 dias", dict(user_name=probe.user_name, start_ts=probe.timestamp,
+                                   end_ts=probe.timestamp + 30 * day)),
+        ("usuário + entidade", dict(user_name=probe.user_name, entity_type=probe.entity_type)),
+        ("sem filtro", dict()),
+    ]
+    print(f"{'consulta':<20} {'registros':>12} {'contagem':>10} {'página 50':>10} {'página 1000':>12}")
+    for label, q in queries:
+        count_ms, total = timed_ms(lambda: store.count(**q))
+        page_ms, page = timed_ms(lambda: store.query(**q, limit=50))
+        deep_ms, _ = timed_ms(lambda: store.query(**q, limit=50, offset=1_000))
+        assert all(r.timestamp >= q.get("start_ts", 0) for r in page)
+        print(f"{label:<20} {total:>12,} {count_ms:>8.2f}ms {page_ms:>8.2f}ms {deep_ms:>10.2f}ms")
+    store.close()
+
+
+def bench_durability(appends: int, threads: int):
+    print(f"{'modo':<10} {'threads':>7} {'appends/s':>12} {'fsyncs':>8}")
+    for mode in DURABILITY_MODES:
+        for n_threads in sorted({1, threads}):
+            directory = tempfile.mkdtemp(prefix="erp-audit-dur-")
+            store = AuditStore(directory, AuditLog, durability=mode)
+            per_thread = appends // n_threads
+
+            def work(k):
+                for i in range(per_thread):
+                    store.append(USERS[k % len(USERS)], "UPDATE", "Customer", i)
+
+            workers = [threading.Thread(target=work, args=(k,)) for k in range(n_threads)]
+            t0 = time.perf_counter()
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            store.flush(fsync=True)
+            seconds = time.perf_counter() - t0
+            print(f"{mode:<10} {n_threads:>7} {per_thread * n_threads / seconds:>12,.0f} {store.fsyncs:>8,}")
+            store.close()
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--appends", type=int, default=5_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--dir", help="diretório de auditoria (padrão: temporário, removido no fim)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="erp-audit-bench-")
+    try:
+        store = AuditStore(directory, AuditLog, durability="buffered")
+        if len(store) < args.rows:
+            t0 = time.perf_counter()
+            store.extend(r for r in records(args.rows, args.seed) if r.id > len(store))
+            seconds = time.perf_counter() - t0
+            print(f"carga: {args.rows:,} registros em {seconds:.1f}s ({args.rows / seconds:,.0f}/s)")
+        store.close()
+        bench_queries(directory, args.rows)
+        bench_durability(args.appends, args.threads)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import dataclasses
+import os
+import pickle
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import streamlit_app as app
+from benchmarks.datagen import Scale, generate
+from erp.consolidation import ConsolidationEngine
+from erp.storage import MemoryRepository
+
+# ============================================================
+# BENCHMARK – CONSOLIDAÇÃO MULTIEMPRESA: CURVA DE ESCALA x PROCESSOS
+# ============================================================
+# python -m benchmarks.bench_consolidation --rows 1000000 --companies 200
+#
+# Gera razão e títulos (benchmarks/datagen.py) com N empresas, acrescenta
+# títulos intercompany (favorecido = outra empresa do grupo) com os
+# lançamentos de origem, e consolida o grupo inteiro com 1, 2, 4, ...
+# processos. Para cada quantidade: tempo por etapa (melhor de --repeat, com
+# o bloco compartilhado já montado), speedup e eficiência sobre a execução
+# no próprio processo (a linha "serial"), e quantos bytes cada tarefa leva por pickle contra o
+# tamanho do bloco compartilhado. O resultado de cada quantidade é
+# conferido contra a execução serial.
+
+AS_OF = date(2025, 1, 1)
+
+
+def add_intercompany(repo, companies: int, n: int, seed: int):
+    # Títulos AR de uma empresa contra outra + o AP espelhado (às vezes com
+    # valor diferente) e um lançamento de origem para cada título.
+    rng = np.random.default_rng([seed, 99])
+    creditor = rng.integers(1, companies + 1, n)
+    debtor = (creditor + rng.integers(1, companies, n) - 1) % companies + 1
+    amount = np.round(rng.lognormal(7, 1.2, n), 2)
+    mirrored = np.where(rng.random(n) < 0.9, amount, np.round(amount * 0.95, 2))
+    issue = np.datetime64("2024-01-01") + rng.integers(0, 730, 2 * n).astype("timedelta64[D]")
+    first = repo.next_ids("title_id", 2 * n)
+    ids = np.arange(first, first + 2 * n)
+    company = np.concatenate([creditor, debtor])
+    party = np.concatenate([debtor, creditor])
+    value = np.concatenate([amount, mirrored])
+    repo.insert_columns("titles", {
+        "id": ids,
+        "company_id": company,
+        "kind": np.array(["AR"] * n + ["AP"] * n, dtype=object),
+        "party_name": np.array([f"Empresa {p}" for p in party.tolist()], dtype=object),
+        "doc_number": np.array([f"IC-{i}" for i in ids.tolist()], dtype=object),
+        "issue_date": issue,
+        "due_date": issue + rng.integers(0, 120, 2 * n).astype("timedelta64[D]"),
+        "amount": value,
+        "cost_center_id": [None] * (2 * n),
+        "account_id": [None] * (2 * n),
+        "status": np.array(["Aberto"] * (2 * n), dtype=object),
+    })
+    first = repo.next_ids("ledger_id", 2 * n)
+    is_ar = np.arange(2 * n) < n
+    repo.insert_columns("ledger", {
+        "id": np.arange(first, first + 2 * n),
+        "company_id": company,
+        "date": issue,
+        "account_code": np.where(is_ar, "1.1.2.0001", "2.1.1.0001").astype(object),
+        "cost_center_id": [None] * (2 * n),
+        "debit": np.where(is_ar, value, 0.0),
+        "credit": np.where(is_ar, 0.0, value),
+        "history": np.array([f"Intercompany {i}" for i in ids.tolist()], dtype=object),
+        "origin_type": np.full(2 * n, "FinancialTitle", dtype=object),
+        "origin_id": ids,
+    })
+
+
+def best_run(engine: ConsolidationEngine, repo, companies: dict, perimeter: list, repeat: int):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = engine.run(repo, companies, perimeter, AS_OF)
+        total = time.perf_counter() - t0
+        if best is None or total < best[0]:
+            best = total, result
+    return best
+
+
+def same(a, b):
+    for name in ("companies", "trial_balance", "intercompany"):
+        pd.testing.assert_frame_equal(getattr(a, name), getattr(b, name))
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    # 1 processo = execução serial (sem pool), sempre medida como base.
+    default_workers = sorted({2, *[2 ** i for i in range(1, 6) if 2 ** i <= cpus], *([cpus] if cpus > 1 else [])})
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="lançamentos (e títulos) gerados")
+    parser.add_argument("--companies", type=int, default=200)
+    parser.add_argument("--intercompany", type=float, default=0.01, help="fração de títulos intercompany")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    repo = MemoryRepository(app.ENTITIES, columnar=app.COLUMNAR)
+    t0 = time.perf_counter()
+    generate(repo, app, dataclasses.replace(Scale.for_rows(args.rows), companies=args.companies), args.seed,
+             progress=None)
+    add_intercompany(repo, args.companies, int(args.rows * args.intercompany / 2), args.seed)
+    companies = {c.name: c.id for c in repo.fetch("companies")}
+    perimeter = list(companies.values())
+    print(f"{len(repo.columnar('ledger')):,} lançamentos, {repo.count('titles'):,} títulos, "
+          f"{len(companies)} empresas (gerados em {time.perf_counter() - t0:.1f}s); {cpus} CPU(s)")
+
+    serial = ConsolidationEngine(workers=1)
+    cold = serial.run(repo, companies, perimeter, AS_OF)
+    print("primeira execução (lê títulos, particiona): "
+          + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in cold.seconds.items()))
+    base_total, base = best_run(serial, repo, companies, perimeter, args.repeat)
+    base_work = base.seconds["processamento"]
+    t = base.totals
+    print(f"eliminações: AR {t['AR_eliminado']:,.2f} | AP {t['AP_eliminado']:,.2f} | "
+          f"divergência {t['divergencia']:,.2f} em {len(base.intercompany)} pares\n")
+
+    print(f"{'processos':>9} {'tarefas':>7} {'bloco':>10} {'pickle/tarefa':>13} {'processamento':>13} "
+          f"{'junção':>8} {'total':>8} {'speedup':>8} {'eficiência':>10}")
+    print(f"{'(serial)':>9} {base.tasks:>7} {'-':>10} {'-':>13} {base_work * 1000:10.0f} ms "
+          f"{base.seconds['consolidacao'] * 1000:5.0f} ms {base_total * 1000:5.0f} ms {1.0:7.2f}x {'':>10}")
+    for workers in args.workers:
+        engine = ConsolidationEngine(workers=workers, min_rows=0)
+        engine.start()
+        engine.run(repo, companies, perimeter, AS_OF)  # monta o bloco compartilhado
+        total, result = best_run(engine, repo, companies, perimeter, args.repeat)
+        same(base, result)
+        snapshot = engine.snapshot
+        block = snapshot.block.shm.size if snapshot.block else 0
+        tasks = engine.tasks(snapshot, np.array(sorted(perimeter)), AS_OF)
+        # Sem bloco compartilhado (workers=1) as tarefas rodam no próprio processo: nada é serializado.
+        task_bytes = (sum(len(pickle.dumps((snapshot.block.spec, task))) for task in tasks) // max(len(tasks), 1)
+                      if snapshot.block else 0)
+        work = result.seconds["processamento"]
+        speedup = base_work / work
+        note = " (mais processos que CPUs)" if workers > cpus else ""
+        print(f"{workers:>9} {result.tasks:>7} {block / 2**20:7.1f} MiB {task_bytes:>10,} B {work * 1000:10.0f} ms "
+              f"{result.seconds['consolidacao'] * 1000:5.0f} ms {total * 1000:5.0f} ms {speedup:7.2f}x "
+              f"{speedup / workers:9.0%}{note}")
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from erp.dedup import DEDUP_STATUSES, DedupIndex, duplicate_groups, find_duplicates
+from streamlit_app import DEDUP_SPECS
+
+# ============================================================
+# BENCHMARK – MDM: DUPLICATAS POR BLOCAGEM x TODOS CONTRA TODOS
+# ============================================================
+# python -m benchmarks.bench_dedup --customers 1000000
+#
+# Clientes com nomes brasileiros e CPF/CNPJ válidos em 20 empresas; uma
+# fração é recadastrada com variações reais (máscara ou não, sem acento,
+# maiúsculas, "da"/"de", Souza/Sousa, Th/T, nome do meio omitido, documento
+# em branco). Mede o lote sobre a base inteira (pares candidatos, tempo,
+# precisão e revocação contra as duplicatas plantadas), a montagem do índice
+# de inclusão e a latência da conferência por inclusão; compara com o número
+# de pares de uma comparação todos contra todos.
+
+FIRST = ["José", "João", "Maria", "Ana", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luíza",
+         "Márcia", "Gabriel", "Rafael", "Fernanda", "Sebastião", "Letícia", "Vinícius", "Cecília", "Inês", "Thiago",
+         "Luiz", "Felipe", "Matheus", "Raphael", "Walter", "Heitor", "Júlia", "Beatriz", "Helena", "Cláudia",
+         "Rodrigo", "Eduardo", "Marcelo", "Débora", "Patrícia", "Sérgio", "Vitória", "Yasmin", "Caio"]
+LAST = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+        "Conceição", "Ribeiro", "Araújo", "Carvalho", "Gonçalves", "Magalhães", "Brandão", "Assunção", "Simões",
+        "Falcão", "Nóbrega", "Guimarães", "Estêvão", "Damião", "Lopes", "Barbosa", "Rocha", "Dias", "Nascimento",
+        "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas", "Cardoso", "Ramos", "Teixeira",
+        "Correia", "Cavalcanti", "Monteiro", "Moura", "Pinto", "Vieira", "Batista", "Campos", "Fonseca", "Queiroz",
+        "Xavier", "Bezerra", "Medeiros", "Siqueira", "Tavares", "Prado", "Macedo", "Sales", "Peixoto", "Aguiar"]
+SPELLING = [("Souza", "Sousa"), ("Thiago", "Tiago"), ("Luiz", "Luís"), ("Felipe", "Phelipe"), ("Raphael", "Rafael"),
+            ("Walter", "Valter"), ("Matheus", "Mateus"), ("Yasmin", "Iasmin"), ("Heitor", "Eitor"), ("Luíza", "Luisa")]
+WORDS = ["Açúcar", "Café", "Feijão", "Arroz", "Óleo", "Sabão", "Farinha", "Leite", "Macarrão", "Biscoito",
+         "Detergente", "Sal", "Molho", "Vinagre", "Margarina", "Achocolatado", "Fermento", "Amido", "Creme", "Suco"]
+BRANDS = ["União", "Pilão", "Camil", "Soya", "Ypê", "Dona Benta", "Italac", "Renata", "Vitarella", "Quero",
+          "Cisne", "Tio João", "Liza", "Qualy", "Nescau", "Fleischmann", "Maizena", "Nestlé", "Tang", "Maguary"]
+
+
+def check_digits(base: np.ndarray, weights: list[np.ndarray]) -> np.ndarray:
+    digits = base
+    for w in weights:
+        r = (digits * w).sum(axis=1) % 11
+        digits = np.column_stack([digits, np.where(r < 2, 0, 11 - r)])
+    return digits
+
+
+def documents(n: int, rng) -> tuple[np.ndarray, np.ndarray]:
+    # CPF (60%) e CNPJ (40%) válidos, mascarados; -> (documentos, é PJ)
+    pj = rng.random(n) < 0.4
+    docs = np.empty(n, dtype=object)
+    for is_pj, size, weights, mask in (
+        (False, 9, [np.arange(10, 1, -1), np.arange(11, 1, -1)], "{}{}{}.{}{}{}.{}{}{}-{}{}"),
+        (True, 12, [np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])],
+         "{}{}.{}{}{}.{}{}{}/{}{}{}{}-{}{}"),
+    ):
+        rows = np.flatnonzero(pj == is_pj)
+        d = check_digits(rng.integers(0, 10, (len(rows), size)), weights)
+        text = pd.Series(["".join(r) for r in d.astype(str).tolist()])
+        docs[rows] = text.map(lambda s: mask.format(*s)).to_numpy(object)
+    return docs, pj
+
+
+def customers(n: int, dup_rate: float, rng) -> tuple[pd.DataFrame, np.ndarray]:
+    originals = n - int(n * dup_rate)
+    pick = lambda names, k: np.array(names, dtype=object)[rng.integers(0, len(names), k)]
+    middle = np.where(rng.random(originals) < 0.5, pick(LAST, originals) + " ", "")
+    names = pick(FIRST, originals) + " " + middle + pick(LAST, originals) + " " + pick(LAST, originals)
+    docs, pj = documents(originals, rng)
+    base = pd.DataFrame({"name": names, "doc": docs, "kind": np.where(pj, "PJ", "PF"),
+                         "company_id": rng.integers(1, 21, originals)})
+
+    source = rng.choice(originals, n - originals, replace=False)
+    dup = base.iloc[source].reset_index(drop=True)
+    name, doc = dup["name"].copy(), dup["doc"].copy()
+    r = rng.random((7, len(dup)))
+    doc[r[0] < 0.5] = doc[r[0] < 0.5].str.replace(r"\D", "", regex=True)            # sem máscara
+    doc[r[1] < 0.15] = ""                                                             # sem documento
+    name[r[2] < 0.3] = name[r[2] < 0.3].str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    name[r[3] < 0.3] = name[r[3] < 0.3].str.upper()
+    parts = name.str.split(" ", n=1)
+    join_da = (r[4] < 0.2) & (parts.str.len() == 2)
+    name[join_da] = parts[join_da].str[0] + " da " + parts[join_da].str[1]
+    for (a, b), hit in zip(SPELLING, rng.random((len(SPELLING), len(dup))) < 0.5):
+        name[hit] = name[hit].str.replace(a, b, regex=False)
+    three = name.str.count(" ") == 3
+    drop_middle = (r[5] < 0.2) & three
+    name[drop_middle] = name[drop_middle].str.replace(r"^(\S+) \S+ ", r"\1 ", regex=True)
+    dup = dup.assign(name=name, doc=doc)
+
+    df = pd.concat([base, dup], ignore_index=True)
+    order = rng.permutation(n)
+    df = df.iloc[order].reset_index(drop=True)
+    df.insert(0, "id", np.arange(1, n + 1))
+    new_id = np.empty(n, dtype=np.int64)
+    new_id[order] = df["id"].to_numpy()
+    truth = np.column_stack([new_id[source], new_id[originals + np.arange(n - originals)]])
+    return df, np.sort(truth, axis=1)
+
+
+def products(n: int, dup_rate: float, rng) -> tuple[pd.DataFrame, np.ndarray]:
+    originals = n - int(n * dup_rate)
+    pick = lambda names, k: np.array(names, dtype=object)[rng.integers(0, len(names), k)]
+    grams = pd.Series(rng.integers(1, 200, originals) * 50).astype(str).to_numpy(object)
+    base = pd.DataFrame({
+        "name": pick(WORDS, originals) + " " + pick(BRANDS, originals) + " " + grams + "g",
+        "sku": pd.Series(np.arange(originals)).map("SKU-{:07d}".format).to_numpy(object),
+        "ncm": pd.Series(rng.integers(1000_0000, 9999_9999, originals)).astype(str).to_numpy(object),
+        "unit": "UN", "company_id": rng.integers(1, 21, originals),
+    })
+    source = rng.choice(originals, n - originals, replace=False)
+    dup = base.iloc[source].reset_index(drop=True)
+    r = rng.random((3, len(dup)))
+    sku, name, ncm = dup["sku"].copy(), dup["name"].copy(), dup["ncm"].copy()
+    sku[r[0] < 0.5] = sku[r[0] < 0.5].str.replace("-", "", regex=False).str.lower()
+    sku[r[0] >= 0.5] = "X" + sku[r[0] >= 0.5]                              # recadastrado com outro SKU
+    name[r[1] < 0.5] = name[r[1] < 0.5].str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    ncm[r[2] < 0.5] = ncm[r[2] < 0.5].str[:4] + "." + ncm[r[2] < 0.5].str[4:6] + "." + ncm[r[2] < 0.5].str[6:]
+    df = pd.concat([base, dup.assign(sku=sku, name=name, ncm=ncm)], ignore_index=True)
+    df.insert(0, "id", np.arange(1, n + 1))
+    return df, np.column_stack([source + 1, originals + np.arange(n - originals) + 1])
+
+
+def evaluate(label: str, key: str, df: pd.DataFrame, truth: np.ndarray, window: int):
+    t0 = time.perf_counter()
+    pairs = find_duplicates(DEDUP_SPECS[key], df, window)
+    seconds = time.perf_counter() - t0
+    n = len(df)
+    strong = pairs[pairs["status"].isin(DEDUP_STATUSES[:2])]
+    found = set(zip(strong["id_a"].tolist(), strong["id_b"].tolist()))
+    planted = set(map(tuple, truth.tolist()))
+    hits = len(found & planted)
+    any_pair = set(zip(pairs["id_a"].tolist(), pairs["id_b"].tolist()))
+    groups = duplicate_groups(pairs)
+    print(f"{label}: {n:,} registros em {seconds:.1f}s ({n / seconds:,.0f}/s)")
+    print(f"    pares: " + ", ".join(f"{(pairs['status'] == s).sum():,} {s}" for s in DEDUP_STATUSES)
+          + f"; {groups['group'].nunique():,} grupos duplicados")
+    print(f"    duplicado+provável: precisão {hits / max(len(found), 1):.1%}, revocação {hits / len(planted):.1%}; "
+          f"com possível: revocação {len(any_pair & planted) / len(planted):.1%}")
+    scored = pairs.attrs["candidates"]
+    print(f"    pares pontuados: {scored:,} (todos contra todos: {n * (n - 1) // 2:,}, "
+          f"{n * (n - 1) // 2 / max(scored, 1):,.0f}x mais)")
+    return pairs
+
+
+def inline(key: str, df: pd.DataFrame, probes: int, rng):
+    t0 = time.perf_counter()
+    index = DedupIndex({key: DEDUP_SPECS[key]})
+    index.add_columns(key, df)
+    build = time.perf_counter() - t0
+    spec = DEDUP_SPECS[key]
+    sample = df.iloc[rng.integers(0, len(df), probes)]
+    lat, flagged = [], 0
+    for row in sample.itertuples(index=False):
+        values = {c: getattr(row, c) for c in (spec.name, spec.doc, spec.code, spec.group, spec.scope) if c}
+        values[spec.name] = values[spec.name].upper()
+        t0 = time.perf_counter()
+        matches = index.check(key, **values)
+        lat.append((time.perf_counter() - t0) * 1000)
+        flagged += bool(matches) and matches[0].status == "duplicado"
+    print(f"    inclusão: índice montado em {build:.1f}s; conferência p50 {np.percentile(lat, 50):.2f} ms, "
+          f"p95 {np.percentile(lat, 95):.2f} ms; {flagged}/{probes} recadastros bloqueados")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--dup-rate", type=float, default=0.05)
+    parser.add_argument("--window", type=int, default=8)
+    parser.add_argument("--probes", type=int, default=1_000, help="conferências por inclusão medidas")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for label, key, make in (("Clientes", "customers", customers), ("Produtos", "products", products)):
+        size = args.customers if key == "customers" else args.products
+        if not size:
+            continue
+        df, truth = make(size, args.dup_rate, rng)
+        evaluate(label, key, df, truth, args.window)
+        inline(key, df, args.probes, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+
+import streamlit_app as app
+from benchmarks.datagen import Scale, generate
+from erp.export import export_chunks, export_where
+from erp.storage import MemoryRepository, open_sqlite_repository
+
+# ============================================================
+# BENCHMARK – EXPORTAÇÃO EM BLOCOS: MEMÓRIA DE PICO x LINHAS
+# ============================================================
+# python -m benchmarks.bench_export --rows 100000 400000 1600000
+#
+# Gera razão e títulos (benchmarks/datagen.py) em memória e em SQLite e
+# exporta cada entidade nos três formatos, inteira e filtrada (uma empresa,
+# um mês). Mede a vazão (sem tracemalloc) e a memória de pico alocada
+# durante a exportação (tracemalloc para Python/NumPy, amostra do pool do
+# Arrow por bloco). Para comparação, o caminho ingênuo: um DataFrame com a
+# entidade inteira (asdict por linha) e to_csv de uma vez.
+
+FORMATS = ("csv", "parquet", "sped")
+
+
+def consume(chunks) -> tuple[int, int]:
+    # Descarta os bytes (como um download já enviado); devolve bytes e pico do Arrow.
+    size, arrow = 0, 0
+    for chunk in chunks:
+        size += len(chunk)
+        arrow = max(arrow, pa.total_allocated_bytes())
+    return size, arrow
+
+
+def traced(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def naive_csv(repo, key: str, where: dict) -> int:
+    if key in repo.columnar_types:
+        df = repo.columnar(key).select(where)
+    else:
+        df = pd.DataFrame([asdict(r) for r in repo.fetch(key, where)])
+    return len(df.to_csv(sep=";", decimal=",", index=False).encode())
+
+
+def open_repo(storage: str, tmp: str, rows: int):
+    if storage == "memory":
+        return MemoryRepository(app.ENTITIES, columnar=app.COLUMNAR)
+    return open_sqlite_repository(os.path.join(tmp, f"export-{rows}.db"), app.ENTITIES, app.COLUMNAR, app.INDEXES)
+
+
+def mib(n: int) -> str:
+    return f"{n / 2**20:7.1f} MiB"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 400_000, 1_600_000])
+    parser.add_argument("--storage", nargs="+", choices=["memory", "sqlite"], default=["memory", "sqlite"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-naive", action="store_true", help="pula o DataFrame inteiro (muito lento em escala)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="erp-export-")
+    month = (date(2024, 3, 1), date(2024, 3, 31))
+    print(f"{'armazen.':<8} {'linhas':>10} {'entidade':<7} {'formato':<8} {'filtro':<12} "
+          f"{'saída':>12} {'tempo':>7} {'linhas/s':>11} {'pico Py/NumPy':>14} {'pico Arrow':>12}")
+    for storage in args.storage:
+        for rows in args.rows:
+            repo = open_repo(storage, tmp, rows)
+            generate(repo, app, Scale.for_rows(rows), args.seed, progress=None)
+            for key in ("ledger", "titles"):
+                spec = app.EXPORT_SPECS[key]
+                if key in repo.columnar_types:
+                    repo.columnar(key)  # no SQLite, o espelho colunar é carregado uma vez, fora da medição
+                for label, company_id, period in (("tudo", None, None), ("empresa/mês", 1, month)):
+                    company = app.Company(1, "Empresa 1", "00000001/0001-01", "Real") if company_id else None
+                    n = repo.count(key, export_where(spec, company_id, period))
+                    for fmt in FORMATS:
+                        t0 = time.perf_counter()
+                        size, _ = consume(export_chunks(repo, key, spec, fmt, company, period))
+                        seconds = time.perf_counter() - t0
+                        (_, arrow), peak = traced(lambda: consume(export_chunks(repo, key, spec, fmt, company,
+                                                                                  period)))
+                        print(f"{storage:<8} {rows:>10,} {key:<7} {fmt:<8} {label:<12} {mib(size):>12} "
+                              f"{seconds:6.1f}s {n / seconds:>11,.0f} {mib(peak):>14} {mib(arrow):>12}")
+                    if not args.no_naive:
+                        where = export_where(spec, company_id, period)
+                        t0 = time.perf_counter()
+                        size = naive_csv(repo, key, where)
+                        seconds = time.perf_counter() - t0
+                        _, peak = traced(lambda: naive_csv(repo, key, where))
+                        print(f"{storage:<8} {rows:>10,} {key:<7} {'ingênuo':<8} {label:<12} {mib(size):>12} "
+                              f"{seconds:6.1f}s {n / seconds:>11,.0f} {mib(peak):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# BENCHMARK – DIÁRIO EM LOTE x UM add_ledger_entry POR PARTIDA
+# ============================================================
+# python -m benchmarks.bench_journal --entries 100000 --storage shared sqlite
+#
+# Cada armazenamento roda num processo novo (o modo é lido na importação do
+# app). Lançamentos de duas ou três partidas balanceadas; o caminho por
+# partida chama add_ledger_entry (uma transação e um evento por partida) e o
+# caminho em lote chama post_journal uma vez. Resultado em partidas/s.
+
+ACCOUNTS = ["1.1.1.01", "1.1.2.01", "2.1.1.01", "2.1.2.01", "3.1.1.01", "4.1.1.01"]
+
+
+def journal_legs(entries: int, seed: int = 42) -> pd.DataFrame:
+    # Metade dos lançamentos com duas partidas, metade com três (tributo).
+    rng = np.random.default_rng(seed)
+    amount = np.round(rng.uniform(10, 10_000, entries), 2)
+    tax = np.where(np.arange(entries) % 2 == 1, np.round(amount * 0.1, 2), 0.0)
+    day = np.datetime64("2024-01-01") + rng.integers(0, 365, entries).astype("timedelta64[D]")
+    company = rng.integers(1, 4, entries)
+    ids = np.arange(entries)
+    debit_acc = np.array(ACCOUNTS[:2], dtype=object)[rng.integers(0, 2, entries)]
+    credit_acc = np.array(ACCOUNTS[4:], dtype=object)[rng.integers(0, 2, entries)]
+    parts = [
+        pd.DataFrame({"entry": ids, "company_id": company, "date": day, "account_code": debit_acc,
+                      "debit": amount, "credit": 0.0}),
+        pd.DataFrame({"entry": ids, "company_id": company, "date": day, "account_code": credit_acc,
+                      "debit": 0.0, "credit": amount - tax}),
+    ]
+    has_tax = tax > 0
+    parts.append(pd.DataFrame({"entry": ids[has_tax], "company_id": company[has_tax], "date": day[has_tax],
+                               "account_code": ACCOUNTS[2], "debit": 0.0, "credit": tax[has_tax]}))
+    return pd.concat(parts, ignore_index=True).sort_values("entry", kind="stable", ignore_index=True)
+
+
+def run_worker(storage: str, entries: int, per_leg_entries: int):
+    tmp = tempfile.mkdtemp(prefix="erp-journal-")
+    os.environ["ERP_STORAGE"] = storage
+    os.environ["ERP_DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ERP_EVENTS_DIR"] = os.path.join(tmp, "events")
+    os.environ["ERP_AUDIT_DIR"] = os.path.join(tmp, "audit")
+    os.environ["ERP_STATE_DIR"] = os.path.join(tmp, "state")
+    import streamlit_app as app
+
+    for i in range(1, 4):
+        app.add_company(f"Empresa {i}", f"{i:014d}", "Lucro Real")
+    for code in ACCOUNTS:
+        app.add_account(code, f"Conta {code}", "Ativo")
+
+    legs = journal_legs(entries)
+    sample = legs[legs["entry"] < per_leg_entries]
+    t0 = time.perf_counter()
+    for leg in sample.itertuples(index=False):
+        app.add_ledger_entry(int(leg.company_id), leg.date.date(), leg.account_code, None,
+                             float(leg.debit), float(leg.credit), "Lançamento", "Manual", None)
+    per_leg = len(sample) / (time.perf_counter() - t0)
+
+    events = len(app.event_log())
+    t0 = time.perf_counter()
+    stats = app.post_journal(legs)
+    batch = len(legs) / (time.perf_counter() - t0)
+    repo = app.get_repo()
+    assert repo.count("ledger") == len(sample) + len(legs)
+    assert app.trial_balance().check(repo.columnar("ledger")).empty
+    print(f"{storage:>7} {entries:>9,} lançamentos / {len(legs):,} partidas")
+    print(f"    por partida ({len(sample):,} partidas) {per_leg:>12,.0f} partidas/s")
+    print(f"    post_journal                 {batch:>12,.0f} partidas/s  ({batch / per_leg:,.0f}x, "
+          f"{len(app.event_log()) - events} evento, ids {stats.journal_ids[0]}-{stats.journal_ids[1]})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--per-leg-entries", type=int, default=None,
+                        help="lançamentos medidos no caminho por partida (padrão: todos)")
+    parser.add_argument("--storage", nargs="+", default=["shared", "sqlite"])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    per_leg = args.per_leg_entries or args.entries
+
+    if args.worker:
+        run_worker(args.worker, args.entries, per_leg)
+        return
+    import subprocess
+
+    for storage in args.storage:
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_journal", "--worker", storage,
+                        "--entries", str(args.entries), "--per-leg-entries", str(per_leg)], check=True)
+
+
+if __name__ == "__main__":
+    main()
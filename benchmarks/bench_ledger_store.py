@@ -0,0 +1,105 @@
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from erp.ledger_store import ColumnarLedger
+from streamlit_app import LedgerEntry
+
+# ============================================================
+# BENCHMARK – LISTA DE DATACLASSES x LIVRO RAZÃO COLUNAR
+# ============================================================
+# python -m benchmarks.bench_ledger_store --sizes 100000 1000000 5000000
+
+ACCOUNTS = [f"{a}.{b}.{c}.{d:02d}" for a in (1, 2, 3, 4) for b in (1, 2) for c in (1, 2, 3) for d in range(1, 6)]
+
+
+def ledger_columns(n: int, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n + 1)
+    debit = np.round(rng.uniform(1, 10_000, n), 2)
+    is_debit = rng.random(n) < 0.5
+    return {
+        "id": ids,
+        "company_id": rng.integers(1, 21, n),
+        "date": np.datetime64("2024-01-01") + rng.integers(0, 365, n).astype("timedelta64[D]"),
+        "account_code": np.array(ACCOUNTS, dtype=object)[rng.integers(0, len(ACCOUNTS), n)],
+        "cost_center_id": rng.integers(1, 50, n),
+        "debit": np.where(is_debit, debit, 0.0),
+        "credit": np.where(is_debit, 0.0, debit),
+        "history": np.array([f"Reconhecimento ref. título NF-{i}" for i in ids], dtype=object),
+        "origin_type": np.array(["FinancialTitle"], dtype=object)[np.zeros(n, np.int64)],
+        "origin_id": ids,
+    }
+
+
+def dataclass_entries(cols: dict) -> list:
+    base = date(1970, 1, 1)
+    days = cols["date"].astype("datetime64[D]").astype(np.int64).tolist()
+    return [
+        LedgerEntry(id=i, company_id=c, date=base + timedelta(days=d), account_code=a,
+                    cost_center_id=cc, debit=db, credit=cr, history=h, origin_type=o, origin_id=oi)
+        for i, c, d, a, cc, db, cr, h, o, oi in zip(
+            cols["id"].tolist(), cols["company_id"].tolist(), days, cols["account_code"].tolist(),
+            cols["cost_center_id"].tolist(), cols["debit"].tolist(), cols["credit"].tolist(),
+            cols["history"].tolist(), cols["origin_type"].tolist(), cols["origin_id"].tolist(),
+        )
+    ]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def bench(n: int) -> list[dict]:
+    cols = ledger_columns(n)
+    # As strings de histórico já existem nos dois casos; mede-se só a estrutura.
+    entries, list_bytes = measure(lambda: dataclass_entries(cols))
+    list_ms = timed(lambda: pd.DataFrame([asdict(e) for e in entries]), repeat=1)
+    del entries
+
+    def build_columnar():
+        store = ColumnarLedger(LedgerEntry)
+        for start in range(0, n, 100_000):
+            store.append_columns(**{k: v[start:start + 100_000] for k, v in cols.items()})
+        return store
+
+    store, columnar_bytes = measure(build_columnar)
+    columnar_ms = timed(store.frame)
+    return [
+        {"rows": n, "store": "dataclass list", "bytes_per_row": list_bytes / n, "frame_ms": list_ms},
+        {"rows": n, "store": "columnar", "bytes_per_row": columnar_bytes / n, "frame_ms": columnar_ms},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    args = parser.parse_args()
+    for n in args.sizes:
+        for r in bench(n):
+            print(f"{r['rows']:>10,} {r['store']:>15}: {r['bytes_per_row']:8.1f} B/linha | "
+                  f"DataFrame {r['frame_ms']:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
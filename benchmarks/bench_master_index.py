@@ -0,0 +1,111 @@
+import argparse
+import os
+import tempfile
+import time
+
+# ============================================================
+# BENCHMARK – FORMULÁRIOS COM CADASTROS GRANDES (ÍNDICES)
+# ============================================================
+# python -m benchmarks.bench_master_index --customers 50000 --accounts 20000
+#
+# Compara a montagem dos mapas de opções a partir de fetch() completo (como
+# era feito a cada rerun) com os mapas incrementais do IndexRegistry, e mede
+# a latência de rerun das páginas de cadastro e financeiro via AppTest.
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+
+def seed(repo, app, companies: int, customers: int, accounts: int, cost_centers: int):
+    with repo.transaction():
+        repo.insert_many("companies", [
+            app.Company(id=i, name=f"Empresa {i}", cnpj=f"{i:014d}", regime="Real")
+            for i in range(1, companies + 1)
+        ])
+        repo.insert_many("cost_centers", [
+            app.CostCenter(id=i, code=f"CC{i:05d}", name=f"Centro {i}") for i in range(1, cost_centers + 1)
+        ])
+        repo.insert_many("accounts", [
+            app.Account(id=i, code=f"{1 + i % 5}.{i // 1000 % 10}.{i:06d}", name=f"Conta {i}", type="Ativo")
+            for i in range(1, accounts + 1)
+        ])
+        repo.insert_many("customers", [
+            app.Customer(id=i, name=f"Cliente {i}", doc=f"{i:011d}", kind="PF",
+                         company_id=1 + i % companies)
+            for i in range(1, customers + 1)
+        ])
+        for key, n in [("company_id", companies), ("cost_center_id", cost_centers),
+                       ("account_id", accounts), ("customer_id", customers)]:
+            repo.next_ids(key, n)
+
+
+def time_ms(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--accounts", type=int, default=20_000)
+    parser.add_argument("--cost-centers", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ERP_STORAGE"] = "sqlite"
+        os.environ["ERP_DB_PATH"] = os.path.join(tmp, "bench.db")
+        os.environ["ERP_EVENTS_DIR"] = os.path.join(tmp, "events")
+        os.environ["ERP_AUDIT_DIR"] = os.path.join(tmp, "audit")
+        os.environ["ERP_STATE_DIR"] = os.path.join(tmp, "state")
+        import streamlit_app as app
+        from streamlit.testing.v1 import AppTest
+
+        repo = app.get_repo()
+        t0 = time.perf_counter()
+        seed(repo, app, args.companies, args.customers, args.accounts, args.cost_centers)
+        print(f"carga: {time.perf_counter() - t0:.1f}s")
+
+        def scan_maps():
+            companies = {f"{c.id} - {c.name}": c.id for c in repo.fetch("companies")}
+            accs = {f"{a.code} - {a.name}": a for a in repo.fetch("accounts")}
+            ccs = {f"{c.code} - {c.name}": c.id for c in repo.fetch("cost_centers")}
+            return companies, accs, ccs
+
+        t0 = time.perf_counter()
+        idx = app.IndexRegistry.build(app.INDEX_SPECS, repo)
+        build_ms = (time.perf_counter() - t0) * 1000
+        repo.views["master_index"] = idx
+
+        def indexed_maps():
+            companies = app.company_options()
+            accs = idx.options("accounts", "label", lambda a: f"{a.code} - {a.name}")
+            ccs = idx.options("cost_centers", "label", lambda c: f"{c.code} - {c.name}", lambda c: c.id)
+            return companies, accs, ccs
+
+        indexed_maps()
+        print(f"construção do índice: {build_ms:,.0f} ms")
+        print(f"mapas via fetch completo: {time_ms(scan_maps, args.reruns):8.2f} ms/rerun")
+        print(f"mapas via índice:         {time_ms(indexed_maps, args.reruns):8.2f} ms/rerun")
+        t0 = time.perf_counter()
+        for i in range(1_000):
+            idx.check_unique("accounts", code=f"9.9.{i:06d}")
+        print(f"checagem de unicidade:    {(time.perf_counter() - t0) * 1e6 / 1_000:8.2f} µs")
+
+        for page in ["Cadastros Mestre", "Financeiro-Contábil"]:
+            at = AppTest.from_file(APP, default_timeout=600).run()
+            t0 = time.perf_counter()
+            at.sidebar.radio[0].set_value(page).run()
+            first = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            for _ in range(args.reruns):
+                at.run()
+            rerun = (time.perf_counter() - t0) * 1000 / args.reruns
+            assert not at.exception, [e.value for e in at.exception]
+            print(f"{page:>20}: primeiro render {first:,.0f} ms | rerun {rerun:,.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# ============================================================
+# BENCHMARK – PÁGINAS DOS NÚCLEOS (APPTEST, SEM NAVEGADOR)
+# ============================================================
+# python -m benchmarks.bench_pages --rows 1000 100000 --storage sqlite shared
+# python -m benchmarks.bench_pages --compare bench-results/pages-<a>.json bench-results/pages-<b>.json
+#
+# Para cada (armazenamento, tamanho) um processo novo gera a base com o
+# gerador semeado (benchmarks.datagen), abre o app no AppTest do Streamlit
+# e, para cada núcleo, mede a primeira renderização e N reexecuções:
+# tempo de parede, tempo gasto construindo DataFrames (pd.DataFrame e
+# pd.concat, só a chamada mais externa) e pico de memória residente.
+# O resultado vai para bench-results/pages-<commit>.json, que pode ser
+# comparado com o de outro commit via --compare.
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+PAGES = [
+    "Cadastros Mestre",
+    "Financeiro-Contábil",
+    "Fiscal / Tributário",
+    "Processos & Workflow",
+    "Segurança & Auditoria",
+    "Integração & Eventos",
+    "Analytics & Painel",
+]
+
+
+def percentile(data: list[float], p: float) -> float:
+    data = sorted(data)
+    return data[min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))] if data else 0.0
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(APP), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+# ------------------------------------------------------------
+# Instrumentação (só no processo do benchmark)
+# ------------------------------------------------------------
+
+class FrameTimer:
+    # Envolve pd.DataFrame.__init__ e pd.concat; chamadas aninhadas (um
+    # concat que cria DataFrames) contam uma vez só.
+    def __init__(self):
+        import pandas as pd
+
+        self.seconds = 0.0
+        self.calls = 0
+        self._depth = 0
+        self._init = pd.DataFrame.__init__
+        self._concat = pd.concat
+        timer = self
+
+        def wrap(fn):
+            def timed(*args, **kwargs):
+                if timer._depth:
+                    return fn(*args, **kwargs)
+                timer._depth += 1
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    timer.seconds += time.perf_counter() - t0
+                    timer.calls += 1
+                    timer._depth -= 1
+            return timed
+
+        pd.DataFrame.__init__ = wrap(self._init)
+        pd.concat = wrap(self._concat)
+
+    def reset(self):
+        self.seconds = 0.0
+        self.calls = 0
+
+
+def reset_peak_rss() -> bool:
+    # Linux: "5" em clear_refs zera o pico (VmHWM) do processo.
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ------------------------------------------------------------
+# Worker: um armazenamento, um tamanho
+# ------------------------------------------------------------
+
+def run_worker(storage: str, rows: int, reruns: int, seed: int) -> dict:
+    tmp = tempfile.mkdtemp(prefix="erp-pages-")
+    os.environ["ERP_STORAGE"] = storage
+    os.environ["ERP_DB_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ERP_EVENTS_DIR"] = os.path.join(tmp, "events")
+    os.environ["ERP_AUDIT_DIR"] = os.path.join(tmp, "audit")
+    os.environ["ERP_STATE_DIR"] = os.path.join(tmp, "state")
+    sys.path.insert(0, os.path.dirname(APP))
+    from streamlit.testing.v1 import AppTest
+
+    import streamlit_app as app
+    from benchmarks.datagen import Scale, generate
+    from erp.storage import MemoryRepository
+
+    scale = Scale.for_rows(rows)
+    at = AppTest.from_file(APP, default_timeout=3600)
+    t0 = time.perf_counter()
+    if storage == "memory":
+        # O repositório do modo memória vive no session_state da sessão do
+        # AppTest: gera num repositório avulso e copia o estado para ela.
+        repo = MemoryRepository(app.ENTITIES, {}, app.COLUMNAR)
+        generate(repo, app, scale, seed, progress=None)
+        for key, value in repo.state.items():
+            at.session_state[key] = value
+    else:
+        generate(app.get_repo(), app, scale, seed, progress=None)
+    seed_seconds = time.perf_counter() - t0
+
+    frames = FrameTimer()
+    reset_peak_rss()
+    t0 = time.perf_counter()
+    at.run()
+    startup_ms = (time.perf_counter() - t0) * 1000
+    results = []
+    for page in PAGES:
+        reset_peak_rss()
+        frames.reset()
+        t0 = time.perf_counter()
+        at.sidebar.radio[0].set_value(page).run()
+        first_ms = (time.perf_counter() - t0) * 1000
+        first_df_ms = frames.seconds * 1000
+        errors = [str(e.value) for e in at.exception]
+        frames.reset()
+        times = []
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            at.run()
+            times.append((time.perf_counter() - t0) * 1000)
+            errors += [str(e.value) for e in at.exception]
+        results.append({
+            "storage": storage,
+            "rows": rows,
+            "page": page,
+            "first_ms": first_ms,
+            "first_df_ms": first_df_ms,
+            "rerun_ms": times,
+            "rerun_p50_ms": percentile(times, 50),
+            "rerun_p95_ms": percentile(times, 95),
+            "df_ms_per_rerun": frames.seconds * 1000 / max(reruns, 1),
+            "df_calls_per_rerun": frames.calls / max(reruns, 1),
+            "peak_rss_mb": peak_rss_mb(),
+            "errors": sorted(set(errors)),
+        })
+    return {"storage": storage, "rows": rows, "seed_s": seed_seconds, "startup_ms": startup_ms,
+            "scale": vars(scale), "pages": results}
+
+
+# ------------------------------------------------------------
+# Comparação entre dois arquivos de resultado
+# ------------------------------------------------------------
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as fh:
+        old = json.load(fh)
+    with open(new_path, encoding="utf-8") as fh:
+        new = json.load(fh)
+    before = {(r["storage"], r["rows"], r["page"]): r for r in old["results"]}
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    print(f"{'armaz.':>7} {'linhas':>10} {'núcleo':<24} {'p50 antes':>10} {'p50 depois':>10} {'razão':>7} "
+          f"{'df antes':>9} {'df depois':>9} {'RSS MB':>14}")
+    for r in new["results"]:
+        o = before.get((r["storage"], r["rows"], r["page"]))
+        if o is None:
+            continue
+        ratio = r["rerun_p50_ms"] / o["rerun_p50_ms"] if o["rerun_p50_ms"] else float("nan")
+        print(f"{r['storage']:>7} {r['rows']:>10,} {r['page']:<24} {o['rerun_p50_ms']:>8.1f}ms "
+              f"{r['rerun_p50_ms']:>8.1f}ms {ratio:>6.2f}x {o['df_ms_per_rerun']:>7.1f}ms "
+              f"{r['df_ms_per_rerun']:>7.1f}ms {o['peak_rss_mb']:>6.0f}->{r['peak_rss_mb']:<6.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--storage", nargs="+", default=["sqlite", "shared"])
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="padrão: bench-results/pages-<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"))
+    parser.add_argument("--worker", nargs=2, metavar=("STORAGE", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.worker:
+        print(json.dumps(run_worker(args.worker[0], int(args.worker[1]), args.reruns, args.seed)))
+        return
+
+    commit = git_commit()
+    runs = []
+    for storage in args.storage:
+        for rows in args.rows:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_pages", "--worker", storage, str(rows),
+                 "--reruns", str(args.reruns), "--seed", str(args.seed)],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(APP),
+            ).stdout
+            run = json.loads(out.strip().splitlines()[-1])
+            runs.append(run)
+            print(f"{storage:>7} {rows:>10,} linhas: base gerada em {run['seed_s']:.1f}s, "
+                  f"abertura {run['startup_ms']:.0f} ms")
+            for r in run["pages"]:
+                print(f"    {r['page']:<24} 1ª {r['first_ms']:8.1f} ms | reexec. p50 {r['rerun_p50_ms']:8.1f} ms "
+                      f"p95 {r['rerun_p95_ms']:8.1f} ms | DataFrames {r['df_ms_per_rerun']:7.1f} ms "
+                      f"({r['df_calls_per_rerun']:.0f}) | pico RSS {r['peak_rss_mb']:6.0f} MB"
+                      + (f" | ERRO: {r['errors'][0]}" if r["errors"] else ""))
+
+    path = args.out or os.path.join(os.path.dirname(APP), "bench-results", f"pages-{commit}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    meta = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "reruns": args.reruns,
+        "seed": args.seed,
+    }
+    results = [r for run in runs for r in run["pages"]]
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "runs": [{k: v for k, v in run.items() if k != "pages"} for run in runs],
+                   "results": results}, fh, indent=2, ensure_ascii=False)
+    print(f"resultados em {path}")
+
+
+if __name__ == "__main__":
+    main()
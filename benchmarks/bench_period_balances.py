@@ -0,0 +1,84 @@
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+from benchmarks.bench_ledger_store import ledger_columns
+from erp.ledger_store import ColumnarLedger
+from erp.period_balances import TemporalBalances, month_id
+from streamlit_app import LedgerEntry
+
+# ============================================================
+# BENCHMARK – BALANCETE POR PERÍODO: SOMAS PREFIXADAS x FILTRO + GROUPBY
+# ============================================================
+# python -m benchmarks.bench_period_balances --sizes 100000 1000000
+#
+# Para cada tamanho: monta o razão colunar (datas ao longo de 2024), constrói
+# o índice de saldos por data, fecha os meses até setembro e compara
+# consultas de período (mês, trimestre, ano, até a data) com a varredura do
+# razão filtrando por data e agrupando por conta. Por fim, lançamentos
+# avulsos intercalados com consultas (formulário + balancete na mesma tela).
+
+QUERIES = [
+    ("mês fechado", date(2024, 3, 1), date(2024, 3, 31)),
+    ("trimestre", date(2024, 7, 1), date(2024, 9, 30)),
+    ("mês aberto", date(2024, 11, 1), date(2024, 11, 30)),
+    ("ano", date(2024, 1, 1), date(2024, 12, 31)),
+    ("até a data", None, date(2024, 10, 15)),
+]
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def scan(ledger: ColumnarLedger, start: date | None, end: date):
+    df = ledger.frame(columns=["date", "account_code", "debit", "credit"])
+    mask = df["date"] <= np.datetime64(end)
+    if start is not None:
+        mask &= df["date"] >= np.datetime64(start)
+    return df[mask].groupby("account_code", observed=True)[["debit", "credit"]].sum()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--interleaved", type=int, default=1_000, help="pares lançamento + consulta")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        ledger = ColumnarLedger(LedgerEntry)
+        ledger.append_columns(**ledger_columns(n))
+        t0 = time.perf_counter()
+        view = TemporalBalances.from_ledger(ledger)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        view.close_month(month_id(date(2024, 9, 1)))
+        close = time.perf_counter() - t0
+        print(f"{n:>10,} lançamentos: índice em {build * 1000:.0f} ms, fechamento até 2024-09 em {close * 1000:.0f} ms")
+        for label, start, end in QUERIES:
+            got = view.by_account(start, end).set_index("account_code")
+            want = scan(ledger, start, end)
+            assert np.allclose(got[["debit", "credit"]].to_numpy(), want.loc[got.index].to_numpy())
+            fast = best_of(lambda: view.by_account(start, end), args.repeat)
+            slow = best_of(lambda: scan(ledger, start, end), args.repeat)
+            print(f"    {label:<12} índice {fast * 1000:8.2f} ms | varredura {slow * 1000:8.2f} ms | "
+                  f"{slow / fast:6.1f}x")
+        accounts = view.accounts.values
+        t0 = time.perf_counter()
+        for i in range(args.interleaved):
+            view.post(1, accounts[i % len(accounts)], date(2024, 11, 1 + i % 30), 10.0, 0.0)
+            view.by_account(date(2024, 11, 1), date(2024, 11, 30))
+        per_op = (time.perf_counter() - t0) / args.interleaved
+        print(f"    lançamento avulso + consulta do mês aberto: {per_op * 1000:.2f} ms por par")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from erp.bulk_import import ImportIndexes
+from erp.journal import validate_journal
+from erp.reconciliation import match_statement, read_statement, settlement_legs
+
+# ============================================================
+# BENCHMARK – CONCILIAÇÃO: EXTRATO x TÍTULOS EM ABERTO
+# ============================================================
+# python -m benchmarks.bench_reconciliation --lines 100000 --titles 1000000
+#
+# Títulos AP/AR ao longo de 2024 (5 mil clientes/fornecedores); o extrato
+# paga uma amostra deles com a data deslocada em até 3 dias, metade com o
+# nome da parte no histórico e metade com o documento, mais tarifas sem
+# título. Mede a leitura do extrato (CSV e OFX), o casamento por hash +
+# janela ordenada, a montagem e a validação das partidas de baixa, e
+# compara com o laço aninhado (filtro dos títulos por linha) numa amostra.
+
+BANK, RECEIVABLE, PAYABLE = "1.1.1.01", "1.1.2.01", "2.1.1.01"
+
+
+def open_titles(n: int, rng) -> pd.DataFrame:
+    names = np.array([f"Cliente {i} Ltda" for i in range(5_000)], dtype=object)
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "company_id": rng.integers(1, 4, n),
+        "kind": np.where(rng.random(n) < 0.5, "AR", "AP"),
+        "party_name": names[rng.integers(0, len(names), n)],
+        "doc_number": pd.Series(np.arange(n)).map("NF{:07d}".format).to_numpy(object),
+        "due_date": np.datetime64("2024-01-01") + rng.integers(0, 366, n).astype("timedelta64[D]"),
+        "amount": np.round(rng.lognormal(7, 1.2, n), 2),
+    })
+
+
+def statement(titles: pd.DataFrame, n: int, rng) -> tuple[pd.DataFrame, np.ndarray]:
+    fees = n // 50
+    paid = titles.iloc[rng.choice(len(titles), n - fees, replace=False)]
+    sign = np.where(paid["kind"] == "AR", 1, -1)
+    with_name = rng.random(len(paid)) < 0.5
+    lines = pd.DataFrame({
+        "date": paid["due_date"].to_numpy() + rng.integers(-3, 4, len(paid)).astype("timedelta64[D]"),
+        "amount": sign * paid["amount"].to_numpy(),
+        "description": np.where(with_name, "PIX " + paid["party_name"].str.upper(), "TED"),
+        "doc": np.where(with_name, "", paid["doc_number"]),
+    })
+    tariffs = pd.DataFrame({"date": np.datetime64("2024-06-01"), "amount": -np.round(rng.uniform(1, 50, fees), 2),
+                            "description": "TARIFA BANCARIA", "doc": ""})
+    truth = np.concatenate([paid["id"].to_numpy(), np.zeros(fees, dtype=np.int64)])
+    return pd.concat([lines, tariffs], ignore_index=True), truth
+
+
+def to_csv(lines: pd.DataFrame) -> bytes:
+    out = lines.assign(date=lines["date"].dt.strftime("%d/%m/%Y"),
+                       amount=lines["amount"].map("{:.2f}".format).str.replace(".", ",", regex=False))
+    return out.to_csv(sep=";", index=False).encode()
+
+
+def to_ofx(lines: pd.DataFrame) -> bytes:
+    day = lines["date"].dt.strftime("%Y%m%d").tolist()
+    blocks = [
+        f"<STMTTRN>\n<TRNTYPE>{'CREDIT' if a > 0 else 'DEBIT'}\n<DTPOSTED>{d}120000[-3:BRT]\n<TRNAMT>{a:.2f}\n"
+        f"<FITID>{i}\n<CHECKNUM>{doc}\n<MEMO>{memo}\n</STMTTRN>"
+        for i, (d, a, memo, doc) in enumerate(zip(day, lines["amount"].tolist(), lines["description"].tolist(),
+                                                 lines["doc"].tolist()))
+    ]
+    return ("OFXHEADER:100\n<OFX><BANKTRANLIST>\n" + "\n".join(blocks) + "\n</BANKTRANLIST></OFX>").encode("latin-1")
+
+
+def nested_loop(lines: pd.DataFrame, titles: pd.DataFrame, window_days: int) -> list:
+    # Referência: para cada linha, filtra todos os títulos por valor e data.
+    cents = np.rint(titles["amount"].to_numpy() * 100).astype(np.int64) * np.where(titles["kind"] == "AR", 1, -1)
+    due = titles["due_date"].to_numpy("datetime64[D]")
+    window = np.timedelta64(window_days, "D")
+    out = []
+    for day, amount in zip(lines["date"].to_numpy("datetime64[D]"), lines["amount"].tolist()):
+        hit = (cents == round(amount * 100)) & (np.abs(due - day) <= window)
+        out.append(np.flatnonzero(hit))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--titles", type=int, default=1_000_000)
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--loop-sample", type=int, default=200, help="linhas medidas no laço aninhado")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    titles = open_titles(args.titles, rng)
+    lines, truth = statement(titles, args.lines, rng)
+    print(f"{args.lines:,} linhas de extrato x {args.titles:,} títulos em aberto (janela ±{args.window} dias)")
+
+    for fmt, raw in (("csv", to_csv(lines)), ("ofx", to_ofx(lines))):
+        t0 = time.perf_counter()
+        parsed = read_statement(raw, fmt)
+        print(f"    leitura {fmt.upper():<4} {len(raw) / 2**20:6.1f} MiB  {time.perf_counter() - t0:6.2f}s")
+        assert len(parsed) == len(lines)
+
+    t0 = time.perf_counter()
+    matches, unmatched = match_statement(parsed, titles, args.window)
+    match_s = time.perf_counter() - t0
+    right = matches["title_id"].to_numpy() == truth[matches["line"].to_numpy()]
+    confirmed = (matches["status"] == "confirmado").to_numpy()
+    print(f"    casamento       {match_s:6.2f}s  ({len(parsed) / match_s:,.0f} linhas/s): "
+          f"{confirmed.sum():,} confirmados ({right[confirmed].mean():.2%} corretos), "
+          f"{(~confirmed).sum():,} sugeridos ({right[~confirmed].mean():.2%}), {len(unmatched):,} sem título")
+
+    t0 = time.perf_counter()
+    legs = settlement_legs(matches[confirmed], BANK, RECEIVABLE, PAYABLE)
+    indexes = ImportIndexes(company_ids={1, 2, 3}, account_ids={BANK: 1, RECEIVABLE: 2, PAYABLE: 3},
+                            cost_center_ids={})
+    valid, rejected = validate_journal(legs, indexes)
+    assert rejected.empty
+    print(f"    partidas de baixa {time.perf_counter() - t0:5.2f}s  ({len(valid):,} partidas balanceadas)")
+
+    sample = parsed.head(args.loop_sample)
+    t0 = time.perf_counter()
+    nested_loop(sample, titles, args.window)
+    loop_s = (time.perf_counter() - t0) / len(sample) * len(parsed)
+    print(f"    laço aninhado   {loop_s:6.0f}s estimados (amostra de {len(sample)} linhas) -> "
+          f"{loop_s / match_s:,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import gc
+import sqlite3
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from datetime import datetime
+
+import numpy as np
+
+from erp.ledger_store import ColumnarLedger
+from erp.storage import _Table
+from streamlit_app import AuditLog, FinancialTitle, LedgerEntry
+
+# ============================================================
+# BENCHMARK – MEMÓRIA POR REGISTRO (ANTES x DEPOIS DOS REGISTROS COMPACTOS)
+# ============================================================
+# python -m benchmarks.bench_records --rows 1000000
+#
+# Títulos e auditoria: objetos decodificados de uma tabela SQLite em
+# memória, como o backend faz, com o dataclass comum (com __dict__, textos
+# e data-hora ISO repetidos por linha) e com o registro compacto (slots,
+# textos internados, timestamp inteiro). Razão: layout colunar anterior
+# (histórico como texto completo por linha) x modelo + argumento.
+
+
+def plain(cls, **overrides):
+    # Réplica do dataclass sem slots nem internação (formato anterior).
+    return make_dataclass(cls.__name__, [(f.name, overrides.get(f.name, f.type)) for f in fields(cls)])
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def sqlite_rows(cls, key: str, columns: dict, n: int):
+    table = _Table(key, cls)
+    conn = sqlite3.connect(":memory:")
+    for stmt in table.ddl():
+        conn.execute(stmt)
+    conn.executemany(table.insert_sql, zip(*(columns[c] for c in table.columns)))
+    return conn, table
+
+
+def decode_all(conn, table) -> list:
+    out = []
+    cur = conn.execute(f"{table.select_sql} ORDER BY id")
+    while chunk := cur.fetchmany(50_000):
+        out.extend(table.decode(r) for r in chunk)
+    return out
+
+
+def titles_bench(n: int, rng) -> tuple[int, int]:
+    ids = np.arange(1, n + 1)
+    issue = np.datetime64("2024-01-01") + rng.integers(0, 730, n).astype("timedelta64[D]")
+    cols = {
+        "id": ids.tolist(),
+        "company_id": rng.integers(1, 50, n).tolist(),
+        "kind": np.where(rng.random(n) < 0.5, "AR", "AP").tolist(),
+        "party_name": [f"Cliente {i}" for i in rng.integers(1, n // 10 + 2, n).tolist()],
+        "doc_number": [f"NF-{i}" for i in ids.tolist()],
+        "issue_date": [str(d) for d in issue],
+        "due_date": [str(d) for d in issue + 30],
+        "amount": np.round(rng.lognormal(7, 1.2, n), 2).tolist(),
+        "cost_center_id": [None] * n,
+        "account_id": rng.integers(1, 500, n).tolist(),
+        "status": np.array(["Aberto", "Pago", "Cancelado"])[rng.integers(0, 3, n)].tolist(),
+    }
+    sizes = []
+    for cls in (plain(FinancialTitle), FinancialTitle):
+        conn, table = sqlite_rows(cls, "titles", cols, n)
+        rows, nbytes = measure(lambda: decode_all(conn, table))
+        sizes.append(nbytes)
+        del rows
+        conn.close()
+    return sizes[0], sizes[1]
+
+
+def audit_bench(n: int, rng) -> tuple[int, int]:
+    t0 = int(datetime(2024, 1, 1).timestamp())
+    stamps = (t0 + np.sort(rng.integers(0, 365 * 86_400, n))).tolist()
+    base = {
+        "id": list(range(1, n + 1)),
+        "user_name": np.array(["ana", "bruno", "carla", "diego"])[rng.integers(0, 4, n)].tolist(),
+        "action": np.array(["CREATE", "UPDATE", "DELETE", "LOGIN"])[rng.integers(0, 4, n)].tolist(),
+        "entity_type": np.array(["FinancialTitle", "Company", "LedgerEntry"])[rng.integers(0, 3, n)].tolist(),
+        "entity_id": rng.integers(1, n + 1, n).tolist(),
+    }
+    sizes = []
+    for cls, timestamps in ((plain(AuditLog, timestamp=str),
+                             [datetime.fromtimestamp(t).isoformat(timespec="seconds") for t in stamps]),
+                            (AuditLog, stamps)):
+        conn, table = sqlite_rows(cls, "audit_logs", base | {"timestamp": timestamps}, n)
+        rows, nbytes = measure(lambda: decode_all(conn, table))
+        sizes.append(nbytes)
+        del rows
+        conn.close()
+    return sizes[0], sizes[1]
+
+
+def ledger_bench(n: int, rng) -> tuple[int, int]:
+    ids = np.arange(1, n + 1)
+    codes = [f"{a}.{b}.{c}.{d:02d}" for a in (1, 2, 3, 4) for b in (1, 2) for c in (1, 2, 3) for d in range(1, 6)]
+    amount = np.round(rng.lognormal(7, 1.2, n), 2)
+    is_ar = rng.random(n) < 0.5
+    cols = {
+        "id": ids,
+        "company_id": rng.integers(1, 50, n),
+        "date": np.datetime64("2024-01-01") + rng.integers(0, 730, n).astype("timedelta64[D]"),
+        "account_code": np.array(codes, dtype=object)[rng.integers(0, len(codes), n)],
+        "cost_center_id": rng.integers(1, 50, n),
+        "debit": np.where(is_ar, 0.0, amount),
+        "credit": np.where(is_ar, amount, 0.0),
+        "origin_type": np.full(n, "FinancialTitle", dtype=object),
+        "origin_id": ids,
+    }
+
+    def history():
+        # Textos novos a cada chamada, como chegam do formulário ou do SQLite.
+        return (f"Reconhecimento de {'receita' if ar else 'despesa'} ref. título NF-{i}"
+                for i, ar in zip(ids.tolist(), is_ar.tolist()))
+
+    def before():
+        # Layout colunar anterior: mesmos arrays, histórico completo por linha.
+        return {
+            "id": cols["id"].copy(), "company_id": cols["company_id"].copy(),
+            "date": cols["date"].astype("datetime64[s]"),
+            "account_code": np.zeros(n, np.int8), "cost_center_id": cols["cost_center_id"].copy(),
+            "debit": cols["debit"].copy(), "credit": cols["credit"].copy(),
+            "history": np.array(list(history()), dtype=object),
+            "origin_type": np.zeros(n, np.int8), "origin_id": cols["origin_id"].copy(),
+        }
+
+    def after():
+        store = ColumnarLedger(LedgerEntry)
+        store.append_columns(**cols, history=np.array(list(history()), dtype=object))
+        return store
+
+    old, old_bytes = measure(before)
+    del old
+    new, new_bytes = measure(after)
+    assert new.row(n - 1).history.endswith(f"NF-{n}")
+    del new
+    return old_bytes, new_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    n = args.rows
+    rng = np.random.default_rng(args.seed)
+    print(f"{'entidade':<12} {'antes B/reg':>12} {'depois B/reg':>13} {'redução':>8}")
+    for name, bench in (("títulos", titles_bench), ("razão", ledger_bench), ("auditoria", audit_bench)):
+        old, new = bench(n, rng)
+        print(f"{name:<12} {old / n:>12.1f} {new / n:>13.1f} {1 - new / old:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from erp.search import SearchIndex, normalize
+from streamlit_app import SEARCH_SPECS
+
+# ============================================================
+# BENCHMARK – BUSCA: ÍNDICE INVERTIDO x VARREDURA DAS COLUNAS
+# ============================================================
+# python -m benchmarks.bench_search --records 1000000
+#
+# Cadastros com nomes brasileiros (acentuados) e documentos mascarados:
+# 70% títulos, 25% clientes, 5% produtos e algumas empresas. Mede a
+# montagem do índice, inclusões unitárias (com as fusões de segmentos) e a
+# latência das consultas por tipo (exata, prefixo, erro de digitação,
+# documento com e sem máscara, várias palavras), comparando com a
+# varredura das colunas normalizadas (str.contains) numa amostra.
+
+FIRST = ["José", "João", "Maria", "Ana", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas",
+         "Luíza", "Márcia", "Gabriel", "Rafael", "Fernanda", "Sebastião", "Letícia", "Vinícius", "Cecília", "Inês"]
+LAST = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+        "Conceição", "Ribeiro", "Araújo", "Carvalho", "Gonçalves", "Magalhães", "Brandão", "Assunção", "Simões",
+        "Falcão", "Nóbrega", "Guimarães", "Estêvão", "Damião", "Lopes"]
+WORDS = ["Pão", "Café", "Açúcar", "Feijão", "Óleo", "Sabão", "Farinha", "Leite", "Arroz", "Macarrão"]
+
+
+def people(n: int, rng) -> np.ndarray:
+    f = np.array(FIRST, dtype=object)[rng.integers(0, len(FIRST), n)]
+    a = np.array(LAST, dtype=object)[rng.integers(0, len(LAST), n)]
+    b = np.array(LAST, dtype=object)[rng.integers(0, len(LAST), n)]
+    return f + " " + a + " " + b
+
+
+def masked(digits: np.ndarray, cnpj: bool) -> np.ndarray:
+    s = pd.Series(digits).map(("{:014d}" if cnpj else "{:011d}").format)
+    if cnpj:
+        return (s.str[:2] + "." + s.str[2:5] + "." + s.str[5:8] + "/" + s.str[8:12] + "-" + s.str[12:]).to_numpy(object)
+    return (s.str[:3] + "." + s.str[3:6] + "." + s.str[6:9] + "-" + s.str[9:]).to_numpy(object)
+
+
+def dataset(records: int, seed: int) -> dict[str, dict]:
+    rng = np.random.default_rng(seed)
+    n_titles, n_customers = int(records * 0.70), int(records * 0.25)
+    n_products, n_companies = records - n_titles - n_customers - 200, 200
+    customers = people(n_customers, rng)
+    return {
+        "companies": {"id": np.arange(1, n_companies + 1),
+                      "name": np.array([f"Empresa {LAST[i % len(LAST)]} {i}" for i in range(n_companies)], dtype=object),
+                      "cnpj": masked(rng.integers(10**12, 10**14, n_companies), True)},
+        "customers": {"id": np.arange(1, n_customers + 1), "name": customers,
+                      "doc": masked(rng.integers(10**9, 10**11, n_customers), False)},
+        "products": {"id": np.arange(1, n_products + 1),
+                     "name": (np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), n_products)] + " "
+                              + pd.Series(rng.integers(1, 1000, n_products)).astype(str).to_numpy(object) + "g"),
+                     "sku": pd.Series(np.arange(n_products)).map("SKU-{:08d}".format).to_numpy(object),
+                     "ncm": pd.Series(rng.integers(1000_0000, 9999_9999, n_products)).astype(str).to_numpy(object)},
+        "titles": {"id": np.arange(1, n_titles + 1),
+                   "party_name": customers[rng.integers(0, n_customers, n_titles)],
+                   "doc_number": pd.Series(np.arange(n_titles)).map("NF-{:07d}".format).to_numpy(object)},
+    }
+
+
+def queries(data: dict, rng) -> dict[str, list[str]]:
+    def pick(key, col, n=30):
+        values = data[key][col]
+        return [str(v) for v in values[rng.integers(0, len(values), n)]]
+
+    def typo(word: str) -> str:
+        i = int(rng.integers(1, len(word) - 1))
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]  # troca duas letras vizinhas
+
+    names = pick("customers", "name")
+    return {
+        "nome completo": names,
+        "nome sem acento": [normalize(n) for n in names],
+        "prefixo": [" ".join(w[:4] for w in n.split()[:2]) for n in names],
+        "erro de digitação": [" ".join(typo(w) if len(w) >= 5 else w for w in n.split()) for n in names],
+        "CPF com máscara": pick("customers", "doc"),
+        "CPF sem máscara": ["".join(ch for ch in d if ch.isdigit()) for d in pick("customers", "doc")],
+        "CNPJ raiz (prefixo)": [d[:10] for d in pick("companies", "cnpj")],
+        "nº do título": pick("titles", "doc_number"),
+        "produto": [n.split()[0] for n in pick("products", "name")],
+        "palavra comum": [LAST[int(i)] for i in rng.integers(0, len(LAST), 30)],
+    }
+
+
+def scan(frames: dict[str, pd.DataFrame], query: str, k: int):
+    # Referência: cada termo normalizado contido em alguma coluna (AND).
+    out = []
+    terms = normalize(query).split()
+    for key, df in frames.items():
+        mask = np.ones(len(df), dtype=bool)
+        for t in terms:
+            hit = np.zeros(len(df), dtype=bool)
+            for col in df.columns:
+                hit |= df[col].str.contains(t, regex=False).to_numpy()
+            mask &= hit
+        out.extend((key, i) for i in np.flatnonzero(mask)[:k])
+    return out[:k]
+
+
+def percentiles(ms: list[float]) -> str:
+    return f"p50 {np.percentile(ms, 50):6.2f} ms  p95 {np.percentile(ms, 95):6.2f} ms  máx {max(ms):6.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--adds", type=int, default=5_000)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--scan-sample", type=int, default=3, help="consultas por tipo na varredura")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    data = dataset(args.records, args.seed)
+    index = SearchIndex(SEARCH_SPECS)
+    t0 = time.perf_counter()
+    for key, cols in data.items():
+        index.add_columns(key, cols["id"], cols)
+    build = time.perf_counter() - t0
+    print(f"{len(index):,} registros indexados em {build:.1f}s ({len(index) / build:,.0f}/s), "
+          f"{index.nbytes() / 2**20:,.0f} MiB, {len(index.segments)} segmento(s)")
+
+    lat = []
+    merges = index.merges
+    for i in range(args.adds):
+        obj = SimpleNamespace(id=10**9 + i, name=f"Cliente Novo {i}", doc=f"{i:011d}")
+        t0 = time.perf_counter()
+        index.add("customers", obj)
+        lat.append((time.perf_counter() - t0) * 1000)
+    print(f"{args.adds:,} inclusões unitárias: média {np.mean(lat):.2f} ms, {percentiles(lat)}, "
+          f"{index.merges - merges:,} fusões, {len(index.segments)} segmentos")
+
+    rng = np.random.default_rng(args.seed + 1)
+    frames = {key: pd.DataFrame({c: pd.Series(v).map(normalize) for c, v in cols.items() if c != "id"})
+              for key, cols in data.items()}
+    print(f"{'consulta':<22} {'índice':>52} {'resultados':>11} {'varredura':>11}")
+    for label, qs in queries(data, rng).items():
+        ms, found = [], 0
+        for q in qs:
+            t0 = time.perf_counter()
+            hits = index.search(q, k=args.k)
+            ms.append((time.perf_counter() - t0) * 1000)
+            found += bool(hits)
+        t0 = time.perf_counter()
+        for q in qs[:args.scan_sample]:
+            scan(frames, q, args.k)
+        scan_ms = (time.perf_counter() - t0) * 1000 / args.scan_sample
+        print(f"{label:<22} {percentiles(ms):>52} {found:>5}/{len(qs):<5} {scan_ms:>8,.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
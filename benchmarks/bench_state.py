@@ -0,0 +1,272 @@
+import argparse
+import gc
+import shutil
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+import streamlit_app as app
+from erp.state_store import StateStore, inserted_columns, updated
+from erp.storage import SharedMemoryRepository
+
+# ============================================================
+# BENCHMARK – ESTADO POR EVENTOS: ABERTURA COM SNAPSHOT x REPRODUÇÃO COMPLETA
+# ============================================================
+# python -m benchmarks.bench_state --events 10000000 --tail 500000
+#
+# Grava no diário de estado N eventos no formato de log_event (um por
+# add_*: lançamento avulso, título, baixa de título, cliente; um lote de
+# títulos a cada --batch-every eventos) e mantém o mesmo estado num
+# repositório vivo, aplicado em bloco por outro caminho (insert_columns /
+# update_many) para servir de conferência. Um snapshot é gravado --tail
+# eventos antes do fim. Depois, em repositórios vazios:
+#   abertura   – snapshot mais recente + cauda do diário (o que o app faz);
+#   reprodução – o diário inteiro, sem snapshot.
+# Os dois estados são conferidos contra o repositório vivo.
+
+ACCOUNTS = [f"{g}.{i // 10 + 1}.{i % 10 + 1}.{j:04d}" for g in (1, 2, 3, 4) for i in range(20) for j in range(1, 6)]
+ORIGINS = ["Manual", "FinancialTitle", "JournalEntry"]
+BASE_DAY = date(2023, 1, 1)
+
+
+def store_for(directory: str) -> StateStore:
+    # Sem snapshot automático (o benchmark escolhe o ponto) e sem apagar o
+    # diário: a reprodução completa precisa dele inteiro.
+    return StateStore(directory, app.ID_COUNTERS, app.COUNTERS, app.STATE_SEGMENT_SIZE,
+                      snapshot_every=None, prune=False)
+
+
+def new_repo() -> SharedMemoryRepository:
+    return SharedMemoryRepository(app.ENTITIES, app.COLUMNAR)
+
+
+def seed(repo, store, companies: int):
+    # Cadastros iniciais: um evento por registro, como nos formulários.
+    for i in range(1, companies + 1):
+        columns = {"id": [i], "name": [f"Empresa {i}"], "cnpj": [f"{i:014d}"], "regime": ["Real"]}
+        repo.insert_columns("companies", columns)
+        store.append([inserted_columns("companies", columns)])
+    for i, code in enumerate(ACCOUNTS, 1):
+        columns = {"id": [i], "code": [code], "name": [f"Conta {code}"], "type": ["Ativo"]}
+        repo.insert_columns("accounts", columns)
+        store.append([inserted_columns("accounts", columns)])
+    repo.advance_counter("company_id", companies + 1)
+    repo.advance_counter("account_id", len(ACCOUNTS) + 1)
+
+
+class Generator:
+    # Eventos em blocos: as colunas do bloco são sorteadas com NumPy, cada
+    # evento vira um registro do diário e o bloco inteiro é aplicado ao
+    # repositório vivo de uma vez.
+    def __init__(self, companies: int, batch_every: int, seed: int):
+        self.rng = np.random.default_rng(seed)
+        self.companies = companies
+        self.batch_every = batch_every
+        self.ids = {"ledger": 1, "titles": 1, "customers": 1}
+        self.events = 0
+        self.batches = 0
+        self.append_seconds = 0.0
+
+    def take(self, key: str, n: int) -> np.ndarray:
+        first = self.ids[key]
+        self.ids[key] += n
+        return np.arange(first, first + n)
+
+    def block(self, repo, store, n: int):
+        rng = self.rng
+        kind = rng.choice(4, n, p=[0.70, 0.20, 0.08, 0.02])  # lançamento, título, baixa, cliente
+        existing = self.ids["titles"] - 1  # baixas só de títulos de blocos anteriores
+        ledger = self.ledger(int((kind == 0).sum()))
+        titles = self.titles(int((kind == 1).sum()))
+        paid = rng.integers(1, existing + 1, int((kind == 2).sum())) if existing else np.empty(0, np.int64)
+        customers = self.customers(int((kind == 3).sum()))
+        if not existing:
+            kind = kind[kind != 2]
+
+        rows = {"ledger": _rows(ledger, app.LedgerEntry), "titles": _rows(titles, app.FinancialTitle),
+                "customers": _rows(customers, app.Customer)}
+        position = {"ledger": 0, "titles": 0, "customers": 0}
+        paid_list = paid.tolist()
+        keys = ("ledger", "titles", None, "customers")
+        t0 = time.perf_counter()
+        for k in kind.tolist():
+            key = keys[k]
+            if key is None:
+                ops = [updated("titles", [paid_list.pop()], {"status": "Pago"})]
+            else:
+                i = position[key]
+                position[key] = i + 1
+                ops = [("insert", key, [rows[key][i]])]
+            store.append(ops)
+        self.events += len(kind)
+        self.append_seconds += time.perf_counter() - t0
+
+        repo.insert_columns("ledger", ledger)
+        repo.insert_columns("titles", titles)
+        repo.insert_columns("customers", customers)
+        if len(paid):
+            repo.update_many("titles", np.unique(paid).tolist(), {"status": "Pago"})
+        # Lotes de importação vencidos no bloco, depois dele (ids em ordem).
+        while self.batch_every and self.events // self.batch_every > self.batches:
+            batch = self.titles(1_000)
+            t0 = time.perf_counter()
+            store.append([inserted_columns("titles", batch)])
+            self.append_seconds += time.perf_counter() - t0
+            repo.insert_columns("titles", batch)
+            self.events += 1
+            self.batches += 1
+
+    def ledger(self, n: int) -> dict:
+        rng = self.rng
+        ids = self.take("ledger", n)
+        debit = np.round(rng.lognormal(6, 1.3, n), 2)
+        is_debit = rng.random(n) < 0.5
+        origin = rng.integers(0, len(ORIGINS), n)
+        return {
+            "id": ids,
+            "company_id": rng.integers(1, self.companies + 1, n),
+            "date": np.datetime64(BASE_DAY) + rng.integers(0, 730, n).astype("timedelta64[D]"),
+            "account_code": np.array(ACCOUNTS, dtype=object)[rng.integers(0, len(ACCOUNTS), n)],
+            "cost_center_id": [None] * n,
+            "debit": np.where(is_debit, debit, 0.0),
+            "credit": np.where(is_debit, 0.0, debit),
+            "history": np.array([f"Lançamento ref. documento {i}" for i in ids.tolist()], dtype=object),
+            "origin_type": np.array(ORIGINS, dtype=object)[origin],
+            "origin_id": [None if o == 0 else i // 3 + 1 for o, i in zip(origin.tolist(), ids.tolist())],
+        }
+
+    def titles(self, n: int) -> dict:
+        rng = self.rng
+        ids = self.take("titles", n)
+        issue = np.datetime64(BASE_DAY) + rng.integers(0, 730, n).astype("timedelta64[D]")
+        return {
+            "id": ids,
+            "company_id": rng.integers(1, self.companies + 1, n),
+            "kind": np.where(rng.random(n) < 0.5, "AR", "AP").astype(object),
+            "party_name": np.array([f"Parceiro {p}" for p in rng.integers(1, 5_000, n).tolist()], dtype=object),
+            "doc_number": np.array([f"NF-{i}" for i in ids.tolist()], dtype=object),
+            "issue_date": issue,
+            "due_date": issue + rng.integers(0, 120, n).astype("timedelta64[D]"),
+            "amount": np.round(rng.lognormal(7, 1.2, n), 2),
+            "cost_center_id": [None] * n,
+            "account_id": [None] * n,
+            "status": np.full(n, "Aberto", dtype=object),
+        }
+
+    def customers(self, n: int) -> dict:
+        rng = self.rng
+        ids = self.take("customers", n)
+        return {
+            "id": ids,
+            "name": np.array([f"Cliente {i}" for i in ids.tolist()], dtype=object),
+            "doc": np.array([f"{i:011d}" for i in ids.tolist()], dtype=object),
+            "kind": np.full(n, "PF", dtype=object),
+            "company_id": rng.integers(1, self.companies + 1, n),
+        }
+
+
+def _rows(columns: dict, cls) -> list[tuple]:
+    # Linhas no formato de erp.state_store.inserted (tuplas na ordem dos
+    # campos, valores Python: datas como date, nulos como None).
+    names = [f for f in cls.__dataclass_fields__]
+    values = []
+    for name in names:
+        v = columns[name]
+        if isinstance(v, np.ndarray) and v.dtype.kind == "M":
+            v = v.astype("datetime64[D]").tolist()
+        elif isinstance(v, np.ndarray):
+            v = v.tolist()
+        values.append(v)
+    return list(zip(*values)) if values and len(values[0]) else []
+
+
+def fingerprint(repo) -> dict:
+    ledger = repo.columnar("ledger").frame(columns=["id", "company_id", "debit", "credit", "origin_id"])
+    titles = repo.fetch_frame("titles")
+    return {
+        "ledger": (len(ledger), int(ledger["id"].sum()), round(float(ledger["debit"].sum()), 2),
+                   round(float(ledger["credit"].sum()), 2), int(ledger["origin_id"].isna().sum())),
+        "ledger_last": repo.columnar("ledger").row(len(ledger) - 1) if len(ledger) else None,
+        "titles": (len(titles), int(titles["id"].sum()), round(float(titles["amount"].sum()), 2),
+                   int((titles["status"] == "Pago").sum()), str(titles["due_date"].max())),
+        "titles_last": repo.fetch("titles")[-1] if len(titles) else None,
+        "counts": {key: repo.count(key) for key in app.ENTITIES},
+        "counters": {name: repo.get_counter(name) for name in app.COUNTERS},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--tail", type=int, default=app.STATE_SNAPSHOT_EVERY,
+                        help="eventos gravados depois do snapshot")
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--batch-every", type=int, default=100_000,
+                        help="um lote de 1.000 títulos a cada N eventos (0 = nenhum)")
+    parser.add_argument("--block", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dir", default=None, help="diretório do diário (padrão: temporário, apagado no fim)")
+    args = parser.parse_args()
+    directory = args.dir or tempfile.mkdtemp(prefix="erp-state-bench-")
+
+    try:
+        repo = new_repo()
+        store = store_for(directory)
+        store.restore(repo)
+        seed(repo, store, args.companies)
+        gen = Generator(args.companies, args.batch_every, args.seed)
+        t0 = time.perf_counter()
+        snapshot = None
+        target = args.events - args.companies - len(ACCOUNTS)
+        while gen.events < target:
+            before_snapshot = target - args.tail - gen.events
+            n = min(args.block, target - gen.events, before_snapshot if before_snapshot > 0 else args.block)
+            gen.block(repo, store, n)
+            if snapshot is None and gen.events >= target - args.tail:
+                for key, name in app.ID_COUNTERS.items():
+                    if key in gen.ids:
+                        repo.advance_counter(name, gen.ids[key])
+                snapshot = store.snapshot()
+        for key, name in app.ID_COUNTERS.items():
+            if key in gen.ids:
+                repo.advance_counter(name, gen.ids[key])
+        generated = time.perf_counter() - t0
+        store.close()
+        expected = fingerprint(repo)
+        stats = store.stats()
+        del repo, store
+        gc.collect()
+
+        print(f"{stats['seq']:,} eventos gravados em {generated:.1f}s "
+              f"(diário: {gen.append_seconds:.1f}s, {gen.events / gen.append_seconds:,.0f} eventos/s); "
+              f"{expected['counts']['ledger']:,} lançamentos, {expected['counts']['titles']:,} títulos, "
+              f"{expected['counts']['customers']:,} clientes")
+        print(f"diário {stats['diario_bytes'] / 2**20:,.0f} MiB em {stats['segmentos']} segmento(s); "
+              f"snapshot no evento {snapshot['seq']:,}: {snapshot['bytes'] / 2**20:,.0f} MiB em "
+              f"{snapshot['total_s']:.1f}s (entidades travadas {snapshot['captura_s'] * 1000:.0f} ms)\n")
+
+        results = {}
+        for label, use_snapshot in (("abertura (snapshot + cauda)", True), ("reprodução completa", False)):
+            repo = new_repo()
+            store = store_for(directory)
+            t0 = time.perf_counter()
+            opened = store.restore(repo, use_snapshot=use_snapshot)
+            total = time.perf_counter() - t0
+            assert fingerprint(repo) == expected, label
+            results[label] = total
+            print(f"{label:<28} {total:7.2f}s  snapshot {opened['snapshot_s']:6.2f}s + "
+                  f"{opened['registros']:>10,} registro(s) do diário em {opened['diario_s']:6.2f}s")
+            store.close()
+            del repo, store
+            gc.collect()
+        cold, full = results.values()
+        print(f"\nabertura {full / cold:.1f}x mais rápida que a reprodução completa (estados conferidos)")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
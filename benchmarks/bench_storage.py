@@ -0,0 +1,69 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from erp.storage import MemoryRepository, SQLiteRepository
+from streamlit_app import ENTITIES, FinancialTitle
+
+# ============================================================
+# BENCHMARK – BACKEND EM MEMÓRIA x SQLITE
+# ============================================================
+# python -m benchmarks.bench_storage --rows 100000 --batch 1000
+
+
+def make_titles(start_id: int, n: int):
+    base = date(2024, 1, 1)
+    return [
+        FinancialTitle(
+            id=start_id + i, company_id=1 + i % 20, kind="AR" if i % 2 else "AP",
+            party_name=f"Parceiro {i % 997}", doc_number=f"NF-{start_id + i}",
+            issue_date=base + timedelta(days=i % 365), due_date=base + timedelta(days=30 + i % 365),
+            amount=float(100 + i % 5000), cost_center_id=None, account_id=1,
+        )
+        for i in range(n)
+    ]
+
+
+def run(repo, rows: int, batch: int) -> dict:
+    result = {"backend": repo.mode}
+    t0 = time.perf_counter()
+    for start in range(1, rows + 1, batch):
+        with repo.transaction():
+            repo.insert_many("titles", make_titles(start, min(batch, rows - start + 1)))
+    result["insert_rows_s"] = rows / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for company_id in range(1, 21):
+        repo.fetch("titles", where={"company_id": company_id}, limit=500, desc=True)
+    result["page_query_ms"] = (time.perf_counter() - t0) * 1000 / 20
+
+    t0 = time.perf_counter()
+    repo.count("titles")
+    repo.aggregate("titles", "kind", ["amount"])
+    result["aggregate_ms"] = (time.perf_counter() - t0) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = [
+            MemoryRepository(ENTITIES),
+            SQLiteRepository(ENTITIES, os.path.join(tmp, "bench.db")),
+        ]
+        for repo in repos:
+            r = run(repo, args.rows, args.batch)
+            print(
+                f"{r['backend']:>7}: insert {r['insert_rows_s']:,.0f} linhas/s | "
+                f"página filtrada {r['page_query_ms']:.2f} ms | agregação {r['aggregate_ms']:.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
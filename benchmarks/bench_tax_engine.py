@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from erp.tax_engine import TaxEngine
+from streamlit_app import TaxRule
+
+# ============================================================
+# BENCHMARK – MOTOR TRIBUTÁRIO EM LOTE
+# ============================================================
+# python -m benchmarks.bench_tax_engine --lines 1000000
+#
+# Mede linhas/s do TaxEngine (ICMS, PIS, COFINS e ISS por linha) contra o
+# cálculo linha a linha do simulador (busca da regra + base * alíquota),
+# este último numa amostra e extrapolado.
+
+CFOPS = ["5102", "5405", "6102", "6108", "5933", "1102", "2102", "5949"]
+CSTS = ["00", "10", "20", "40", "41", "60", "90"]
+
+
+def make_rules() -> list[TaxRule]:
+    rules = [
+        TaxRule(1, "ICMS padrão", "ICMS", 18.0, "", ""),
+        TaxRule(2, "ICMS interestadual", "ICMS", 12.0, "6102", ""),
+        TaxRule(3, "ICMS isento", "ICMS", 0.0, "", "40"),
+        TaxRule(4, "ICMS ST", "ICMS", 0.0, "5405", "60"),
+        TaxRule(5, "PIS", "PIS", 1.65, "", ""),
+        TaxRule(6, "COFINS", "COFINS", 7.6, "", ""),
+        TaxRule(7, "ISS serviços", "ISS", 5.0, "5933", ""),
+    ]
+    return rules
+
+
+def make_lines(n: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "base": np.round(rng.uniform(0.01, 50_000, n), 2),
+        "cfop": np.array(CFOPS, dtype=object)[rng.integers(0, len(CFOPS), n)],
+        "cst": np.array(CSTS, dtype=object)[rng.integers(0, len(CSTS), n)],
+    })
+
+
+def per_line(rules: list[TaxRule], lines: pd.DataFrame) -> float:
+    total = 0.0
+    for base, cfop, cst in lines.itertuples(index=False):
+        for tax_type in ("ICMS", "PIS", "COFINS", "ISS"):
+            candidates = [r for r in rules if r.tax_type == tax_type and r.cfop in (cfop, "")
+                          and r.cst in (cst, "")]
+            if candidates:
+                rule = max(candidates, key=lambda r: (r.cfop != "", r.cst != ""))
+                total += round(base * (rule.aliquot / 100.0), 2)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rules = make_rules()
+    lines = make_lines(args.lines)
+
+    t0 = time.perf_counter()
+    engine = TaxEngine(rules)
+    result = engine.compute(lines)
+    totals = engine.totals(result)
+    seconds = time.perf_counter() - t0
+    print(f"motor em lote: {args.lines:,} linhas em {seconds:.2f}s "
+          f"({args.lines / seconds:,.0f} linhas/s, {engine.resolutions} resoluções de regra)")
+    print(totals.to_string(index=False))
+
+    sample = lines.head(args.sample)
+    t0 = time.perf_counter()
+    per_line(rules, sample)
+    seconds = time.perf_counter() - t0
+    print(f"linha a linha: {len(sample) / seconds:,.0f} linhas/s "
+          f"(estimado {args.lines / (len(sample) / seconds):.1f}s para {args.lines:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from erp.webhooks import Subscriber, WebhookDispatcher
+
+# ============================================================
+# BENCHMARK – DESPACHO DE WEBHOOKS CONTRA UM SERVIDOR STUB LOCAL
+# ============================================================
+# python -m benchmarks.bench_webhooks --events 20000 --failure-rate 0.1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, para exercitar o pool
+    received: dict[str, set] = {}
+    failure_rate = 0.0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if random.random() < self.failure_rate:
+            self._reply(503)
+            return
+        payload = json.loads(body)
+        with self.lock:
+            ids = self.received.setdefault(payload["subscriber"], set())
+            ids.update(e["id"] for e in payload["events"])
+        self._reply(200)
+
+    def _reply(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--subscribers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    StubHandler.failure_rate = args.failure_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+
+    dispatcher = WebhookDispatcher(base_backoff=0.05, max_backoff=1.0)
+    names = [f"sub{i}" for i in range(args.subscribers)]
+    for name in names:
+        dispatcher.add_subscriber(Subscriber(name, url, batch_size=args.batch, max_wait=0.05,
+                                             queue_size=args.events))
+
+    t0 = time.perf_counter()
+    for i in range(1, args.events + 1):
+        dispatcher.publish({"id": i, "timestamp": "", "entity_type": "Bench",
+                            "entity_id": i, "description": "evento"})
+    publish_s = time.perf_counter() - t0
+
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        done = sum(dispatcher.stats[n].delivered for n in names)
+        lost = sum(dispatcher.stats[n].dead_events for n in names)
+        if done + lost >= args.events * len(names):
+            break
+        time.sleep(0.05)
+    dispatcher.stop()
+    server.shutdown()
+
+    print(f"publish(): {args.events / publish_s:,.0f} eventos/s (sem bloquear o chamador)")
+    for name in names:
+        s = dispatcher.stats[name]
+        received = len(StubHandler.received.get(name, ()))
+        print(
+            f"{name}: entregues {s.delivered:,} (servidor recebeu {received:,} únicos) | "
+            f"lotes {s.batches} | retentativas {s.retries} | dead-letter {s.dead_events} | "
+            f"p50 {s.percentile(50) * 1000:.1f} ms p95 {s.percentile(95) * 1000:.1f} ms "
+            f"p99 {s.percentile(99) * 1000:.1f} ms | {s.throughput:,.0f} eventos/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
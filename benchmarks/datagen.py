@@ -0,0 +1,230 @@
+import argparse
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+# ============================================================
+# GERADOR DE DADOS SINTÉTICOS (SEMEADO)
+# ============================================================
+# python -m benchmarks.datagen --rows 1000000 --storage sqlite --db bench.db
+#
+# Gera cadastros, títulos e lançamentos direto no repositório, em blocos
+# de colunas NumPy (insert_columns), para qualquer escala de 1 mil a 10
+# milhões de linhas. Mesma semente -> mesmos dados.
+
+CHUNK = 200_000
+ACCOUNT_TYPES = ["Ativo", "Passivo", "Receita", "Despesa", "Patrimônio"]
+CFOPS = ["5102", "5405", "6102", "6108", "5933", "1102"]
+CSTS = ["00", "10", "20", "40", "60", "90"]
+
+
+@dataclass
+class Scale:
+    companies: int
+    cost_centers: int
+    accounts: int
+    customers: int
+    products: int
+    titles: int
+    ledger: int
+    tax_rules: int
+    workflow_rules: int
+
+    @classmethod
+    def for_rows(cls, rows: int) -> "Scale":
+        # "rows" é o volume das entidades grandes (títulos e razão); os
+        # cadastros crescem mais devagar, como numa base real.
+        return cls(
+            companies=int(np.clip(rows // 10_000, 2, 200)),
+            cost_centers=int(np.clip(rows // 2_000, 5, 500)),
+            accounts=int(np.clip(rows // 50, 20, 20_000)),
+            customers=int(np.clip(rows // 10, 10, 1_000_000)),
+            products=int(np.clip(rows // 20, 10, 500_000)),
+            titles=rows,
+            ledger=rows,
+            tax_rules=40,
+            workflow_rules=40,
+        )
+
+
+def account_codes(n: int) -> np.ndarray:
+    # Plano hierárquico de 4 níveis: 1.1.1.0001 ... (grupo 1-5).
+    i = np.arange(n)
+    return np.array([f"{1 + k % 5}.{1 + k // 5 % 3}.{1 + k // 15 % 4}.{k // 60 + 1:04d}" for k in i.tolist()],
+                    dtype=object)
+
+
+def _chunks(total: int):
+    for start in range(0, total, CHUNK):
+        yield start, min(CHUNK, total - start)
+
+
+def generate(repo, app, scale: Scale, seed: int = 42, progress=print) -> dict:
+    # Devolve segundos gastos por entidade. O repositório deve estar vazio.
+    timings = {}
+    codes = account_codes(scale.accounts)
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        fn()
+        timings[name] = time.perf_counter() - t0
+        repo.next_ids(COUNTERS[name], getattr(scale, name))
+        if progress:
+            progress(f"  {name}: {getattr(scale, name):,} em {timings[name]:.1f}s")
+
+    def companies():
+        ids = np.arange(1, scale.companies + 1)
+        repo.insert_columns("companies", {
+            "id": ids,
+            "name": np.array([f"Empresa {i}" for i in ids.tolist()], dtype=object),
+            "cnpj": np.array([f"{i:08d}/0001-{i % 97:02d}" for i in ids.tolist()], dtype=object),
+            "regime": np.array(["Simples", "Presumido", "Real"], dtype=object)[ids % 3],
+        })
+
+    def cost_centers():
+        ids = np.arange(1, scale.cost_centers + 1)
+        repo.insert_columns("cost_centers", {
+            "id": ids,
+            "code": np.array([f"CC{i:04d}" for i in ids.tolist()], dtype=object),
+            "name": np.array([f"Centro de custo {i}" for i in ids.tolist()], dtype=object),
+        })
+
+    def accounts():
+        ids = np.arange(1, scale.accounts + 1)
+        repo.insert_columns("accounts", {
+            "id": ids,
+            "code": codes,
+            "name": np.array([f"Conta {c}" for c in codes.tolist()], dtype=object),
+            "type": np.array(ACCOUNT_TYPES, dtype=object)[(ids - 1) % 5],
+        })
+
+    def customers():
+        for start, n in _chunks(scale.customers):
+            rng = np.random.default_rng([seed, 1, start])
+            ids = np.arange(start + 1, start + n + 1)
+            is_pj = rng.random(n) < 0.4
+            repo.insert_columns("customers", {
+                "id": ids,
+                "name": np.array([f"Cliente {i}" for i in ids.tolist()], dtype=object),
+                "doc": np.array([f"{i:011d}" for i in ids.tolist()], dtype=object),
+                "kind": np.where(is_pj, "PJ", "PF").astype(object),
+                "company_id": rng.integers(1, scale.companies + 1, n),
+            })
+
+    def products():
+        for start, n in _chunks(scale.products):
+            rng = np.random.default_rng([seed, 2, start])
+            ids = np.arange(start + 1, start + n + 1)
+            repo.insert_columns("products", {
+                "id": ids,
+                "name": np.array([f"Produto {i}" for i in ids.tolist()], dtype=object),
+                "sku": np.array([f"SKU-{i:08d}" for i in ids.tolist()], dtype=object),
+                "ncm": np.array([f"{8400_0000 + i % 9999:08d}" for i in ids.tolist()], dtype=object),
+                "unit": np.array(["UN", "KG", "CX", "L"], dtype=object)[rng.integers(0, 4, n)],
+                "company_id": rng.integers(1, scale.companies + 1, n),
+            })
+
+    def titles():
+        for start, n in _chunks(scale.titles):
+            rng = np.random.default_rng([seed, 3, start])
+            ids = np.arange(start + 1, start + n + 1)
+            issue = np.datetime64("2024-01-01") + rng.integers(0, 730, n).astype("timedelta64[D]")
+            status = np.array(["Aberto", "Pago", "Cancelado"], dtype=object)[
+                np.searchsorted([0.55, 0.95], rng.random(n))]
+            cc = rng.integers(0, scale.cost_centers + 1, n)
+            repo.insert_columns("titles", {
+                "id": ids,
+                "company_id": rng.integers(1, scale.companies + 1, n),
+                "kind": np.where(rng.random(n) < 0.5, "AR", "AP").astype(object),
+                "party_name": np.array([f"Cliente {i}" for i in rng.integers(1, scale.customers + 1, n).tolist()],
+                                       dtype=object),
+                "doc_number": np.array([f"NF-{i}" for i in ids.tolist()], dtype=object),
+                "issue_date": issue,
+                "due_date": issue + rng.integers(0, 120, n).astype("timedelta64[D]"),
+                "amount": np.round(rng.lognormal(7, 1.2, n), 2),
+                "cost_center_id": [None if c == 0 else c for c in cc.tolist()],
+                "account_id": rng.integers(1, scale.accounts + 1, n),
+                "status": status,
+            })
+
+    def ledger():
+        for start, n in _chunks(scale.ledger):
+            rng = np.random.default_rng([seed, 4, start])
+            ids = np.arange(start + 1, start + n + 1)
+            amount = np.round(rng.lognormal(7, 1.2, n), 2)
+            is_debit = rng.random(n) < 0.5
+            origin = np.where(ids <= scale.titles, ids, 0)
+            repo.insert_columns("ledger", {
+                "id": ids,
+                "company_id": rng.integers(1, scale.companies + 1, n),
+                "date": np.datetime64("2024-01-01") + rng.integers(0, 730, n).astype("timedelta64[D]"),
+                "account_code": codes[rng.integers(0, scale.accounts, n)],
+                "cost_center_id": [None] * n,
+                "debit": np.where(is_debit, amount, 0.0),
+                "credit": np.where(is_debit, 0.0, amount),
+                "history": np.array([f"Lançamento {i}" for i in ids.tolist()], dtype=object),
+                "origin_type": np.where(origin > 0, "FinancialTitle", "Manual").astype(object),
+                "origin_id": [None if o == 0 else o for o in origin.tolist()],
+            })
+
+    def tax_rules():
+        rng = np.random.default_rng([seed, 5])
+        rules = []
+        for i in range(1, scale.tax_rules + 1):
+            tax_type = ["ICMS", "PIS", "COFINS", "ISS"][i % 4]
+            rules.append(app.TaxRule(
+                id=i, name=f"{tax_type} regra {i}", tax_type=tax_type,
+                aliquot=float(rng.choice([0.65, 1.65, 3.0, 5.0, 7.6, 12.0, 18.0])),
+                cfop="" if i <= 4 else str(rng.choice(CFOPS)), cst="" if i <= 8 else str(rng.choice(CSTS)),
+            ))
+        repo.insert_many("tax_rules", rules)
+
+    def workflow_rules():
+        rng = np.random.default_rng([seed, 6])
+        repo.insert_many("workflow_rules", [
+            app.WorkflowRule(
+                id=i, name=f"Aprovação {i}", entity_type=["FinancialTitle", "PurchaseOrder"][i % 2],
+                min_value=float(rng.choice([0, 1_000, 5_000, 10_000, 50_000])), approvals_required=1 + i % 3,
+            )
+            for i in range(1, scale.workflow_rules + 1)
+        ])
+
+    for name, fn in [("companies", companies), ("cost_centers", cost_centers), ("accounts", accounts),
+                     ("customers", customers), ("products", products), ("titles", titles),
+                     ("ledger", ledger), ("tax_rules", tax_rules), ("workflow_rules", workflow_rules)]:
+        with repo.transaction(name):
+            timed(name, fn)
+    return timings
+
+
+COUNTERS = {
+    "companies": "company_id", "cost_centers": "cost_center_id", "accounts": "account_id",
+    "customers": "customer_id", "products": "product_id", "titles": "title_id", "ledger": "ledger_id",
+    "tax_rules": "tax_rule_id", "workflow_rules": "workflow_rule_id",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--storage", choices=["sqlite"], default="sqlite")
+    parser.add_argument("--db", default="bench.db")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} já existe; o gerador só escreve em bases vazias.")
+    os.environ["ERP_STORAGE"] = args.storage
+    os.environ["ERP_DB_PATH"] = args.db
+    import streamlit_app as app
+
+    scale = Scale.for_rows(args.rows)
+    print(f"gerando {scale}")
+    timings = generate(app.get_repo(), app, scale, args.seed)
+    print(f"total: {sum(timings.values()):.1f}s")
+
+
+if __name__ == "__main__":
+    main()
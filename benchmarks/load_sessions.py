@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# ============================================================
+# TESTE DE CARGA – SESSÕES CONCORRENTES NO MESMO PROCESSO
+# ============================================================
+# python -m benchmarks.load_sessions --sessions 1 2 4 8 --writes 300
+#
+# Cada sessão é uma thread que faz o mesmo que o formulário de títulos
+# (título + lançamento de reconhecimento numa transação) e, a cada 10
+# títulos, baixa um título próprio. Uma thread leitora pagina títulos e
+# lê o balancete o tempo todo. O AppTest do Streamlit usa um runtime único
+# por processo e não roda em paralelo, por isso as sessões chamam direto
+# as funções dos formulários. Cada configuração roda num processo novo.
+# Ao final confere ids únicos, balancete x razão e aging x títulos.
+
+
+def percentile(data: list[float], p: float) -> float:
+    data = sorted(data)
+    return data[min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))] if data else 0.0
+
+
+def run_worker(mode: str, sessions: int, writes: int) -> dict:
+    tmp = tempfile.mkdtemp(prefix="erp-load-")
+    os.environ["ERP_STORAGE"] = mode
+    os.environ["ERP_DB_PATH"] = os.path.join(tmp, "load.db")
+    os.environ["ERP_EVENTS_DIR"] = os.path.join(tmp, "events")
+    os.environ["ERP_AUDIT_DIR"] = os.path.join(tmp, "audit")
+    os.environ["ERP_STATE_DIR"] = os.path.join(tmp, "state")
+    import streamlit_app as app
+
+    app.add_company("Empresa Carga", "00.000.000/0001-00", "Real")
+    app.add_account("1.1.2.01", "Clientes", "Ativo")
+    app.add_account("3.1.01", "Receita", "Receita")
+    repo = app.get_repo()
+    accounts = {a.code: a for a in repo.fetch("accounts")}
+    latencies: list[list[float]] = [[] for _ in range(sessions)]
+    errors: list[str] = []
+    stop = threading.Event()
+    reads = [0]
+
+    def session(n: int):
+        own = []
+        try:
+            for i in range(writes):
+                t0 = time.perf_counter()
+                amount = float(100 + (n * writes + i) % 900)
+                issue = date(2024, 1, 1) + timedelta(days=i % 365)
+                acc = accounts["3.1.01" if i % 2 else "1.1.2.01"]
+                with repo.transaction("ledger", "titles"):
+                    title_id = app.add_financial_title(
+                        1, "AR" if i % 2 else "AP", f"Sessão {n}", f"S{n}-{i}", issue,
+                        issue + timedelta(days=30), amount, None, acc.id)
+                    app.add_ledger_entry(
+                        1, issue, acc.code, None, 0.0 if i % 2 else amount, amount if i % 2 else 0.0,
+                        f"Reconhecimento ref. título S{n}-{i}", "FinancialTitle", title_id)
+                own.append(title_id)
+                if i % 10 == 9:
+                    app.set_titles_status([own[-5]], "Pago")
+                latencies[n].append(time.perf_counter() - t0)
+        except Exception as e:  # noqa: BLE001 – o relatório mostra o erro
+            errors.append(f"sessão {n}: {type(e).__name__}: {e}")
+
+    def reader():
+        while not stop.is_set():
+            repo.fetch_frame("titles", limit=50, desc=True)
+            app.trial_balance().by_account()
+            reads[0] += 1
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    stop.set()
+    reader_thread.join()
+
+    titles = repo.fetch_frame("titles")
+    ledger = repo.columnar("ledger")
+    open_titles = titles[titles["status"] == "Aberto"]
+    aging = app.aging_view().open_totals()
+    expected_open = open_titles.groupby("kind")["amount"].sum().round(2).to_dict()
+    all_lat = [x for lat in latencies for x in lat]
+    result = {
+        "mode": mode,
+        "sessions": sessions,
+        "writes": len(all_lat),
+        "seconds": seconds,
+        "writes_per_s": len(all_lat) / seconds if seconds else 0.0,
+        "p50_ms": percentile(all_lat, 50) * 1000,
+        "p95_ms": percentile(all_lat, 95) * 1000,
+        "p99_ms": percentile(all_lat, 99) * 1000,
+        "reads": reads[0],
+        "errors": errors,
+        "ids_unique": bool(titles["id"].is_unique and ledger.frame(columns=["id"])["id"].is_unique),
+        "titles_ok": len(titles) == sessions * writes,
+        "balance_ok": app.trial_balance().check(ledger).empty,
+        "aging_ok": all(abs(aging[k] - expected_open.get(k, 0.0)) < 0.005 for k in aging),
+        "locks": repo.lock_stats(),
+    }
+    app.event_log().close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=["shared", "sqlite"])
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--writes", type=int, default=300, help="títulos por sessão")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "SESSIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker[0], int(args.worker[1]), args.writes)))
+        return
+
+    results = []
+    for mode in args.modes:
+        for n in args.sessions:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.load_sessions", "--worker", mode, str(n),
+                 "--writes", str(args.writes)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            results.append(r)
+            contended = sum(lk["contencoes"] for lk in r["locks"])
+            wait = sum(lk["espera_ms"] for lk in r["locks"])
+            checks = all(r[k] for k in ("ids_unique", "titles_ok", "balance_ok", "aging_ok")) and not r["errors"]
+            print(
+                f"{mode:>7} x{n:<2}: {r['writes_per_s']:8,.0f} escritas/s | p50 {r['p50_ms']:6.2f} ms "
+                f"p95 {r['p95_ms']:6.2f} ms p99 {r['p99_ms']:6.2f} ms | leituras {r['reads']:,} | "
+                f"contenção {contended:,} ({wait:,.0f} ms) | consistência {'OK' if checks else 'FALHOU'}"
+            )
+            for e in r["errors"]:
+                print("   ", e)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
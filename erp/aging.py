@@ -0,0 +1,178 @@
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from erp.metrics import timed
+
+# ============================================================
+# AGING E FLUXO DE CAIXA – VISÃO MATERIALIZADA INCREMENTAL
+# ============================================================
+# Só títulos em aberto entram na visão. Para cada tipo (AR/AP) há um
+# total por dia de vencimento (centavos e quantidade) e uma árvore de
+# Fenwick sobre os dias, que responde soma de intervalos de datas em
+# O(log dias). As faixas são definidas em dias relativos a "hoje", que é
+# só um parâmetro da leitura: a virada do dia não recalcula nada.
+
+AGING_BUCKETS: list[tuple[str, int | None, int | None]] = [
+    # (rótulo, de, até) em dias de (vencimento - hoje), inclusivos
+    ("Vencidos 90+", None, -91),
+    ("Vencidos 61–90", -90, -61),
+    ("Vencidos 31–60", -60, -31),
+    ("Vencidos 1–30", -30, -1),
+    ("A vencer 0–7", 0, 7),
+    ("A vencer 8–30", 8, 30),
+    ("A vencer 31–60", 31, 60),
+    ("A vencer 60+", 61, None),
+]
+KINDS = ("AR", "AP")
+
+
+class _Fenwick:
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = np.zeros((size + 1, 2), dtype=np.int64)  # [centavos, quantidade]
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> "_Fenwick":
+        # Construção O(n): nó i cobre (i - lowbit(i), i] da soma acumulada.
+        fw = cls(len(values))
+        prefix = np.zeros((fw.size + 1, 2), dtype=np.int64)
+        np.cumsum(values, axis=0, out=prefix[1:])
+        i = np.arange(1, fw.size + 1)
+        fw.tree[1:] = prefix[i] - prefix[i - (i & -i)]
+        return fw
+
+    def add(self, pos: int, cents: int, n: int):
+        i = pos + 1
+        while i <= self.size:
+            self.tree[i, 0] += cents
+            self.tree[i, 1] += n
+            i += i & -i
+
+    def prefix(self, pos: int) -> tuple[int, int]:
+        # Soma das posições [0, pos].
+        cents = n = 0
+        i = min(pos + 1, self.size)
+        while i > 0:
+            cents += int(self.tree[i, 0])
+            n += int(self.tree[i, 1])
+            i -= i & -i
+        return cents, n
+
+
+class AgingView:
+    def __init__(self):
+        # tipo -> ordinal do vencimento -> [centavos, quantidade]
+        self.days: dict[str, dict[int, list[int]]] = {k: {} for k in KINDS}
+        self.base = 0
+        self.trees: dict[str, _Fenwick] = {k: _Fenwick(0) for k in KINDS}
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_titles(cls, titles: pd.DataFrame) -> "AgingView":
+        view = cls()
+        view.add_frame(titles["kind"], titles["due_date"], titles["amount"])
+        return view
+
+    # ------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------
+
+    def add(self, kind: str, due_date: date, amount: float, sign: int = 1):
+        self._apply(kind, due_date.toordinal(), sign * int(round(amount * 100)), sign)
+
+    def remove(self, kind: str, due_date: date, amount: float):
+        self.add(kind, due_date, amount, -1)
+
+    @timed("groupby.aging.add_frame")
+    def add_frame(self, kind, due_date, amount, sign: int = 1):
+        # Lote (ex.: importação, baixa em massa): agrega por (tipo, dia) antes.
+        batch = pd.DataFrame({
+            "kind": np.asarray(kind, dtype=object),
+            "day": pd.to_datetime(np.asarray(due_date)).to_numpy("datetime64[D]").astype(np.int64)
+            + date(1970, 1, 1).toordinal(),
+            "cents": np.rint(np.asarray(amount, dtype=np.float64) * 100).astype(np.int64) * sign,
+            "n": sign,
+        })
+        grouped = batch.groupby(["kind", "day"], sort=False)[["cents", "n"]].sum()
+        for (k, day), (cents, n) in zip(grouped.index, grouped.to_numpy()):
+            self._apply(k, int(day), int(cents), int(n))
+
+    def _apply(self, kind: str, day: int, cents: int, n: int):
+        if kind not in self.days:
+            return
+        with self.lock:
+            cell = self.days[kind].setdefault(day, [0, 0])
+            cell[0] += cents
+            cell[1] += n
+            tree = self.trees[kind]
+            if self.base <= day < self.base + tree.size:
+                tree.add(day - self.base, cents, n)
+            else:
+                self._rebuild(day)
+            if cell[1] == 0 and cell[0] == 0:
+                del self.days[kind][day]
+
+    def _rebuild(self, day: int):
+        # Dia fora da janela das árvores: reabre a janela com folga (amortizado).
+        all_days = [d for k in KINDS for d in self.days[k]] + [day]
+        lo, hi = min(all_days), max(all_days)
+        span = hi - lo + 1
+        self.base = lo - span // 2 - 366
+        size = 2 * span + 2 * 366
+        for k in KINDS:
+            values = np.zeros((size, 2), dtype=np.int64)
+            for d, (cents, n) in self.days[k].items():
+                values[d - self.base] = (cents, n)
+            self.trees[k] = _Fenwick.from_values(values)
+
+    # ------------------------------------------------------------
+    # Leitura – O(faixas · log dias)
+    # ------------------------------------------------------------
+
+    def range_sum(self, kind: str, lo: int | None, hi: int | None) -> tuple[int, int]:
+        # Totais de vencimentos com ordinal em [lo, hi] (None = aberto).
+        with self.lock:
+            tree = self.trees[kind]
+            if not tree.size:
+                return 0, 0
+            lo_pos = 0 if lo is None else max(lo - self.base, 0)
+            hi_pos = tree.size - 1 if hi is None else min(hi - self.base, tree.size - 1)
+            if hi_pos < lo_pos:
+                return 0, 0
+            c_hi, n_hi = tree.prefix(hi_pos)
+            c_lo, n_lo = tree.prefix(lo_pos - 1) if lo_pos else (0, 0)
+            return c_hi - c_lo, n_hi - n_lo
+
+    def buckets(self, today: date) -> pd.DataFrame:
+        t = today.toordinal()
+        rows = []
+        for label, lo, hi in AGING_BUCKETS:
+            row = {"faixa": label}
+            for k in KINDS:
+                cents, n = self.range_sum(k, None if lo is None else t + lo, None if hi is None else t + hi)
+                row[k] = cents / 100
+                row[f"qtd_{k}"] = n
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def cash_flow(self, today: date, horizon: int = 90) -> pd.DataFrame:
+        # Projeção diária de hoje até hoje + horizon; vencidos ficam nas faixas.
+        t = today.toordinal()
+        days = range(t, t + horizon + 1)
+        with self.lock:
+            inflow = np.array([self.days["AR"].get(d, (0, 0))[0] for d in days], dtype=np.int64)
+            outflow = np.array([self.days["AP"].get(d, (0, 0))[0] for d in days], dtype=np.int64)
+        net = inflow - outflow
+        return pd.DataFrame({
+            "data": [today + timedelta(days=i) for i in range(horizon + 1)],
+            "entradas": inflow / 100,
+            "saidas": outflow / 100,
+            "saldo_dia": net / 100,
+            "saldo_acumulado": np.cumsum(net) / 100,
+        })
+
+    def open_totals(self) -> dict[str, float]:
+        return {k: self.range_sum(k, None, None)[0] / 100 for k in KINDS}
@@ -0,0 +1,552 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+# ============================================================
+# AUDITORIA – ARQUIVO APPEND-ONLY SEGMENTADO COM ÍNDICES LATERAIS
+# ============================================================
+# Cada registro é [tamanho u32][crc32 u32][payload]: o payload tem id,
+# timestamp, entity_id (int64) e os textos usuário/ação/entidade com
+# prefixo de tamanho. Segmentos de segment_size registros; ao fechar um
+# segmento grava-se ao lado um arquivo .idx com os índices ordenados
+# (usuário, entidade+id, timestamp -> posição no segmento) e os offsets.
+# Leitura por mmap: a consulta faz buscas binárias nos índices de cada
+# segmento e só decodifica os registros da página pedida.
+#
+# Usuário e tipo de entidade entram nos índices como hash de 64 bits
+# (blake2b, estável entre processos); o texto é conferido ao decodificar.
+#
+# Durabilidade (durability):
+#   "buffered" – buffer em memória, descarregado ao encher ou na leitura;
+#                fsync só ao fechar segmento (uma queda perde o buffer).
+#   "group"    – append só retorna depois do fsync que cobre o registro;
+#                escritas concorrentes dividem o mesmo fsync (group commit).
+#   "sync"     – write + fsync por registro.
+
+DURABILITY_MODES = ("buffered", "group", "sync")
+_HEADER = struct.Struct("<II")        # tamanho do payload, crc32
+_FIXED = struct.Struct("<qqqHHH")     # id, timestamp, entity_id, tamanhos dos textos
+_NULL_ID = -(2 ** 63)
+_INDEX_MAGIC = b"ERPAIDX1"
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _segment_name(first_id: int) -> str:
+    return f"audit-{first_id:012d}.seg"
+
+
+@dataclass
+class _Sealed:
+    # Segmento fechado: dados e índices via mmap, somente leitura.
+    first_id: int
+    path: str
+    count: int
+    min_ts: int
+    max_ts: int
+    arrays: dict
+    data: mmap.mmap | None
+
+
+def _write_index(path: str, meta: dict, arrays: dict[str, np.ndarray]):
+    # [magia][tamanho do cabeçalho u32][cabeçalho JSON][arrays alinhados em 8 bytes]
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = [arr.dtype.str, offset, len(arr)]
+        offset += -(-arr.nbytes // 8) * 8
+    header = json.dumps({"meta": meta, "arrays": layout}).encode()
+    header += b" " * (-(len(_INDEX_MAGIC) + 4 + len(header)) % 8)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(_INDEX_MAGIC + struct.pack("<I", len(header)) + header)
+        for arr in arrays.values():
+            raw = np.ascontiguousarray(arr).tobytes()
+            fh.write(raw + b"\0" * (-len(raw) % 8))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _read_index(path: str) -> tuple[dict, dict]:
+    with open(path, "rb") as fh:
+        buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(_INDEX_MAGIC)] != _INDEX_MAGIC:
+        raise ValueError(f"Índice de auditoria inválido: {path}")
+    size = struct.unpack_from("<I", buf, len(_INDEX_MAGIC))[0]
+    start = len(_INDEX_MAGIC) + 4
+    header = json.loads(buf[start:start + size])
+    base = start + size
+    arrays = {name: np.frombuffer(buf, dtype=np.dtype(dt), count=n, offset=base + off)
+              for name, (dt, off, n) in header["arrays"].items()}
+    return header["meta"], arrays
+
+
+def _sorted_index(keys: np.ndarray, secondary: np.ndarray | None = None) -> tuple:
+    pos = np.lexsort((secondary, keys)) if secondary is not None else np.argsort(keys, kind="stable")
+    pos = pos.astype(np.uint32)
+    return (keys[pos], pos) if secondary is None else (keys[pos], secondary[pos], pos)
+
+
+def _match(columns: dict, pos: np.ndarray, user_h, etype_h, entity_id, start_ts, end_ts) -> np.ndarray:
+    at = pos.astype(np.intp)
+    keep = np.ones(len(pos), bool)
+    if user_h is not None:
+        keep &= columns["user"][at] == np.uint64(user_h)
+    if etype_h is not None:
+        keep &= columns["etype"][at] == np.uint64(etype_h)
+    if entity_id is not None:
+        keep &= columns["eid"][at] == entity_id
+    if start_ts is not None:
+        keep &= columns["ts"][at] >= start_ts
+    if end_ts is not None:
+        keep &= columns["ts"][at] <= end_ts
+    return pos[keep]
+
+
+class AuditStore:
+    def __init__(self, directory: str, record_type, segment_size: int = 262_144,
+                 durability: str = "group", buffer_size: int = 1 << 16):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Modo de durabilidade inválido: {durability}")
+        self.directory = directory
+        self.record_type = record_type
+        self.segment_size = segment_size
+        self.durability = durability
+        self.buffer_size = buffer_size
+        self.lock = threading.RLock()
+        self._synced_cond = threading.Condition(self.lock)
+        self.sealed: list[_Sealed] = []
+        self._hashes: dict[str, int] = {}
+        self._buffer = bytearray()
+        self._seq = 0          # registros aceitos
+        self._synced = 0       # registros cobertos por fsync (modo group)
+        self._syncing = False
+        self.fsyncs = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------
+    # Abertura e recuperação
+    # ------------------------------------------------------------
+
+    def _load(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("audit-") and n.endswith(".seg"))
+        self.next_id = 1
+        for i, name in enumerate(names):
+            path = os.path.join(self.directory, name)
+            first_id = int(name[len("audit-"):-len(".seg")])
+            if i == len(names) - 1:
+                self._open_active(first_id, path)
+                return
+            idx_path = path[:-4] + ".idx"
+            if not os.path.exists(idx_path):
+                # Queda entre o fechamento do segmento e a gravação do índice.
+                self._open_active(first_id, path)
+                self._seal(roll=False)
+                continue
+            meta, arrays = _read_index(idx_path)
+            self.sealed.append(self._sealed(first_id, path, meta, arrays))
+            self.next_id = first_id + meta["count"]
+        self._open_active(self.next_id, os.path.join(self.directory, _segment_name(self.next_id)))
+
+    def _sealed(self, first_id: int, path: str, meta: dict, arrays: dict) -> _Sealed:
+        data = None
+        if meta["count"]:
+            with open(path, "rb") as fh:
+                data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return _Sealed(first_id, path, meta["count"], meta["min_ts"], meta["max_ts"], arrays, data)
+
+    def _open_active(self, first_id: int, path: str):
+        # Relê o segmento ativo, reconstrói os índices em memória e corta um
+        # registro final incompleto ou corrompido (escrita interrompida).
+        self.active_first_id = first_id
+        self.active_path = path
+        self._n = 0
+        cap = self.segment_size
+        self._offsets = np.empty(cap, np.uint64)
+        self._ts = np.empty(cap, np.int64)
+        self._user = np.empty(cap, np.uint64)
+        self._etype = np.empty(cap, np.uint64)
+        self._eid = np.empty(cap, np.int64)
+        good = 0
+        if os.path.exists(path):
+            with open(path, "rb") as fh:
+                data = fh.read()
+            good = self._scan(data, self._load_checkpoint(path, len(data)))
+        self._file = open(path, "ab")
+        if self._file.tell() != good:
+            self._file.truncate(good)
+            self._file.seek(good)
+        self._file_size = good
+        self.next_id = max(self.next_id, first_id + self._n)
+        self._data = None
+        self._data_size = 0
+
+    def _load_checkpoint(self, path: str, size: int) -> int:
+        # Índices do segmento ativo gravados no último close(): só o trecho
+        # posterior precisa ser relido. Devolve o offset onde a leitura segue.
+        ckpt = path[:-4] + ".ckpt"
+        if not os.path.exists(ckpt):
+            return 0
+        meta, arrays = _read_index(ckpt)
+        if meta["size"] > size or meta["count"] > self.segment_size:
+            return 0
+        n = self._n = meta["count"]
+        for name, target in (("offsets", self._offsets), ("ts", self._ts), ("user", self._user),
+                             ("etype", self._etype), ("eid", self._eid)):
+            target[:n] = arrays[name]
+        self.next_id = meta["next_id"]
+        return meta["size"]
+
+    def _scan(self, data: bytes, pos: int) -> int:
+        # Reindexa registros a partir de pos, parando no primeiro incompleto
+        # ou com CRC divergente (escrita interrompida). Devolve o fim do
+        # último registro válido.
+        fixed = _FIXED.size
+        while pos + _HEADER.size <= len(data) and self._n < self.segment_size:
+            size, crc = _HEADER.unpack_from(data, pos)
+            start = pos + _HEADER.size
+            payload = data[start:start + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            record_id, timestamp, entity_id, lu, la, le = _FIXED.unpack_from(payload)
+            i = self._n
+            self._offsets[i] = pos
+            self._ts[i] = timestamp
+            self._user[i] = self._key_bytes(payload[fixed:fixed + lu])
+            self._etype[i] = self._key_bytes(payload[fixed + lu + la:fixed + lu + la + le])
+            self._eid[i] = entity_id
+            self._n += 1
+            self.next_id = record_id + 1
+            pos = start + size
+        return pos
+
+    # ------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------
+
+    def _key_bytes(self, raw: bytes) -> int:
+        h = self._hashes.get(raw)
+        if h is None:
+            if len(self._hashes) > 100_000:
+                self._hashes.clear()
+            h = self._hashes[raw] = int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+        return h
+
+    def _key(self, text: str) -> int:
+        h = self._hashes.get(text)
+        if h is None:
+            if len(self._hashes) > 100_000:
+                self._hashes.clear()
+            h = self._hashes[text] = _hash(text)
+        return h
+
+    def _index(self, offset: int, timestamp: int, user_name: str, entity_type: str, entity_id):
+        i = self._n
+        self._offsets[i] = offset
+        self._ts[i] = timestamp
+        self._user[i] = self._key(user_name)
+        self._etype[i] = self._key(entity_type)
+        self._eid[i] = _NULL_ID if entity_id is None else entity_id
+        self._n += 1
+
+    def _encode(self, record_id: int, timestamp: int, user_name: str, action: str,
+                entity_type: str, entity_id) -> bytes:
+        u, a, e = user_name.encode(), action.encode(), entity_type.encode()
+        payload = _FIXED.pack(record_id, timestamp, _NULL_ID if entity_id is None else entity_id,
+                              len(u), len(a), len(e)) + u + a + e
+        return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def append(self, user_name: str, action: str, entity_type: str, entity_id: int | None,
+               timestamp: int | None = None, record_id: int | None = None):
+        timestamp = int(time.time()) if timestamp is None else int(timestamp)
+        with self.lock:
+            if self._n >= self.segment_size:
+                self._seal()
+            record_id = self.next_id if record_id is None else record_id
+            raw = self._encode(record_id, timestamp, user_name, action, entity_type, entity_id)
+            self._index(self._file_size + len(self._buffer), timestamp, user_name, entity_type, entity_id)
+            self._buffer += raw
+            self.next_id = record_id + 1
+            self._seq += 1
+            seq = self._seq
+            if self.durability == "sync":
+                self._write_buffer(fsync=True)
+            elif self.durability == "buffered":
+                if len(self._buffer) >= self.buffer_size:
+                    self._write_buffer(fsync=False)
+            else:
+                self._group_commit(seq)
+        return self.record_type(id=record_id, timestamp=timestamp, user_name=user_name, action=action,
+                                entity_type=entity_type, entity_id=entity_id)
+
+    def extend(self, records):
+        # Carga em lote (migração): um fsync no fim, qualquer que seja o modo.
+        with self.lock:
+            for r in records:
+                if self._n >= self.segment_size:
+                    self._seal()
+                raw = self._encode(r.id, int(r.timestamp), r.user_name, r.action, r.entity_type, r.entity_id)
+                self._index(self._file_size + len(self._buffer), int(r.timestamp), r.user_name,
+                            r.entity_type, r.entity_id)
+                self._buffer += raw
+                self.next_id = r.id + 1
+                if len(self._buffer) >= self.buffer_size:
+                    self._write_buffer(fsync=False)
+            self._write_buffer(fsync=True)
+
+    def _write_buffer(self, fsync: bool):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file_size += len(self._buffer)
+            self._buffer.clear()
+            self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+
+    def _group_commit(self, seq: int):
+        # Chamado com o lock. O primeiro a chegar vira líder: leva o buffer
+        # acumulado, solta o lock durante write + fsync e acorda os demais.
+        while self._synced < seq:
+            if self._syncing:
+                self._synced_cond.wait()
+                continue
+            self._syncing = True
+            batch, upto, fh = bytes(self._buffer), self._seq, self._file
+            self._buffer.clear()
+            self._file_size += len(batch)
+            self.lock.release()
+            try:
+                fh.write(batch)
+                fh.flush()
+                os.fsync(fh.fileno())
+            finally:
+                self.lock.acquire()
+                self._syncing = False
+                self.fsyncs += 1
+                self._synced = max(self._synced, upto)
+                self._synced_cond.notify_all()
+
+    def _seal(self, roll: bool = True):
+        # Fecha o segmento ativo: fsync dos dados, índice lateral e novo segmento.
+        self._settle()
+        self._write_buffer(fsync=True)
+        self._synced = self._seq
+        self._file.close()
+        self._close_data()
+        n = self._n
+        ts, user, etype, eid = self._ts[:n], self._user[:n], self._etype[:n], self._eid[:n]
+        arrays = {"offsets": self._offsets[:n].copy(), "ts": ts, "user": user, "etype": etype, "eid": eid}
+        arrays["ts_keys"], arrays["ts_pos"] = _sorted_index(ts)
+        arrays["user_keys"], arrays["user_pos"] = _sorted_index(user)
+        arrays["etype_keys"], arrays["eid_keys"], arrays["entity_pos"] = _sorted_index(etype, eid)
+        meta = {"count": n, "min_ts": int(ts.min()) if n else 0, "max_ts": int(ts.max()) if n else 0}
+        idx_path = self.active_path[:-4] + ".idx"
+        _write_index(idx_path, meta, arrays)
+        if os.path.exists(self.active_path[:-4] + ".ckpt"):
+            os.remove(self.active_path[:-4] + ".ckpt")
+        meta, arrays = _read_index(idx_path)
+        self.sealed.append(self._sealed(self.active_first_id, self.active_path, meta, arrays))
+        if roll:
+            self._open_active(self.next_id, os.path.join(self.directory, _segment_name(self.next_id)))
+
+    def _settle(self):
+        # Com o lock: espera um fsync de grupo em andamento e grava o buffer,
+        # para que o arquivo contenha tudo o que os índices apontam.
+        while self._syncing:
+            self._synced_cond.wait()
+        self._write_buffer(fsync=False)
+
+    def flush(self, fsync: bool = False):
+        with self.lock:
+            self._settle()
+            if fsync:
+                self._write_buffer(fsync=True)
+            if fsync:
+                self._synced = self._seq
+
+    def close(self):
+        with self.lock:
+            self.flush(fsync=True)
+            n = self._n
+            if n:
+                _write_index(self.active_path[:-4] + ".ckpt",
+                             {"count": n, "size": self._file_size, "next_id": self.next_id},
+                             {"offsets": self._offsets[:n], "ts": self._ts[:n], "user": self._user[:n],
+                              "etype": self._etype[:n], "eid": self._eid[:n]})
+            self._file.close()
+            self._close_data()
+            for seg in self.sealed:
+                if seg.data is not None:
+                    seg.data.close()
+
+    # ------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------
+
+    def __len__(self):
+        with self.lock:
+            return sum(s.count for s in self.sealed) + self._n
+
+    def _close_data(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+            self._data_size = 0
+
+    def _active_data(self) -> mmap.mmap | None:
+        # mmap do segmento ativo, refeito quando o arquivo cresceu.
+        if not self._file_size:
+            return None
+        if self._data_size != self._file_size:
+            self._close_data()
+            with open(self.active_path, "rb") as fh:
+                self._data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data_size = self._file_size
+        return self._data
+
+    def _sealed_positions(self, seg: _Sealed, user_h, etype_h, entity_id, start_ts, end_ts):
+        # Candidatos vêm do índice mais seletivo (menor faixa); os demais
+        # filtros são conferidos nas colunas por posição. Posições fora de
+        # ordem: só o segmento de onde sai a página é ordenado (query).
+        a = seg.arrays
+        if (start_ts is not None and seg.max_ts < start_ts) or (end_ts is not None and seg.min_ts > end_ts):
+            return np.empty(0, np.uint32)
+        ranges = []
+        if user_h is not None:
+            keys = a["user_keys"]
+            ranges.append((a["user_pos"], np.searchsorted(keys, np.uint64(user_h), "left"),
+                           np.searchsorted(keys, np.uint64(user_h), "right")))
+        if etype_h is not None:
+            keys = a["etype_keys"]
+            lo = np.searchsorted(keys, np.uint64(etype_h), "left")
+            hi = np.searchsorted(keys, np.uint64(etype_h), "right")
+            if entity_id is not None:
+                eids = a["eid_keys"][lo:hi]
+                lo, hi = lo + np.searchsorted(eids, entity_id, "left"), lo + np.searchsorted(eids, entity_id, "right")
+            ranges.append((a["entity_pos"], lo, hi))
+        if start_ts is not None or end_ts is not None:
+            keys = a["ts_keys"]
+            ranges.append((a["ts_pos"], 0 if start_ts is None else np.searchsorted(keys, start_ts, "left"),
+                           len(keys) if end_ts is None else np.searchsorted(keys, end_ts, "right")))
+        if not ranges and entity_id is None:
+            return range(seg.count)
+        if ranges:
+            index, lo, hi = min(ranges, key=lambda r: r[2] - r[1])
+            pos = index[lo:hi]
+        else:
+            pos = np.arange(seg.count, dtype=np.uint32)
+        if len(ranges) > 1 or (entity_id is not None and etype_h is None):
+            pos = _match(a, pos, user_h, etype_h, entity_id, start_ts, end_ts)
+        return pos
+
+    def _active_positions(self, user_h, etype_h, entity_id, start_ts, end_ts):
+        n = self._n
+        mask = None
+
+        def add(m):
+            nonlocal mask
+            mask = m if mask is None else mask & m
+
+        if user_h is not None:
+            add(self._user[:n] == np.uint64(user_h))
+        if etype_h is not None:
+            add(self._etype[:n] == np.uint64(etype_h))
+        if entity_id is not None:
+            add(self._eid[:n] == entity_id)
+        if start_ts is not None:
+            add(self._ts[:n] >= start_ts)
+        if end_ts is not None:
+            add(self._ts[:n] <= end_ts)
+        return range(n) if mask is None else np.flatnonzero(mask).astype(np.uint32)
+
+    def _positions(self, user_name, entity_type, entity_id, start_ts, end_ts):
+        # [(segmento, posições)] do mais novo para o mais antigo.
+        user_h = None if user_name is None else self._key(user_name)
+        etype_h = None if entity_type is None else self._key(entity_type)
+        with self.lock:
+            self._settle()
+            out = [(None, self._active_positions(user_h, etype_h, entity_id, start_ts, end_ts))]
+            sealed = list(self.sealed)
+        for seg in reversed(sealed):
+            out.append((seg, self._sealed_positions(seg, user_h, etype_h, entity_id, start_ts, end_ts)))
+        return out
+
+    def count(self, user_name: str | None = None, entity_type: str | None = None,
+              entity_id: int | None = None, start_ts: int | None = None, end_ts: int | None = None) -> int:
+        return sum(len(p) for _, p in self._positions(user_name, entity_type, entity_id, start_ts, end_ts))
+
+    def query(self, user_name: str | None = None, entity_type: str | None = None,
+              entity_id: int | None = None, start_ts: int | None = None, end_ts: int | None = None,
+              limit: int = 100, offset: int = 0) -> list:
+        # Registros mais recentes primeiro (ordem de gravação), paginados.
+        out = []
+        for seg, pos in self._positions(user_name, entity_type, entity_id, start_ts, end_ts):
+            if offset >= len(pos):
+                offset -= len(pos)
+                continue
+            if isinstance(pos, np.ndarray) and seg is not None:
+                pos = np.sort(pos)
+            take = pos[::-1][offset:offset + limit - len(out)]
+            offset = 0
+            out += self._read(seg, take)
+            if len(out) >= limit:
+                break
+        if user_name is not None or entity_type is not None:
+            # Conferência do texto (colisão de hash: praticamente impossível).
+            out = [r for r in out if (user_name is None or r.user_name == user_name)
+                   and (entity_type is None or r.entity_type == entity_type)]
+        return out
+
+    def latest(self, n: int) -> list:
+        return self.query(limit=n)
+
+    def _read(self, seg: _Sealed | None, positions) -> list:
+        positions = np.asarray(positions, dtype=np.intp)
+        if seg is None:
+            with self.lock:
+                self._settle()
+                data = self._active_data()
+                offsets = self._offsets[positions]
+                return [self._decode_at(data, int(o)) for o in offsets]
+        offsets = seg.arrays["offsets"][positions]
+        return [self._decode_at(seg.data, int(o)) for o in offsets]
+
+    def _decode_at(self, data, offset: int):
+        size, _ = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        return self._decode_payload(data[start:start + size])
+
+    def _decode_payload(self, payload: bytes):
+        record_id, timestamp, entity_id, lu, la, le = _FIXED.unpack_from(payload)
+        p = _FIXED.size
+        user = payload[p:p + lu].decode()
+        action = payload[p + lu:p + lu + la].decode()
+        etype = payload[p + lu + la:p + lu + la + le].decode()
+        return self.record_type(id=record_id, timestamp=timestamp, user_name=sys.intern(user),
+                                action=sys.intern(action), entity_type=sys.intern(etype),
+                                entity_id=None if entity_id == _NULL_ID else entity_id)
+
+    def nbytes(self) -> int:
+        # Memória residente própria (índices do segmento ativo); segmentos
+        # fechados ficam no cache de páginas do sistema via mmap.
+        return sum(a.nbytes for a in (self._offsets, self._ts, self._user, self._etype, self._eid)) \
+            + len(self._buffer)
+
+    def disk_bytes(self) -> int:
+        total = self._file_size
+        for seg in self.sealed:
+            total += os.path.getsize(seg.path) + os.path.getsize(seg.path[:-4] + ".idx")
+        return total
@@ -0,0 +1,145 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from erp.metrics import timed
+
+# ============================================================
+# BALANCETE MATERIALIZADO – SALDOS CORRENTES POR CONTA
+# ============================================================
+# Atualizado a cada lançamento em O(profundidade do código da conta):
+# uma célula (empresa, conta, centro de custo) e um total por prefixo
+# do plano de contas (1 -> 1.1 -> 1.1.1 -> 1.1.1.01). Valores em centavos
+# inteiros para que a conferência contra o razão seja exata.
+
+ALL_COMPANIES = None
+
+
+def to_cents(value: float) -> int:
+    return int(round(value * 100))
+
+
+def account_prefixes(code: str) -> list[str]:
+    parts = code.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class TrialBalance:
+    def __init__(self):
+        # (company_id, account_code, cost_center_id) -> [débito, crédito]
+        self.cells: dict[tuple, list[int]] = {}
+        # (company_id | None, prefixo) -> [débito, crédito]
+        self.prefixes: dict[tuple, list[int]] = {}
+        self.postings = 0
+        # Escritas de várias sessões (backend compartilhado): leituras usam cópias.
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_ledger(cls, ledger) -> "TrialBalance":
+        tb = cls()
+        if len(ledger):
+            tb.post_frame(ledger.frame(columns=["company_id", "account_code", "cost_center_id",
+                                                "debit", "credit"]))
+        return tb
+
+    def post(self, company_id: int, account_code: str, cost_center_id: int | None,
+             debit: float, credit: float):
+        self._add(company_id, account_code, cost_center_id, to_cents(debit), to_cents(credit), 1)
+
+    @timed("groupby.trial_balance.post_frame")
+    def post_frame(self, df: pd.DataFrame):
+        # Lote de lançamentos: agrega o lote primeiro e aplica uma vez por célula.
+        if df.empty:
+            return
+        batch = pd.DataFrame({
+            "company_id": df["company_id"].to_numpy(),
+            "account_code": df["account_code"].astype(str).to_numpy(),
+            "cost_center_id": df["cost_center_id"].astype("Int64").fillna(-1).to_numpy(np.int64),
+            "debit": np.rint(df["debit"].to_numpy(np.float64) * 100).astype(np.int64),
+            "credit": np.rint(df["credit"].to_numpy(np.float64) * 100).astype(np.int64),
+            "n": 1,
+        })
+        grouped = batch.groupby(["company_id", "account_code", "cost_center_id"], sort=False).sum()
+        for (company_id, code, cc), (debit, credit, n) in zip(grouped.index, grouped.to_numpy()):
+            self._add(int(company_id), code, None if cc == -1 else int(cc), int(debit), int(credit), int(n))
+
+    def _add(self, company_id, account_code, cost_center_id, debit: int, credit: int, n: int):
+        prefixes = account_prefixes(account_code)
+        with self.lock:
+            cell = self.cells.setdefault((company_id, account_code, cost_center_id), [0, 0])
+            cell[0] += debit
+            cell[1] += credit
+            for prefix in prefixes:
+                for key in ((company_id, prefix), (ALL_COMPANIES, prefix)):
+                    total = self.prefixes.setdefault(key, [0, 0])
+                    total[0] += debit
+                    total[1] += credit
+            self.postings += n
+
+    def _items(self, totals: dict) -> list[tuple]:
+        with self.lock:
+            return [(k, tuple(v)) for k, v in totals.items()]
+
+    # ------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------
+
+    @timed("groupby.trial_balance.by_account")
+    def by_account(self, company_id: int | None = ALL_COMPANIES) -> pd.DataFrame:
+        acc: dict[str, list[int]] = {}
+        for (cid, code, _), (debit, credit) in self._items(self.cells):
+            if company_id is not ALL_COMPANIES and cid != company_id:
+                continue
+            total = acc.setdefault(code, [0, 0])
+            total[0] += debit
+            total[1] += credit
+        return _frame("account_code", acc)
+
+    @timed("groupby.trial_balance.rollup")
+    def rollup(self, company_id: int | None = ALL_COMPANIES, depth: int | None = None) -> pd.DataFrame:
+        rows = {
+            prefix: values for (cid, prefix), values in self._items(self.prefixes)
+            if cid == company_id and (depth is None or prefix.count(".") + 1 == depth)
+        }
+        return _frame("account_code", rows)
+
+    def cells_frame(self) -> pd.DataFrame:
+        rows = [(cid, code, cc, d / 100, c / 100) for (cid, code, cc), (d, c) in self._items(self.cells)]
+        df = pd.DataFrame(rows, columns=["company_id", "account_code", "cost_center_id", "debit", "credit"])
+        df["saldo"] = df["debit"] - df["credit"]
+        return df
+
+    def max_depth(self) -> int:
+        return max((p.count(".") + 1 for (_, p), _ in self._items(self.prefixes)), default=0)
+
+    # ------------------------------------------------------------
+    # Conferência contra o razão
+    # ------------------------------------------------------------
+
+    def check(self, ledger) -> pd.DataFrame:
+        # Recalcula do razão bruto e devolve apenas as células e os totais por
+        # prefixo divergentes (nivel "celula" / "prefixo"; nos prefixos o
+        # centro de custo é nulo e company_id nulo é o total de todas as empresas).
+        expected = TrialBalance.from_ledger(ledger)
+        rows = []
+        for level, exp_totals, got_totals in (("celula", expected.cells, self.cells),
+                                              ("prefixo", expected.prefixes, self.prefixes)):
+            exp_items = dict(expected._items(exp_totals))
+            got_items = dict(self._items(got_totals))
+            for key in exp_items.keys() | got_items.keys():
+                exp = exp_items.get(key, (0, 0))
+                got = got_items.get(key, (0, 0))
+                if exp != got:
+                    cell = key if level == "celula" else (*key, None)
+                    rows.append((level, *cell, got[0] / 100, exp[0] / 100, got[1] / 100, exp[1] / 100))
+        return pd.DataFrame(rows, columns=[
+            "nivel", "company_id", "account_code", "cost_center_id",
+            "debit_materializado", "debit_razao", "credit_materializado", "credit_razao",
+        ])
+
+def _frame(key_name: str, totals: dict) -> pd.DataFrame:
+    rows = sorted((k, d / 100, c / 100) for k, (d, c) in totals.items())
+    df = pd.DataFrame(rows, columns=[key_name, "debit", "credit"])
+    df["saldo"] = df["debit"] - df["credit"]
+    return df
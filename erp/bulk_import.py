@@ -0,0 +1,157 @@
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# IMPORTAÇÃO EM LOTE DE TÍTULOS (AP/AR) – PIPELINE POR CHUNKS
+# ============================================================
+# Arquivo -> chunks (read_chunks) -> validação vetorizada (validate_chunk)
+# -> colunas de títulos e lançamentos de reconhecimento (title_columns /
+# recognition_columns). Só um chunk fica em memória por vez.
+
+TITLE_COLUMNS = ["company_id", "kind", "party_name", "doc_number",
+                 "issue_date", "due_date", "amount", "account_code", "cost_center_code", "counterpart_code"]
+REQUIRED_COLUMNS = ["company_id", "kind", "issue_date", "due_date", "amount", "account_code"]
+REJECTION_SAMPLE = 1_000  # linhas rejeitadas guardadas para exibição
+
+
+@dataclass
+class ImportIndexes:
+    # Índices hash das referências de cadastro usados na validação.
+    company_ids: set[int]
+    account_ids: dict[str, int]        # código da conta -> id
+    cost_center_ids: dict[str, int]    # código do CC -> id
+    closed_through: date | None = None  # último dia de período contábil fechado
+    control_accounts: dict[str, str] = field(default_factory=dict)  # AR/AP -> contrapartida padrão
+
+
+@dataclass
+class ImportStats:
+    chunks: int = 0
+    rows: int = 0
+    imported: int = 0
+    rejected: int = 0
+    pending_approval: int = 0  # títulos que caem em algum workflow
+    seconds: float = 0.0
+    rejections: list[pd.DataFrame] = field(default_factory=list)
+
+    def add_rejections(self, rejected: pd.DataFrame):
+        self.rejected += len(rejected)
+        kept = sum(len(r) for r in self.rejections)
+        if len(rejected) and kept < REJECTION_SAMPLE:
+            self.rejections.append(rejected.head(REJECTION_SAMPLE - kept))
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_chunks(source, fmt: str, chunksize: int = 50_000):
+    if fmt == "csv":
+        yield from pd.read_csv(
+            source, chunksize=chunksize,
+            dtype={"doc_number": str, "account_code": str, "cost_center_code": str, "party_name": str},
+        )
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Formato não suportado: {fmt}")
+
+
+def validate_chunk(df: pd.DataFrame, indexes: ImportIndexes):
+    # Devolve (linhas válidas normalizadas, linhas rejeitadas com motivo).
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+    df = df.reset_index(drop=True)
+    for c in ("party_name", "doc_number", "cost_center_code", "counterpart_code"):
+        df[c] = df[c].fillna("").astype(str) if c in df.columns else ""
+    df["kind"] = df["kind"].astype(str).str.strip().str.upper()
+    df["account_code"] = df["account_code"].astype(str).str.strip()
+    df["cost_center_code"] = df["cost_center_code"].str.strip()
+    # Sem contrapartida informada vale a conta de controle do tipo do título.
+    df["counterpart_code"] = df["counterpart_code"].str.strip()
+    df["counterpart_code"] = df["counterpart_code"].mask(
+        df["counterpart_code"] == "", df["kind"].map(indexes.control_accounts)).fillna("")
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    df["company_id"] = pd.to_numeric(df["company_id"], errors="coerce")
+    df["issue_date"] = pd.to_datetime(df["issue_date"], errors="coerce")
+    df["due_date"] = pd.to_datetime(df["due_date"], errors="coerce")
+    df["account_id"] = df["account_code"].map(indexes.account_ids)
+    df["cost_center_id"] = df["cost_center_code"].map(indexes.cost_center_ids)
+
+    reason = pd.Series("", index=df.index, dtype=object)
+    checks = [
+        (~df["company_id"].isin(indexes.company_ids), "empresa inexistente"),
+        (~df["kind"].isin(["AP", "AR"]), "tipo inválido"),
+        (~(df["amount"] > 0), "valor inválido"),
+        (df["issue_date"].isna() | df["due_date"].isna(), "data inválida"),
+        (df["account_id"].isna(), "conta inexistente"),
+        ((df["cost_center_code"] != "") & df["cost_center_id"].isna(), "centro de custo inexistente"),
+        (~df["counterpart_code"].isin(indexes.account_ids), "contrapartida inexistente"),
+    ]
+    if indexes.closed_through is not None:
+        checks.append((df["issue_date"] <= pd.Timestamp(indexes.closed_through), "período fechado"))
+    for mask, msg in checks:
+        reason = reason.mask(mask & (reason == ""), msg)
+    bad = reason != ""
+    rejected = df.loc[bad, [c for c in TITLE_COLUMNS if c in df.columns]].assign(motivo=reason[bad])
+    return df.loc[~bad].reset_index(drop=True), rejected
+
+
+def title_columns(df: pd.DataFrame, first_id: int) -> dict:
+    n = len(df)
+    return {
+        "id": np.arange(first_id, first_id + n, dtype=np.int64),
+        "company_id": df["company_id"].to_numpy(np.int64),
+        "kind": df["kind"].to_numpy(object),
+        "party_name": df["party_name"].to_numpy(object),
+        "doc_number": df["doc_number"].to_numpy(object),
+        "issue_date": df["issue_date"].to_numpy("datetime64[D]"),
+        "due_date": df["due_date"].to_numpy("datetime64[D]"),
+        "amount": df["amount"].to_numpy(np.float64),
+        "cost_center_id": _nullable(df["cost_center_id"]),
+        "account_id": df["account_id"].to_numpy(np.int64),
+        "status": np.full(n, "Aberto", dtype=object),
+    }
+
+
+def recognition_columns(titles: dict, df: pd.DataFrame, first_id: int) -> dict:
+    # Mesma regra do formulário, em partidas dobradas: AR credita a conta e
+    # debita a contrapartida, AP o inverso. Duas partidas por título, em
+    # sequência (ids first_id .. first_id + 2n - 1).
+    n = len(df)
+    is_ar = titles["kind"] == "AR"
+    amount = titles["amount"]
+    history = np.where(is_ar, "Reconhecimento de receita ref. título ",
+                       "Reconhecimento de despesa ref. título ").astype(object) + titles["doc_number"]
+    own_debit = np.where(is_ar, 0.0, amount)
+    own_credit = np.where(is_ar, amount, 0.0)
+
+    def paired(own, counterpart) -> np.ndarray:
+        out = np.empty(2 * n, dtype=np.asarray(own).dtype)
+        out[0::2], out[1::2] = own, counterpart
+        return out
+
+    return {
+        "id": np.arange(first_id, first_id + 2 * n, dtype=np.int64),
+        "company_id": np.repeat(titles["company_id"], 2),
+        "date": np.repeat(titles["issue_date"], 2),
+        "account_code": paired(df["account_code"].to_numpy(object), df["counterpart_code"].to_numpy(object)),
+        "cost_center_id": [c for c in titles["cost_center_id"] for _ in (0, 1)],
+        "debit": paired(own_debit, own_credit),
+        "credit": paired(own_credit, own_debit),
+        "history": np.repeat(history, 2),
+        "origin_type": np.full(2 * n, "FinancialTitle", dtype=object),
+        "origin_id": np.repeat(titles["id"], 2),
+    }
+
+
+def _nullable(series: pd.Series) -> list:
+    return [None if pd.isna(v) else int(v) for v in series.tolist()]
+
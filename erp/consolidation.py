@@ -0,0 +1,533 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import date
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from erp import metrics
+from erp.export import iter_frames
+
+# ============================================================
+# CONSOLIDAÇÃO MULTIEMPRESA – PROCESSOS EM PARALELO
+# ============================================================
+# Razão e títulos são particionados por empresa (ordenação estável por
+# company_id + início de cada empresa) e copiados uma vez para um bloco de
+# memória compartilhada, reaproveitado até o razão ou os títulos mudarem.
+# Cada tarefa do pool leva só o nome do bloco e as faixas de linhas de um
+# grupo contíguo de empresas: o processo mapeia as mesmas páginas (nada de
+# pickle dos dados), escreve o balancete por (empresa, conta) numa região
+# de saída reservada no próprio bloco e devolve só os totais por empresa
+# (razão e AR/AP) e os pares intercompany. O processo principal junta as
+# partes e aplica as eliminações.
+#
+# Intercompany: título de uma empresa do perímetro cujo favorecido
+# (party_name) é o nome cadastrado de outra empresa do perímetro. Saem do
+# consolidado os próprios títulos (AR/AP) e os lançamentos originados deles
+# (origin_type FinancialTitle), dos dois lados. Pares em que o a receber do
+# credor não bate com o a pagar do devedor aparecem como divergência.
+
+TITLE_ORIGIN = "FinancialTitle"
+TITLE_COLUMNS = ["id", "company_id", "kind", "status", "due_date", "amount", "party_name"]
+MIN_PARALLEL_ROWS = 200_000  # abaixo disso o pool não compensa: roda no próprio processo
+TASKS_PER_WORKER = 4         # tarefas menores equilibram empresas de tamanhos diferentes
+_ALIGN = 64
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Região de saída: uma célula (empresa, conta) por linha do razão, no máximo.
+_CELLS = ("company", "account", "postings", "debit", "credit", "ic_debit", "ic_credit")
+
+# Pools por processo (um por quantidade de processos), compartilhados pelos
+# motores com shared_pool=True – ex.: um motor por sessão no modo memória.
+_SHARED_POOLS: dict[int, ProcessPoolExecutor] = {}
+_SHARED_POOLS_LOCK = threading.Lock()
+
+
+@dataclass
+class Consolidation:
+    companies: pd.DataFrame      # posição por empresa (razão e AR/AP)
+    trial_balance: pd.DataFrame  # balancete consolidado, com as eliminações
+    intercompany: pd.DataFrame   # pares credor x devedor: a receber x a pagar
+    totals: dict = field(default_factory=dict)
+    workers: int = 0             # 0 = no próprio processo
+    tasks: int = 0
+    seconds: dict = field(default_factory=dict)  # por etapa
+    cells: dict = field(default_factory=dict, repr=False)  # balancete por (empresa, conta), em centavos
+    accounts: pd.Index = field(default_factory=pd.Index, repr=False)
+
+    def balance(self, company_id: int) -> pd.DataFrame:
+        # Balancete de uma empresa, montado sob demanda: as células vêm
+        # ordenadas por empresa, então é só recortar.
+        cells = self.cells
+        lo, hi = np.searchsorted(cells["company"], [company_id, company_id + 1]) if cells else (0, 0)
+        part = {k: v[lo:hi] for k, v in cells.items()} if cells else {k: np.empty(0) for k in _CELLS}
+        df = pd.DataFrame({
+            "account_code": np.asarray(self.accounts, dtype=object)[part["account"].astype(np.int64)],
+            "lancamentos": part["postings"].astype(np.int64),
+            "debit": part["debit"] / 100,
+            "credit": part["credit"] / 100,
+            "debit_eliminado": part["ic_debit"] / 100,
+            "credit_eliminado": part["ic_credit"] / 100,
+        })
+        df["saldo"] = df["debit"] - df["credit"]
+        return df.sort_values("account_code", ignore_index=True)
+
+
+# ------------------------------------------------------------
+# Memória compartilhada
+# ------------------------------------------------------------
+
+class SharedColumns:
+    # Várias colunas NumPy num único bloco; os processos recebem só
+    # (nome, leiaute) e montam visões sobre as mesmas páginas.
+    def __init__(self, columns: dict[str, np.ndarray]):
+        layout, size = [], 0
+        for name, values in columns.items():
+            size = -(-size // _ALIGN) * _ALIGN
+            layout.append((name, values.dtype.str, len(values), size))
+            size += values.nbytes
+        self.shm = SharedMemory(create=True, size=max(size, 1))
+        self.layout = tuple(layout)
+        self.arrays = _views(self.shm.buf, self.layout)
+        for name, view in self.arrays.items():
+            view[:] = columns[name]
+
+    @property
+    def spec(self) -> tuple:
+        return self.shm.name, self.layout
+
+    def close(self):
+        self.arrays = None  # nenhuma visão pode sobreviver ao close()
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _views(buf, layout) -> dict[str, np.ndarray]:
+    return {name: np.ndarray(n, dtype, buf, offset) for name, dtype, n, offset in layout}
+
+
+def _pool_task(spec: tuple, task: "_Task") -> dict:
+    # Executado nos processos do pool: mapeia o bloco só durante a tarefa.
+    name, layout = spec
+    shm = SharedMemory(name=name)
+    columns = None
+    try:
+        columns = _views(shm.buf, layout)
+        return _run_task(columns, task)
+    finally:
+        del columns  # as visões precisam sumir antes do close()
+        shm.close()
+
+
+# ------------------------------------------------------------
+# Particionamento por empresa
+# ------------------------------------------------------------
+
+def load_titles(repo, companies: dict[str, int], size: int = 100_000) -> dict[str, np.ndarray]:
+    # Colunas dos títulos (todos os status) lidas em blocos; o favorecido
+    # vira o id da empresa com esse nome (0 = terceiro).
+    names = pd.Index(list(companies))
+    ids = np.append(np.fromiter(companies.values(), np.int64, len(companies)), 0)
+    parts = []
+    for df in iter_frames(repo, "titles", TITLE_COLUMNS, size=size):
+        parts.append({
+            "id": df["id"].to_numpy(np.int64),
+            "company": df["company_id"].to_numpy(np.int64),
+            "is_ar": (df["kind"] == "AR").to_numpy(bool),
+            "is_open": (df["status"] == "Aberto").to_numpy(bool),
+            "cents": np.rint(df["amount"].to_numpy(np.float64) * 100).astype(np.int64),
+            "due": df["due_date"].to_numpy().astype("datetime64[D]").astype(np.int64),
+            "counterparty": ids[names.get_indexer(df["party_name"])],
+        })
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def _partition(company_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Ordem estável por empresa e offsets[c]:offsets[c + 1] = linhas da
+    # empresa c nessa ordem. Ids sequenciais pequenos: contagem por bincount
+    # e argsort em int16 (radix sort no NumPy).
+    if not len(company_ids):
+        return np.empty(0, np.int64), np.zeros(1, np.int64)
+    keys = company_ids
+    if company_ids.max() < np.iinfo(np.int16).max:
+        keys = company_ids.astype(np.int16)
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(company_ids.max() + 2, np.int64)
+    np.cumsum(np.bincount(company_ids), out=offsets[1:])
+    return order, offsets
+
+
+def _bounds(offsets: np.ndarray, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Empresas acima do maior id presente ficam com faixa vazia.
+    last = len(offsets) - 1
+    return offsets[np.minimum(ids, last)], offsets[np.minimum(ids + 1, last)]
+
+
+def _ranges(lo: np.ndarray, hi: np.ndarray) -> tuple:
+    # Faixas de empresas vizinhas na ordem viram uma só.
+    out = []
+    for a, b in zip(lo.tolist(), hi.tolist()):
+        if a == b:
+            continue
+        if out and out[-1][1] == a:
+            out[-1] = (out[-1][0], b)
+        else:
+            out.append((a, b))
+    return tuple(out)
+
+
+@dataclass(frozen=True)
+class _Task:
+    ledger: tuple                # faixas (início, fim) em ledger_order
+    titles: tuple                # faixas em title_order
+    out: int                     # início da região de saída das células
+    perimeter: np.ndarray        # ids das empresas do grupo, ordenados
+    n_accounts: int
+    origin: int                  # código de TITLE_ORIGIN em origin_type (-1 se ausente)
+    as_of: int                   # dias desde 1970
+    ic_titles: np.ndarray        # ids dos títulos intercompany do perímetro, ordenados
+
+
+def _tasks(perimeter: np.ndarray, ledger_offsets, title_offsets, n_tasks: int, **common) -> list[_Task]:
+    # Grupos contíguos de empresas com quantidades de linhas parecidas; cada
+    # um reserva na saída tantas células quantas linhas do razão tiver.
+    if not len(perimeter):
+        return []
+    lo_l, hi_l = _bounds(ledger_offsets, perimeter)
+    lo_t, hi_t = _bounds(title_offsets, perimeter)
+    weight = np.cumsum((hi_l - lo_l) + (hi_t - lo_t) + 1)
+    cuts = np.searchsorted(weight, weight[-1] * np.arange(1, n_tasks) / n_tasks, side="right")
+    tasks, out = [], 0
+    for g in np.split(np.arange(len(perimeter)), np.unique(cuts)):
+        if len(g):
+            tasks.append(_Task(_ranges(lo_l[g], hi_l[g]), _ranges(lo_t[g], hi_t[g]), out, perimeter, **common))
+            out += int((hi_l[g] - lo_l[g]).sum())
+    return tasks
+
+
+# ------------------------------------------------------------
+# Tarefa (uma por grupo de empresas)
+# ------------------------------------------------------------
+
+def _take(order: np.ndarray, ranges: tuple) -> np.ndarray:
+    if len(ranges) == 1:
+        return order[ranges[0][0]:ranges[0][1]]
+    return np.concatenate([order[a:b] for a, b in ranges] or [order[:0]])
+
+
+def _isin_sorted(values: np.ndarray, sorted_ids: np.ndarray) -> np.ndarray:
+    if not len(sorted_ids):
+        return np.zeros(len(values), bool)
+    pos = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return sorted_ids[pos] == values
+
+
+def _runs(sorted_keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # np.unique(..., return_inverse=True) para chaves já ordenadas, em O(n).
+    change = np.ones(len(sorted_keys), bool)
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=change[1:])
+    return sorted_keys[change], np.cumsum(change) - 1
+
+
+def _run_task(cols: dict, task: _Task) -> dict:
+    # Somas em centavos (float64 exato até 2**53).
+    rows = _take(cols["ledger_order"], task.ledger)
+    company = cols["ledger_company"][rows]
+    debit = np.rint(cols["ledger_debit"][rows] * 100)
+    credit = np.rint(cols["ledger_credit"][rows] * 100)
+    from_title = cols["ledger_origin"][rows] == task.origin
+    ic = np.zeros(len(rows), bool)
+    ic[from_title] = _isin_sorted(cols["ledger_origin_id"][rows[from_title]], task.ic_titles)
+    keys, inv = np.unique(company * task.n_accounts + cols["ledger_account"][rows], return_inverse=True)
+    k = len(keys)
+    out = slice(task.out, task.out + k)
+    cols["cell_company"][out] = keys // task.n_accounts
+    cols["cell_account"][out] = keys % task.n_accounts
+    cols["cell_postings"][out] = np.bincount(inv, minlength=k)
+    for name, weights in (("debit", debit), ("credit", credit),
+                          ("ic_debit", np.where(ic, debit, 0)), ("ic_credit", np.where(ic, credit, 0))):
+        cols[f"cell_{name}"][out] = np.bincount(inv, weights, k)
+    # Células ordenadas por chave: as de cada empresa são contíguas.
+    cell_company = cols["cell_company"][out]
+    starts = np.flatnonzero(np.diff(cell_company, prepend=-1))
+    ledger = (cell_company[starts], *(np.add.reduceat(cols[f"cell_{c}"][out], starts) if k else np.empty(0)
+                                      for c in ("postings", "debit", "credit")))
+    n_cells = k
+
+    rows = _take(cols["title_order"], task.titles)
+    rows = rows[cols["title_open"][rows]]
+    company = cols["title_company"][rows]
+    counterparty = cols["title_counterparty"][rows]
+    cents = cols["title_cents"][rows].astype(np.float64)
+    ar = cols["title_ar"][rows]
+    overdue = cols["title_due"][rows] < task.as_of
+    ic = np.isin(counterparty, task.perimeter) & (counterparty != company)
+    keys, inv = _runs(company)
+    k = len(keys)
+    sums = lambda mask: np.bincount(inv, np.where(mask, cents, 0), k)
+    titles = (keys, sums(ar), sums(~ar), sums(ar & overdue), sums(~ar & overdue), sums(ar & ic),
+              sums(~ar & ic), np.bincount(inv, ar, k), np.bincount(inv, ~ar, k))
+
+    pair_keys, inv = np.unique(np.column_stack([company[ic], counterparty[ic], ar[ic]]), axis=0,
+                               return_inverse=True)
+    pairs = (pair_keys, np.bincount(inv.reshape(-1), cents[ic], len(pair_keys)))
+    return {"cells": (task.out, n_cells), "ledger": ledger,
+            "titles": titles, "pairs": pairs}
+
+
+# ------------------------------------------------------------
+# Motor (pool de processos reaproveitado entre execuções)
+# ------------------------------------------------------------
+
+class _Snapshot:
+    # Razão e títulos particionados por empresa, prontos para as tarefas.
+    # Vale enquanto nenhum dos dois mudar: execuções seguidas (outro
+    # perímetro, outra data) não reordenam nem copiam nada de novo.
+    def __init__(self, key: tuple, ledger: pd.DataFrame, titles: dict[str, np.ndarray]):
+        self.key = key
+        self.rows = len(ledger) + len(titles["id"])
+        self.accounts = ledger["account_code"].cat.categories
+        origins = ledger["origin_type"].cat.categories
+        self.origin = origins.get_loc(TITLE_ORIGIN) if TITLE_ORIGIN in origins else -1
+        ledger_order, self.ledger_offsets = _partition(ledger["company_id"].to_numpy())
+        title_order, self.title_offsets = _partition(titles["company"])
+        n = len(ledger)
+        self.columns = {
+            "ledger_order": ledger_order,
+            "ledger_company": ledger["company_id"].to_numpy(),
+            "ledger_account": ledger["account_code"].cat.codes.to_numpy(),
+            "ledger_debit": ledger["debit"].to_numpy(),
+            "ledger_credit": ledger["credit"].to_numpy(),
+            "ledger_origin": ledger["origin_type"].cat.codes.to_numpy(),
+            "ledger_origin_id": ledger["origin_id"].to_numpy(np.int64, na_value=0),
+            "title_order": title_order,
+            "title_company": titles["company"],
+            "title_ar": titles["is_ar"],
+            "title_open": titles["is_open"],
+            "title_cents": titles["cents"],
+            "title_due": titles["due"],
+            "title_counterparty": titles["counterparty"],
+            **{f"cell_{c}": np.zeros(n, np.int64 if c in ("company", "account", "postings") else np.float64)
+               for c in _CELLS},
+        }
+        # Candidatos a intercompany (favorecido é outra empresa); o perímetro filtra a cada execução.
+        other = (titles["counterparty"] != 0) & (titles["counterparty"] != titles["company"])
+        self.candidates = {k: titles[k][other] for k in ("id", "company", "counterparty")}
+        self.block: SharedColumns | None = None
+
+    def shared(self) -> SharedColumns:
+        if self.block is None:
+            self.block = SharedColumns(self.columns)
+        return self.block
+
+    def arrays(self, parallel: bool) -> dict[str, np.ndarray]:
+        return self.block.arrays if parallel else self.columns
+
+    def ic_titles(self, perimeter: np.ndarray) -> np.ndarray:
+        c = self.candidates
+        return np.sort(c["id"][np.isin(c["company"], perimeter) & np.isin(c["counterparty"], perimeter)])
+
+    def close(self):
+        if self.block is not None:
+            self.block.close()
+            self.block = None
+
+
+def _spawn_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: o servidor tem threads, e fork copiaria locks em uso.
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shared_pool(workers: int) -> ProcessPoolExecutor:
+    with _SHARED_POOLS_LOCK:
+        pool = _SHARED_POOLS.get(workers)
+        if pool is None:
+            pool = _SHARED_POOLS[workers] = _spawn_pool(workers)
+        return pool
+
+
+def _discard_shared_pool(pool: ProcessPoolExecutor):
+    with _SHARED_POOLS_LOCK:
+        for workers, p in list(_SHARED_POOLS.items()):
+            if p is pool:
+                del _SHARED_POOLS[workers]
+
+
+class ConsolidationEngine:
+    def __init__(self, workers: int | None = None, min_rows: int = MIN_PARALLEL_ROWS,
+                 shared_pool: bool = False):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        # shared_pool: usa o pool do processo (close() não o encerra).
+        self.shared_pool = shared_pool
+        self._executor: ProcessPoolExecutor | None = None
+        self._titles: tuple | None = None  # (versão, empresas) -> colunas da última leitura
+        self._snapshot: _Snapshot | None = None
+        self.lock = threading.Lock()
+        # Uma consolidação por vez: o bloco compartilhado (e sua região de
+        # saída) só é usado ou trocado sem tarefas em curso.
+        self.run_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> _Snapshot | None:
+        return self._snapshot
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self._executor is None:
+                self._executor = shared_pool(self.workers) if self.shared_pool else _spawn_pool(self.workers)
+            return self._executor
+
+    def start(self):
+        # Sobe os processos antes da primeira consolidação (cada um importa NumPy/pandas).
+        if self.workers > 1:
+            list(self.executor().map(int, range(self.workers)))
+
+    def close(self):
+        with self.run_lock, self.lock:
+            if self._executor is not None:
+                if not self.shared_pool:
+                    self._executor.shutdown()
+                self._executor = None
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+
+    def titles(self, repo, companies: dict[str, int]) -> dict[str, np.ndarray]:
+        key = (repo.version("titles"), tuple(companies.items()))
+        with self.lock:
+            if self._titles is None or self._titles[0] != key:
+                self._titles = key, load_titles(repo, companies)
+            return self._titles[1]
+
+    def tasks(self, snapshot: _Snapshot, perimeter: np.ndarray, as_of: date, parallel: bool = True) -> list[_Task]:
+        return _tasks(perimeter, snapshot.ledger_offsets, snapshot.title_offsets,
+                      self.workers * TASKS_PER_WORKER if parallel else 1,
+                      n_accounts=max(len(snapshot.accounts), 1), origin=snapshot.origin,
+                      as_of=as_of.toordinal() - _EPOCH_ORDINAL, ic_titles=snapshot.ic_titles(perimeter))
+
+    @metrics.timed("consolidation.run")
+    def run(self, repo, companies: dict[str, int], perimeter, as_of: date) -> Consolidation:
+        # companies: nome -> id de todas as empresas; perimeter: ids do grupo.
+        with self.run_lock:
+            seconds = {"leitura": 0.0}
+            t0 = time.perf_counter()
+            ledger = repo.columnar("ledger")
+            key = (len(ledger), repo.version("ledger"), repo.version("titles"), tuple(companies.items()))
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.key != key:
+                titles = self.titles(repo, companies)
+                frame = ledger.frame(columns=["company_id", "account_code", "debit", "credit",
+                                              "origin_type", "origin_id"])
+                seconds["leitura"] = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                if snapshot is not None:
+                    snapshot.close()
+                snapshot = self._snapshot = _Snapshot(key, frame, titles)
+            parallel = self.workers > 1 and snapshot.rows >= self.min_rows
+            if parallel:
+                block = snapshot.shared()
+            seconds["particionamento"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            perimeter = np.unique(np.asarray(list(perimeter), np.int64))
+            tasks = self.tasks(snapshot, perimeter, as_of, parallel)
+            if parallel and tasks:
+                results = self._map(block, tasks)
+            else:
+                results = [_run_task(snapshot.columns, task) for task in tasks]
+            seconds["processamento"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            names = {cid: name for name, cid in companies.items()}
+            result = _merge(results, snapshot.arrays(parallel), perimeter, snapshot.accounts, names)
+            seconds["consolidacao"] = time.perf_counter() - t0
+        result.workers = self.workers if parallel else 0
+        result.tasks = len(tasks)
+        result.seconds = seconds
+        return result
+
+    def _map(self, block: SharedColumns, tasks: list[_Task]) -> list[dict]:
+        try:
+            return list(self.executor().map(_pool_task, [block.spec] * len(tasks), tasks))
+        except BrokenProcessPool:
+            # Processo do pool morreu: o próximo run recria o pool.
+            with self.lock:
+                if self.shared_pool and self._executor is not None:
+                    _discard_shared_pool(self._executor)
+                self._executor = None
+            raise
+
+
+# ------------------------------------------------------------
+# Junção e eliminações
+# ------------------------------------------------------------
+
+def _stack(results: list[dict], key: str, width: int) -> list[np.ndarray]:
+    if not results:
+        return [np.empty(0)] * width
+    return [np.concatenate(parts) for parts in zip(*(r[key] for r in results))]
+
+
+def _merge(results: list[dict], arrays: dict, perimeter: np.ndarray, accounts: pd.Index,
+           names: dict) -> Consolidation:
+    # As células saem da região de saída (cópia: o bloco é reaproveitado na
+    # próxima execução); o resto são totais pequenos vindos das tarefas.
+    spans = [slice(start, start + k) for start, k in (r["cells"] for r in results)]
+    cells = {c: np.concatenate([arrays[f"cell_{c}"][s] for s in spans] or [arrays[f"cell_{c}"][:0]])
+             for c in _CELLS}
+
+    n_accounts = len(accounts)
+    account = cells["account"]
+    by_account = np.stack([np.bincount(account, cells[c], n_accounts)
+                           for c in ("debit", "credit", "ic_debit", "ic_credit")]) / 100
+    used = np.flatnonzero(np.bincount(account, minlength=n_accounts))
+    codes = np.asarray(accounts, dtype=object)[used]
+    order = np.argsort(codes)
+    used, by_account = used[order], by_account[:, used[order]]
+    trial = pd.DataFrame({"account_code": codes[order], "debit": by_account[0], "credit": by_account[1],
+                          "debit_eliminado": by_account[2], "credit_eliminado": by_account[3]})
+    trial["saldo"] = trial["debit"] - trial["credit"]
+    trial["saldo_consolidado"] = trial["saldo"] - (trial["debit_eliminado"] - trial["credit_eliminado"])
+
+    keys, postings, debit, credit = _stack(results, "ledger", 4)
+    ledger = pd.DataFrame({"lancamentos": postings.astype(np.int64), "debit": debit / 100, "credit": credit / 100},
+                          index=keys.astype(np.int64))
+    keys, *sums = _stack(results, "titles", 9)
+    labels = ["AR", "AP", "AR_vencido", "AP_vencido", "AR_intercompany", "AP_intercompany", "qtd_AR", "qtd_AP"]
+    titles = pd.DataFrame({label: values if label.startswith("qtd") else values / 100
+                           for label, values in zip(labels, sums)}, index=keys.astype(np.int64))
+    companies = (pd.DataFrame({"empresa": [names.get(int(c), "") for c in perimeter]}, index=perimeter)
+                 .join(ledger).join(titles).fillna(0).rename_axis("company_id").reset_index())
+    for c in ("lancamentos", "qtd_AR", "qtd_AP"):
+        companies[c] = companies[c].astype(np.int64)
+    companies["liquido"] = companies["AR"] - companies["AP"]
+
+    # Pares: AR do credor contra o devedor x AP do devedor para o credor.
+    pair_keys, pair_cents = _stack(results, "pairs", 2)
+    pair_keys = pair_keys.reshape(-1, 3).astype(np.int64)
+    is_ar = pair_keys[:, 2] == 1
+    pairs = pd.DataFrame({"credor": np.where(is_ar, pair_keys[:, 0], pair_keys[:, 1]),
+                          "devedor": np.where(is_ar, pair_keys[:, 1], pair_keys[:, 0]),
+                          "valor": pair_cents / 100})
+    intercompany = pd.concat([
+        pairs[is_ar].groupby(["credor", "devedor"])["valor"].sum().rename("a_receber"),
+        pairs[~is_ar].groupby(["credor", "devedor"])["valor"].sum().rename("a_pagar"),
+    ], axis=1).fillna(0).reset_index()
+    intercompany["diferenca"] = intercompany["a_receber"] - intercompany["a_pagar"]
+
+    ar, ap = float(companies["AR"].sum()), float(companies["AP"].sum())
+    ar_ic, ap_ic = float(companies["AR_intercompany"].sum()), float(companies["AP_intercompany"].sum())
+    totals = {
+        "AR": ar, "AP": ap, "AR_eliminado": ar_ic, "AP_eliminado": ap_ic,
+        "AR_consolidado": ar - ar_ic, "AP_consolidado": ap - ap_ic,
+        "debit_eliminado": float(trial["debit_eliminado"].sum()),
+        "credit_eliminado": float(trial["credit_eliminado"].sum()),
+        "divergencia": float(intercompany["diferenca"].abs().sum()),
+    }
+    return Consolidation(companies, trial, intercompany, totals, cells=cells, accounts=accounts)
@@ -0,0 +1,455 @@
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from erp.indexes import DuplicateKeyError
+
+# ============================================================
+# MDM – DETECÇÃO DE CADASTROS DUPLICADOS POR BLOCAGEM
+# ============================================================
+# Cada registro gera chaves de bloco: documento normalizado (só dígitos,
+# com DV conferido), código normalizado (SKU), chave fonética do nome e uma
+# chave parcial (primeiro + último termo fonético, refinada pela
+# classificação – NCM – quando há). Só pares que dividem algum bloco são
+# pontuados, nunca todos contra todos: dentro de um bloco, ordenado pelo
+# nome, cada registro é comparado com os WINDOW vizinhos seguintes (todos os
+# pares em blocos pequenos; vizinhança ordenada nos blocos grandes, como
+# "Maria Silva"). Normalização e fonética rodam uma vez por texto distinto,
+# sobre um único texto com separadores (cada regra é um re.sub só).
+#
+# O mesmo cálculo atende a inclusão (DedupIndex.check, blocos em dicts) e o
+# lote sobre a base inteira (find_duplicates, vetorizado).
+
+DEDUP_STATUSES = ["duplicado", "provável", "possível"]
+STATUS_SCORES = (85, 60, 30)   # pontuação mínima de cada situação
+
+SCORE_DOC = 60              # mesmo CPF/CNPJ com DV válido
+SCORE_DOC_INVALID = 45      # mesmos dígitos, DV inválido
+SCORE_CODE = 60             # mesmo código (SKU) normalizado
+SCORE_NAME = 30             # nome foneticamente igual (proporcional aos termos em comum)
+SCORE_NAME_EXACT = 10       # nome normalizado idêntico
+SCORE_GROUP = 20            # mesma classificação (NCM)
+PENALTY_GROUP = 20          # classificações diferentes
+WINDOW = 8                  # vizinhos comparados por registro dentro de cada bloco
+INLINE_CANDIDATES = 200     # membros mais recentes de cada bloco conferidos na inclusão
+
+_SEP = "\x1f"
+_NOT_WORD = re.compile(r"[^0-9a-z\x1f ]+")
+_NOT_DIGIT = re.compile(r"[^0-9\x1f]+")
+_NOT_CODE = re.compile(r"[^0-9A-Z\x1f]+")
+_STOPWORDS = re.compile(r" (?:da|de|do|das|dos|e|ltda|me|epp|eireli|sa|s a|cia)(?= |\x1f|$)")
+_REPEATED = re.compile(r"([a-z])\1+")
+_TERMS = re.compile(r"[^ \x1f]+|\x1f")                              # termos e separadores
+_ENDS = re.compile(r"(?<![^\x1f])([^ \x1f]+)[^\x1f]* ([^ \x1f]+)(?![^\x1f])")  # primeiro e último termo
+_SINGLE = re.compile(r"(?<![^\x1f])[^ \x1f]+(?![^\x1f])")          # valor de um termo só
+# Fonética simplificada do português: grafias que soam igual viram a mesma
+# chave (Souza/Sousa, Luiz/Luís, Thiago/Tiago, Felipe/Phelipe, Estevão/Estevam).
+_DIGRAPHS = (("ph", "f"), ("ch", "x"), ("sh", "x"), ("lh", "l"), ("nh", "n"), ("qu", "k"), ("q", "k"))
+_SOFT = ((re.compile(r"gu(?=[ei])"), "g"), (re.compile(r"g(?=[ei])"), "j"), (re.compile(r"c(?=[ei])"), "s"))
+_LETTERS = str.maketrans({"c": "k", "y": "i", "w": "v", "z": "s", "h": None})
+_ENDINGS = ((re.compile(r"(?:ao|am)\b"), "an"), (re.compile(r"m\b"), "n"))
+
+_ROW = ("scope", "doc", "valid", "code", "group", "norm", "phonetic", "compact")
+_CPF_WEIGHTS = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+_CNPJ_WEIGHTS = (np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+
+# Motivos do par, em bits (a descrição sai de uma tabela, não por par).
+_R_DOC, _R_DOC_INVALID, _R_CODE, _R_NAME, _R_NAME_PARTIAL, _R_NAME_EXACT, _R_GROUP = (1 << i for i in range(7))
+_REASONS = ((_R_DOC, "documento"), (_R_DOC_INVALID, "documento (DV inválido)"), (_R_CODE, "código"),
+            (_R_NAME_EXACT, "nome idêntico"), (_R_NAME, "nome semelhante"), (_R_NAME_PARTIAL, "nome parcial"),
+            (_R_GROUP, "classificação"))
+
+
+@dataclass(frozen=True)
+class DedupSpec:
+    name: str                  # nome/descrição: chaves fonéticas
+    doc: str | None = None     # CPF/CNPJ: dígitos, DV e conflito
+    code: str | None = None    # código (SKU): alfanumérico em maiúsculas
+    group: str | None = None   # classificação (NCM): pontua e refina o bloco parcial
+    scope: str | None = None   # duplicatas só dentro do mesmo valor (ex.: company_id)
+
+
+@dataclass(frozen=True, slots=True)
+class DedupMatch:
+    id: int
+    score: int
+    status: str
+    reasons: str
+
+
+class DuplicateRecordError(DuplicateKeyError):
+    def __init__(self, matches: list[DedupMatch]):
+        self.matches = matches
+        best = matches[0]
+        super().__init__(f"Cadastro provavelmente duplicado: id {best.id} ({best.reasons}; pontuação {best.score})")
+
+
+# ------------------------------------------------------------
+# Documentos (CPF/CNPJ)
+# ------------------------------------------------------------
+
+def doc_digits(values) -> np.ndarray:
+    codes, uniques = _distinct(values)
+    digits = np.array(_NOT_DIGIT.sub("", _SEP.join(uniques)).split(_SEP), dtype=object)
+    return digits[codes]
+
+
+def valid_docs(digits) -> np.ndarray:
+    # DV de CPF (11 dígitos) e CNPJ (14), vetorizado; sequências repetidas são inválidas.
+    digits = np.asarray(digits, dtype=object)
+    out = np.zeros(len(digits), dtype=bool)
+    lengths = np.fromiter(map(len, digits), dtype=np.int64, count=len(digits))
+    for size, weights in ((11, _CPF_WEIGHTS), (14, _CNPJ_WEIGHTS)):
+        rows = np.flatnonzero(lengths == size)
+        if not len(rows):
+            continue
+        d = np.frombuffer("".join(digits[rows]).encode(), dtype=np.uint8).reshape(-1, size).astype(np.int64) - 48
+        ok = (d[:, -2] == _check_digit(d[:, :-2], weights[0])) & (d[:, -1] == _check_digit(d[:, :-1], weights[1]))
+        out[rows] = ok & ~(d == d[:, :1]).all(axis=1)
+    return out
+
+
+def valid_doc(doc: str) -> bool:
+    return bool(valid_docs(doc_digits([doc]))[0])
+
+
+def doc_status(values) -> np.ndarray:
+    digits = doc_digits(values)
+    status = np.where(valid_docs(digits), "válido", "inválido").astype(object)
+    status[digits == ""] = "vazio"
+    return status
+
+
+def _check_digit(d: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    r = (d * weights).sum(axis=1) % 11
+    return np.where(r < 2, 0, 11 - r)
+
+
+# ------------------------------------------------------------
+# Normalização por texto distinto
+# ------------------------------------------------------------
+
+def _distinct(values) -> tuple[np.ndarray, list[str]]:
+    # Códigos por linha e textos distintos (None vira ""; o separador vira espaço).
+    codes, uniques = pd.factorize(pd.Series(np.asarray(values, dtype=object)).fillna(""))
+    return codes, [str(u).replace(_SEP, " ") for u in uniques]
+
+
+def _ascii_lower(text: str) -> str:
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return text.lower()
+
+
+def normalize_names(texts: list[str]) -> tuple[list[str], list[str]]:
+    # -> (nomes normalizados, chaves fonéticas com espaços entre os termos)
+    # Cada passo é uma varredura só do texto inteiro; regex só onde há contexto.
+    text = _STOPWORDS.sub("", _NOT_WORD.sub(" ", _ascii_lower(_SEP.join(texts))))
+    while "  " in text:
+        text = text.replace("  ", " ")
+    text = text.replace(" " + _SEP, _SEP).replace(_SEP + " ", _SEP).strip(" ")
+    norm = text.split(_SEP)
+    for old, new in _DIGRAPHS:
+        text = text.replace(old, new)
+    for pattern, repl in _SOFT:
+        text = pattern.sub(repl, text)
+    text = text.translate(_LETTERS)
+    for pattern, repl in _ENDINGS:
+        text = pattern.sub(repl, text)
+    return norm, _REPEATED.sub(r"\1", text).split(_SEP)
+
+
+# ------------------------------------------------------------
+# Atributos comparáveis
+# ------------------------------------------------------------
+
+def _attributes(spec: DedupSpec, columns) -> dict[str, np.ndarray]:
+    # Valores normalizados por linha (object), calculados por texto distinto:
+    # scope, doc (dígitos), valid, code, group, norm, phonetic (termos com
+    # espaço), compact (sem espaço) e, com classificação, ends (primeiro +
+    # último termo; vazio se há um termo só).
+    n = len(columns[spec.name])
+    blank = np.full(n, "", dtype=object)
+    out = {"scope": pd.Series(columns[spec.scope]).to_numpy(object) if spec.scope else np.zeros(n, dtype=object)}
+    out["doc"] = doc_digits(columns[spec.doc]) if spec.doc else blank
+    out["valid"] = valid_docs(out["doc"]) if spec.doc else np.zeros(n, dtype=bool)
+    out["code"] = _cleaned(columns[spec.code], _NOT_CODE, upper=True) if spec.code else blank
+    out["group"] = _cleaned(columns[spec.group], _NOT_DIGIT) if spec.group else blank
+    codes, names = _distinct(columns[spec.name])
+    norm, phonetic = normalize_names(names)
+    text = _SEP.join(phonetic)
+    for col, values in (("norm", norm), ("phonetic", phonetic), ("compact", text.replace(" ", "").split(_SEP))):
+        out[col] = np.array(values, dtype=object)[codes]
+    if spec.group:
+        out["ends"] = np.array(_SINGLE.sub("", _ENDS.sub(r"\1 \2", text)).split(_SEP), dtype=object)[codes]
+    return out
+
+
+def _cleaned(values, pattern, upper: bool = False) -> np.ndarray:
+    codes, uniques = _distinct(values)
+    text = _SEP.join(uniques)
+    return np.array(pattern.sub("", text.upper() if upper else text).split(_SEP), dtype=object)[codes]
+
+
+def _block_keys(spec: DedupSpec, attrs: dict[str, np.ndarray]) -> list[np.ndarray]:
+    # Chaves de bloco em texto (None = sem chave), prefixadas pelo escopo.
+    # Sem classificação o bloco parcial só traria pares que não alcançam a
+    # menor situação (nome parcial sem documento/código em comum).
+    scope = pd.Series(attrs["scope"]).astype(str).to_numpy(object) + _SEP
+    keys = [("d", attrs["doc"], attrs["doc"]), ("c", attrs["code"], attrs["code"]),
+            ("n", attrs["compact"], attrs["compact"])]
+    if spec.group:
+        keys.append(("p", attrs["group"] + _SEP + attrs["ends"], attrs["ends"]))
+    return [np.where(present != "", tag + scope + values, None) for tag, values, present in keys]
+
+
+class _Features:
+    # Colunas por registro em códigos inteiros (-1 = vazio) e, por nome
+    # fonético distinto, os termos em CSR (distintos e ordenados).
+
+    def __init__(self, attrs: dict[str, np.ndarray]):
+        self.valid = np.asarray(attrs["valid"], dtype=bool)
+        self.doc, self.code, self.group = (_codes(attrs[c], empty="") for c in ("doc", "code", "group"))
+        self.norm = _codes(attrs["norm"], empty="")
+        self.phonetic = _codes(attrs["compact"], empty="")
+        self.name, names = pd.factorize(pd.Series(attrs["phonetic"]))
+        parts = np.array(_TERMS.findall(_SEP.join(names)), dtype=object)
+        sep = parts == _SEP
+        term_codes, _ = pd.factorize(parts[~sep])
+        owner = np.cumsum(sep)[~sep].astype(np.int64)  # nome distinto de cada termo
+        self.term_keys = _sorted_unique((owner << 32) | term_codes)
+        self.term_offsets = np.searchsorted(self.term_keys >> 32, np.arange(len(names) + 1))
+
+    def jaccard(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # Termos fonéticos em comum / termos distintos dos dois nomes, por par.
+        na, nb = self.name[a], self.name[b]
+        la = self.term_offsets[na + 1] - self.term_offsets[na]
+        lb = self.term_offsets[nb + 1] - self.term_offsets[nb]
+        pair = np.repeat(np.arange(len(a)), la)
+        pos = np.repeat(self.term_offsets[na] - np.cumsum(la) + la, la) + np.arange(len(pair))
+        probe = (nb[pair].astype(np.int64) << 32) | (self.term_keys[pos] & 0xFFFFFFFF)
+        i = np.minimum(np.searchsorted(self.term_keys, probe), len(self.term_keys) - 1)
+        inter = np.bincount(pair, weights=self.term_keys[i] == probe, minlength=len(a))
+        union = la + lb - inter
+        return np.divide(inter, union, out=np.zeros(len(a)), where=union > 0)
+
+
+class _RowFeatures:
+    # As mesmas colunas, a partir das linhas guardadas no DedupIndex (poucos
+    # candidatos: termos em comum por conjunto).
+
+    def __init__(self, rows: list[tuple]):
+        _, doc, valid, code, group, norm, phonetic, compact = zip(*rows)
+        self.valid = np.array(valid, dtype=bool)
+        self.doc, self.code, self.group = _codes(doc, empty=""), _codes(code, empty=""), _codes(group, empty="")
+        self.norm, self.phonetic = _codes(norm, empty=""), _codes(compact, empty="")
+        self.terms = [set(p.split()) for p in phonetic]
+
+    def jaccard(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        out = np.zeros(len(a))
+        for i, (x, y) in enumerate(zip(a.tolist(), b.tolist())):
+            union = len(self.terms[x] | self.terms[y])
+            out[i] = len(self.terms[x] & self.terms[y]) / union if union else 0.0
+        return out
+
+
+def _codes(values, empty=None, sort: bool = False) -> np.ndarray:
+    codes, uniques = pd.factorize(pd.Series(np.asarray(values, dtype=object)), sort=sort)
+    codes = codes.astype(np.int64)
+    if empty is not None:
+        hit = np.flatnonzero(np.asarray(uniques, dtype=object) == empty)
+        if len(hit):
+            codes[codes == hit[0]] = -1
+    return codes
+
+
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    keys = np.sort(keys)
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+
+
+# ------------------------------------------------------------
+# Pontuação (comum à inclusão e ao lote)
+# ------------------------------------------------------------
+
+def _evidence(f, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Algo além do nome em comum (documento, código ou classificação).
+    return (((f.doc[a] == f.doc[b]) & (f.doc[a] >= 0)) | ((f.code[a] == f.code[b]) & (f.code[a] >= 0))
+            | ((f.group[a] == f.group[b]) & (f.group[a] >= 0)))
+
+
+def _score(f, a: np.ndarray, b: np.ndarray, name_sim: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    doc_same = (f.doc[a] == f.doc[b]) & (f.doc[a] >= 0)
+    doc_conflict = (f.doc[a] >= 0) & (f.doc[b] >= 0) & ~doc_same
+    doc_valid = doc_same & f.valid[a]
+    code_same = (f.code[a] == f.code[b]) & (f.code[a] >= 0)
+    has_group = (f.group[a] >= 0) & (f.group[b] >= 0)
+    group_same = has_group & (f.group[a] == f.group[b])
+    norm_same = (f.norm[a] == f.norm[b]) & (f.norm[a] >= 0)
+    name_sim = np.where((f.phonetic[a] == f.phonetic[b]) & (f.phonetic[a] >= 0), 1.0, name_sim)
+
+    score = (SCORE_DOC * doc_valid + SCORE_DOC_INVALID * (doc_same & ~doc_valid) + SCORE_CODE * code_same
+             + np.rint(SCORE_NAME * name_sim).astype(np.int64) + SCORE_NAME_EXACT * norm_same
+             + SCORE_GROUP * group_same - PENALTY_GROUP * (has_group & ~group_same))
+    score = np.where(doc_conflict, 0, np.minimum(score, 100))  # documentos diferentes: pessoas diferentes
+    reasons = (_R_DOC * doc_valid | _R_DOC_INVALID * (doc_same & ~doc_valid) | _R_CODE * code_same
+               | np.where(norm_same, _R_NAME_EXACT,
+                          np.where(name_sim >= 1, _R_NAME, np.where(name_sim > 0, _R_NAME_PARTIAL, 0)))
+               | _R_GROUP * group_same)
+    return score, reasons
+
+
+def _status(score: np.ndarray) -> np.ndarray:
+    return np.select([score >= s for s in STATUS_SCORES], DEDUP_STATUSES, default="")
+
+
+def _reason_text(mask: np.ndarray) -> np.ndarray:
+    uniques, inverse = np.unique(mask, return_inverse=True)
+    labels = np.array([", ".join(t for bit, t in _REASONS if m & bit) for m in uniques.tolist()], dtype=object)
+    return labels[inverse]
+
+
+def _name_similarity(f: _Features, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Nome só parcialmente igual não alcança a menor situação sozinho
+    # (SCORE_NAME < STATUS_SCORES[-1]): os termos em comum só são contados
+    # nos pares com outra evidência, poucos entre os vizinhos dos blocos.
+    sim = ((f.phonetic[a] == f.phonetic[b]) & (f.phonetic[a] >= 0)).astype(np.float64)
+    need = np.flatnonzero((sim == 0) & _evidence(f, a, b))
+    sim[need] = f.jaccard(a[need], b[need])
+    return sim
+
+
+# ------------------------------------------------------------
+# Lote: base inteira
+# ------------------------------------------------------------
+
+def candidate_pairs(blocks: list[np.ndarray], order: np.ndarray, window: int = WINDOW) -> tuple[np.ndarray, np.ndarray]:
+    # Vizinhança ordenada por bloco: (linha, linha + d) para d = 1..window
+    # quando as duas estão no mesmo bloco. Pares repetidos entre blocos saem
+    # por ordenação das chaves a*n + b.
+    n = len(order)
+    found = []
+    for block in blocks:
+        rows = np.flatnonzero(block >= 0)
+        rows = rows[np.lexsort((order[rows], block[rows]))]
+        keys = block[rows]
+        for d in range(1, window + 1):
+            same = np.flatnonzero(keys[d:] == keys[:-d])
+            if not len(same):
+                break
+            a, b = rows[same], rows[same + d]
+            found.append(np.minimum(a, b) * n + np.maximum(a, b))
+    if not found:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    keys = np.sort(np.concatenate(found))
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return keys // n, keys % n
+
+
+def find_duplicates(spec: DedupSpec, columns, window: int = WINDOW,
+                    min_score: int = STATUS_SCORES[-1]) -> pd.DataFrame:
+    # columns: DataFrame ou dict de colunas com "id". -> pares id_a < id_b
+    # com pontuação, situação e motivos, do mais forte para o mais fraco.
+    attrs = _attributes(spec, columns)
+    f = _Features(attrs)
+    blocks = [_codes(keys) for keys in _block_keys(spec, attrs)]
+    a, b = candidate_pairs(blocks, _codes(attrs["norm"], sort=True), window)
+    score, reasons = _score(f, a, b, _name_similarity(f, a, b))
+    keep = np.flatnonzero(score >= min_score)
+    keep = keep[np.argsort(-score[keep], kind="stable")]
+    ids = np.asarray(columns["id"], dtype=np.int64)
+    ids_a, ids_b = ids[a[keep]], ids[b[keep]]
+    pairs = pd.DataFrame({
+        "id_a": np.minimum(ids_a, ids_b), "id_b": np.maximum(ids_a, ids_b), "score": score[keep],
+        "status": _status(score[keep]), "reasons": _reason_text(reasons[keep]),
+    })
+    pairs.attrs["candidates"] = len(a)  # pares pontuados
+    return pairs
+
+
+def duplicate_groups(pairs: pd.DataFrame, statuses=("duplicado",)) -> pd.DataFrame:
+    # Componentes conexos dos pares escolhidos (propagação do menor rótulo
+    # com salto de ponteiros). -> id, group (menor id do grupo).
+    chosen = pairs[pairs["status"].isin(statuses)]
+    a, b = chosen["id_a"].to_numpy(), chosen["id_b"].to_numpy()
+    ids = np.unique(np.concatenate([a, b]))
+    a, b = np.searchsorted(ids, a), np.searchsorted(ids, b)
+    label = np.arange(len(ids))
+    while True:
+        low = np.minimum(label[a], label[b])
+        new = label.copy()
+        np.minimum.at(new, a, low)
+        np.minimum.at(new, b, low)
+        new = new[new]
+        if np.array_equal(new, label):
+            break
+        label = new
+    return pd.DataFrame({"id": ids, "group": ids[label]})
+
+
+# ------------------------------------------------------------
+# Inclusão: blocos em dicts, conferência O(tamanho dos blocos)
+# ------------------------------------------------------------
+
+class DedupIndex:
+    # Por entidade: id -> atributos normalizados (tupla _ROW) e chave de
+    # bloco -> ids, na ordem de inclusão.
+
+    def __init__(self, specs: dict[str, DedupSpec]):
+        self.specs = specs
+        self.lock = threading.RLock()
+        self.rows: dict[str, dict[int, tuple]] = {k: {} for k in specs}
+        self.blocks: dict[str, dict[str, list[int]]] = {k: {} for k in specs}
+
+    @classmethod
+    def build(cls, specs: dict[str, DedupSpec], repo) -> "DedupIndex":
+        index = cls(specs)
+        for key in specs:
+            index.add_columns(key, repo.fetch_frame(key))
+        return index
+
+    def _columns(self, key: str) -> list[str]:
+        spec = self.specs[key]
+        return [c for c in (spec.name, spec.doc, spec.code, spec.group, spec.scope) if c]
+
+    def _rows(self, key: str, columns) -> tuple[list[tuple], list[np.ndarray]]:
+        attrs = _attributes(self.specs[key], columns)
+        return list(zip(*(attrs[c].tolist() for c in _ROW))), _block_keys(self.specs[key], attrs)
+
+    def add(self, key: str, obj):
+        self.add_columns(key, {c: [getattr(obj, c)] for c in ["id", *self._columns(key)]})
+
+    def add_columns(self, key: str, columns):
+        if not len(columns["id"]):
+            return
+        rows, keys = self._rows(key, columns)
+        ids = np.asarray(columns["id"], dtype=np.int64)
+        with self.lock:
+            self.rows[key].update(zip(ids.tolist(), rows))
+            blocks = self.blocks[key]
+            for block in keys:
+                present = np.flatnonzero(pd.notna(block))
+                for k, obj_id in zip(block[present].tolist(), ids[present].tolist()):
+                    blocks.setdefault(k, []).append(obj_id)
+
+    def check(self, key: str, **values) -> list[DedupMatch]:
+        # Candidatos a duplicata de um registro ainda não incluído, do mais
+        # forte para o mais fraco.
+        (row,), keys = self._rows(key, {c: [values.get(c)] for c in self._columns(key)})
+        with self.lock:
+            records, blocks = self.rows[key], self.blocks[key]
+            ids = list(dict.fromkeys(i for (k,) in keys if k is not None
+                                     for i in blocks.get(k, ())[-INLINE_CANDIDATES:]))
+            others = [records[i] for i in ids]
+        if not ids:
+            return []
+        f = _RowFeatures([row, *others])
+        a, b = np.zeros(len(ids), dtype=np.int64), np.arange(1, len(ids) + 1)
+        score, reasons = _score(f, a, b, f.jaccard(a, b))
+        status, text = _status(score), _reason_text(reasons)
+        found = [DedupMatch(i, int(s), str(st), r) for i, s, st, r in zip(ids, score.tolist(), status, text) if st]
+        return sorted(found, key=lambda m: -m.score)
@@ -0,0 +1,287 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+# ============================================================
+# LOG DE EVENTOS SEGMENTADO (APPEND-ONLY)
+# ============================================================
+# Eventos recentes ficam num anel de tamanho fixo; todos são gravados no
+# segmento ativo em disco (uma linha JSON compacta por evento). Ao atingir
+# segment_size o segmento é fechado e outro é aberto. Retenção remove
+# segmentos antigos; compactação funde segmentos pequenos. A memória fica
+# limitada ao anel, não importa quantos eventos sejam gerados. O timestamp
+# é inteiro (segundos desde a época); segmentos antigos podem trazer texto
+# ISO, e quem exibe formata os dois (erp.records.format_ts).
+
+_FIELDS = ("id", "timestamp", "entity_type", "entity_id", "description")
+
+
+@dataclass
+class Segment:
+    first_id: int
+    path: str
+    last_id: int = 0
+    mtime: float = 0.0
+
+
+def _segment_name(first_id: int) -> str:
+    return f"events-{first_id:012d}.jsonl"
+
+
+def _encode(event: dict) -> str:
+    return json.dumps([event[f] for f in _FIELDS], ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(line: str) -> dict:
+    event = dict(zip(_FIELDS, json.loads(line)))
+    event["entity_type"] = sys.intern(event["entity_type"])
+    return event
+
+
+def _tail_id(path: str, block: int = 65_536) -> int:
+    # Id do último evento legível do segmento (0 se nenhum).
+    with open(path, "rb") as fh:
+        size = fh.seek(0, os.SEEK_END)
+        fh.seek(max(size - block, 0))
+        lines = fh.read().split(b"\n")
+    for line in reversed(lines if size <= block else lines[1:]):
+        try:
+            return int(json.loads(line)[0])
+        except (ValueError, TypeError, IndexError):
+            continue
+    return 0
+
+
+class EventLog:
+    def __init__(self, directory: str, ring_size: int = 1_000, segment_size: int = 10_000,
+                 max_segments: int | None = 500, max_age_days: float | None = None):
+        self.directory = directory
+        self.ring_size = ring_size
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.max_age_days = max_age_days
+        self.ring: deque[dict] = deque(maxlen=ring_size)
+        self.lock = threading.RLock()
+        self.segments: list[Segment] = []
+        self._active = None
+        self._active_count = 0
+        # Assinantes chamados a cada append (ex.: despacho de webhooks); devem
+        # retornar rápido e não levantar exceções.
+        self.listeners: list = []
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------
+    # Abertura / escrita
+    # ------------------------------------------------------------
+
+    def _load(self):
+        # Sobras de uma compactação interrompida: .tmp ainda não promovido (os
+        # segmentos originais seguem intactos) é descartado; segmento cujos
+        # eventos já estão no anterior fundido (queda após o replace) é removido.
+        for name in os.listdir(self.directory):
+            if name.startswith("events-") and name.endswith(".jsonl.tmp"):
+                os.remove(os.path.join(self.directory, name))
+        names = sorted(n for n in os.listdir(self.directory)
+                       if n.startswith("events-") and n.endswith(".jsonl"))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            first_id = int(name[len("events-"):-len(".jsonl")])
+            if self.segments and _tail_id(self.segments[-1].path) >= first_id:
+                os.remove(path)
+                continue
+            self.segments.append(Segment(first_id, path, first_id - 1, os.path.getmtime(path)))
+        for prev, nxt in zip(self.segments, self.segments[1:]):
+            prev.last_id = nxt.first_id - 1
+        self.next_id = 1
+        if self.segments:
+            # Reabre o último segmento: recupera o próximo id e reabastece o anel.
+            last = self.segments[-1]
+            count = self._recover(last)
+            self.next_id = last.last_id + 1
+            if count < self.segment_size:
+                self._active = open(last.path, "a", encoding="utf-8")
+                self._active_count = count
+
+    def _recover(self, seg: Segment) -> int:
+        # Linha final sem quebra ou ilegível (queda no meio da escrita) é
+        # truncada; no meio do segmento é corrupção.
+        with open(seg.path, "rb") as fh:
+            data = fh.read()
+        pos = count = 0
+        while (end := data.find(b"\n", pos)) >= 0:
+            line = data[pos:end]
+            if line.strip():
+                try:
+                    event = _decode(line.decode("utf-8"))
+                except (ValueError, TypeError, KeyError):
+                    if data[end + 1:].strip():
+                        raise ValueError(f"Log de eventos corrompido: {seg.path} (offset {pos})") from None
+                    break
+                self.ring.append(event)
+                seg.last_id = event["id"]
+                count += 1
+            pos = end + 1
+        if pos < len(data):
+            with open(seg.path, "r+b") as fh:
+                fh.truncate(pos)
+        return count
+
+    def _roll(self):
+        if self._active is not None:
+            self._active.close()
+        seg = Segment(self.next_id, os.path.join(self.directory, _segment_name(self.next_id)),
+                      self.next_id - 1, time.time())
+        self.segments.append(seg)
+        self._active = open(seg.path, "a", encoding="utf-8")
+        self._active_count = 0
+        self.apply_retention()
+
+    def append(self, description: str, entity_type: str = "GENERIC", entity_id: int | None = None,
+               timestamp: int | None = None) -> dict:
+        with self.lock:
+            if self._active is None or self._active_count >= self.segment_size:
+                self._roll()
+            event = {
+                "id": self.next_id,
+                "timestamp": int(time.time()) if timestamp is None else timestamp,
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "description": description,
+            }
+            self._active.write(_encode(event) + "\n")
+            self._active_count += 1
+            self.segments[-1].last_id = event["id"]
+            self.segments[-1].mtime = time.time()
+            self.next_id += 1
+            self.ring.append(event)
+        for listener in self.listeners:
+            listener(event)
+        return event
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def flush(self):
+        with self.lock:
+            if self._active is not None:
+                self._active.flush()
+
+    def close(self):
+        with self.lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    # ------------------------------------------------------------
+    # Leitura por cursor
+    # ------------------------------------------------------------
+
+    def __len__(self):
+        with self.lock:
+            if not self.segments:
+                return 0
+            return self.segments[-1].last_id - self.segments[0].first_id + 1
+
+    @property
+    def first_id(self) -> int:
+        return self.segments[0].first_id if self.segments else self.next_id
+
+    def latest(self, n: int) -> list[dict]:
+        with self.lock:
+            if n <= len(self.ring):
+                return list(self.ring)[-n:] if n else []
+            return self.read_since(max(self.next_id - 1 - n, 0), n)
+
+    def read_since(self, event_id: int, limit: int = 1_000) -> list[dict]:
+        # Eventos com id > event_id, em ordem, até `limit`.
+        with self.lock:
+            if self.ring and event_id + 1 >= self.ring[0]["id"]:
+                start = event_id + 1 - self.ring[0]["id"]
+                return [self.ring[i] for i in range(start, min(start + limit, len(self.ring)))]
+            self.flush()
+            segments = list(self.segments)
+        out: list[dict] = []
+        pos = max(bisect.bisect_right([s.first_id for s in segments], event_id + 1) - 1, 0)
+        for seg in segments[pos:]:
+            if seg.last_id <= event_id:
+                continue
+            for event in self._read_segment(seg):
+                if event["id"] > event_id:
+                    out.append(event)
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def _read_segment(self, seg: Segment):
+        try:
+            with open(seg.path, encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        yield _decode(line)
+        except FileNotFoundError:
+            return
+
+    # ------------------------------------------------------------
+    # Retenção e compactação
+    # ------------------------------------------------------------
+
+    def apply_retention(self) -> int:
+        with self.lock:
+            removed = 0
+            cutoff = None if self.max_age_days is None else time.time() - self.max_age_days * 86_400
+            # O segmento ativo (último) nunca é removido.
+            while len(self.segments) > 1 and (
+                (self.max_segments is not None and len(self.segments) > self.max_segments)
+                or (cutoff is not None and self.segments[0].mtime < cutoff)
+            ):
+                seg = self.segments.pop(0)
+                os.remove(seg.path)
+                removed += 1
+            return removed
+
+    def compact(self) -> dict:
+        # Funde segmentos fechados consecutivos menores que segment_size
+        # (sobras de reinícios) e reaplica a retenção.
+        with self.lock:
+            self.flush()
+            closed, active = self.segments[:-1], self.segments[-1:]
+            merged: list[Segment] = []
+            before = len(self.segments)
+            group: list[Segment] = []
+
+            def flush_group():
+                if len(group) > 1:
+                    # Fundido fica durável e promovido antes de apagar os originais;
+                    # _load trata uma queda em qualquer ponto.
+                    tmp = group[0].path + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as out:
+                        for seg in group:
+                            with open(seg.path, encoding="utf-8") as fh:
+                                out.writelines(line for line in fh if line.strip())
+                        out.flush()
+                        os.fsync(out.fileno())
+                    os.replace(tmp, group[0].path)
+                    for seg in group[1:]:
+                        os.remove(seg.path)
+                    merged.append(Segment(group[0].first_id, group[0].path, group[-1].last_id,
+                                          max(s.mtime for s in group)))
+                else:
+                    merged.extend(group)
+                group.clear()
+
+            for seg in closed:
+                size = sum(s.last_id - s.first_id + 1 for s in group)
+                if group and size + (seg.last_id - seg.first_id + 1) > self.segment_size:
+                    flush_group()
+                group.append(seg)
+            flush_group()
+            self.segments = merged + active
+            removed = self.apply_retention()
+            return {"segmentos_antes": before, "segmentos_depois": len(self.segments),
+                    "removidos_por_retencao": removed}
@@ -0,0 +1,398 @@
+import codecs
+import io
+import zlib
+from dataclasses import dataclass, fields
+from datetime import date
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from erp import metrics
+from erp.storage import Between
+
+# ============================================================
+# EXPORTAÇÃO EM BLOCOS – CSV, PARQUET E TEXTO NO LEIAUTE SPED
+# ============================================================
+# As linhas saem da entidade em blocos (janelas dos arrays no razão
+# colunar, páginas por id nas demais) e cada bloco vira bytes antes de o
+# próximo ser lido: a memória de pico depende do tamanho do bloco, não da
+# quantidade de linhas. Nada passa por asdict() nem por um DataFrame com a
+# exportação inteira.
+#
+# CSV: padrão do Excel brasileiro (";", vírgula decimal, dd/mm/aaaa, UTF-8
+# com BOM). Parquet: um row group por bloco. Texto: registros delimitados
+# por "|" como nos arquivos do SPED (abertura 0000, encerramento 9999 com a
+# quantidade de linhas, valores 1234,56, datas ddmmaaaa, latin-1).
+
+CHUNK_ROWS = 20_000
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+EXPORT_FORMATS = {
+    # formato: (extensão, mime)
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/octet-stream"),
+    "sped": ("txt", "text/plain"),
+}
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    date_field: str               # campo filtrado pelo período
+    columns: tuple[str, ...]      # colunas exportadas, na ordem
+    book: str                     # identificação do arquivo no registro 0000
+    record: str                   # registro de cada linha no texto
+    entry_record: str = ""        # razão: cabeçalho por lançamento (I200) antes das partidas
+
+
+# ------------------------------------------------------------
+# Leitura em blocos
+# ------------------------------------------------------------
+
+def export_where(spec: ExportSpec, company_id: int | None = None,
+                 period: tuple[date, date] | None = None) -> dict:
+    where = {}
+    if company_id is not None:
+        where["company_id"] = company_id
+    if period:
+        where[spec.date_field] = Between(period[0], period[1])
+    return where
+
+
+def iter_frames(repo, key: str, columns, where: dict | None = None, size: int = CHUNK_ROWS):
+    # Um DataFrame por bloco (pelo menos um, vazio quando nada atende ao filtro).
+    columns = list(columns)
+    if key in repo.columnar_types:
+        ledger = repo.columnar(key)
+        chunks = ledger.chunks(where, size, columns)
+        empty = lambda: ledger.take(np.empty(0, np.int64))[columns]
+    else:
+        types = {f.name: f.type for f in fields(repo.entities[key])}
+        chunks = (_rows_frame(rows, columns, types) for rows in repo.scan(key, where, size))
+        empty = lambda: _rows_frame([], columns, types)
+    found = False
+    for df in chunks:
+        found = True
+        yield df
+    if not found:
+        yield empty()
+
+
+def _rows_frame(rows: list, columns: list[str], types: dict) -> pd.DataFrame:
+    # Colunas direto dos atributos (slots), já com os tipos da exportação.
+    data = {}
+    for c in columns:
+        values = [getattr(r, c) for r in rows]
+        tp = types[c]
+        if tp is date:
+            # Ordinal -> dias desde 1970: bem mais rápido que converter date a date.
+            days = np.fromiter(map(date.toordinal, values), np.int64, len(values)) - _EPOCH_ORDINAL
+            data[c] = days.astype("datetime64[D]")
+        elif tp == int | None:
+            floats = np.array(values, dtype=np.float64)  # None -> nan
+            missing = np.isnan(floats)
+            data[c] = pd.arrays.IntegerArray(np.where(missing, 0, floats).astype(np.int64), missing)
+        elif tp is float:
+            data[c] = np.array(values, dtype=np.float64)
+        else:
+            data[c] = values
+    return pd.DataFrame(data)
+
+
+# ------------------------------------------------------------
+# Formatos (cada um recebe os blocos e devolve bytes por bloco)
+# ------------------------------------------------------------
+
+def csv_chunks(frames):
+    yield codecs.BOM_UTF8
+    for i, df in enumerate(frames):
+        with metrics.timer("export.csv"):
+            lines = _join([_field(df[c], "%d/%m/%Y", _quote) for c in df.columns], ";")
+            if i == 0:
+                lines = [";".join(_quote(list(df.columns))), *lines]
+        yield _encode(lines, "utf-8", "\n")
+
+
+class _Sink:
+    # Destino do ParquetWriter esvaziado a cada row group.
+    closed = False
+
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.pos = 0
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def parquet_chunks(frames, size: int = CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink, writer, schema = _Sink(), None, None
+    for df in _coalesce(frames, size):
+        with metrics.timer("export.parquet"):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                # Datas gravam como date32.
+                schema = pa.schema([pa.field(f.name, pa.date32()) if pa.types.is_timestamp(f.type) else f
+                                    for f in table.schema]).remove_metadata()
+                writer = pq.ParquetWriter(sink, schema, compression="zstd")
+            writer.write_table(table.cast(schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+def _coalesce(frames, size: int):
+    # Junta blocos pequenos (filtros seletivos) até size linhas, para não
+    # gerar um row group por janela. Categorias viram texto antes (o Parquet
+    # já codifica por dicionário e o concat de categorias grandes é caro).
+    parts, n = [], 0
+    for df in frames:
+        df = df.astype({c: str for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+        parts.append(df)
+        n += len(df)
+        if n >= size:
+            yield pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+            parts, n = [], 0
+    if parts:
+        yield pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+def sped_chunks(frames, spec: ExportSpec, period: tuple[date, date] | None = None, company=None):
+    # company: objeto com name/cnpj para o registro 0000 (None = todas).
+    lines = 1
+    head = ["0000", spec.book, *(_dates(np.array(period, "datetime64[D]")) if period else ["", ""]),
+            _clean([company.name])[0] if company else "", _digits(company.cnpj) if company else ""]
+    yield _sped(["|" + "|".join(head) + "|"])
+    pending = None
+    for df in frames:
+        with metrics.timer("export.sped"):
+            if spec.entry_record:
+                out, pending = _entry_lines(df, spec, pending, final=False)
+            else:
+                out = _join(["", spec.record, *(_field(df[c]) for c in spec.columns), ""], "|")
+        lines += len(out)
+        yield _sped(out)
+    if pending is not None:
+        out, _ = _entry_lines(None, spec, pending, final=True)
+        lines += len(out)
+        yield _sped(out)
+    yield _sped([f"|9999|{lines + 1}|"])
+
+
+def _sped(lines) -> bytes:
+    return _encode(lines, "latin-1", "\r\n")
+
+
+def _encode(lines, encoding: str, newline: str) -> bytes:
+    if not len(lines):
+        return b""
+    return (newline.join(lines) + newline).encode(encoding, errors="replace")
+
+
+def _join(columns: list, sep: str) -> list[str]:
+    # Uma linha por registro a partir das colunas já formatadas; textos
+    # fixos (registro, campos vazios do leiaute) se repetem em todas.
+    return list(map(sep.join, zip(*(repeat(c) if isinstance(c, str) else c for c in columns))))
+
+
+def _entry_lines(df: pd.DataFrame | None, spec: ExportSpec, pending: dict | None, final: bool):
+    # Partidas consecutivas com a mesma empresa, data e origem formam um
+    # lançamento: |I200|NUM_LCTO|DT_LCTO|VL_LCTO|IND_LCTO| seguido das suas
+    # partidas |I250|COD_CTA|COD_CCUS|VL_DC|IND_DC|HIST|COD_HIST_PAD|COD_PART|
+    # (registros conforme spec.entry_record / spec.record).
+    # O último lançamento do bloco fica retido até o próximo (pode continuar),
+    # já com as partidas formatadas: só arrays simples passam de um bloco a outro.
+    part = pending
+    if df is not None and len(df):
+        debit, credit = df["debit"].to_numpy(), df["credit"].to_numpy()
+        is_debit = debit > 0
+        part = {
+            "company_id": df["company_id"].to_numpy(),
+            "date": df["date"].to_numpy(),
+            "origin_type": np.asarray(df["origin_type"], dtype=object),
+            "origin_id": df["origin_id"].to_numpy(np.int64, na_value=-1),
+            "id": df["id"].to_numpy(),
+            "debit": debit,
+            "credit": credit,
+            "leg": np.array(_join(["", spec.record, _field(df["account_code"]), _field(df["cost_center_id"]),
+                                   _money(np.where(is_debit, debit, credit)), np.where(is_debit, "D", "C").tolist(),
+                                   _field(df["history"]), "", "", ""], "|"), dtype=object),
+        }
+        if pending is not None:
+            part = {k: np.concatenate([pending[k], v]) for k, v in part.items()}
+    if part is None:
+        return [], None
+    n = len(part["id"])
+    origin = part["origin_id"]
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = np.any([part[k][1:] != part[k][:-1] for k in ("company_id", "date", "origin_type", "origin_id")],
+                        axis=0)
+    starts |= origin == -1
+    first = np.flatnonzero(starts)
+    pending = None
+    if not final:
+        cut = first[-1]
+        pending = {k: v[cut:] for k, v in part.items()}
+        part, first, n = {k: v[:cut] for k, v in part.items()}, first[:-1], cut
+        if not n:
+            return [], pending
+
+    value = np.maximum(np.add.reduceat(part["debit"], first), np.add.reduceat(part["credit"], first))
+    heads = _join(["", spec.entry_record, part["id"][first].astype(str).tolist(), _dates(part["date"][first]),
+                   _money(value), "N", ""], "|")
+    # Cabeçalho de cada lançamento logo antes da sua primeira partida.
+    out = np.empty(n + len(first), dtype=object)
+    is_head = np.zeros(len(out), dtype=bool)
+    is_head[first + np.arange(len(first))] = True
+    out[is_head] = heads
+    out[~is_head] = part["leg"]
+    return out, pending
+
+
+def _field(s: pd.Series, date_format: str = "%d%m%Y", text=None):
+    # Coluna como textos: valores 1234,56, datas no formato pedido, nulos
+    # vazios; text trata os textos livres (padrão: limpeza do leiaute SPED).
+    text = text or _clean
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Trata só as categorias presentes no bloco e expande pelos códigos.
+        used, inverse = np.unique(s.cat.codes.to_numpy(), return_inverse=True)
+        labels = np.asarray(s.cat.categories, dtype=object)[np.maximum(used, 0)]
+        labels = np.array(text([str(v) for v in labels.tolist()]), dtype=object)
+        labels[used < 0] = ""
+        return labels[inverse]
+    if isinstance(s.dtype, pd.Int64Dtype):
+        out = s.to_numpy(np.int64, na_value=0).astype(str).astype(object)
+        out[s.isna().to_numpy()] = ""
+        return out
+    values = s.to_numpy()
+    if values.dtype.kind == "M":
+        return _dates(values, date_format)
+    if values.dtype.kind == "f":
+        return _money(values)
+    if values.dtype.kind in "iub":
+        return values.astype(str).astype(object)
+    values = values.tolist()
+    if None in values:
+        values = ["" if v is None else v for v in values]
+    return text(values)
+
+
+def _money(values: np.ndarray) -> list[str]:
+    if not len(values):
+        return []
+    return ("\x1f".join(["%.2f"] * len(values)) % tuple(values.tolist())).replace(".", ",").split("\x1f")
+
+
+def _dates(values: np.ndarray, date_format: str = "%d%m%Y") -> np.ndarray:
+    # Poucas datas distintas por bloco: formata só as únicas.
+    uniques, inverse = np.unique(values.astype("datetime64[D]"), return_inverse=True)
+    text = np.array([d.strftime(date_format) for d in uniques.tolist()], dtype=object)
+    return text[inverse]
+
+
+def _clean(values: list[str]) -> list[str]:
+    # "|" e quebras de linha quebrariam o leiaute. O bloco inteiro é
+    # conferido de uma vez; só há laço quando algum texto precisa de troca.
+    joined = "".join(values)
+    if "|" not in joined and "\n" not in joined and "\r" not in joined:
+        return values
+    return [v.replace("|", " ").replace("\r", " ").replace("\n", " ") for v in values]
+
+
+def _quote(values: list[str]) -> list[str]:
+    # Aspas só nos textos com separador, aspas ou quebra de linha.
+    joined = "".join(values)
+    if ";" not in joined and '"' not in joined and "\n" not in joined and "\r" not in joined:
+        return values
+    return ['"' + v.replace('"', '""') + '"' if ";" in v or '"' in v or "\n" in v or "\r" in v else v
+            for v in values]
+
+
+def _digits(value) -> str:
+    return "".join(ch for ch in str(value) if ch.isdigit())
+
+
+# ------------------------------------------------------------
+# Montagem e compactação
+# ------------------------------------------------------------
+
+def export_chunks(repo, key: str, spec: ExportSpec, fmt: str, company=None,
+                  period: tuple[date, date] | None = None, size: int = CHUNK_ROWS):
+    # Gerador de bytes do arquivo inteiro; nada é lido antes de ser pedido.
+    where = export_where(spec, company.id if company else None, period)
+    frames = iter_frames(repo, key, spec.columns, where, size)
+    if fmt == "csv":
+        return csv_chunks(frames)
+    if fmt == "parquet":
+        return parquet_chunks(frames, size)
+    if fmt == "sped":
+        return sped_chunks(frames, spec, period, company)
+    raise ValueError(f"Formato de exportação inválido: {fmt}")
+
+
+def gzip_chunks(chunks, level: int = 6):
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if out := z.compress(chunk):
+            yield out
+    yield z.flush()
+
+
+class ChunkedFile(io.RawIOBase):
+    # Arquivo somente leitura sobre um gerador de bytes: quem lê puxa os
+    # blocos sob demanda (st.download_button, shutil.copyfileobj...).
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = memoryview(b"")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # Só "voltar ao início" antes da primeira leitura (o download_button faz isso).
+        if (offset, whence) != (0, io.SEEK_SET) or self._pos:
+            raise io.UnsupportedOperation("ChunkedFile só é lido em sequência")
+        return 0
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = memoryview(chunk)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        self._pos += n
+        return n
+
+    def readall(self) -> bytes:
+        parts = [bytes(self._buf), *self._chunks]
+        self._buf = memoryview(b"")
+        out = b"".join(parts)
+        self._pos += len(out)
+        return out
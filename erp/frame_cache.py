@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+
+# ============================================================
+# CACHE DE DATAFRAMES VERSIONADO POR ENTIDADE
+# ============================================================
+# Cada entrada guarda o DataFrame montado para uma entidade junto com a
+# versão do repositório e o último id incluído. Versão igual -> reuso;
+# versão maior -> só as linhas novas (id > último id) são montadas e
+# concatenadas. Despejo LRU por número de entradas e por bytes.
+
+
+@dataclass
+class _Entry:
+    version: int
+    last_id: int
+    frame: pd.DataFrame
+    nbytes: int
+
+
+class FrameCache:
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, version: int, build, build_after, limit: int | None = None) -> pd.DataFrame:
+        # build() -> DataFrame completo; build_after(last_id) -> linhas novas.
+        # Com limit, a entrada guarda apenas as últimas `limit` linhas.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.version == version:
+                    self.hits += 1
+                    return entry.frame
+        if entry is None:
+            self.misses += 1
+            frame = build()
+        else:
+            self.appends += 1
+            tail = build_after(entry.last_id)
+            if not len(tail):
+                frame = entry.frame
+            elif not len(entry.frame):
+                frame = tail
+            else:
+                frame = pd.concat([entry.frame, tail], ignore_index=True)
+        if limit is not None and len(frame) > limit:
+            frame = frame.iloc[-limit:].reset_index(drop=True)
+        last_id = int(frame["id"].iloc[-1]) if len(frame) else 0
+        self._store(key, _Entry(version, last_id, frame, int(frame.memory_usage(deep=True).sum())))
+        return frame
+
+    def _store(self, key: tuple, entry: _Entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def invalidate(self, entity: str | None = None):
+        with self._lock:
+            for key in [k for k in self._entries if entity is None or k[0] == entity]:
+                self.nbytes -= self._entries.pop(key).nbytes
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses + self.appends
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entradas": len(self._entries),
+            "bytes": self.nbytes,
+            "acertos": self.hits,
+            "faltas": self.misses,
+            "incrementais": self.appends,
+            "despejos": self.evictions,
+            "taxa_acerto": self.hit_ratio,
+        }
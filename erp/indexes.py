@@ -0,0 +1,120 @@
+import threading
+from dataclasses import dataclass
+
+# ============================================================
+# ÍNDICES DE CADASTRO – PRIMÁRIOS, ÚNICOS E POR EMPRESA
+# ============================================================
+# Mantidos pelos add_*: id -> objeto, chaves únicas (CNPJ, SKU, código de
+# conta/CC) -> id, e company_id -> ids filhos. Também guardam os mapas de
+# opções dos selectbox, estendidos incrementalmente a cada inclusão.
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    unique: tuple[tuple[str, ...], ...] = ()   # cada item: campos da chave única
+    parent: str | None = None                  # campo do pai (ex.: "company_id")
+    keep_objects: bool = True                  # False: só ids (entidades volumosas)
+
+
+class DuplicateKeyError(ValueError):
+    pass
+
+
+class IndexRegistry:
+    def __init__(self, specs: dict[str, IndexSpec]):
+        self.specs = specs
+        self.lock = threading.RLock()
+        self.by_id: dict[str, dict[int, object]] = {k: {} for k in specs}
+        self.ordered: dict[str, list] = {k: [] for k in specs}
+        self.unique: dict[tuple, dict[tuple, int]] = {
+            (k, fields): {} for k, spec in specs.items() for fields in spec.unique
+        }
+        self.children: dict[str, dict[int, list[int]]] = {
+            k: {} for k, spec in specs.items() if spec.parent
+        }
+        self._options: dict[tuple, tuple[int, dict]] = {}
+
+    @classmethod
+    def build(cls, specs: dict[str, IndexSpec], repo) -> "IndexRegistry":
+        registry = cls(specs)
+        for key in specs:
+            registry.add_many(key, repo.fetch(key))
+        return registry
+
+    # ------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------
+
+    def check_unique(self, key: str, **values):
+        # Levanta DuplicateKeyError se alguma chave única (não vazia) já existe.
+        for fields in self.specs[key].unique:
+            if not all(f in values for f in fields):
+                continue
+            value = tuple(values[f] for f in fields)
+            if any(v in (None, "") for v in value):
+                continue
+            existing = self.unique[(key, fields)].get(value)
+            if existing is not None:
+                raise DuplicateKeyError(
+                    f"{'/'.join(fields)} já cadastrado: {' / '.join(map(str, value))} (id {existing})"
+                )
+
+    def add(self, key: str, obj):
+        self.add_many(key, [obj])
+
+    def add_many(self, key: str, objs):
+        spec = self.specs[key]
+        with self.lock:
+            by_id = self.by_id[key]
+            ordered = self.ordered[key]
+            for obj in objs:
+                if spec.keep_objects:
+                    by_id[obj.id] = obj
+                    ordered.append(obj)
+                for fields in spec.unique:
+                    value = tuple(getattr(obj, f) for f in fields)
+                    if not any(v in (None, "") for v in value):
+                        self.unique[(key, fields)][value] = obj.id
+                if spec.parent:
+                    self.children[key].setdefault(getattr(obj, spec.parent), []).append(obj.id)
+
+    def add_children(self, key: str, parent_ids, ids):
+        # Inclusão em bloco só do índice pai -> filhos (ex.: títulos importados).
+        with self.lock:
+            index = self.children[key]
+            for parent_id, child_id in zip(parent_ids, ids):
+                index.setdefault(int(parent_id), []).append(int(child_id))
+
+    # ------------------------------------------------------------
+    # Consultas O(1)
+    # ------------------------------------------------------------
+
+    def get(self, key: str, obj_id: int):
+        return self.by_id[key].get(obj_id)
+
+    def lookup(self, key: str, fields: tuple[str, ...], *values):
+        obj_id = self.unique[(key, fields)].get(tuple(values))
+        return None if obj_id is None else self.by_id[key].get(obj_id, obj_id)
+
+    def exists(self, key: str, fields: tuple[str, ...], *values) -> bool:
+        return tuple(values) in self.unique[(key, fields)]
+
+    def children_of(self, key: str, parent_id: int) -> list[int]:
+        return self.children[key].get(parent_id, [])
+
+    def all(self, key: str) -> list:
+        return self.ordered[key]
+
+    def count(self, key: str) -> int:
+        return len(self.ordered[key])
+
+    def options(self, key: str, name: str, label, value=lambda o: o) -> dict:
+        # Mapa rótulo -> valor para selectbox; só os objetos novos desde a
+        # última chamada são formatados.
+        with self.lock:
+            n, opts = self._options.get((key, name), (0, {}))
+            ordered = self.ordered[key]
+            for obj in ordered[n:]:
+                opts[label(obj)] = value(obj)
+            self._options[(key, name)] = (len(ordered), opts)
+            return opts
@@ -0,0 +1,146 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from erp.bulk_import import ImportIndexes
+
+# ============================================================
+# LANÇAMENTOS DE DIÁRIO COM PARTIDAS MÚLTIPLAS – VALIDAÇÃO EM LOTE
+# ============================================================
+# Um lote é um DataFrame de partidas (uma linha por débito ou crédito); a
+# coluna `entry` agrupa as partidas de cada lançamento. A validação é
+# vetorizada: somas por lançamento com bincount sobre os códigos do
+# factorize, em centavos inteiros. Um lançamento só entra se débitos ==
+# créditos, todas as partidas forem da mesma empresa e data e cada partida
+# tiver exatamente um lado. Lançamentos rejeitados voltam com o motivo.
+
+LEG_COLUMNS = ["entry", "company_id", "date", "account_code", "cost_center_id",
+               "debit", "credit", "history", "origin_type", "origin_id"]
+REQUIRED_COLUMNS = ["entry", "company_id", "date", "account_code", "debit", "credit"]
+JOURNAL_ORIGIN = "JournalEntry"  # origem padrão: origin_id = id do lançamento
+
+
+class JournalError(ValueError):
+    def __init__(self, message: str, rejected: pd.DataFrame):
+        super().__init__(message)
+        self.rejected = rejected
+
+
+@dataclass
+class JournalStats:
+    entries: int = 0
+    legs: int = 0
+    journal_ids: tuple[int, int] | None = None  # primeiro e último id do bloco
+    ledger_ids: tuple[int, int] | None = None
+    seconds: float = 0.0
+    rejected: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def legs_per_sec(self) -> float:
+        return self.legs / self.seconds if self.seconds else 0.0
+
+
+def validate_journal(legs: pd.DataFrame, indexes: ImportIndexes):
+    # Devolve (partidas válidas normalizadas, ordenadas por lançamento, com a
+    # coluna entry_code 0..k-1; partidas dos lançamentos rejeitados com motivo).
+    missing = [c for c in REQUIRED_COLUMNS if c not in legs.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+    df = legs.reset_index(drop=True)
+    for c in ("cost_center_id", "origin_id"):
+        if c not in df.columns:
+            df[c] = None
+    if "history" not in df.columns:
+        df["history"] = ""
+    if "origin_type" not in df.columns:
+        df["origin_type"] = ""
+    df["account_code"] = df["account_code"].astype(str).str.strip()
+    df["company_id"] = pd.to_numeric(df["company_id"], errors="coerce")
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["debit"] = pd.to_numeric(df["debit"], errors="coerce").fillna(0.0)
+    df["credit"] = pd.to_numeric(df["credit"], errors="coerce").fillna(0.0)
+    given_cc = df["cost_center_id"].notna() & (df["cost_center_id"].astype(str).str.strip() != "")
+    cost_center = pd.to_numeric(df["cost_center_id"], errors="coerce")
+
+    # Partida sem lançamento não pertence a nenhum grupo: recusada sozinha
+    # (o factorize daria -1, que o bincount não aceita).
+    blank = df["entry"].isna() | (df["entry"].astype(str).str.strip() == "")
+    if blank.any():
+        orphans = df.loc[blank, [c for c in LEG_COLUMNS if c in df.columns]].assign(motivo="lançamento não informado")
+        valid, rejected = validate_journal(legs.reset_index(drop=True).loc[~blank.to_numpy()], indexes)
+        return valid, pd.concat([orphans, rejected], ignore_index=True)
+
+    codes, uniques = pd.factorize(df["entry"])
+    k = len(uniques)
+    debit = np.rint(df["debit"].to_numpy(np.float64) * 100).astype(np.int64)
+    credit = np.rint(df["credit"].to_numpy(np.float64) * 100).astype(np.int64)
+    company = df["company_id"].fillna(-1).to_numpy(np.int64)
+    day = df["date"].to_numpy("datetime64[D]").astype(np.int64)
+    _, first = np.unique(codes, return_index=True)
+
+    def any_leg(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(codes, mask, k) > 0
+
+    leg_checks = [
+        (~df["company_id"].isin(indexes.company_ids).to_numpy(), "empresa inexistente"),
+        (df["date"].isna().to_numpy(), "data inválida"),
+        (~df["account_code"].isin(indexes.account_ids).to_numpy(), "conta inexistente"),
+        ((given_cc & ~cost_center.isin(set(indexes.cost_center_ids.values()))).to_numpy(),
+         "centro de custo inexistente"),
+        ((debit < 0) | (credit < 0), "valor negativo"),
+        ((debit > 0) == (credit > 0), "partida sem lado único (débito ou crédito)"),
+    ]
+    if indexes.closed_through is not None:
+        leg_checks.append(((df["date"] <= pd.Timestamp(indexes.closed_through)).to_numpy(), "período fechado"))
+    entry_checks = [(any_leg(mask), msg) for mask, msg in leg_checks] + [
+        (np.bincount(codes, minlength=k) < 2, "menos de duas partidas"),
+        (any_leg(company != company[first][codes]), "empresas diferentes no lançamento"),
+        (any_leg(day != day[first][codes]), "datas diferentes no lançamento"),
+        (np.bincount(codes, debit, k) != np.bincount(codes, credit, k), "débitos diferentes dos créditos"),
+    ]
+    reason = np.full(k, "", dtype=object)
+    for mask, msg in entry_checks:
+        reason[mask & (reason == "")] = msg
+    bad = reason[codes] != ""
+    rejected = df.loc[bad, [c for c in LEG_COLUMNS if c in df.columns]].assign(motivo=reason[codes][bad])
+    valid = df.loc[~bad].assign(entry_code=codes[~bad])
+    # Partidas de um lançamento ficam contíguas (ids de razão em sequência).
+    valid = valid.sort_values("entry_code", kind="stable", ignore_index=True)
+    valid["entry_code"] = pd.factorize(valid["entry_code"])[0]
+    return valid, rejected
+
+
+def journal_columns(valid: pd.DataFrame, first_journal_id: int, first_ledger_id: int) -> dict:
+    # Colunas do razão para as partidas válidas; lançamentos sem origem
+    # própria apontam para o id do lançamento de diário.
+    n = len(valid)
+    journal_id = first_journal_id + valid["entry_code"].to_numpy(np.int64)
+    own_origin = valid["origin_type"].fillna("").astype(str).to_numpy(object) != ""
+    history = valid["history"].fillna("").astype(str).to_numpy(object)
+    default_history = "Lançamento " + journal_id.astype(str).astype(object)
+    return {
+        "id": np.arange(first_ledger_id, first_ledger_id + n, dtype=np.int64),
+        "company_id": valid["company_id"].to_numpy(np.int64),
+        "date": valid["date"].to_numpy("datetime64[D]"),
+        "account_code": valid["account_code"].to_numpy(object),
+        "cost_center_id": _nullable(_floats(valid["cost_center_id"])),
+        "debit": valid["debit"].to_numpy(np.float64),
+        "credit": valid["credit"].to_numpy(np.float64),
+        "history": np.where(history != "", history, default_history),
+        "origin_type": np.where(own_origin, valid["origin_type"].to_numpy(object), JOURNAL_ORIGIN),
+        "origin_id": _nullable(np.where(own_origin, _floats(valid["origin_id"]), journal_id)),
+    }
+
+
+def _floats(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series, errors="coerce").to_numpy(np.float64)
+
+
+def _nullable(values: np.ndarray):
+    # Inteiros anuláveis (NaN = nulo): array int64 sem nulos, senão lista com None.
+    na = np.isnan(values)
+    ints = np.nan_to_num(values).astype(np.int64)
+    if not na.any():
+        return ints
+    return np.where(na, None, ints.astype(object)).tolist()
@@ -0,0 +1,409 @@
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from erp.metrics import timed
+from erp.storage import Between, In, matches
+
+# ============================================================
+# LIVRO RAZÃO COLUNAR – ARRAYS NUMPY TIPADOS
+# ============================================================
+# Cada coluna do LedgerEntry vira um array com capacidade que dobra a cada
+# estouro (append amortizado O(1)). frame() entrega ao pandas visões dos
+# arrays (sem cópia) em vez de reconstruir dataclasses linha a linha.
+# O histórico gerado ("Reconhecimento de receita ref. título NF-12") é
+# guardado como modelo codificado por dicionário + argumento final curto
+# e só é remontado quando a coluna é pedida (exibição). O dicionário de
+# modelos é limitado: texto livre que não cabe mais nele fica inteiro no
+# argumento, com modelo vazio.
+
+_INITIAL_CAPACITY = 1024
+_NULL_INT = np.iinfo(np.int64).min
+_DICTIONARIES = ("account_codes", "origin_types", "history_templates")
+HISTORY_TEMPLATE_LIMIT = 4_096  # modelos distintos de histórico (códigos em int16)
+
+
+def _codes_dtype(n_categories: int):
+    # Mesmo critério do pandas para os códigos de um Categorical, para que
+    # Categorical.from_codes reaproveite o array sem convertê-lo.
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+    if n_categories < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
+class Dictionary:
+    # Codificação por dicionário para colunas de baixa cardinalidade.
+    def __init__(self):
+        self.values: list[str] = []
+        self.codes: dict[str, int] = {}
+        self.nbytes = 0  # soma de sys.getsizeof dos valores, mantida a cada inclusão
+        self._index: pd.Index | None = None
+
+    def index(self) -> pd.Index:
+        # Categorias prontas para o pandas; só são refeitas quando o
+        # dicionário cresce (leituras em blocos pedem o mesmo Index várias vezes).
+        if self._index is None or len(self._index) != len(self.values):
+            self._index = pd.Index(self.values)
+        return self._index
+
+    def encode(self, value: str, limit: int | None = None) -> int:
+        # Com limit, valor novo num dicionário cheio devolve -1 (não entra).
+        code = self.codes.get(value)
+        if code is None:
+            if limit is not None and len(self.values) >= limit:
+                return -1
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self.nbytes += sys.getsizeof(value)
+        return code
+
+    @classmethod
+    def from_values(cls, values) -> "Dictionary":
+        dictionary = cls()
+        dictionary.values = list(values)
+        dictionary.codes = {value: code for code, value in enumerate(dictionary.values)}
+        dictionary.nbytes = sum(map(sys.getsizeof, dictionary.values))
+        return dictionary
+
+    def encode_many(self, values, limit: int | None = None) -> np.ndarray:
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+        mapping = np.fromiter((self.encode(u, limit) for u in uniques), dtype=np.int64, count=len(uniques))
+        return mapping[codes]
+
+    def dtype(self):
+        return _codes_dtype(len(self.values))
+
+
+class ColumnarLedger:
+    columns = ("id", "company_id", "date", "account_code", "cost_center_id",
+               "debit", "credit", "history", "origin_type", "origin_id")
+    # Arrays efetivamente alocados (history vira modelo + argumento).
+    arrays = ("id", "company_id", "date", "account_code", "cost_center_id",
+              "debit", "credit", "history_template", "history_arg", "origin_type", "origin_id")
+
+    def __init__(self, entry_cls=None, capacity: int = _INITIAL_CAPACITY):
+        self.entry_cls = entry_cls
+        self._n = 0
+        self.account_codes = Dictionary()
+        self.origin_types = Dictionary()
+        self.history_templates = Dictionary()
+        self._arg_bytes: int | None = 0  # None = recalcular (ledger vindo de snapshot)
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        self._cap = capacity
+        self.id = np.empty(capacity, np.int64)
+        self.company_id = np.empty(capacity, np.int64)
+        self.date = np.empty(capacity, "datetime64[s]")
+        self.account_code = np.empty(capacity, np.int8)
+        self.cost_center_id = np.empty(capacity, np.int64)
+        self.debit = np.empty(capacity, np.float64)
+        self.credit = np.empty(capacity, np.float64)
+        self.history_template = np.empty(capacity, np.int8)
+        self.history_arg = np.empty(capacity, object)
+        self.origin_type = np.empty(capacity, np.int8)
+        self.origin_id = np.empty(capacity, np.int64)
+
+    def _reserve(self, extra: int):
+        needed = self._n + extra
+        if needed <= self._cap:
+            return
+        capacity = max(self._cap, _INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        for name in self.arrays:
+            old = getattr(self, name)
+            new = np.empty(capacity, old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+        self._cap = capacity
+
+    def _widen_codes(self):
+        # Quando o dicionário passa do limite do tipo atual, promove o array.
+        for name, dictionary in (("account_code", self.account_codes),
+                                 ("origin_type", self.origin_types),
+                                 ("history_template", self.history_templates)):
+            dtype = dictionary.dtype()
+            if getattr(self, name).dtype != dtype:
+                setattr(self, name, getattr(self, name).astype(dtype))
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def nbytes(self) -> int:
+        # Textos contados de forma incremental: a tela de diagnóstico chama a cada rerun.
+        n = self._n
+        if self._arg_bytes is None:
+            self._arg_bytes = _text_bytes(self.history_arg[:n])
+        total = sum(getattr(self, c)[:n].nbytes for c in self.arrays)
+        return total + self._arg_bytes + self.history_templates.nbytes
+
+    # ------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------
+
+    def append(self, entry):
+        self.extend([entry])
+
+    def extend(self, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        self.append_columns(
+            id=[e.id for e in entries],
+            company_id=[e.company_id for e in entries],
+            date=[e.date for e in entries],
+            account_code=[e.account_code for e in entries],
+            cost_center_id=[e.cost_center_id for e in entries],
+            debit=[e.debit for e in entries],
+            credit=[e.credit for e in entries],
+            history=[e.history for e in entries],
+            origin_type=[e.origin_type for e in entries],
+            origin_id=[e.origin_id for e in entries],
+        )
+
+    def append_columns(self, **cols):
+        # Inserção em bloco a partir de colunas (listas ou arrays) já alinhadas.
+        k = len(cols["id"])
+        self._reserve(k)
+        account_codes = self.account_codes.encode_many(cols["account_code"])
+        origin_types = self.origin_types.encode_many(cols["origin_type"])
+        templates, args = _split_history(cols["history"])
+        history_templates = self.history_templates.encode_many(templates, HISTORY_TEMPLATE_LIMIT)
+        full = history_templates < 0
+        if full.any():
+            # Dicionário cheio: o texto inteiro vai para o argumento, com modelo vazio.
+            history_templates[full] = self.history_templates.encode("")
+            args = np.array(args, dtype=object)
+            args[full] = np.array(templates, dtype=object)[full] + args[full]
+        if self._arg_bytes is not None:
+            self._arg_bytes += _text_bytes(args)
+        self._widen_codes()
+        s = slice(self._n, self._n + k)
+        self.id[s] = cols["id"]
+        self.company_id[s] = cols["company_id"]
+        self.date[s] = _to_datetime64(cols["date"])
+        self.account_code[s] = account_codes
+        self.cost_center_id[s] = _nullable_ints(cols["cost_center_id"])
+        self.debit[s] = cols["debit"]
+        self.credit[s] = cols["credit"]
+        self.history_template[s] = history_templates
+        self.history_arg[s] = args
+        self.origin_type[s] = origin_types
+        self.origin_id[s] = _nullable_ints(cols["origin_id"])
+        self._n += k
+
+    # ------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------
+
+    def row(self, i: int):
+        return self.entry_cls(
+            id=int(self.id[i]),
+            company_id=int(self.company_id[i]),
+            date=self.date[i].astype("datetime64[D]").item(),
+            account_code=self.account_codes.values[self.account_code[i]],
+            cost_center_id=_int_or_none(self.cost_center_id[i]),
+            debit=float(self.debit[i]),
+            credit=float(self.credit[i]),
+            history=self.history_templates.values[self.history_template[i]] + self.history_arg[i],
+            origin_type=self.origin_types.values[self.origin_type[i]],
+            origin_id=_int_or_none(self.origin_id[i]),
+        )
+
+    def __iter__(self):
+        return (self.row(i) for i in range(self._n))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(self._n))]
+        if index < 0:
+            index += self._n
+        if not 0 <= index < self._n:
+            raise IndexError(index)
+        return self.row(index)
+
+    @timed("dataframe.ledger.frame")
+    def frame(self, start: int = 0, stop: int | None = None, columns=None) -> pd.DataFrame:
+        # columns restringe as colunas montadas (ex.: agregações não precisam
+        # remontar o histórico).
+        s = slice(start, self._n if stop is None else min(stop, self._n))
+        return pd.DataFrame(self._columns(s, columns), copy=False)
+
+    def history(self, index) -> np.ndarray:
+        # Textos do histórico remontados para as linhas pedidas.
+        templates = np.array(self.history_templates.values, dtype=object)
+        return templates[self.history_template[index]] + self.history_arg[index]
+
+    def _columns(self, index, columns=None) -> dict:
+        getters = {
+            "id": lambda: self.id[index],
+            "company_id": lambda: self.company_id[index],
+            "date": lambda: self.date[index],
+            "account_code": lambda: _categorical(self.account_code[index], self.account_codes),
+            "cost_center_id": lambda: _masked(self.cost_center_id[index]),
+            "debit": lambda: self.debit[index],
+            "credit": lambda: self.credit[index],
+            "history": lambda: self.history(index),
+            "origin_type": lambda: _categorical(self.origin_type[index], self.origin_types),
+            "origin_id": lambda: _masked(self.origin_id[index]),
+        }
+        return {c: getters[c]() for c in (columns or self.columns)}
+
+    # ------------------------------------------------------------
+    # Consultas (filtros avaliados direto nos arrays)
+    # ------------------------------------------------------------
+
+    def mask(self, where: dict | None, start: int = 0, stop: int | None = None) -> np.ndarray:
+        # start/stop limitam a avaliação a uma janela de linhas (leitura em blocos).
+        stop = self._n if stop is None else min(stop, self._n)
+        s = slice(start, max(stop, start))
+        mask = np.ones(s.stop - s.start, dtype=bool)
+        for col, cond in (where or {}).items():
+            if col in ("account_code", "origin_type"):
+                dictionary = self.account_codes if col == "account_code" else self.origin_types
+                wanted = [code for value, code in dictionary.codes.items() if matches(value, cond)]
+                mask &= np.isin(getattr(self, col)[s], wanted)
+                continue
+            values = self.history(s) if col == "history" else getattr(self, col)[s]
+            if col == "date":
+                cond = _date_cond(cond)
+            if isinstance(cond, Between):
+                if cond.lo is not None:
+                    mask &= values >= cond.lo
+                if cond.hi is not None:
+                    mask &= values <= cond.hi
+            elif isinstance(cond, In):
+                mask &= np.isin(values, list(cond.values))
+            elif cond is None and col in ("cost_center_id", "origin_id"):
+                mask &= values == _NULL_INT
+            else:
+                mask &= values == cond
+        return mask
+
+    def count(self, where: dict | None = None) -> int:
+        if not where:
+            return self._n
+        return int(np.count_nonzero(self.mask(where)))
+
+    @timed("dataframe.ledger.select")
+    def select(self, where: dict | None = None, order_by: str = "id", desc: bool = False,
+               limit: int | None = None, offset: int = 0) -> pd.DataFrame:
+        idx = np.flatnonzero(self.mask(where)) if where else np.arange(self._n)
+        if order_by != "id":
+            keys = self.history(idx) if order_by == "history" else getattr(self, order_by)[idx]
+            if order_by in ("account_code", "origin_type"):
+                # Ordena pelos textos, não pela ordem de chegada dos códigos.
+                dictionary = self.account_codes if order_by == "account_code" else self.origin_types
+                keys = np.argsort(np.argsort(np.array(dictionary.values, dtype=object)))[keys]
+            idx = idx[np.argsort(keys, kind="stable")]
+        if desc:
+            idx = idx[::-1]
+        end = None if limit is None else offset + limit
+        return self.take(idx[offset:end])
+
+    def take(self, idx: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(self._columns(idx))
+
+    def chunks(self, where: dict | None = None, size: int = 50_000, columns=None):
+        # Blocos já filtrados, janela a janela: a memória depende de size, não
+        # do tamanho do razão. Linhas anexadas durante a leitura ficam de fora.
+        n = self._n
+        for start in range(0, n, size):
+            idx = start + np.flatnonzero(self.mask(where, start, start + size))
+            if len(idx):
+                yield pd.DataFrame(self._columns(idx, columns))
+
+
+    # ------------------------------------------------------------
+    # Snapshot (erp/state_store.py)
+    # ------------------------------------------------------------
+
+    def state(self) -> dict:
+        # Visões das n linhas atuais + cópia dos dicionários. O prefixo dos
+        # arrays nunca é reescrito (append-only; _reserve troca de array), então
+        # o estado pode ser serializado depois, fora do lock de escrita.
+        n = self._n
+        return {
+            "arrays": {name: getattr(self, name)[:n] for name in self.arrays},
+            "dictionaries": {name: list(getattr(self, name).values) for name in _DICTIONARIES},
+        }
+
+    @classmethod
+    def from_state(cls, entry_cls, state: dict) -> "ColumnarLedger":
+        # Adota os arrays lidos do snapshot (capacidade = tamanho; o próximo
+        # append realoca dobrando, como de costume).
+        ledger = cls(entry_cls, capacity=0)
+        for name in cls.arrays:
+            setattr(ledger, name, state["arrays"][name])
+        for name in _DICTIONARIES:
+            setattr(ledger, name, Dictionary.from_values(state["dictionaries"][name]))
+        ledger._n = ledger._cap = len(ledger.id)
+        ledger._arg_bytes = None
+        return ledger
+
+
+def _split_history(values) -> tuple[list[str], list[str]]:
+    # Separa o último termo quando ele termina em dígito (documento, id):
+    # "Reconhecimento de receita ref. título NF-12" -> modelo + " NF-12".
+    # Textos sem número viram modelo inteiro (repetidos são guardados uma vez).
+    templates, args = [], []
+    add_template, add_arg = templates.append, args.append
+    for text in values:
+        cut = text.rfind(" ") if text and text[-1].isdigit() else -1
+        if cut >= 0:
+            add_template(text[:cut])
+            add_arg(text[cut:])
+        else:
+            add_template(text or "")
+            add_arg("")
+    return templates, args
+
+
+def _text_bytes(texts) -> int:
+    return sum(sys.getsizeof(t) for t in texts if t)
+
+
+def _date_cond(cond):
+    if isinstance(cond, Between):
+        return Between(
+            None if cond.lo is None else np.datetime64(cond.lo, "s"),
+            # Limite superior inclusivo no dia inteiro.
+            None if cond.hi is None else np.datetime64(cond.hi, "D") + np.timedelta64(1, "D") - np.timedelta64(1, "s"),
+        )
+    return np.datetime64(cond, "s")
+
+
+def _to_datetime64(values) -> np.ndarray:
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values.astype("datetime64[s]")
+    return np.array(
+        [v if isinstance(v, datetime) else datetime(v.year, v.month, v.day) for v in values],
+        dtype="datetime64[s]",
+    )
+
+
+def _nullable_ints(values) -> np.ndarray:
+    if isinstance(values, np.ndarray) and values.dtype.kind == "i":
+        return values
+    return np.fromiter((_NULL_INT if v is None else v for v in values), dtype=np.int64)
+
+
+def _int_or_none(v):
+    return None if v == _NULL_INT else int(v)
+
+
+def _masked(values: np.ndarray):
+    return pd.arrays.IntegerArray(values, values == _NULL_INT)
+
+
+def _categorical(codes: np.ndarray, dictionary: Dictionary):
+    return pd.Categorical.from_codes(codes, categories=dictionary.index(), validate=False)
+
@@ -0,0 +1,215 @@
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+# ============================================================
+# MÉTRICAS EM PROCESSO – CONTADORES, HISTOGRAMAS E PERFILADOR
+# ============================================================
+# Um registro por processo (compartilhado por todas as sessões). Cada
+# operação cronometrada alimenta um histograma de baldes log-lineares
+# (8 sub-baldes por potência de 2, erro relativo <= ~6%): registrar custa
+# um frexp e um incremento, sem guardar as amostras. Percentis saem dos
+# baldes; mínimo, máximo e soma são exatos.
+
+SUB_BUCKETS = 8
+_MIN_EXP = -20          # 2**-20 s ~ 1 µs: abaixo disso tudo cai no primeiro balde
+_MAX_EXP = 8            # 2**8 s ~ 4 min: acima disso, no último
+_N_BUCKETS = (_MAX_EXP - _MIN_EXP) * SUB_BUCKETS + 1
+
+
+def _bucket(value: float) -> int:
+    if value <= 0:
+        return 0
+    mantissa, exp = math.frexp(value)          # value = mantissa * 2**exp, 0.5 <= mantissa < 1
+    if exp <= _MIN_EXP:
+        return 0
+    if exp > _MAX_EXP:
+        return _N_BUCKETS - 1
+    return (exp - _MIN_EXP - 1) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS) + 1
+
+
+def _bucket_mid(i: int) -> float:
+    if i == 0:
+        return 2.0 ** _MIN_EXP
+    octave, sub = divmod(i - 1, SUB_BUCKETS)
+    return 2.0 ** (octave + _MIN_EXP) * (1 + (sub + 0.5) / SUB_BUCKETS)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * _N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.buckets[_bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(max(_bucket_mid(i), self.min), self.max)
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: Counter = Counter()
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.record(seconds)
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def timer(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: str | None = None):
+        # Decorador: @metrics.timed() usa o nome da função.
+        def decorate(fn):
+            label = name or fn.__qualname__
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(label, time.perf_counter() - t0)
+            return wrapper
+        return decorate
+
+    def ratio(self, hits: str, misses: str) -> float:
+        total = self.counters[hits] + self.counters[misses]
+        return self.counters[hits] / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> pd.DataFrame:
+        # Uma linha por operação, tempos em milissegundos.
+        with self._lock:
+            items = [(name, h.count, h.total, h.min, h.max, h.percentile(50), h.percentile(95), h.percentile(99))
+                     for name, h in self.histograms.items()]
+        df = pd.DataFrame(items, columns=["operacao", "chamadas", "total_ms", "min_ms", "max_ms",
+                                          "p50_ms", "p95_ms", "p99_ms"])
+        for c in df.columns[2:]:
+            df[c] = df[c] * 1000
+        return df.sort_values("total_ms", ascending=False, ignore_index=True)
+
+
+REGISTRY = MetricsRegistry()
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+incr = REGISTRY.incr
+
+
+# ------------------------------------------------------------
+# Perfilador por amostragem (opcional, uma execução por vez)
+# ------------------------------------------------------------
+
+class SamplingProfiler:
+    # Uma thread amostra a pilha da thread alvo a cada `interval` segundos e
+    # conta pilhas no formato "folded" (func;func;func N), que alimenta
+    # flamegraph.pl, speedscope e similares. Enquanto ativo, o intervalo de
+    # troca de threads do interpretador cai para `interval`, senão a thread
+    # amostradora só ganha o GIL a cada 5 ms.
+    def __init__(self, interval: float = 0.001, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def _frame_label(self, frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None or self._stop.is_set():
+                continue  # alvo já saiu do bloco perfilado
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                names.append(self._frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="erp-profiler", daemon=True)
+        self._switch = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch, self.interval))
+        self._t0 = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self.seconds = time.perf_counter() - self._t0
+        self._thread.join()
+        sys.setswitchinterval(self._switch)
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 30) -> pd.DataFrame:
+        # Tempo próprio (topo da pilha) e inclusivo por função, em amostras.
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for f in set(frames):
+                inclusive[f] += count
+        total = max(self.samples, 1)
+        rows = [(f, own[f], inclusive[f], inclusive[f] / total) for f in inclusive]
+        df = pd.DataFrame(rows, columns=["funcao", "amostras_proprias", "amostras_inclusivas", "fracao"])
+        return df.sort_values(["amostras_proprias", "amostras_inclusivas"], ascending=False).head(n)
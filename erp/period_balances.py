@@ -0,0 +1,330 @@
+import threading
+from datetime import date
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from erp.ledger_store import Dictionary
+from erp.metrics import timed
+
+# ============================================================
+# SALDOS POR DATA – SOMAS PREFIXADAS POR (EMPRESA, CONTA) E FECHAMENTOS
+# ============================================================
+# Cada lançamento vira uma chave composta (empresa, conta, dia) num int64:
+# empresa << 42 | conta << 20 | ordinal do dia. Um segmento guarda as
+# chaves distintas ordenadas e as somas acumuladas de débito, crédito e
+# quantidade (centavos inteiros): o movimento de uma conta até um dia são
+# duas buscas binárias (início da conta e último dia <= data), e o
+# balancete de todas as contas é a mesma busca vetorizada.
+#
+# Fechamento mensal: o movimento do mês sai do segmento aberto e vira um
+# segmento congelado, junto com o saldo acumulado de cada conta no fim do
+# mês. Consultas numa data somam o saldo de fechamento do mês anterior ao
+# movimento do próprio mês, sem tocar nos meses fechados anteriores.
+# Lançamentos com data num período fechado são recusados.
+#
+# Lançamentos avulsos (post) ficam num delta pequeno, consultado junto com o
+# segmento aberto; só a cada PENDING_LIMIT o delta é fundido no segmento.
+
+_DAY_BITS = 20                      # ordinal de date: < 2**20 até o ano 2870
+_ACCOUNT_BITS = 22
+_DAY_MASK = (1 << _DAY_BITS) - 1
+_ACCOUNT_MASK = (1 << _ACCOUNT_BITS) - 1
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+PENDING_LIMIT = 4_096               # lançamentos avulsos antes de fundir o delta no segmento aberto
+
+
+class ClosedPeriodError(ValueError):
+    pass
+
+
+def month_id(d: date) -> int:
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def month_start(m: int) -> date:
+    return date(1970 + m // 12, m % 12 + 1, 1)
+
+
+def month_end(m: int) -> date:
+    return date.fromordinal(month_start(m + 1).toordinal() - 1)
+
+
+def month_label(m: int) -> str:
+    return f"{1970 + m // 12:04d}-{m % 12 + 1:02d}"
+
+
+class _Segment:
+    # Movimento agregado por (chave, dia), ordenado, com somas acumuladas.
+    def __init__(self, comp: np.ndarray, debit: np.ndarray, credit: np.ndarray, n: np.ndarray):
+        self.comp = comp
+        self.debit = debit
+        self.credit = credit
+        self.n = n
+        self._keys = None
+        zero = np.zeros(1, np.int64)
+        self.cum = [np.concatenate([zero, np.cumsum(a)]) for a in (debit, credit, n)]
+
+    @classmethod
+    def empty(cls) -> "_Segment":
+        e = np.empty(0, np.int64)
+        return cls(e, e, e, e)
+
+    @classmethod
+    def from_postings(cls, comp, debit, credit, n) -> "_Segment":
+        if not len(comp):
+            return cls.empty()
+        order = np.argsort(comp, kind="stable")
+        comp = comp[order]
+        starts = np.flatnonzero(np.concatenate([[True], comp[1:] != comp[:-1]]))
+        return cls(comp[starts], *(np.add.reduceat(a[order], starts) for a in (debit, credit, n)))
+
+    def __len__(self):
+        return len(self.comp)
+
+    def merged(self, comp, debit, credit, n) -> "_Segment":
+        return _Segment.from_postings(
+            np.concatenate([self.comp, comp]), np.concatenate([self.debit, debit]),
+            np.concatenate([self.credit, credit]), np.concatenate([self.n, n]))
+
+    def split(self, last_ordinal: int) -> tuple["_Segment", "_Segment"]:
+        # (dias <= last_ordinal, resto); ambos continuam ordenados.
+        mask = (self.comp & _DAY_MASK) <= last_ordinal
+        parts = []
+        for m in (mask, ~mask):
+            parts.append(_Segment(self.comp[m], self.debit[m], self.credit[m], self.n[m]))
+        return parts[0], parts[1]
+
+    def keys(self) -> np.ndarray:
+        # Segmentos são imutáveis: as chaves distintas são calculadas uma vez.
+        if self._keys is None:
+            keys = self.comp >> _DAY_BITS
+            self._keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+        return self._keys
+
+    def upto(self, keys: np.ndarray, ordinal: int) -> list[np.ndarray]:
+        # Movimento de cada chave do início do segmento até o dia (inclusive).
+        lo = np.searchsorted(self.comp, keys << _DAY_BITS, "left")
+        hi = np.searchsorted(self.comp, (keys << _DAY_BITS) | ordinal, "right")
+        return [c[hi] - c[lo] for c in self.cum]
+
+    def totals(self) -> tuple[np.ndarray, list[np.ndarray]]:
+        # Total do segmento por chave.
+        keys = self.comp >> _DAY_BITS
+        if not len(keys):
+            return keys, [keys, keys, keys]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        return keys[starts], [np.add.reduceat(a, starts) for a in (self.debit, self.credit, self.n)]
+
+
+class _Close:
+    # Mês fechado: movimento congelado e saldo acumulado por chave no fim do mês.
+    def __init__(self, month: int, segment: _Segment, keys: np.ndarray, balances: list[np.ndarray]):
+        self.month = month
+        self.segment = segment
+        self.keys = keys
+        self.balances = balances
+
+    def lookup(self, keys: np.ndarray) -> list[np.ndarray]:
+        pos = np.searchsorted(self.keys, keys)
+        pos = np.minimum(pos, max(len(self.keys) - 1, 0))
+        found = (self.keys[pos] == keys) if len(self.keys) else np.zeros(len(keys), bool)
+        return [np.where(found, b[pos] if len(b) else 0, 0) for b in self.balances]
+
+
+class TemporalBalances:
+    def __init__(self):
+        self.accounts = Dictionary()
+        self.closes: list[_Close] = []
+        self.open = _Segment.empty()
+        self._pending: list[tuple[int, int, int]] = []
+        self._delta: _Segment | None = None  # _pending agregado (None = desatualizado)
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_ledger(cls, ledger, closed_months: list[int] | None = None) -> "TemporalBalances":
+        view = cls()
+        if len(ledger):
+            view.post_frame(ledger.frame(columns=["company_id", "account_code", "date", "debit", "credit"]))
+        for m in sorted(closed_months or []):
+            view.close_month(m)
+        return view
+
+    # ------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------
+
+    @property
+    def closed_through(self) -> date | None:
+        return month_end(self.closes[-1].month) if self.closes else None
+
+    def ensure_open(self, day: date):
+        closed = self.closed_through
+        if closed is not None and day <= closed:
+            raise ClosedPeriodError(
+                f"Período {month_label(month_id(day))} fechado: lançamentos só após {closed.isoformat()}.")
+
+    def post(self, company_id: int, account_code: str, day: date, debit: float, credit: float):
+        self.ensure_open(day)
+        with self.lock:
+            key = int(company_id) << _ACCOUNT_BITS | self.accounts.encode(account_code)
+            comp = key << _DAY_BITS | day.toordinal()
+            self._pending.append((comp, int(round(debit * 100)), int(round(credit * 100))))
+            self._delta = None
+            if len(self._pending) >= PENDING_LIMIT:
+                self._flush()
+
+    @timed("groupby.temporal_balances.post_frame")
+    def post_frame(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        days = pd.to_datetime(df["date"]).to_numpy("datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL
+        self.ensure_open(date.fromordinal(int(days.min())))
+        accounts = df["account_code"]
+        with self.lock:
+            if isinstance(accounts.dtype, pd.CategoricalDtype):
+                # Coluna do razão colunar: codifica só as categorias.
+                codes = self.accounts.encode_many(accounts.cat.categories.to_numpy(object))[
+                    accounts.cat.codes.to_numpy()]
+            else:
+                codes = self.accounts.encode_many(accounts.astype(str).to_numpy(object))
+        comp = ((df["company_id"].to_numpy(np.int64) << _ACCOUNT_BITS | codes) << _DAY_BITS) | days
+        debit = np.rint(df["debit"].to_numpy(np.float64) * 100).astype(np.int64)
+        credit = np.rint(df["credit"].to_numpy(np.float64) * 100).astype(np.int64)
+        with self.lock:
+            self.open = self.open.merged(comp, debit, credit, np.ones(len(comp), np.int64))
+
+    def _pending_arrays(self) -> list[np.ndarray]:
+        comp, debit, credit = (np.array(c, dtype=np.int64) for c in zip(*self._pending))
+        return [comp, debit, credit, np.ones(len(comp), np.int64)]
+
+    def _flush(self):
+        if self._pending:
+            self.open = self.open.merged(*self._pending_arrays())
+            self._pending.clear()
+            self._delta = None
+
+    def _delta_segment(self) -> _Segment:
+        # Só os lançamentos avulsos (no máximo PENDING_LIMIT), reagregados
+        # apenas quando chegou lançamento novo desde a última leitura.
+        if self._delta is None:
+            self._delta = _Segment.from_postings(*self._pending_arrays()) if self._pending else _Segment.empty()
+        return self._delta
+
+    @timed("groupby.temporal_balances.close_month")
+    def close_month(self, month: int) -> list[dict]:
+        # Fecha todos os meses abertos até `month` (inclusive), em ordem.
+        # Devolve um resumo por mês fechado.
+        with self.lock:
+            self._flush()
+            if self.closes and month <= self.closes[-1].month:
+                return []
+            if self.closes:
+                first = self.closes[-1].month + 1
+            elif len(self.open):
+                first = min(month, month_id(date.fromordinal(int((self.open.comp & _DAY_MASK).min()))))
+            else:
+                first = month
+            summaries = []
+            for m in range(first, month + 1):
+                segment, self.open = self.open.split(month_end(m).toordinal())
+                keys, totals = segment.totals()
+                prev = self.closes[-1] if self.closes else None
+                if prev is not None:
+                    all_keys = np.union1d(prev.keys, keys)
+                    base = prev.lookup(all_keys)
+                    pos = np.searchsorted(all_keys, keys)
+                    balances = [b.copy() for b in base]
+                    for b, t in zip(balances, totals):
+                        b[pos] += t
+                else:
+                    all_keys, balances = keys, totals
+                self.closes.append(_Close(m, segment, all_keys, balances))
+                summaries.append({"period": month_label(m), "entries": int(totals[2].sum()),
+                                  "debit": int(totals[0].sum()) / 100, "credit": int(totals[1].sum()) / 100})
+            return summaries
+
+    # ------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------
+
+    def _as_of(self, day: date) -> tuple[np.ndarray, list[np.ndarray]]:
+        # Saldo acumulado (débito, crédito, quantidade) de cada chave no fim do dia.
+        m, ordinal = month_id(day), day.toordinal()
+        with self.lock:
+            if self.closes and m < self.closes[0].month:
+                return np.empty(0, np.int64), [np.empty(0, np.int64)] * 3
+            if self.closes and m <= self.closes[-1].month:
+                i = m - self.closes[0].month
+                prev = self.closes[i - 1] if i else None
+                segments = [self.closes[i].segment]
+                keys = self.closes[i].keys
+            else:
+                prev = self.closes[-1] if self.closes else None
+                segments = [s for s in (self.open, self._delta_segment()) if len(s)]
+                keys = None
+        if keys is None:
+            parts = [s.keys() for s in segments] + ([prev.keys] if prev is not None else [])
+            keys = reduce(np.union1d, parts) if len(parts) > 1 else parts[0] if parts else np.empty(0, np.int64)
+        moved = [np.zeros(len(keys), np.int64)] * 3
+        for segment in segments:
+            moved = [a + b for a, b in zip(moved, segment.upto(keys, ordinal))]
+        if prev is None:
+            return keys, moved
+        return keys, [b + mv for b, mv in zip(prev.lookup(keys), moved)]
+
+    def _range(self, start: date | None, end: date) -> tuple[np.ndarray, list[np.ndarray]]:
+        keys, hi = self._as_of(end)
+        if start is not None:
+            lo_keys, lo = self._as_of(date.fromordinal(start.toordinal() - 1))
+            pos = np.minimum(np.searchsorted(lo_keys, keys), max(len(lo_keys) - 1, 0))
+            found = lo_keys[pos] == keys if len(lo_keys) else np.zeros(len(keys), bool)
+            hi = [h - np.where(found, lo_v[pos] if len(lo_v) else 0, 0) for h, lo_v in zip(hi, lo)]
+        return keys, hi
+
+    def _labels(self, codes: np.ndarray) -> np.ndarray:
+        return np.array(self.accounts.values, dtype=object)[codes] if len(codes) else np.empty(0, object)
+
+    @timed("groupby.temporal_balances.range")
+    def range_frame(self, start: date | None, end: date, company_id: int | None = None) -> pd.DataFrame:
+        # Movimento de cada (empresa, conta) entre start e end (inclusive);
+        # start None = desde o início.
+        keys, (debit, credit, n) = self._range(start, end)
+        mask = n > 0
+        if company_id is not None:
+            mask &= (keys >> _ACCOUNT_BITS) == company_id
+        keys = keys[mask]
+        return pd.DataFrame({
+            "company_id": keys >> _ACCOUNT_BITS,
+            "account_code": self._labels(keys & _ACCOUNT_MASK),
+            "debit": debit[mask] / 100,
+            "credit": credit[mask] / 100,
+            "lancamentos": n[mask],
+        })
+
+    @timed("groupby.temporal_balances.by_account")
+    def by_account(self, start: date | None, end: date, company_id: int | None = None,
+                   depth: int | None = None) -> pd.DataFrame:
+        # Mesmo formato do TrialBalance.by_account / rollup, para um período.
+        # Soma por conta nos arrays (poucas linhas chegam ao pandas).
+        keys, (debit, credit, n) = self._range(start, end)
+        mask = n > 0
+        if company_id is not None:
+            mask &= (keys >> _ACCOUNT_BITS) == company_id
+        codes = keys[mask] & _ACCOUNT_MASK
+        size = len(self.accounts.values)
+        used = np.bincount(codes, minlength=size) > 0
+        df = pd.DataFrame({
+            "account_code": self._labels(np.flatnonzero(used)),
+            "debit": np.bincount(codes, debit[mask], size)[used] / 100,
+            "credit": np.bincount(codes, credit[mask], size)[used] / 100,
+        })
+        if depth is None:
+            out = df.sort_values("account_code", ignore_index=True)
+        else:
+            parts = df["account_code"].str.split(".")
+            df = df[parts.str.len() >= depth].assign(account_code=parts.str[:depth].str.join("."))
+            out = df.groupby("account_code", sort=True)[["debit", "credit"]].sum().reset_index()
+        out["saldo"] = out["debit"] - out["credit"]
+        return out
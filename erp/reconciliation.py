@@ -0,0 +1,268 @@
+import io
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# CONCILIAÇÃO BANCÁRIA – EXTRATO x TÍTULOS EM ABERTO
+# ============================================================
+# O extrato (CSV ou OFX, lido localmente) vira um DataFrame de linhas com
+# valor assinado: crédito (> 0) casa com títulos AR, débito (< 0) com AP.
+# O casamento não compara linha a linha: os títulos são agrupados por valor
+# em centavos (junção por hash: factorize + get_indexer) e, dentro de cada
+# valor, ordenados por vencimento; a janela de datas de cada linha sai de
+# dois searchsorted sobre a chave composta (grupo, dia). Os candidatos recebem
+# pontuação (distância em dias, número do documento e nome da parte no
+# histórico) e a atribuição um-para-um é gulosa, em rodadas vetorizadas.
+
+STATEMENT_COLUMNS = ["date", "amount", "description", "doc"]
+TITLE_COLUMNS = ["id", "company_id", "kind", "party_name", "doc_number", "due_date", "amount"]
+MATCH_STATUSES = ["confirmado", "sugerido"]
+
+SCORE_BASE = 60         # valor exato dentro da janela
+SCORE_PER_DAY = 5       # desconto por dia entre o lançamento e o vencimento
+SCORE_DOC = 40          # número do documento aparece no extrato
+SCORE_PARTY = 20        # nome do cliente/fornecedor aparece no extrato
+MAX_CANDIDATES = 32     # candidatos por linha (os mais próximos da data)
+
+_DAY_BITS = 21
+_DAY_OFFSET = 1 << 12   # folga para a janela não invadir o grupo vizinho
+_OFX_BLOCK = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+_OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]+")
+
+
+# ------------------------------------------------------------
+# Leitura do extrato
+# ------------------------------------------------------------
+
+def read_statement(source, fmt: str) -> pd.DataFrame:
+    # source: caminho, bytes ou arquivo enviado pelo st.file_uploader.
+    raw = source if isinstance(source, bytes) else _read_bytes(source)
+    text = _decode(raw)
+    df = parse_ofx(text) if fmt == "ofx" else parse_csv(text)
+    df["date"] = df["date"].dt.normalize()
+    bad = df["date"].isna() | df["amount"].isna() | (df["amount"] == 0)
+    return df.loc[~bad, STATEMENT_COLUMNS].reset_index(drop=True)
+
+
+def parse_csv(text: str) -> pd.DataFrame:
+    # Colunas date, amount (crédito positivo), description e doc (opcional).
+    # Cabeçalho com ";" indica o formato brasileiro: 1.234,56 e dd/mm/aaaa.
+    header = text.split("\n", 1)[0]
+    brazilian = ";" in header
+    df = pd.read_csv(io.StringIO(text), sep=";" if brazilian else ",", dtype=str, keep_default_na=False)
+    df.columns = [c.strip().lower() for c in df.columns]
+    missing = [c for c in ("date", "amount") if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes no extrato: {', '.join(missing)}")
+    amount = df["amount"].str.strip()
+    if brazilian:
+        amount = amount.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    dates = df["date"].str.strip()
+    parsed = pd.to_datetime(dates, format="ISO8601", errors="coerce")
+    if parsed.isna().any():
+        parsed = parsed.fillna(pd.to_datetime(dates, format="%d/%m/%Y", errors="coerce"))
+    return pd.DataFrame({
+        "date": parsed,
+        "amount": pd.to_numeric(amount, errors="coerce"),
+        "description": df["description"] if "description" in df.columns else "",
+        "doc": df["doc"] if "doc" in df.columns else "",
+    })
+
+
+def parse_ofx(text: str) -> pd.DataFrame:
+    # OFX 1.x (SGML) e 2.x (XML): só os blocos <STMTTRN> interessam. O
+    # documento é CHECKNUM, REFNUM ou FITID, nessa ordem.
+    dates, amounts, descriptions, docs = [], [], [], []
+    for block in _OFX_BLOCK.findall(text):
+        tags = {k.upper(): v.strip() for k, v in _OFX_TAG.findall(block)}
+        dates.append(tags.get("DTPOSTED", "")[:8])
+        amounts.append(tags.get("TRNAMT", "").replace(",", "."))
+        descriptions.append(" ".join(filter(None, (tags.get("NAME"), tags.get("MEMO")))))
+        docs.append(tags.get("CHECKNUM") or tags.get("REFNUM") or tags.get("FITID", ""))
+    return pd.DataFrame({
+        "date": pd.to_datetime(pd.Series(dates, dtype=object), format="%Y%m%d", errors="coerce"),
+        "amount": pd.to_numeric(pd.Series(amounts, dtype=object), errors="coerce"),
+        "description": descriptions,
+        "doc": docs,
+    })
+
+
+def _read_bytes(source) -> bytes:
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _decode(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")  # OFX de bancos brasileiros costuma vir em CP1252
+
+
+# ------------------------------------------------------------
+# Casamento
+# ------------------------------------------------------------
+
+def match_statement(lines: pd.DataFrame, titles: pd.DataFrame, window_days: int = 5):
+    # Devolve (casamentos, linhas sem título). Casamentos: uma linha por par
+    # extrato/título com pontuação e status "confirmado" (documento ou nome
+    # conferem e não há empate no topo) ou "sugerido" (só valor e data).
+    lines = lines.reset_index(drop=True)
+    line_cents = _cents(lines["amount"])
+    title_cents = np.where(titles["kind"].to_numpy(object) == "AR", 1, -1) * _cents(titles["amount"])
+    line_day = _days(lines["date"])
+    title_day = _days(titles["due_date"])
+
+    # Junção por hash: grupo = posição do valor entre os valores distintos
+    # dos títulos; linhas sem nenhum título de mesmo valor saem aqui.
+    title_bucket, buckets = pd.factorize(title_cents)
+    line_bucket = pd.Index(buckets).get_indexer(line_cents)
+    keys = (title_bucket.astype(np.int64) << _DAY_BITS) | title_day
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    probe = np.flatnonzero(line_bucket >= 0)
+    line_keys = (line_bucket[probe].astype(np.int64) << _DAY_BITS) | line_day[probe]
+    lo = np.searchsorted(keys, line_keys - window_days, "left")
+    hi = np.searchsorted(keys, line_keys + window_days, "right")
+    # Janelas muito cheias (valores redondos) ficam com os mais próximos da data.
+    mid = np.searchsorted(keys, line_keys, "left")
+    lo = np.maximum(lo, np.minimum(mid - MAX_CANDIDATES // 2, hi - MAX_CANDIDATES))
+    hi = np.minimum(hi, lo + MAX_CANDIDATES)
+    counts = hi - lo
+
+    total = int(counts.sum())
+    starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    cand_line = np.repeat(probe, counts)
+    cand_title = order[starts + np.arange(total)]
+    day_diff = np.abs(line_day[cand_line] - title_day[cand_title])
+
+    doc_hit, party_hit = _text_hits(lines, titles, cand_line, cand_title)
+    score = SCORE_BASE - SCORE_PER_DAY * day_diff + SCORE_DOC * doc_hit + SCORE_PARTY * party_hit
+
+    line_pick, title_pick, cand_pick = _assign(cand_line, cand_title, score, day_diff, len(lines), len(titles))
+    # Empate: outra candidata da mesma linha com a mesma pontuação máxima.
+    best = np.full(len(lines), np.iinfo(np.int64).min)
+    np.maximum.at(best, cand_line, score)
+    ties = np.bincount(cand_line[score == best[cand_line]], minlength=len(lines))
+    confirmed = (doc_hit[cand_pick] | party_hit[cand_pick]) & (ties[line_pick] == 1)
+
+    t = titles.iloc[title_pick]
+    matches = pd.DataFrame({
+        "line": line_pick,
+        "date": lines["date"].to_numpy()[line_pick],
+        "amount": lines["amount"].to_numpy()[line_pick],
+        "description": lines["description"].to_numpy(object)[line_pick],
+        "doc": lines["doc"].to_numpy(object)[line_pick],
+        "title_id": t["id"].to_numpy(np.int64),
+        "company_id": t["company_id"].to_numpy(np.int64),
+        "kind": t["kind"].to_numpy(object),
+        "party_name": t["party_name"].to_numpy(object),
+        "doc_number": t["doc_number"].to_numpy(object),
+        "due_date": t["due_date"].to_numpy(),
+        "day_diff": day_diff[cand_pick],
+        "score": score[cand_pick],
+        "status": np.where(confirmed, MATCH_STATUSES[0], MATCH_STATUSES[1]),
+    }).sort_values("line", ignore_index=True)
+    unmatched = np.ones(len(lines), dtype=bool)
+    unmatched[line_pick] = False
+    return matches, lines[unmatched]
+
+
+def _assign(cand_line, cand_title, score, day_diff, n_lines: int, n_titles: int, max_rounds: int = 64):
+    # Gulosa por pontuação: a cada rodada, entram os pares que são a melhor
+    # opção tanto da linha quanto do título; os demais disputam a próxima.
+    rank = np.lexsort((cand_title, cand_line, day_diff, -score))
+    line_used = np.zeros(n_lines, dtype=bool)
+    title_used = np.zeros(n_titles, dtype=bool)
+    picked = []
+    for _ in range(max_rounds):
+        rank = rank[~line_used[cand_line[rank]] & ~title_used[cand_title[rank]]]
+        if not len(rank):
+            break
+        first_of_line = np.zeros(len(rank), dtype=bool)
+        first_of_line[np.unique(cand_line[rank], return_index=True)[1]] = True
+        first_of_title = np.zeros(len(rank), dtype=bool)
+        first_of_title[np.unique(cand_title[rank], return_index=True)[1]] = True
+        won = rank[first_of_line & first_of_title]
+        line_used[cand_line[won]] = True
+        title_used[cand_title[won]] = True
+        picked.append(won)
+    cand = np.concatenate(picked) if picked else np.zeros(0, dtype=np.int64)
+    return cand_line[cand], cand_title[cand], cand
+
+
+def _text_hits(lines: pd.DataFrame, titles: pd.DataFrame, cand_line: np.ndarray, cand_title: np.ndarray):
+    # Normaliza só os textos distintos das linhas e títulos candidatos.
+    used_lines, line_pos = np.unique(cand_line, return_inverse=True)
+    used_titles, title_pos = np.unique(cand_title, return_inverse=True)
+    text_code, texts = _normalized(lines["description"].iloc[used_lines].astype(str) + " "
+                                   + lines["doc"].iloc[used_lines].astype(str))
+    doc_code, docs = _normalized(titles["doc_number"].iloc[used_titles].astype(str))
+    party_code, parties = _normalized(titles["party_name"].iloc[used_titles].astype(str))
+    compact = [t.replace(" ", "") for t in texts]
+    words = [set(t.split()) for t in texts]
+    docs = [d.replace(" ", "") for d in docs]
+    parties = [[w for w in p.split() if len(w) >= 4] for p in parties]
+
+    text_i = text_code[line_pos].tolist()
+    doc_hit = np.fromiter(
+        (len(docs[d]) >= 3 and docs[d] in compact[i] for i, d in zip(text_i, doc_code[title_pos].tolist())),
+        dtype=bool, count=len(cand_line))
+    party_hit = np.fromiter(
+        (any(w in words[i] for w in parties[p]) for i, p in zip(text_i, party_code[title_pos].tolist())),
+        dtype=bool, count=len(cand_line))
+    return doc_hit, party_hit
+
+
+def _normalized(values: pd.Series) -> tuple[np.ndarray, list[str]]:
+    # (código por linha, textos distintos sem acento, em maiúsculas, só letras e dígitos).
+    codes, uniques = pd.factorize(values)
+    out = []
+    for v in uniques.tolist():
+        if not v.isascii():
+            v = unicodedata.normalize("NFKD", v).encode("ascii", "ignore").decode("ascii")
+        out.append(_NOT_ALNUM.sub(" ", v.upper()).strip())
+    return codes, out
+
+
+def _cents(values: pd.Series) -> np.ndarray:
+    return np.rint(pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(np.float64) * 100).astype(np.int64)
+
+
+def _days(values: pd.Series) -> np.ndarray:
+    days = pd.to_datetime(values).to_numpy("datetime64[D]").astype(np.int64) + _DAY_OFFSET
+    return np.clip(days, 0, (1 << _DAY_BITS) - 1)
+
+
+# ------------------------------------------------------------
+# Baixa
+# ------------------------------------------------------------
+
+def settlement_legs(matches: pd.DataFrame, bank_account: str, receivable_account: str,
+                    payable_account: str) -> pd.DataFrame:
+    # Um lançamento de duas partidas por título, na data do extrato:
+    # AR debita o banco e credita clientes; AP debita fornecedores e credita o banco.
+    n = len(matches)
+    is_ar = matches["kind"].to_numpy(object) == "AR"
+    amount = np.abs(matches["amount"].to_numpy(np.float64))
+    history = ("Baixa por conciliação ref. título " + matches["doc_number"].astype(str)).to_numpy(object)
+    common = {
+        "entry": np.arange(n),
+        "company_id": matches["company_id"].to_numpy(np.int64),
+        "date": matches["date"].to_numpy(),
+        "history": history,
+        "origin_type": "FinancialTitle",
+        "origin_id": matches["title_id"].to_numpy(np.int64),
+    }
+    bank = pd.DataFrame(common | {"account_code": bank_account,
+                                  "debit": np.where(is_ar, amount, 0.0), "credit": np.where(is_ar, 0.0, amount)})
+    party = pd.DataFrame(common | {"account_code": np.where(is_ar, receivable_account, payable_account),
+                                   "debit": np.where(is_ar, 0.0, amount), "credit": np.where(is_ar, amount, 0.0)})
+    return pd.concat([bank, party], ignore_index=True).sort_values("entry", kind="stable", ignore_index=True)
@@ -0,0 +1,44 @@
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as dtime
+
+# ============================================================
+# REGISTROS COMPACTOS – SLOTS, TEXTOS INTERNADOS, DATA-HORA INTEIRA
+# ============================================================
+# Entidades de alto volume são dataclasses com __slots__ (sem __dict__ por
+# instância). Campos de texto de baixa cardinalidade (tipo, status, conta,
+# entidade...) passam por sys.intern na construção: um milhão de títulos
+# "Aberto" apontam para o mesmo objeto str. Data-hora é guardada como
+# inteiro (segundos desde a época) e só vira texto na exibição.
+
+
+def record(*interned: str):
+    def decorate(cls):
+        if interned:
+            def __post_init__(self):
+                for name in interned:
+                    value = getattr(self, name)
+                    if type(value) is str:
+                        setattr(self, name, sys.intern(value))
+            cls.__post_init__ = __post_init__
+        return dataclass(slots=True)(cls)
+    return decorate
+
+
+def now_ts() -> int:
+    return int(time.time())
+
+
+def ts_range(start: date, end: date) -> tuple[int, int]:
+    # Intervalo de dias inclusivo -> [início do primeiro dia, fim do último].
+    return (int(datetime.combine(start, dtime.min).timestamp()),
+            int(datetime.combine(end, dtime.max).timestamp()))
+
+
+def format_ts(value) -> str:
+    # Hora local, como o isoformat que era gravado antes. Textos (registros
+    # anteriores ao formato inteiro) passam direto.
+    if value is None or isinstance(value, str):
+        return value or ""
+    return datetime.fromtimestamp(int(value)).isoformat(timespec="seconds")
@@ -0,0 +1,438 @@
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# BUSCA – ÍNDICE INVERTIDO DE TERMOS COM TRIGRAMAS DO VOCABULÁRIO
+# ============================================================
+# Textos normalizados (sem acento, minúsculas) viram termos alfanuméricos;
+# documentos e códigos também entram inteiros, sem pontuação (CNPJ com ou
+# sem máscara). Cada segmento é imutável: vocabulário ordenado em bytes de
+# largura fixa (exato e prefixo por searchsorted), listas de documentos por
+# termo em CSR e, para erros de digitação, trigramas do vocabulário em CSR
+# (candidatos por contagem de trigramas, confirmados por distância de
+# edição). Inclusões viram segmentos pequenos, fundidos com o anterior
+# quando ficam do mesmo tamanho (como um contador binário), então há
+# O(log n) segmentos e cada lista é remontada O(log n) vezes.
+
+MAX_TERM = 32            # termos mais longos são quebrados; compactos, truncados
+PREFIX_TERMS = 256       # termos expandidos por prefixo, por segmento
+GRAM_CAP = 50_000        # trigramas mais comuns que isso não filtram candidatos
+FUZZY_CANDIDATES = 128   # termos conferidos por distância de edição, por segmento
+WEIGHT_EXACT, WEIGHT_PREFIX, WEIGHT_FUZZY = 4, 2, 1
+
+_TOKEN = re.compile(r"[0-9a-z]{1,%d}" % MAX_TERM)       # termos longos viram pedaços
+_END = "\x1f"            # separador de valores no texto único (US do ASCII)
+_TOKEN_OR_END = re.compile(r"[0-9a-z]{1,%d}|\x1f" % MAX_TERM)
+_NOT_TERM = re.compile(r"[^0-9a-z\x1f]+")
+_NO_DOCS = np.zeros(0, dtype=np.int32)
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    text: tuple[str, ...] = ()    # nomes: só os termos
+    codes: tuple[str, ...] = ()   # documentos/códigos: termos + valor compacto
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    entity: str
+    id: int
+    score: int
+
+
+def normalize(text: str) -> str:
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return text.lower()
+
+
+def tokenize(text, code: bool = False) -> list[str]:
+    terms = _TOKEN.findall(normalize("" if text is None else str(text)))
+    if code and len(terms) > 1:
+        terms.append("".join(terms)[:MAX_TERM])
+    return terms
+
+
+# ------------------------------------------------------------
+# Segmento imutável
+# ------------------------------------------------------------
+
+class _Segment:
+    def __init__(self, vocab: np.ndarray, offsets: np.ndarray, postings: np.ndarray, grams=None):
+        self.vocab = vocab          # bytes "S<n>", ordenado
+        self.offsets = offsets      # int64, len(vocab) + 1
+        self.postings = postings    # int32, documentos ordenados dentro de cada termo
+        self.gram_pairs = _gram_pairs(vocab) if grams is None else grams  # (trigrama << 32) | termo
+        self.gram_keys, self.gram_offsets = _csr(self.gram_pairs >> 32)
+
+    @classmethod
+    def from_terms(cls, terms: np.ndarray, docs: np.ndarray) -> "_Segment":
+        # terms: textos (object); o vocabulário é ordenado só depois do factorize.
+        codes, uniques = pd.factorize(terms)
+        # Largura explícita: astype("S") em array object não mede o maior texto.
+        width = max(map(len, uniques), default=1)
+        unique_bytes = np.asarray(uniques, dtype=object).astype(f"S{max(width, 1)}")
+        order = np.argsort(unique_bytes, kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        keys = _sorted_unique((rank[codes] << 32) | docs)
+        return cls._from_keys(unique_bytes[order], keys)
+
+    @classmethod
+    def merge(cls, a: "_Segment", b: "_Segment") -> "_Segment":
+        # Vocabulário novo por inserção ordenada dos termos de b que faltam em
+        # a; postings e trigramas só são renumerados (cada parte já está
+        # ordenada, e documentos de segmentos diferentes nunca se repetem).
+        if len(a.vocab) < len(b.vocab):
+            a, b = b, a
+        # Alarga para o maior dos dois tipos (np.insert truncaria os termos de b).
+        dtype = max(a.vocab.dtype, b.vocab.dtype, key=lambda d: d.itemsize)
+        a_vocab, b_vocab = a.vocab.astype(dtype, copy=False), b.vocab.astype(dtype, copy=False)
+        pos = np.searchsorted(a_vocab, b_vocab)
+        known = pos < len(a_vocab)
+        known[known] = a_vocab[pos[known]] == b_vocab[known]
+        vocab = np.insert(a_vocab, pos[~known], b_vocab[~known])
+        a_codes = np.arange(len(a_vocab)) + np.searchsorted(pos[~known], np.arange(len(a_vocab)), "right")
+        b_codes = np.searchsorted(vocab, b_vocab)
+        keys = np.sort(np.concatenate([a._keys(a_codes), b._keys(b_codes)]), kind="stable")
+        fresh = b.gram_pairs[~known[b.gram_pairs & 0xFFFFFFFF]]
+        grams = np.sort(np.concatenate([_renumber(a.gram_pairs, a_codes), _renumber(fresh, b_codes)]),
+                        kind="stable")
+        return cls._from_keys(vocab, keys, grams)
+
+    @classmethod
+    def _from_keys(cls, vocab: np.ndarray, keys: np.ndarray, grams=None) -> "_Segment":
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys >> 32, minlength=len(vocab)), out=offsets[1:])
+        return cls(vocab, offsets, (keys & 0xFFFFFFFF).astype(np.int32), grams)
+
+    def _keys(self, codes: np.ndarray) -> np.ndarray:
+        return (np.repeat(codes.astype(np.int64), np.diff(self.offsets)) << 32) | self.postings
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.vocab, self.offsets, self.postings, self.gram_pairs,
+                                      self.gram_keys, self.gram_offsets))
+
+    # Consultas: devolvem ids de termos do vocabulário. A chave é convertida
+    # para o tipo do vocabulário (senão o searchsorted copia o vocabulário).
+
+    def exact(self, term: bytes) -> int | None:
+        if len(term) > self.vocab.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.vocab, np.array(term, self.vocab.dtype)))
+        return i if i < len(self.vocab) and self.vocab[i] == term else None
+
+    def prefix(self, term: bytes) -> range:
+        width = self.vocab.dtype.itemsize
+        if len(term) > width:
+            return range(0)
+        key = np.array(term, self.vocab.dtype)
+        lo = int(np.searchsorted(self.vocab, key))
+        if len(term) == width:
+            hi = int(np.searchsorted(self.vocab, key, "right"))
+        else:
+            hi = int(np.searchsorted(self.vocab, np.array(term + b"\xff", self.vocab.dtype)))
+        return range(lo, min(hi, lo + PREFIX_TERMS))
+
+    def fuzzy(self, term: str, distance: int) -> list[int]:
+        rows, frequent = [], 0
+        grams = _term_grams(term)
+        for g in grams:
+            i = int(np.searchsorted(self.gram_keys, g))
+            if i == len(self.gram_keys) or self.gram_keys[i] != g:
+                continue
+            lo, hi = self.gram_offsets[i], self.gram_offsets[i + 1]
+            if hi - lo > GRAM_CAP:
+                frequent += 1
+            else:
+                rows.append(self.gram_pairs[lo:hi] & 0xFFFFFFFF)
+        if not rows:
+            return []
+        # Uma edição destrói no máximo quatro trigramas (troca de vizinhas).
+        need = max(1, len(grams) - 4 * distance - frequent)
+        ids, counts = np.unique(np.concatenate(rows), return_counts=True)
+        ids, counts = ids[counts >= need], counts[counts >= need]
+        if len(ids) > FUZZY_CANDIDATES:
+            ids = ids[np.argpartition(-counts, FUZZY_CANDIDATES)[:FUZZY_CANDIDATES]]
+        return [i for i, t in zip(ids.tolist(), self.vocab[ids].tolist())
+                if _within(term, t.decode("ascii"), distance)]
+
+    def docs(self, term_ids) -> np.ndarray:
+        # Documentos ordenados e distintos: cada lista já vem ordenada, mas a
+        # junção de vários termos (prefixo, erro de digitação) precisa ser refeita.
+        parts = [self.postings[self.offsets[i]:self.offsets[i + 1]] for i in term_ids]
+        if not parts:
+            return _NO_DOCS
+        return parts[0] if len(parts) == 1 else _sorted_unique(np.concatenate(parts))
+
+
+def _gram_pairs(vocab: np.ndarray, chunk: int = 65_536) -> np.ndarray:
+    # Trigramas de "^termo$" codificados em 24 bits: (trigrama << 32) | termo, ordenados.
+    pairs = []
+    width = vocab.dtype.itemsize
+    for start in range(0, len(vocab), chunk):
+        part = vocab[start:start + chunk]
+        n = len(part)
+        lens = np.char.str_len(part)
+        padded = np.zeros((n, width + 2), dtype=np.int64)
+        padded[:, 0] = ord("^")
+        padded[:, 1:width + 1] = np.frombuffer(part.tobytes(), np.uint8).reshape(n, width)
+        padded[np.arange(n), lens + 1] = ord("$")
+        grams = (padded[:, :-2] << 16) | (padded[:, 1:-1] << 8) | padded[:, 2:]
+        valid = np.arange(width) < lens[:, None]
+        term_ids = np.broadcast_to(np.arange(start, start + n)[:, None], grams.shape)
+        pairs.append((grams[valid] << 32) | term_ids[valid])
+    return _sorted_unique(np.concatenate(pairs)) if pairs else np.zeros(0, dtype=np.int64)
+
+
+def _renumber(pairs: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    return (pairs >> 32 << 32) | codes[pairs & 0xFFFFFFFF]
+
+
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    # np.unique usa hash para inteiros sem return_*; ordenar sai mais barato aqui.
+    keys = np.sort(keys)
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    return keys[keep]
+
+
+def _csr(sorted_keys: np.ndarray):
+    # (chaves distintas, início de cada uma + fim) de um array ordenado.
+    if not len(sorted_keys):
+        return sorted_keys, np.zeros(1, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    return sorted_keys[starts], np.append(starts, len(sorted_keys)).astype(np.int64)
+
+
+def _term_grams(term: str) -> list[int]:
+    padded = f"^{term}$".encode("ascii")
+    return sorted({(padded[i] << 16) | (padded[i + 1] << 8) | padded[i + 2] for i in range(len(padded) - 2)})
+
+
+def _within(a: str, b: str, limit: int) -> bool:
+    # Distância de Damerau-Levenshtein (transposição adjacente) <= limit.
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], before[j - 2] + 1)
+        if min(cur) > limit:
+            return False
+        before, prev = prev, cur
+    return prev[-1] <= limit
+
+
+def _typo_distance(term: str) -> int:
+    return 2 if len(term) >= 8 else 1 if len(term) >= 4 else 0
+
+
+# ------------------------------------------------------------
+# Índice
+# ------------------------------------------------------------
+
+class SearchIndex:
+    def __init__(self, specs: dict[str, SearchSpec]):
+        self.specs = specs
+        self.entities = list(specs)
+        self.lock = threading.RLock()
+        self.segments: list[_Segment] = []
+        self.doc_entity = np.zeros(0, dtype=np.int8)
+        self.doc_id = np.zeros(0, dtype=np.int64)
+        self._n = 0
+        self.merges = 0
+
+    @classmethod
+    def build(cls, specs: dict[str, SearchSpec], repo) -> "SearchIndex":
+        index = cls(specs)
+        for key, spec in specs.items():
+            rows = repo.fetch(key)
+            index.add_columns(key, [r.id for r in rows],
+                              {f: [getattr(r, f) for r in rows] for f in spec.text + spec.codes})
+        return index
+
+    def __len__(self) -> int:
+        return self._n
+
+    def nbytes(self) -> int:
+        return sum(s.nbytes() for s in self.segments) + self.doc_entity.nbytes + self.doc_id.nbytes
+
+    # ------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------
+
+    def add(self, key: str, obj):
+        self.add_many(key, [obj])
+
+    def add_many(self, key: str, objs):
+        objs = list(objs)
+        spec = self.specs[key]
+        self.add_columns(key, [o.id for o in objs],
+                         {f: [getattr(o, f) for o in objs] for f in spec.text + spec.codes})
+
+    def add_columns(self, key: str, ids, columns: dict):
+        # Inclusão em bloco (ex.: títulos importados): um segmento por chamada.
+        spec = self.specs[key]
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        with self.lock:
+            first = self._append_docs(self.entities.index(key), ids)
+            terms, docs = [], []
+            for field in spec.text + spec.codes:
+                t, d = _field_terms(columns[field], field in spec.codes, first)
+                terms.append(t)
+                docs.append(d)
+            terms = np.concatenate(terms)
+            if not len(terms):
+                return
+            self.segments.append(_Segment.from_terms(terms, np.concatenate(docs)))
+            while len(self.segments) > 1 and len(self.segments[-2]) <= 2 * len(self.segments[-1]):
+                last = self.segments.pop()
+                self.segments[-1] = _Segment.merge(self.segments[-1], last)
+                self.merges += 1
+
+    def _append_docs(self, entity: int, ids: np.ndarray) -> int:
+        first, needed = self._n, self._n + len(ids)
+        if needed > len(self.doc_id):
+            capacity = max(1024, len(self.doc_id))
+            while capacity < needed:
+                capacity *= 2
+            self.doc_entity = np.resize(self.doc_entity, capacity)
+            self.doc_id = np.resize(self.doc_id, capacity)
+        self.doc_entity[first:needed] = entity
+        self.doc_id[first:needed] = ids
+        self._n = needed
+        return first
+
+    # ------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------
+
+    def search(self, query: str, entities=None, k: int = 20) -> list[SearchHit]:
+        # Todos os termos precisam casar (exato, prefixo ou com erro de
+        # digitação); pontuação = soma dos pesos, empate -> inclusão mais recente.
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self.lock:
+            segments = list(self.segments)
+            doc_entity, doc_id = self.doc_entity[:self._n], self.doc_id[:self._n]
+        if not terms or not segments:
+            return []
+        matches = sorted((self._term_matches(segments, t) for t in terms), key=lambda m: sum(map(len, m[0])))
+        docs, score = _best_weight(*matches[0])
+        if entities is not None:
+            keep = np.isin(doc_entity[docs], [self.entities.index(e) for e in entities])
+            docs, score = docs[keep], score[keep]
+        for arrays, weights in matches[1:]:
+            if not len(docs):
+                break
+            docs, score = _intersect(docs, score, arrays, weights)
+        if not len(docs):
+            return []
+        rank = (score.astype(np.int64) << 32) | docs
+        if len(rank) > k:
+            rank = rank[np.argpartition(-rank, k)[:k]]
+        rank = np.sort(rank)[::-1]
+        top = (rank & 0xFFFFFFFF).astype(np.int64)
+        return [SearchHit(self.entities[e], i, s) for e, i, s in
+                zip(doc_entity[top].tolist(), doc_id[top].tolist(), (rank >> 32).tolist())]
+
+    def _term_matches(self, segments: list[_Segment], term: str):
+        # (listas de documentos, peso de cada lista) para um termo da consulta.
+        raw = term.encode("ascii")
+        arrays, weights = [], []
+        exact_any = False
+        for seg in segments:
+            i = seg.exact(raw)
+            if i is not None:
+                exact_any = True
+                arrays.append(seg.docs([i]))
+                weights.append(WEIGHT_EXACT)
+            if len(term) >= 2:
+                longer = [j for j in seg.prefix(raw) if j != i]
+                if longer:
+                    arrays.append(seg.docs(longer))
+                    weights.append(WEIGHT_PREFIX)
+        distance = _typo_distance(term)
+        if not exact_any and distance:
+            for seg in segments:
+                close = seg.fuzzy(term, distance)
+                if close:
+                    arrays.append(seg.docs(close))
+                    weights.append(WEIGHT_FUZZY)
+        return arrays, weights
+
+
+def _field_terms(values, code: bool, first: int):
+    # (termos, documentos int32) de uma coluna. Os valores distintos são
+    # normalizados e quebrados num único texto (uma passada de regex); nomes
+    # repetidos (clientes em títulos) só são tokenizados uma vez.
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(""))
+    text = normalize(_END.join(map(str, uniques.tolist())))
+    stream = np.array(_TOKEN_OR_END.findall(text) + [_END], dtype=object)
+    end = stream == _END
+    value = (np.cumsum(end) - end)[~end]
+    tokens = stream[~end]
+    lens = np.bincount(value, minlength=len(uniques))
+    if code:
+        # Valor compacto (sem pontuação) para documentos com mais de um termo.
+        multi = np.flatnonzero(lens > 1)
+        compact = np.array(_NOT_TERM.sub("", text).split(_END), dtype=object)[multi]
+        tokens = np.concatenate([tokens, [c[:MAX_TERM] for c in compact]])
+        value = np.concatenate([value, multi])
+        order = np.argsort(value, kind="stable")
+        tokens, lens = tokens[order], lens + (lens > 1)
+    row_lens = lens[codes]
+    total = int(row_lens.sum())
+    starts = np.cumsum(lens) - lens
+    pos = np.repeat(starts[codes] - (np.cumsum(row_lens) - row_lens), row_lens) + np.arange(total)
+    docs = np.repeat(np.arange(first, first + len(codes), dtype=np.int64), row_lens)
+    return tokens[pos], docs
+
+
+def _best_weight(arrays: list[np.ndarray], weights: list[int]):
+    # Documentos distintos (ordenados) com o maior peso entre as listas.
+    if not arrays:
+        return _NO_DOCS, np.zeros(0, dtype=np.int16)
+    if len(arrays) == 1:
+        return arrays[0], np.full(len(arrays[0]), weights[0], dtype=np.int16)
+    docs = np.concatenate(arrays)
+    weight = np.repeat(np.array(weights, dtype=np.int16), [len(a) for a in arrays])
+    order = np.lexsort((-weight, docs))
+    docs, weight = docs[order], weight[order]
+    first = np.ones(len(docs), dtype=bool)
+    first[1:] = docs[1:] != docs[:-1]
+    return docs[first], weight[first]
+
+
+def _intersect(docs: np.ndarray, score: np.ndarray, arrays: list[np.ndarray], weights: list[int]):
+    # Mantém os candidatos presentes em alguma lista do termo. Listas grandes
+    # são sondadas por searchsorted (estão ordenadas); as pequenas, por isin.
+    best = np.zeros(len(docs), dtype=np.int16)
+    small, small_w = [], []
+    for a, w in zip(arrays, weights):
+        if len(a) > 8 * len(docs):
+            pos = np.minimum(np.searchsorted(a, docs), len(a) - 1)
+            best = np.where(a[pos] == docs, np.maximum(best, w), best)
+        else:
+            small.append(a)
+            small_w.append(w)
+    if small:
+        other, other_w = _best_weight(small, small_w)
+        pos = np.minimum(np.searchsorted(other, docs), max(len(other) - 1, 0))
+        if len(other):
+            best = np.where(other[pos] == docs, np.maximum(best, other_w[pos]), best)
+    keep = best > 0
+    return docs[keep], score[keep] + best[keep]
@@ -0,0 +1,461 @@
+import gc
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import fields
+from datetime import date
+from itertools import starmap
+from operator import attrgetter, itemgetter
+
+import numpy as np
+
+# ============================================================
+# ESTADO POR EVENTOS – DIÁRIO DE MUTAÇÕES + SNAPSHOTS
+# ============================================================
+# Cada escrita (add_*, lote, baixa...) grava no diário um registro com as
+# mutações que aplicou: linhas inseridas, colunas de um lote, alterações por
+# id e contadores reservados fora das entidades. Registro:
+# [tamanho u32][crc32 u32][seq i64][pickle das mutações], em segmentos de
+# segment_size registros (flush a cada registro; fsync opcional).
+#
+# A cada snapshot_every registros um snapshot de todas as entidades vai para
+# disco em segundo plano: listas de registros viram colunas (datas como
+# ordinais), o razão colunar entra com os próprios arrays. A captura trava
+# todas as entidades só o tempo de copiar referências; a serialização
+# acontece depois, sem lock. Na abertura carrega-se o snapshot mais recente
+# e só os registros posteriores do diário são reaplicados. Segmentos já
+# cobertos pelo snapshot mais antigo mantido são apagados (prune=False os
+# guarda, para reprodução completa).
+#
+# Diário e snapshots são arquivos locais do servidor, lidos com pickle:
+# não apontar state_dir para arquivos de terceiros.
+
+_HEADER = struct.Struct("<IIq")      # tamanho do payload, crc32, seq
+_SNAPSHOT_MAGIC = b"ERPSNAP1"
+_NULL_DATE = np.iinfo(np.int64).min
+_FLUSH_ROWS = 100_000                # linhas acumuladas por entidade na reprodução
+
+
+def _segment_name(first_seq: int) -> str:
+    return f"journal-{first_seq:012d}.log"
+
+
+def _snapshot_name(seq: int) -> str:
+    return f"snapshot-{seq:012d}.snap"
+
+
+def _seq_of(name: str) -> int:
+    return int(name.split("-", 1)[1].split(".", 1)[0])
+
+
+# ------------------------------------------------------------
+# Mutações (payload de log_event)
+# ------------------------------------------------------------
+
+def inserted(key: str, objs) -> tuple:
+    # Linhas como tuplas, na ordem dos campos do dataclass.
+    objs = list(objs)
+    get = attrgetter(*[f.name for f in fields(objs[0])]) if objs else None
+    return ("insert", key, [get(o) for o in objs])
+
+
+def inserted_columns(key: str, columns: dict) -> tuple:
+    return ("columns", key, columns)
+
+
+def updated(key: str, ids, changes: dict) -> tuple:
+    # Só os ids efetivamente alterados (a reprodução não reavalia filtros).
+    return ("update", key, list(ids), dict(changes))
+
+
+def counter(name: str, value: int) -> tuple:
+    # Contador reservado fora de uma entidade (ex.: journal_id): próximo valor.
+    return ("counter", name, value)
+
+
+@contextmanager
+def _no_gc():
+    # Milhões de registros novos disparariam coletas completas repetidas.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class _Replay:
+    # Aplica mutações em lote: inserções consecutivas de uma entidade viram
+    # um único insert_many; contadores são reposicionados no fim.
+    def __init__(self, repo, id_counters: dict[str, str]):
+        self.repo = repo
+        self.id_counters = id_counters
+        self.pending: dict[str, list] = {}
+        self.pending_min: dict[str, int] = {}
+        self.max_ids: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self.records = 0
+
+    def apply(self, ops):
+        self.records += 1
+        for op in ops:
+            kind, key = op[0], op[1]
+            if kind == "insert":
+                rows = self.pending.setdefault(key, [])
+                if op[2]:
+                    low = min(map(itemgetter(0), op[2]))
+                    self.pending_min[key] = min(self.pending_min.get(key, low), low)
+                rows += op[2]
+                if len(rows) >= _FLUSH_ROWS:
+                    self.flush(key)
+            elif kind == "columns":
+                self.flush(key)
+                ids = op[2]["id"]
+                if len(ids):
+                    self._seen(key, int(np.max(ids)))
+                    self.repo.insert_columns(key, op[2])
+            elif kind == "update":
+                # Só descarrega as inserções pendentes se a alteração as atinge.
+                if max(op[2], default=0) >= self.pending_min.get(key, np.inf):
+                    self.flush(key)
+                self.repo.update_many(key, op[2], op[3])
+            elif kind == "counter":
+                self.counters[key] = max(self.counters.get(key, 0), op[2])
+
+    def _seen(self, key: str, max_id: int):
+        self.max_ids[key] = max(self.max_ids.get(key, 0), max_id)
+
+    def flush(self, key: str | None = None):
+        for k in [key] if key is not None else list(self.pending):
+            rows = self.pending.pop(k, None)
+            self.pending_min.pop(k, None)
+            if rows:
+                self._seen(k, max(map(itemgetter(0), rows)))
+                self.repo.insert_many(k, list(starmap(self.repo.entities[k], rows)))
+
+    def finish(self):
+        self.flush()
+        for key, max_id in self.max_ids.items():
+            if key in self.id_counters:
+                self.repo.advance_counter(self.id_counters[key], max_id + 1)
+        for name, value in self.counters.items():
+            self.repo.advance_counter(name, value)
+
+
+# ------------------------------------------------------------
+# Colunas do snapshot
+# ------------------------------------------------------------
+
+def _is_date(tp) -> bool:
+    return tp is date or date in getattr(tp, "__args__", ())
+
+
+def _encode_rows(cls, rows: list) -> list:
+    columns = []
+    for f in fields(cls):
+        values = list(map(attrgetter(f.name), rows))
+        if _is_date(f.type):
+            values = np.fromiter((_NULL_DATE if v is None else v.toordinal() for v in values),
+                                 np.int64, len(values))
+        columns.append(values)
+    return columns
+
+
+def _decode_rows(cls, columns: list) -> list:
+    epoch = date(1970, 1, 1).toordinal()
+    decoded = []
+    for f, values in zip(fields(cls), columns):
+        if _is_date(f.type):
+            nulls = values == _NULL_DATE
+            values = (values - epoch).astype("datetime64[D]").tolist()
+            if nulls.any():
+                for i in np.flatnonzero(nulls).tolist():
+                    values[i] = None
+        decoded.append(values)
+    return list(map(cls, *decoded)) if decoded and len(decoded[0]) else []
+
+
+class StateStore:
+    def __init__(self, directory: str, id_counters: dict[str, str], counters: list[str],
+                 segment_size: int = 1_000_000, snapshot_every: int | None = 500_000,
+                 keep_snapshots: int = 2, fsync: bool = False, prune: bool = True):
+        # id_counters: entidade -> contador de ids; counters: todos os
+        # contadores gravados no snapshot.
+        self.directory = directory
+        self.id_counters = id_counters
+        self.counters = list(counters)
+        self.segment_size = segment_size
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = max(keep_snapshots, 1)
+        self.fsync = fsync
+        self.prune = prune
+        self.lock = threading.RLock()
+        self.snapshot_lock = threading.Lock()  # um snapshot por vez (manual ou periódico)
+        self.repo = None
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.last_restore: dict = {}
+        self.last_snapshot: dict = {}
+        self.last_error: str | None = None
+        self._file = None
+        self._first = 0  # primeiro seq do segmento ativo
+        self._size = 0   # bytes gravados no segmento ativo
+        self._count = 0
+        self._snapshotting: threading.Thread | None = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------
+    # Abertura: snapshot mais recente + cauda do diário
+    # ------------------------------------------------------------
+
+    def _names(self, prefix: str, suffix: str) -> list[str]:
+        return sorted(n for n in os.listdir(self.directory) if n.startswith(prefix) and n.endswith(suffix))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def restore(self, repo, use_snapshot: bool = True) -> dict:
+        # Reconstrói o estado num repositório vazio e liga o diário a ele.
+        # use_snapshot=False reaplica o diário inteiro (exige prune=False).
+        if self._file is not None:
+            raise RuntimeError("Estado já restaurado.")
+        for name in self._names("", ".tmp"):
+            os.remove(self._path(name))
+        stats = {"snapshot": 0, "snapshot_s": 0.0, "registros": 0, "diario_s": 0.0}
+        t0 = time.perf_counter()
+        position = None
+        with _no_gc():
+            if use_snapshot:
+                for name in reversed(self._names("snapshot-", ".snap")):
+                    try:
+                        self.snapshot_seq, position = self._load_snapshot(repo, self._path(name))
+                    except (OSError, ValueError, EOFError, pickle.UnpicklingError) as e:
+                        # Snapshot ilegível: tenta o anterior (o diário cobre a diferença).
+                        self.last_error = f"{name}: {e}"
+                        continue
+                    stats["snapshot"] = self.seq = self.snapshot_seq
+                    break
+            stats["snapshot_s"] = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            replay = _Replay(repo, self.id_counters)
+            self._replay(replay, position)
+            replay.finish()
+            stats["registros"] = replay.records
+            stats["diario_s"] = time.perf_counter() - t0
+        # Estado carregado vive até o fim do processo: fora das coletas futuras.
+        gc.freeze()
+        self.repo = repo
+        self.last_restore = stats
+        return stats
+
+    def _load_snapshot(self, repo, path: str) -> tuple[int, tuple | None]:
+        with open(path, "rb") as fh:
+            if fh.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+                raise ValueError("snapshot inválido")
+            data = pickle.load(fh)
+        for key, (kind, payload) in data["entities"].items():
+            cls = repo.entities[key]
+            if kind == "columnar":
+                repo.replace_rows(key, repo.columnar_types[key].from_state(cls, payload))
+            else:
+                repo.replace_rows(key, _decode_rows(cls, payload))
+        for name, value in data["counters"].items():
+            repo.advance_counter(name, value)
+        return data["seq"], data.get("journal")
+
+    def _replay(self, replay: _Replay, position: tuple | None):
+        # position (gravada no snapshot): segmento, offset e registros antes
+        # dele; a leitura recomeça ali sem percorrer o trecho já coberto.
+        names = self._names("journal-", ".log")
+        firsts = [_seq_of(n) for n in names]
+        after = self.seq
+        if names and firsts[0] > after + 1:
+            raise ValueError(f"Diário de estado incompleto: começa em {firsts[0]}, snapshot em {after}.")
+        for i, name in enumerate(names):
+            if i + 1 < len(names) and firsts[i + 1] <= after + 1:
+                continue  # segmento inteiro coberto pelo snapshot
+            last = i == len(names) - 1
+            start = position[1:] if position and position[0] == firsts[i] else (0, 0)
+            good = self._replay_segment(replay, self._path(name), after, last, *start)
+            if last:
+                self._open_active(firsts[i], self._path(name), good)
+        if self._file is None:
+            self._open_active(self.seq + 1, self._path(_segment_name(self.seq + 1)), 0)
+
+    def _replay_segment(self, replay: _Replay, path: str, after: int, last: bool,
+                        start: int = 0, count: int = 0) -> int:
+        # Devolve o fim do último registro válido. Registro incompleto ou com
+        # CRC divergente só é tolerado no fim do último segmento (queda
+        # durante a escrita); nos demais é corrupção.
+        with open(path, "rb") as fh:
+            if start > os.fstat(fh.fileno()).st_size:
+                # Diário sem fsync perdeu o fim após a queda: lê do início.
+                start, count = 0, 0
+            fh.seek(start)
+            data = memoryview(fh.read())
+        pos, header = 0, _HEADER.size
+        while pos + header <= len(data):
+            size, crc, seq = _HEADER.unpack_from(data, pos)
+            payload = data[pos + header:pos + header + size]
+            if len(payload) < size or zlib.crc32(payload, seq & 0xFFFFFFFF) != crc:
+                break
+            if seq > after:
+                replay.apply(pickle.loads(payload))
+                self.seq = seq
+            pos += header + size
+            count += 1
+        if pos != len(data) and not last:
+            raise ValueError(f"Diário de estado corrompido: {path} (offset {start + pos})")
+        self._count = count
+        return start + pos
+
+    def _open_active(self, first_seq: int, path: str, size: int):
+        self._file = open(path, "ab")
+        self._first, self._size = first_seq, size
+        if self._file.tell() != size:
+            self._file.truncate(size)
+            self._file.seek(size)
+
+    # ------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------
+
+    def append(self, ops: list) -> int:
+        payload = pickle.dumps(ops, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if self._file is None:
+                raise RuntimeError("StateStore.restore() deve ser chamado antes de append().")
+            if self._count >= self.segment_size:
+                self._roll()
+            self.seq += 1
+            seq = self.seq
+            # O seq entra como semente do CRC: registro fora de lugar não confere.
+            record = _HEADER.pack(len(payload), zlib.crc32(payload, seq & 0xFFFFFFFF), seq) + payload
+            self._file.write(record)
+            self._size += len(record)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._count += 1
+            if (self.snapshot_every and seq - self.snapshot_seq >= self.snapshot_every
+                    and self._snapshotting is None):
+                self._snapshotting = threading.Thread(target=self._snapshot_background, daemon=True,
+                                                      name="state-snapshot")
+                self._snapshotting.start()
+        return seq
+
+    def _roll(self):
+        self._file.close()
+        self._open_active(self.seq + 1, self._path(_segment_name(self.seq + 1)), 0)
+        self._count = 0
+
+    def close(self):
+        thread = self._snapshotting
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    # ------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------
+
+    def _snapshot_background(self):
+        try:
+            self.snapshot()
+        except Exception as e:  # noqa: BLE001 – a escrita segue; o diário cobre o estado
+            self.last_error = f"snapshot: {e}"
+        finally:
+            self._snapshotting = None
+
+    def _capture(self) -> tuple[int, tuple, dict, dict]:
+        # Com todas as entidades travadas: nenhuma escrita pela metade e o seq
+        # lido corresponde exatamente ao estado capturado. Só referências e
+        # cópias rasas (listas de registros imutáveis, visões do razão).
+        repo = self.repo
+        with repo.transaction(*repo.entities):
+            with self.lock:
+                seq = self.seq
+                position = (self._first, self._size, self._count)
+            entities = {}
+            for key in repo.entities:
+                if key in repo.columnar_types:
+                    entities[key] = ("columnar", repo.columnar(key).state())
+                else:
+                    entities[key] = ("rows", repo.fetch(key))
+            counters = {name: repo.get_counter(name) for name in self.counters}
+        return seq, position, entities, counters
+
+    def snapshot(self) -> dict:
+        if self.repo is None:
+            raise RuntimeError("StateStore.restore() deve ser chamado antes de snapshot().")
+        with self.snapshot_lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict:
+        t0 = time.perf_counter()
+        seq, position, entities, counters = self._capture()
+        captured = time.perf_counter() - t0
+        with _no_gc():
+            for key, (kind, payload) in entities.items():
+                if kind == "rows":
+                    entities[key] = (kind, _encode_rows(self.repo.entities[key], payload))
+            path = self._path(_snapshot_name(seq))
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(_SNAPSHOT_MAGIC)
+                pickle.dump({"seq": seq, "created": int(time.time()), "journal": position,
+                             "counters": counters, "entities": entities}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, path)
+        with self.lock:
+            self.snapshot_seq = max(self.snapshot_seq, seq)
+        removed = self._prune()
+        self.last_snapshot = {"seq": seq, "captura_s": captured, "total_s": time.perf_counter() - t0,
+                              "bytes": os.path.getsize(path), "segmentos_removidos": removed}
+        return self.last_snapshot
+
+    def _prune(self) -> int:
+        # Mantém keep_snapshots snapshots; com prune, apaga os segmentos do
+        # diário inteiramente cobertos pelo mais antigo deles.
+        snapshots = self._names("snapshot-", ".snap")
+        for name in snapshots[:-self.keep_snapshots]:
+            os.remove(self._path(name))
+        if not self.prune:
+            return 0
+        oldest = _seq_of(snapshots[-self.keep_snapshots:][0]) if snapshots else 0
+        removed = 0
+        with self.lock:
+            names = self._names("journal-", ".log")
+            for name, nxt in zip(names, names[1:]):
+                if _seq_of(nxt) - 1 > oldest:
+                    break
+                os.remove(self._path(name))
+                removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        with self.lock:
+            journal = self._names("journal-", ".log")
+            snapshots = self._names("snapshot-", ".snap")
+            return {
+                "seq": self.seq,
+                "snapshot_seq": self.snapshot_seq,
+                "desde_snapshot": self.seq - self.snapshot_seq,
+                "segmentos": len(journal),
+                "diario_bytes": sum(os.path.getsize(self._path(n)) for n in journal),
+                "snapshots": len(snapshots),
+                "snapshot_bytes": os.path.getsize(self._path(snapshots[-1])) if snapshots else 0,
+                "snapshot_em_curso": self._snapshotting is not None,
+                "erro": self.last_error,
+            }
@@ -0,0 +1,741 @@
+import bisect
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass, fields, replace
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from erp.metrics import timed
+
+# ============================================================
+# REPOSITÓRIO – CAMADA DE PERSISTÊNCIA PLUGÁVEL
+# ============================================================
+# Cada entidade é identificada por uma chave ("companies", "ledger", ...)
+# associada ao seu dataclass. Os backends expõem a mesma interface:
+# next_id / insert / insert_many / update_many / fetch / count / aggregate /
+# transaction. transaction(*keys) recebe as entidades que serão escritas;
+# só o backend compartilhado usa essa informação (um lock por entidade).
+
+
+@dataclass(frozen=True)
+class Between:
+    # Filtro de intervalo fechado; None deixa o lado em aberto.
+    lo: object = None
+    hi: object = None
+
+
+@dataclass(frozen=True)
+class Prefix:
+    # Filtro por prefixo de texto (ex.: código de conta "1.1").
+    value: str
+
+
+@dataclass(frozen=True)
+class In:
+    # Filtro por lista de valores (ex.: ids de uma baixa em lote).
+    values: frozenset
+
+    def __init__(self, values):
+        object.__setattr__(self, "values", frozenset(values))
+
+
+def matches(value, cond) -> bool:
+    if isinstance(cond, Between):
+        return value is not None and (cond.lo is None or value >= cond.lo) and (cond.hi is None or value <= cond.hi)
+    if isinstance(cond, Prefix):
+        return value is not None and value.startswith(cond.value)
+    if isinstance(cond, In):
+        return value in cond.values
+    return value == cond
+
+
+class LockStats:
+    # RLock que conta aquisições, esperas (contenção) e tempo esperando.
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            t0 = time.perf_counter()
+            self._lock.acquire()
+            self.contended += 1
+            self.wait_seconds += time.perf_counter() - t0
+        self.acquisitions += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def _lock_rows(locks) -> list[dict]:
+    return [
+        {"lock": name, "aquisicoes": s.acquisitions, "contencoes": s.contended,
+         "espera_ms": s.wait_seconds * 1000}
+        for name, s in locks if s.acquisitions
+    ]
+
+
+def _base_type(tp):
+    # "int | None" -> int
+    args = getattr(tp, "__args__", None)
+    if args:
+        return next(a for a in args if a is not type(None))
+    return tp
+
+
+class Repository:
+    mode = "abstract"
+
+    def __init__(self, entities: dict[str, type], columnar: dict[str, type] | None = None):
+        self.entities = entities
+        # Entidades com armazenamento colunar em memória (ex.: "ledger" ->
+        # ColumnarLedger); construídas com o dataclass da entidade.
+        self.columnar_types = columnar or {}
+        # Estruturas derivadas (índices, visões materializadas...) mantidas
+        # pelos add_* e reconstruídas a partir do repositório quando ausentes.
+        self.views: dict = {}
+        # Serviços de longa duração (log de eventos, despacho de webhooks):
+        # ao contrário das visões, nunca são descartados num rollback.
+        self.services: dict = {}
+        # Versão por entidade, incrementada a cada escrita; usada pelos caches
+        # para saber se podem reaproveitar o que já montaram.
+        self.versions: dict[str, int] = {}
+        self.lock = LockStats()
+
+    def version(self, key: str) -> int:
+        return self.versions.get(key, 0)
+
+    def lock_stats(self) -> list[dict]:
+        return _lock_rows([("repositorio", self.lock)])
+
+    def _touch(self, key: str):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def memory_usage(self) -> dict[str, int]:
+        # Bytes mantidos em memória do processo por entidade (estimativa).
+        return {}
+
+    def columnar(self, key: str):
+        raise NotImplementedError
+
+    def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    def inc_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    def next_id(self, key: str) -> int:
+        return self.next_ids(key, 1)
+
+    def advance_counter(self, key: str, value: int):
+        # Garante que o próximo id reservado seja >= value (restauração de estado).
+        raise NotImplementedError
+
+    def next_ids(self, key: str, n: int) -> int:
+        # Reserva um bloco de n ids consecutivos e devolve o primeiro.
+        raise NotImplementedError
+
+    def insert(self, key: str, obj):
+        self.insert_many(key, [obj])
+
+    def insert_many(self, key: str, objs):
+        raise NotImplementedError
+
+    def insert_columns(self, key: str, columns: dict):
+        # Inserção em bloco a partir de colunas alinhadas (arrays NumPy ou
+        # listas; inteiros anuláveis como listas com None).
+        cls = self.entities[key]
+        names = list(columns)
+        values = [_pylist(columns[n]) for n in names]
+        self.insert_many(key, [cls(**dict(zip(names, row))) for row in zip(*values)])
+
+    def update(self, key: str, obj_id: int, changes: dict):
+        self.update_many(key, [obj_id], changes)
+
+    def update_many(self, key: str, ids, changes: dict, where: dict | None = None) -> list[int]:
+        # Aplica os mesmos valores (ex.: {"status": "Pago"}) a vários ids.
+        # Com where, só altera as linhas que ainda atendem ao filtro (controle
+        # otimista, compare-and-set) e devolve os ids efetivamente alterados.
+        raise NotImplementedError
+
+    def fetch(self, key: str, where: dict | None = None, limit: int | None = None,
+              offset: int = 0, desc: bool = False, after_id: int | None = None,
+              order_by: str = "id") -> list:
+        # where: {coluna: valor | Between | Prefix}, combinados com AND.
+        raise NotImplementedError
+
+    def count(self, key: str, where: dict | None = None) -> int:
+        raise NotImplementedError
+
+    def scan(self, key: str, where: dict | None = None, size: int = 50_000):
+        # Percorre a entidade em blocos de até size linhas, em ordem de id
+        # (paginação por id, sem OFFSET): memória limitada ao bloco corrente.
+        after_id = None
+        while rows := self.fetch(key, where, limit=size, after_id=after_id):
+            yield rows
+            after_id = rows[-1].id
+
+    @timed("dataframe.fetch_frame")
+    def fetch_frame(self, key: str, where: dict | None = None, limit: int | None = None,
+                    offset: int = 0, desc: bool = False, order_by: str = "id") -> pd.DataFrame:
+        # Página já como DataFrame; entidades colunares filtram nos arrays.
+        if key in self.columnar_types:
+            return self.columnar(key).select(where, order_by, desc, limit, offset)
+        rows = self.fetch(key, where, limit, offset, desc, order_by=order_by)
+        return pd.DataFrame([asdict(r) for r in rows], columns=[f.name for f in fields(self.entities[key])])
+
+    def aggregate(self, key: str, group_by: str, columns: list[str]) -> list[tuple]:
+        # Retorna [(grupo, soma_col1, soma_col2, ...)] ordenado por grupo.
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self, *keys: str):
+        with self.lock:
+            yield self
+
+
+# ------------------------------------------------------------
+# Backend em memória (modo original: listas no session_state)
+# ------------------------------------------------------------
+
+class MemoryRepository(Repository):
+    mode = "memory"
+
+    def __init__(self, entities: dict[str, type], state=None, columnar: dict[str, type] | None = None):
+        super().__init__(entities, columnar)
+        self.state = state if state is not None else {}
+
+    def _rows(self, key: str):
+        if key not in self.state:
+            factory = self.columnar_types.get(key)
+            self.state[key] = factory(self.entities[key]) if factory else []
+        return self.state[key]
+
+    def columnar(self, key: str):
+        return self._rows(key)
+
+    def get_counter(self, key: str) -> int:
+        if key not in self.state:
+            self.state[key] = 1
+        return self.state[key]
+
+    def inc_counter(self, key: str) -> int:
+        self.state[key] = self.get_counter(key) + 1
+        return self.state[key]
+
+    def next_ids(self, key: str, n: int) -> int:
+        with self.lock:
+            first = self.get_counter(key)
+            self.state[key] = first + n
+            return first
+
+    def advance_counter(self, key: str, value: int):
+        with self.lock:
+            if self.get_counter(key) < value:
+                self.state[key] = value
+
+    def insert_many(self, key: str, objs):
+        with self._write_lock(key):
+            self._rows(key).extend(objs)
+            self._touch(key)
+
+    def replace_rows(self, key: str, rows):
+        # Troca o conteúdo inteiro da entidade (lista ou armazenamento colunar
+        # carregado de um snapshot).
+        with self._write_lock(key):
+            self.state[key] = rows
+            self._touch(key)
+
+    def insert_columns(self, key: str, columns: dict):
+        if key not in self.columnar_types:
+            return super().insert_columns(key, columns)
+        with self._write_lock(key):
+            self._rows(key).append_columns(**columns)
+            self._touch(key)
+
+    def _write_lock(self, key: str):
+        return self.lock
+
+    def memory_usage(self) -> dict[str, int]:
+        usage = {}
+        for key in self.entities:
+            rows = self.state.get(key)
+            if rows is None:
+                continue
+            usage[key] = rows.nbytes if key in self.columnar_types else _rows_nbytes(rows)
+        return usage
+
+    def update_many(self, key: str, ids, changes: dict, where: dict | None = None) -> list[int]:
+        if key in self.columnar_types:
+            raise NotImplementedError(f"{key} é append-only")
+        items = list((where or {}).items())
+        updated = []
+        with self._write_lock(key):
+            rows = self._rows(key)
+            for obj_id in ids:
+                i = bisect.bisect_left(rows, obj_id, key=lambda r: r.id)
+                if i < len(rows) and rows[i].id == obj_id:
+                    row = rows[i]
+                    if all(matches(getattr(row, c), v) for c, v in items):
+                        # Cópia na escrita: leitores seguem vendo a versão anterior inteira.
+                        rows[i] = replace(row, **changes)
+                        updated.append(obj_id)
+            self._touch(key)
+        return updated
+
+    def _filtered(self, key: str, where: dict | None, after_id: int | None = None):
+        rows = self._rows(key)
+        if where and isinstance(where.get("id"), In) and key not in self.columnar_types:
+            # Busca por lista de ids: bisect por id em vez de varrer a entidade.
+            found = []
+            for obj_id in sorted(where["id"].values):
+                i = bisect.bisect_left(rows, obj_id, key=lambda r: r.id)
+                if i < len(rows) and rows[i].id == obj_id:
+                    found.append(rows[i])
+            rows = found
+            where = {c: v for c, v in where.items() if c != "id"}
+        if after_id is not None:
+            # Linhas são anexadas em ordem de id: busca binária pelo ponto de corte.
+            rows = rows[bisect.bisect_right(rows, after_id, key=lambda r: r.id):]
+        if not where:
+            return rows
+        items = list(where.items())
+        return [r for r in rows if all(matches(getattr(r, c), v) for c, v in items)]
+
+    def fetch(self, key: str, where: dict | None = None, limit: int | None = None,
+              offset: int = 0, desc: bool = False, after_id: int | None = None,
+              order_by: str = "id") -> list:
+        rows = self._filtered(key, where, after_id)
+        if order_by != "id":
+            rows = sorted(rows, key=lambda r: (getattr(r, order_by) is None, getattr(r, order_by), r.id),
+                          reverse=desc)
+            desc = False
+        end = None if limit is None else offset + limit
+        if desc:
+            # Fatia pelo fim sem inverter a coleção inteira.
+            n = len(rows)
+            start = 0 if end is None else max(n - end, 0)
+            return rows[start:max(n - offset, 0)][::-1]
+        return rows[offset:end]
+
+    def scan(self, key: str, where: dict | None = None, size: int = 50_000):
+        # Filtra fatia a fatia em vez de montar a lista inteira de uma vez.
+        rows = self._rows(key)
+        items = list((where or {}).items())
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            if items:
+                chunk = [r for r in chunk if all(matches(getattr(r, c), v) for c, v in items)]
+            if chunk:
+                yield chunk
+
+    def count(self, key: str, where: dict | None = None) -> int:
+        if not where:
+            return len(self._rows(key))
+        if key in self.columnar_types:
+            return self._rows(key).count(where)
+        return len(self._filtered(key, where))
+
+    @timed("groupby.aggregate")
+    def aggregate(self, key: str, group_by: str, columns: list[str]) -> list[tuple]:
+        rows = self._rows(key)
+        if key in self.columnar_types:
+            df = rows.frame(columns=[group_by, *columns]).groupby(group_by, observed=True)[columns].sum().sort_index()
+            return list(df.itertuples(name=None))
+        acc: dict = {}
+        for r in rows:
+            sums = acc.setdefault(getattr(r, group_by), [0.0] * len(columns))
+            for i, c in enumerate(columns):
+                sums[i] += getattr(r, c)
+        return [(g, *sums) for g, sums in sorted(acc.items())]
+
+
+# ------------------------------------------------------------
+# Backend em memória compartilhado pelo processo (todas as sessões)
+# ------------------------------------------------------------
+
+class SharedMemoryRepository(MemoryRepository):
+    # Escritas serializadas por um lock por entidade (transaction(*keys)
+    # trava as entidades declaradas, sempre em ordem alfabética para não
+    # haver deadlock); ids reservados atomicamente em blocos. Leituras não
+    # travam: linhas são anexadas e alteradas por cópia (update_many troca o
+    # objeto inteiro), então um leitor nunca vê uma linha pela metade.
+    mode = "shared"
+
+    def __init__(self, entities: dict[str, type], columnar: dict[str, type] | None = None):
+        super().__init__(entities, {}, columnar)
+        self.entity_locks = {k: LockStats() for k in entities}
+        self.counter_lock = LockStats()
+        for key in entities:
+            self._rows(key)
+
+    def _write_lock(self, key: str):
+        return self.entity_locks[key]
+
+    @contextmanager
+    def transaction(self, *keys: str):
+        with ExitStack() as stack:
+            for key in sorted(set(keys)):
+                stack.enter_context(self.entity_locks[key])
+            yield self
+
+    def get_counter(self, key: str) -> int:
+        with self.counter_lock:
+            return self.state.setdefault(key, 1)
+
+    def inc_counter(self, key: str) -> int:
+        return self.next_ids(key, 1) + 1
+
+    def next_ids(self, key: str, n: int) -> int:
+        # Busca-e-soma atômica: nenhuma outra sessão recebe ids do bloco.
+        with self.counter_lock:
+            first = self.state.setdefault(key, 1)
+            self.state[key] = first + n
+            return first
+
+    def advance_counter(self, key: str, value: int):
+        with self.counter_lock:
+            if self.state.setdefault(key, 1) < value:
+                self.state[key] = value
+
+    def lock_stats(self) -> list[dict]:
+        return _lock_rows([*self.entity_locks.items(), ("contadores", self.counter_lock),
+                           ("repositorio", self.lock)])
+
+
+_SHARED_REPOS: dict[tuple, SharedMemoryRepository] = {}
+_SHARED_REPOS_LOCK = threading.Lock()
+
+
+def open_shared_repository(entities: dict[str, type],
+                           columnar: dict[str, type] | None = None) -> SharedMemoryRepository:
+    # Um repositório por processo, visto por todas as sessões do Streamlit.
+    key = tuple(entities)
+    with _SHARED_REPOS_LOCK:
+        repo = _SHARED_REPOS.get(key)
+        if repo is None:
+            repo = _SHARED_REPOS[key] = SharedMemoryRepository(entities, columnar)
+        return repo
+
+
+# ------------------------------------------------------------
+# Backend SQLite (WAL, uma conexão por processo, transações em lote)
+# ------------------------------------------------------------
+
+_SQL_TYPES = {int: "INTEGER", float: "REAL", bool: "INTEGER", str: "TEXT",
+              date: "TEXT", datetime: "TEXT"}
+
+
+def _encoder(tp):
+    if tp in (date, datetime):
+        return lambda v: None if v is None else v.isoformat()
+    if tp is bool:
+        return lambda v: None if v is None else int(v)
+    return None
+
+
+def _decoder(tp):
+    if tp is datetime:
+        return lambda v: None if v is None else datetime.fromisoformat(v)
+    if tp is date:
+        return lambda v: None if v is None else date.fromisoformat(v)
+    if tp is bool:
+        return lambda v: None if v is None else bool(v)
+    return None
+
+
+def _pylist(values) -> list:
+    # Arrays NumPy -> objetos Python (datetime64[D] vira date).
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == "M":
+            values = values.astype("datetime64[D]")
+        return values.tolist()
+    return list(values)
+
+
+def _rows_nbytes(rows: list, sample: int = 64) -> int:
+    # Lista de dataclasses: tamanho médio de uma amostra de linhas (objeto,
+    # __dict__ se houver e valores) vezes o número de linhas, mais a lista.
+    if not rows:
+        return sys.getsizeof(rows)
+    step = max(1, len(rows) // sample)
+    picked = rows[::step][:sample]
+    per_row = 0
+    for r in picked:
+        per_row += sys.getsizeof(r) + (sys.getsizeof(r.__dict__) if hasattr(r, "__dict__") else 0)
+        per_row += sum(sys.getsizeof(getattr(r, f.name)) for f in fields(r))
+    return sys.getsizeof(rows) + per_row * len(rows) // len(picked)
+
+
+def _sql_param(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+class _Table:
+    def __init__(self, key: str, cls: type, indexes: list[tuple] | None = None):
+        self.key = key
+        self.cls = cls
+        self.indexes = indexes or []
+        flds = fields(cls)
+        self.columns = [f.name for f in flds]
+        types = [_base_type(f.type) for f in flds]
+        self.sql_types = [_SQL_TYPES.get(t, "TEXT") for t in types]
+        self.encoders = [(i, e) for i, e in enumerate(map(_encoder, types)) if e]
+        self.decoders = [(i, d) for i, d in enumerate(map(_decoder, types)) if d]
+        # SQL montado uma única vez por entidade: o cache de statements do
+        # sqlite3 reaproveita o prepared statement em todas as chamadas.
+        cols = ", ".join(self.columns)
+        marks = ", ".join("?" for _ in self.columns)
+        self.insert_sql = f"INSERT INTO {key} ({cols}) VALUES ({marks})"
+        self.select_sql = f"SELECT {cols} FROM {key}"
+
+    def ddl(self) -> list[str]:
+        cols = ", ".join(
+            f"{c} {t}{' PRIMARY KEY' if c == 'id' else ''}"
+            for c, t in zip(self.columns, self.sql_types)
+        )
+        stmts = [f"CREATE TABLE IF NOT EXISTS {self.key} ({cols})"]
+        if "company_id" in self.columns:
+            stmts.append(
+                f"CREATE INDEX IF NOT EXISTS ix_{self.key}_company ON {self.key} (company_id)"
+            )
+        for cols in self.indexes:
+            stmts.append(
+                f"CREATE INDEX IF NOT EXISTS ix_{self.key}_{'_'.join(cols)} ON {self.key} ({', '.join(cols)})"
+            )
+        return stmts
+
+    def encode(self, obj) -> tuple:
+        row = [getattr(obj, c) for c in self.columns]
+        for i, enc in self.encoders:
+            row[i] = enc(row[i])
+        return row
+
+    def decode(self, row):
+        row = list(row)
+        for i, dec in self.decoders:
+            row[i] = dec(row[i])
+        return self.cls(*row)
+
+
+class SQLiteRepository(Repository):
+    mode = "sqlite"
+
+    def __init__(self, entities: dict[str, type], path: str, columnar: dict[str, type] | None = None,
+                 indexes: dict[str, list[tuple]] | None = None):
+        super().__init__(entities, columnar)
+        self.path = path
+        # Uma única conexão compartilhada pelas threads do servidor Streamlit;
+        # o acesso é serializado por self.lock.
+        self.conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, cached_statements=512
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        indexes = indexes or {}
+        self.tables = {k: _Table(k, cls, indexes.get(k)) for k, cls in entities.items()}
+        self._depth = 0
+        # Espelhos colunares em memória, carregados sob demanda e mantidos
+        # em sincronia pelos inserts.
+        self._mirrors: dict = {}
+        with self.transaction():
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            for t in self.tables.values():
+                for stmt in t.ddl():
+                    self.conn.execute(stmt)
+
+    @contextmanager
+    def transaction(self, *keys: str):
+        # Uma conexão por processo: o SQLite já serializa os escritores, então
+        # as entidades declaradas não mudam nada aqui.
+        with self.lock:
+            outer = self._depth == 0
+            if outer:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self.conn.execute("ROLLBACK")
+                    # Espelhos e visões podem ter recebido linhas descartadas.
+                    self._mirrors.clear()
+                    self.views.clear()
+                raise
+            self._depth -= 1
+            if outer:
+                self.conn.execute("COMMIT")
+
+    def get_counter(self, key: str) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.conn.execute("INSERT INTO counters (key, value) VALUES (?, 1)", (key,))
+                return 1
+            return row[0]
+
+    def inc_counter(self, key: str) -> int:
+        with self.transaction():
+            self.get_counter(key)
+            self.conn.execute("UPDATE counters SET value = value + 1 WHERE key = ?", (key,))
+            return self.get_counter(key)
+
+    def next_ids(self, key: str, n: int) -> int:
+        with self.transaction():
+            self.get_counter(key)
+            row = self.conn.execute(
+                "UPDATE counters SET value = value + ? WHERE key = ? RETURNING value", (n, key)
+            ).fetchone()
+            return row[0] - n
+
+    def memory_usage(self) -> dict[str, int]:
+        # As tabelas ficam no arquivo; em memória só os espelhos colunares.
+        return {key: mirror.nbytes for key, mirror in list(self._mirrors.items())}
+
+    def columnar(self, key: str):
+        with self.lock:
+            mirror = self._mirrors.get(key)
+            if mirror is None:
+                table = self.tables[key]
+                mirror = self.columnar_types[key](self.entities[key])
+                cur = self.conn.execute(f"{table.select_sql} ORDER BY id")
+                while chunk := cur.fetchmany(50_000):
+                    mirror.extend(table.decode(r) for r in chunk)
+                self._mirrors[key] = mirror
+            return mirror
+
+    def insert_many(self, key: str, objs):
+        table = self.tables[key]
+        mirror = self._mirrors.get(key)
+        if mirror is not None:
+            objs = list(objs)
+        with self.transaction():
+            self.conn.executemany(table.insert_sql, (table.encode(o) for o in objs))
+            if mirror is not None:
+                mirror.extend(objs)
+            self._touch(key)
+
+    def insert_columns(self, key: str, columns: dict):
+        table = self.tables[key]
+        values = [_pylist(columns[c]) for c in table.columns]
+        for i, enc in table.encoders:
+            values[i] = [enc(v) for v in values[i]]
+        mirror = self._mirrors.get(key)
+        with self.transaction():
+            self.conn.executemany(table.insert_sql, zip(*values))
+            if mirror is not None:
+                mirror.append_columns(**columns)
+            self._touch(key)
+
+    def update_many(self, key: str, ids, changes: dict, where: dict | None = None) -> list[int]:
+        if key in self.columnar_types:
+            raise NotImplementedError(f"{key} é append-only")
+        table = self.tables[key]
+        for c in list(changes) + list(where or {}):
+            if c not in table.columns:
+                raise ValueError(f"Coluna inválida: {c}")
+        assignments = ", ".join(f"{c} = ?" for c in changes)
+        values = [_sql_param(v) for v in changes.values()]
+        clause, params = self._where(where)
+        ids = [int(i) for i in ids]
+        updated = []
+        with self.transaction():
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                sql = (f"UPDATE {key} SET {assignments}{clause}"
+                       f"{' AND' if clause else ' WHERE'} id IN ({', '.join('?' * len(chunk))}) RETURNING id")
+                updated += [r[0] for r in self.conn.execute(sql, values + params + chunk).fetchall()]
+            self._touch(key)
+        return updated
+
+    def _where(self, where: dict | None):
+        if not where:
+            return "", []
+        terms, params = [], []
+        for c, v in where.items():
+            if v is None:
+                terms.append(f"{c} IS NULL")
+            elif isinstance(v, Between):
+                if v.lo is not None:
+                    terms.append(f"{c} >= ?")
+                    params.append(_sql_param(v.lo))
+                if v.hi is not None:
+                    terms.append(f"{c} <= ?")
+                    params.append(_sql_param(v.hi))
+            elif isinstance(v, Prefix):
+                terms.append(f"substr({c}, 1, ?) = ?")
+                params += [len(v.value), v.value]
+            elif isinstance(v, In):
+                if not v.values:
+                    terms.append("0")
+                    continue
+                terms.append(f"{c} IN ({', '.join('?' * len(v.values))})")
+                params += [_sql_param(x) for x in v.values]
+            else:
+                terms.append(f"{c} = ?")
+                params.append(_sql_param(v))
+        return (f" WHERE {' AND '.join(terms)}" if terms else ""), params
+
+    def fetch(self, key: str, where: dict | None = None, limit: int | None = None,
+              offset: int = 0, desc: bool = False, after_id: int | None = None,
+              order_by: str = "id") -> list:
+        table = self.tables[key]
+        clause, params = self._where(where)
+        if after_id is not None:
+            clause += f"{' AND' if clause else ' WHERE'} id > ?"
+            params.append(after_id)
+        if order_by not in table.columns:
+            raise ValueError(f"Coluna de ordenação inválida: {order_by}")
+        direction = " DESC" if desc else ""
+        order = f"{order_by}{direction}, id{direction}" if order_by != "id" else f"id{direction}"
+        sql = f"{table.select_sql}{clause} ORDER BY {order}"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [table.decode(r) for r in rows]
+
+    def count(self, key: str, where: dict | None = None) -> int:
+        if where and key in self.columnar_types:
+            return self.columnar(key).count(where)
+        clause, params = self._where(where)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {key}{clause}", params).fetchone()[0]
+
+    @timed("groupby.aggregate")
+    def aggregate(self, key: str, group_by: str, columns: list[str]) -> list[tuple]:
+        sums = ", ".join(f"TOTAL({c})" for c in columns)
+        sql = f"SELECT {group_by}, {sums} FROM {key} GROUP BY {group_by} ORDER BY {group_by}"
+        with self.lock:
+            return [tuple(r) for r in self.conn.execute(sql).fetchall()]
+
+
+_SQLITE_REPOS: dict[str, SQLiteRepository] = {}
+_SQLITE_REPOS_LOCK = threading.Lock()
+
+
+def open_sqlite_repository(path: str, entities: dict[str, type],
+                           columnar: dict[str, type] | None = None,
+                           indexes: dict[str, list[tuple]] | None = None) -> SQLiteRepository:
+    # Uma conexão por processo (e por arquivo), compartilhada entre sessões.
+    key = os.path.abspath(path)
+    with _SQLITE_REPOS_LOCK:
+        repo = _SQLITE_REPOS.get(key)
+        if repo is None:
+            repo = _SQLITE_REPOS[key] = SQLiteRepository(entities, path, columnar, indexes)
+        return repo
@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+# ============================================================
+# DESPACHO DE WEBHOOKS – ASYNCIO EM THREAD DEDICADA
+# ============================================================
+# O log de eventos chama publish() a cada evento; publish só agenda o
+# evento no loop do despachante (nunca bloqueia o rerun do Streamlit).
+# Cada assinante tem uma fila limitada e um worker que agrupa eventos em
+# lotes (batch_size ou max_wait) e os envia por POST com pool de conexões
+# HTTP/1.1 keep-alive, concorrência limitada, retentativas com backoff
+# exponencial e fila de dead-letter. Com segredo, cada lote leva
+# X-ERP-Timestamp e X-ERP-Signature (sha256=HMAC de "<timestamp>.<corpo>").
+
+
+_QUEUE_FULL = "fila do assinante cheia"
+
+
+@dataclass
+class Subscriber:
+    name: str
+    url: str
+    entity_types: frozenset[str] | None = None  # None = todos os eventos
+    batch_size: int = 100
+    max_wait: float = 1.0
+    queue_size: int = 10_000
+    secret: str = ""  # vazio = lotes sem assinatura
+
+    def wants(self, event: dict) -> bool:
+        return self.entity_types is None or event["entity_type"] in self.entity_types
+
+
+@dataclass
+class DeadLetter:
+    subscriber: str
+    events: list[dict]
+    error: str
+    attempts: int
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class SubscriberStats:
+    delivered: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    dropped: int = 0
+    dead_events: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=10_000))
+    first_publish: float | None = None
+    last_delivery: float | None = None
+
+    def percentile(self, p: float) -> float | None:
+        if not self.latencies:
+            return None
+        data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))]
+
+    @property
+    def throughput(self) -> float:
+        if not self.delivered or self.first_publish is None or self.last_delivery is None:
+            return 0.0
+        return self.delivered / max(self.last_delivery - self.first_publish, 1e-9)
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode("utf-8"), timestamp.encode("ascii") + b"." + body, hashlib.sha256)
+    return f"sha256={digest.hexdigest()}"
+
+
+# ------------------------------------------------------------
+# Cliente HTTP/1.1 mínimo com pool de conexões por host
+# ------------------------------------------------------------
+
+class HttpPool:
+    def __init__(self, size: int = 4, timeout: float = 10.0):
+        self.size = size
+        self.timeout = timeout
+        self._idle: dict[tuple, list] = {}
+        self._slots: dict[tuple, asyncio.Semaphore] = {}
+
+    async def post(self, url: str, body: bytes, headers: dict | None = None) -> int:
+        u = urlsplit(url)
+        secure = u.scheme == "https"
+        key = (u.hostname, u.port or (443 if secure else 80), secure)
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.size))
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: {u.netloc}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n"
+            + "".join(f"{k}: {v}\r\n" for k, v in (headers or {}).items())
+            + "\r\n"
+        ).encode("latin-1")
+        async with slots:
+            idle = self._idle.setdefault(key, [])
+            while idle:
+                # Conexão ociosa pode ter sido fechada pelo servidor: tenta e, se
+                # falhar, segue para uma nova.
+                conn = idle.pop()
+                try:
+                    return await self._send(key, conn, head + body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    continue
+            conn = await asyncio.wait_for(
+                asyncio.open_connection(key[0], key[1], ssl=secure or None), self.timeout
+            )
+            return await self._send(key, conn, head + body)
+
+    async def _send(self, key: tuple, conn, payload: bytes) -> int:
+        reader, writer = conn
+        try:
+            writer.write(payload)
+            await writer.drain()
+            status, keep_alive = await asyncio.wait_for(self._read_response(reader), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle[key].append(conn)
+        else:
+            writer.close()
+        return status
+
+    async def _read_response(self, reader) -> tuple[int, bool]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("conexão encerrada pelo servidor")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while size := int((await reader.readline()).split(b";")[0], 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        elif "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        else:
+            await reader.read()
+            return int(status), False
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        return int(status), keep_alive
+
+    def close(self):
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+
+# ------------------------------------------------------------
+# Despachante
+# ------------------------------------------------------------
+
+class WebhookDispatcher:
+    def __init__(self, concurrency: int = 8, max_retries: int = 5, base_backoff: float = 0.5,
+                 max_backoff: float = 30.0, timeout: float = 10.0, pool_size: int = 4,
+                 dead_letter_size: int = 1_000):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.subscribers: dict[str, Subscriber] = {}
+        self.stats: dict[str, SubscriberStats] = {}
+        self.dead_letters: deque[DeadLetter] = deque(maxlen=dead_letter_size)
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="webhook-dispatcher", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._pool = HttpPool(self.pool_size, self.timeout)
+        self._ready.set()
+        self.loop.run_forever()
+
+    # ---------------- API chamada de outras threads ----------------
+
+    def add_subscriber(self, sub: Subscriber):
+        asyncio.run_coroutine_threadsafe(self._add(sub), self.loop).result()
+
+    def remove_subscriber(self, name: str):
+        asyncio.run_coroutine_threadsafe(self._remove(name), self.loop).result()
+
+    def publish(self, event: dict):
+        if self.subscribers:
+            self.loop.call_soon_threadsafe(self._enqueue, event, time.monotonic())
+
+    def retry_dead_letters(self) -> int:
+        letters = list(self.dead_letters)
+        self.dead_letters.clear()
+        now = time.monotonic()
+        for letter in letters:
+            if letter.subscriber in self.subscribers:
+                for event in letter.events:
+                    self.loop.call_soon_threadsafe(self._enqueue_one, letter.subscriber, event, now)
+        return len(letters)
+
+    def pending(self) -> dict[str, int]:
+        return {name: q.qsize() for name, q in self._queues.items()}
+
+    def stop(self):
+        async def shutdown():
+            # Workers e entregas em curso (inclusive esperando retentativa).
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._pool.close()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+    # ---------------- dentro do loop ----------------
+
+    async def _add(self, sub: Subscriber):
+        await self._remove(sub.name)
+        self.subscribers[sub.name] = sub
+        self.stats.setdefault(sub.name, SubscriberStats())
+        self._queues[sub.name] = asyncio.Queue(maxsize=sub.queue_size)
+        self._tasks[sub.name] = asyncio.create_task(self._worker(sub))
+
+    async def _remove(self, name: str):
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        self._queues.pop(name, None)
+        self.subscribers.pop(name, None)
+
+    def _enqueue(self, event: dict, published: float):
+        for sub in self.subscribers.values():
+            if sub.wants(event):
+                self._enqueue_one(sub.name, event, published)
+
+    def _enqueue_one(self, name: str, event: dict, published: float):
+        queue = self._queues.get(name)
+        if queue is None:
+            return
+        stats = self.stats[name]
+        if stats.first_publish is None:
+            stats.first_publish = published
+        try:
+            queue.put_nowait((event, published))
+        except asyncio.QueueFull:
+            stats.dropped += 1
+            stats.dead_events += 1
+            last = self.dead_letters[-1] if self.dead_letters else None
+            if (last is not None and last.subscriber == name and last.error == _QUEUE_FULL
+                    and len(last.events) < self.subscribers[name].batch_size):
+                last.events.append(event)
+            else:
+                self.dead_letters.append(DeadLetter(name, [event], _QUEUE_FULL, 0))
+
+    async def _worker(self, sub: Subscriber):
+        queue = self._queues[sub.name]
+        while True:
+            batch = [await queue.get()]
+            deadline = self.loop.time() + sub.max_wait
+            while len(batch) < sub.batch_size:
+                try:
+                    batch.append(queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Backpressure: o worker espera enquanto a concorrência estiver cheia.
+            await self._sem.acquire()
+            task = asyncio.create_task(self._deliver(sub, batch))
+            task.add_done_callback(lambda _: self._sem.release())
+
+    async def _deliver(self, sub: Subscriber, batch: list[tuple[dict, float]]):
+        stats = self.stats[sub.name]
+        events = [e for e, _ in batch]
+        body = json.dumps({"subscriber": sub.name, "events": events},
+                          ensure_ascii=False, default=str).encode("utf-8")
+        headers = None
+        if sub.secret:
+            timestamp = str(int(time.time()))
+            headers = {"X-ERP-Timestamp": timestamp, "X-ERP-Signature": sign(sub.secret, timestamp, body)}
+        error = ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                stats.retries += 1
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            try:
+                status = await self._pool.post(sub.url, body, headers)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            if 200 <= status < 300:
+                now = time.monotonic()
+                stats.delivered += len(batch)
+                stats.batches += 1
+                stats.last_delivery = now
+                stats.latencies.extend(now - published for _, published in batch)
+                return
+            error = f"HTTP {status}"
+            if status < 500 and status != 429:
+                break  # erro do cliente: retentar não resolve
+        stats.failed_batches += 1
+        stats.dead_events += len(events)
+        self.dead_letters.append(DeadLetter(sub.name, events, error, attempt + 1))
@@ -0,0 +1,72 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# ROTEAMENTO DE WORKFLOWS COMPILADO
+# ============================================================
+# Regras agrupadas por entity_type e ordenadas por min_value: as regras
+# aplicáveis a um valor são sempre um prefixo da lista, achado por bisect.
+# Para lotes, np.searchsorted por grupo dá o prefixo de cada linha e um
+# máximo acumulado de approvals_required dá a exigência da linha.
+
+
+class _Route:
+    def __init__(self, rules: list):
+        self.rules = sorted(rules, key=lambda r: (r.min_value, r.id))
+        self.min_values = np.array([r.min_value for r in self.rules], dtype=np.float64)
+        approvals = np.array([r.approvals_required for r in self.rules], dtype=np.int64)
+        self.max_approvals = np.maximum.accumulate(approvals)
+        # Índice da regra que define o máximo em cada prefixo.
+        best = np.zeros(len(approvals), dtype=np.int64)
+        for i in range(1, len(approvals)):
+            best[i] = i if approvals[i] > approvals[best[i - 1]] else best[i - 1]
+        self.rule_ids = np.array([r.id for r in self.rules], dtype=np.int64)[best]
+
+
+class WorkflowRouter:
+    def __init__(self, rules, version: int = 0):
+        self.version = version
+        groups: dict[str, list] = {}
+        for r in rules:
+            groups.setdefault(r.entity_type, []).append(r)
+        self.routes = {entity: _Route(rs) for entity, rs in groups.items()}
+
+    def route(self, entity_type: str, value: float) -> list:
+        route = self.routes.get(entity_type)
+        if route is None:
+            return []
+        return route.rules[:bisect.bisect_right(route.min_values, value)]
+
+    def approvals_for(self, entity_type: str, value: float) -> int:
+        route = self.routes.get(entity_type)
+        if route is None:
+            return 0
+        n = bisect.bisect_right(route.min_values, value)
+        return int(route.max_approvals[n - 1]) if n else 0
+
+    def route_frame(self, df: pd.DataFrame, entity_col: str = "entity_type",
+                    value_col: str = "value") -> pd.DataFrame:
+        # Devolve, por linha: qtd. de workflows aplicáveis, aprovações exigidas
+        # (máximo entre as regras aplicáveis) e a regra que define a exigência.
+        n = len(df)
+        matched = np.zeros(n, dtype=np.int64)
+        approvals = np.zeros(n, dtype=np.int64)
+        rule_id = np.zeros(n, dtype=np.int64)
+        values = df[value_col].to_numpy(np.float64)
+        entities = df[entity_col].to_numpy(object)
+        for entity, route in self.routes.items():
+            rows = np.flatnonzero(entities == entity)
+            if not len(rows):
+                continue
+            pos = np.searchsorted(route.min_values, values[rows], side="right")
+            hit = pos > 0
+            matched[rows] = pos
+            approvals[rows[hit]] = route.max_approvals[pos[hit] - 1]
+            rule_id[rows[hit]] = route.rule_ids[pos[hit] - 1]
+        return pd.DataFrame({
+            "workflows": matched,
+            "approvals_required": approvals,
+            "rule_id": pd.Series(rule_id, index=df.index, dtype="Int64").mask(matched == 0),
+        }, index=df.index)
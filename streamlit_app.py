@@ -1,44 +1,54 @@
 import streamlit as st
 import pandas as pd
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from datetime import date, datetime
-
-# ============================================================
-# HELPERS DE SESSÃO / "BANCO DE DADOS" EM MEMÓRIA
-# ============================================================
-
-def get_list(key: str):
-    if key not in st.session_state:
-        st.session_state[key] = []
-    return st.session_state[key]
-
-def get_counter(key: str):
-    if key not in st.session_state:
-        st.session_state[key] = 1
-    return st.session_state[key]
-
-def inc_counter(key: str):
-    st.session_state[key] = get_counter(key) + 1
-    return st.session_state[key]
-
-def log_event(description: str, entity_type: str = "GENERIC", entity_id: int | None = None):
-    events = get_list("events")
-    event_id = get_counter("event_id")
-    events.append({
-        "id": event_id,
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-        "entity_type": entity_type,
-        "entity_id": entity_id,
-        "description": description,
-    })
-    inc_counter("event_id")
-
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+
+from erp.aging import AgingView
+from erp.audit_store import AuditStore
+from erp.balances import TrialBalance
+from erp.bulk_import import (
+    REJECTION_SAMPLE, ImportIndexes, ImportStats, read_chunks, recognition_columns, title_columns,
+    validate_chunk,
+)
+from erp.consolidation import ConsolidationEngine
+from erp.dedup import (
+    DEDUP_STATUSES, DedupIndex, DedupMatch, DedupSpec, DuplicateRecordError, doc_status, duplicate_groups,
+    find_duplicates,
+)
+from erp.event_log import EventLog
+from erp.export import EXPORT_FORMATS, ChunkedFile, ExportSpec, export_chunks, gzip_chunks
+from erp.frame_cache import FrameCache
+from erp import metrics
+from erp.journal import JournalError, JournalStats, journal_columns, validate_journal
+from erp.indexes import DuplicateKeyError, IndexRegistry, IndexSpec
+from erp.ledger_store import ColumnarLedger
+from erp.period_balances import TemporalBalances, month_id, month_label
+from erp.reconciliation import (
+    MATCH_STATUSES, TITLE_COLUMNS, match_statement, read_statement, settlement_legs,
+)
+from erp.records import format_ts, now_ts, record, ts_range
+from erp.search import SearchIndex, SearchSpec
+from erp.state_store import StateStore, counter, inserted, inserted_columns, updated
+from erp.storage import (
+    Between, In, MemoryRepository, Prefix, Repository, open_shared_repository, open_sqlite_repository,
+)
+from erp.tax_engine import TaxEngine
+from erp.webhooks import Subscriber, WebhookDispatcher
+from erp.workflow_routing import WorkflowRouter
 
 # ============================================================
 # MODELOS CORE – ENTIDADES PRINCIPAIS (TIPAGENS SIMPLIFICADAS)
 # ============================================================
+# Todas com __slots__; @record também interna os textos de baixa
+# cardinalidade (ver erp/records.py).
 
-@dataclass
+@record("regime")
 class Company:
     id: int
     name: str
@@ -46,14 +56,14 @@ class Company:
     regime: str  # Simples, Presumido, Real
 
 
-@dataclass
+@dataclass(slots=True)
 class CostCenter:
     id: int
     code: str
     name: str
 
 
-@dataclass
+@record("type")
 class Account:
     id: int
     code: str
@@ -61,7 +71,7 @@ class Account:
     type: str  # Ativo, Passivo, Receita, Despesa, Patrimônio
 
 
-@dataclass
+@record("kind")
 class Customer:
     id: int
     name: str
@@ -70,7 +80,7 @@ class Customer:
     company_id: int
 
 
-@dataclass
+@record("unit", "ncm")
 class Product:
     id: int
     name: str
@@ -80,7 +90,7 @@ class Product:
     company_id: int
 
 
-@dataclass
+@record("kind", "status")
 class FinancialTitle:
     id: int
     company_id: int
@@ -95,7 +105,7 @@ class FinancialTitle:
     status: str = "Aberto"  # Aberto, Pago, Cancelado
 
 
-@dataclass
+@record("account_code", "origin_type")
 class LedgerEntry:
     id: int
     company_id: int
@@ -109,7 +119,7 @@ class LedgerEntry:
     origin_id: int | None
 
 
-@dataclass
+@dataclass(slots=True)
 class TaxRule:
     id: int
     name: str
@@ -119,7 +129,7 @@ class TaxRule:
     cst: str
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkflowRule:
     id: int
     name: str
@@ -128,7 +138,7 @@ class WorkflowRule:
     approvals_required: int
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: int
     name: str
@@ -136,145 +146,965 @@ class User:
     is_admin: bool = False
 
 
-@dataclass
+@record("user_name", "action", "entity_type")
 class AuditLog:
     id: int
-    timestamp: str
+    timestamp: int  # segundos desde a época; formatado só na exibição
     user_name: str
     action: str
     entity_type: str
     entity_id: int | None
 
 
-# ============================================================
-# FUNÇÕES DE CRUD SIMPLES
-# ============================================================
+@dataclass(slots=True)
+class PeriodClose:
+    id: int
+    period: str  # AAAA-MM
+    closed_at: int
+    entries: int
+    debit: float
+    credit: float
 
-def add_company(name: str, cnpj: str, regime: str):
-    companies = get_list("companies")
-    new_id = get_counter("company_id")
-    companies.append(Company(id=new_id, name=name, cnpj=cnpj, regime=regime))
-    inc_counter("company_id")
-    log_event(f"Empresa criada: {name}", "Company", new_id)
 
+@dataclass(slots=True)
+class WebhookSubscription:
+    id: int
+    name: str
+    url: str
+    entity_types: str  # separados por vírgula; vazio = todos
+    batch_size: int
 
-def add_cost_center(code: str, name: str):
-    ccs = get_list("cost_centers")
-    new_id = get_counter("cost_center_id")
-    ccs.append(CostCenter(id=new_id, code=code, name=name))
-    inc_counter("cost_center_id")
-    log_event(f"Centro de custo criado: {code} - {name}", "CostCenter", new_id)
 
+# ============================================================
+# REPOSITÓRIO / "BANCO DE DADOS"
+# ============================================================
+# ERP_STORAGE=sqlite (padrão) persiste em ERP_DB_PATH e é compartilhado entre
+# sessões; ERP_STORAGE=shared mantém tudo em memória, compartilhado por todas
+# as sessões do processo, e sobrevive a reinícios pelo diário + snapshots em
+# ERP_STATE_DIR (vazio desliga); ERP_STORAGE=memory mantém o modo original
+# em st.session_state (um ERP por aba).
+
+STORAGE_MODE = os.environ.get("ERP_STORAGE", "sqlite")
+DB_PATH = os.environ.get("ERP_DB_PATH", "erp.db")
+EVENTS_DIR = os.environ.get("ERP_EVENTS_DIR", "erp_events")
+EVENT_RING_SIZE = 1_000        # eventos recentes mantidos em memória
+EVENT_SEGMENT_SIZE = 10_000    # eventos por segmento em disco
+EVENT_MAX_SEGMENTS = 500       # retenção (None = sem limite)
+AUDIT_DIR = os.environ.get("ERP_AUDIT_DIR", "erp_audit")
+# buffered | group (padrão: fsync compartilhado entre escritas concorrentes) | sync
+AUDIT_DURABILITY = os.environ.get("ERP_AUDIT_DURABILITY", "group")
+AUDIT_SEGMENT_SIZE = 262_144   # registros por segmento de auditoria
+STATE_DIR = os.environ.get("ERP_STATE_DIR", "erp_state")
+STATE_SEGMENT_SIZE = 1_000_000  # registros por segmento do diário de estado
+STATE_SNAPSHOT_EVERY = 500_000  # registros entre snapshots (= máximo reaplicado na abertura)
+STATE_KEEP_SNAPSHOTS = 2
+STATE_FSYNC = os.environ.get("ERP_STATE_FSYNC", "0") == "1"
+# Contas de controle de clientes (AR) e fornecedores (AP): contrapartida padrão
+# do reconhecimento de títulos (formulário e importação em lote).
+CONTROL_ACCOUNTS = {"AR": os.environ.get("ERP_AR_ACCOUNT", "1.1.2.0001"),
+                    "AP": os.environ.get("ERP_AP_ACCOUNT", "2.1.1.0001")}
+# Segredo HMAC dos webhooks (vazio = lotes sem assinatura; ver erp/webhooks.py).
+WEBHOOK_SECRET = os.environ.get("ERP_WEBHOOK_SECRET", "")
+LIST_LIMIT = 500  # linhas exibidas por listagem
+# Processos da consolidação multiempresa (vazio = um por CPU; 1 = no próprio processo).
+CONSOLIDATION_WORKERS = int(os.environ.get("ERP_CONSOLIDATION_WORKERS", "0")) or None
+# ERP_METRICS=0 desliga os cronômetros (o registro continua existindo, vazio).
+metrics.REGISTRY.enabled = os.environ.get("ERP_METRICS", "1") != "0"
+
+ENTITIES: dict[str, type] = {
+    "companies": Company,
+    "cost_centers": CostCenter,
+    "accounts": Account,
+    "customers": Customer,
+    "products": Product,
+    "titles": FinancialTitle,
+    "ledger": LedgerEntry,
+    "tax_rules": TaxRule,
+    "workflow_rules": WorkflowRule,
+    "users": User,
+    "audit_logs": AuditLog,  # legado: migrado para o AuditStore na primeira abertura
+    "webhooks": WebhookSubscription,
+    "period_closes": PeriodClose,
+}
+
+# Contador de ids de cada entidade (reposicionado ao restaurar o estado).
+ID_COUNTERS: dict[str, str] = {
+    "companies": "company_id",
+    "cost_centers": "cost_center_id",
+    "accounts": "account_id",
+    "customers": "customer_id",
+    "products": "product_id",
+    "titles": "title_id",
+    "ledger": "ledger_id",
+    "tax_rules": "tax_rule_id",
+    "workflow_rules": "workflow_rule_id",
+    "users": "user_id",
+    "audit_logs": "audit_id",
+    "webhooks": "webhook_id",
+    "period_closes": "period_close_id",
+}
+COUNTERS = [*ID_COUNTERS.values(), "journal_id"]
+
+# Índices secundários do SQLite para os filtros das tabelas paginadas.
+INDEXES: dict[str, list[tuple]] = {
+    "titles": [("kind", "status"), ("due_date",)],
+    "ledger": [("account_code",), ("date",)],
+    "audit_logs": [("user_name",), ("entity_type", "entity_id"), ("timestamp",)],
+}
+
+# Índices em memória dos cadastros: chaves únicas e filhos por empresa.
+INDEX_SPECS: dict[str, IndexSpec] = {
+    "companies": IndexSpec(unique=(("cnpj",),)),
+    "cost_centers": IndexSpec(unique=(("code",),)),
+    "accounts": IndexSpec(unique=(("code",),)),
+    "customers": IndexSpec(parent="company_id"),
+    "products": IndexSpec(unique=(("company_id", "sku"),), parent="company_id"),
+    "titles": IndexSpec(parent="company_id", keep_objects=False),
+    "tax_rules": IndexSpec(),
+    "workflow_rules": IndexSpec(),
+    "users": IndexSpec(),
+    "webhooks": IndexSpec(unique=(("name",),)),
+}
+
+# Campos da busca: nomes (termos) e documentos/códigos (também sem pontuação).
+SEARCH_SPECS: dict[str, SearchSpec] = {
+    "companies": SearchSpec(text=("name",), codes=("cnpj",)),
+    "customers": SearchSpec(text=("name",), codes=("doc",)),
+    "products": SearchSpec(text=("name",), codes=("sku", "ncm")),
+    "titles": SearchSpec(text=("party_name",), codes=("doc_number",)),
+}
+SEARCH_LABELS = {"companies": "Empresa", "customers": "Cliente", "products": "Produto", "titles": "Título"}
+SEARCH_TOP_K = 20
+
+# Detecção de duplicatas (MDM): documento, código, nome fonético e classificação.
+DEDUP_SPECS: dict[str, DedupSpec] = {
+    "companies": DedupSpec(name="name", doc="cnpj"),
+    "customers": DedupSpec(name="name", doc="doc", scope="company_id"),
+    "products": DedupSpec(name="name", code="sku", group="ncm", scope="company_id"),
+}
+DEDUP_LABELS = {"Empresas": "companies", "Clientes": "customers", "Produtos": "products"}
+
+# Exportações para a contabilidade: período pelo campo de data da entidade;
+# no texto, o razão sai como lançamentos I200 + partidas I250 (ECD).
+EXPORT_SPECS: dict[str, ExportSpec] = {
+    "ledger": ExportSpec(date_field="date", columns=tuple(f.name for f in fields(LedgerEntry)),
+                         book="LECD", record="I250", entry_record="I200"),
+    "titles": ExportSpec(date_field="issue_date", columns=tuple(f.name for f in fields(FinancialTitle)),
+                         book="TITULOS", record="T100"),
+}
+EXPORT_LABELS = {"Livro Razão": "ledger", "Títulos (AP/AR)": "titles"}
+EXPORT_FORMAT_LABELS = {"CSV (Excel)": "csv", "Parquet": "parquet", "Texto SPED (|)": "sped"}
+
+# Entidades de alto volume guardadas em colunas NumPy em vez de dataclasses.
+COLUMNAR: dict[str, type] = {
+    "ledger": ColumnarLedger,
+}
+
+
+def get_repo() -> Repository:
+    if STORAGE_MODE == "shared":
+        repo = open_shared_repository(ENTITIES, COLUMNAR)
+        if STATE_DIR and "state_store" not in repo.services:
+            open_state_store(repo)
+        return repo
+    if STORAGE_MODE == "memory":
+        if "_repo" not in st.session_state:
+            repo = st.session_state["_repo"] = MemoryRepository(ENTITIES, st.session_state, COLUMNAR)
+            # Threads, processos e arquivos dos serviços da sessão saem com ela.
+            weakref.finalize(repo, release_services, repo.services)
+        return st.session_state["_repo"]
+    return open_sqlite_repository(DB_PATH, ENTITIES, COLUMNAR, INDEXES)
+
+
+def open_state_store(repo) -> StateStore:
+    # Primeiro acesso do processo: restaura o estado (snapshot mais recente +
+    # cauda do diário) antes de qualquer leitura ou escrita; as demais
+    # sessões esperam no lock do repositório.
+    with repo.lock:
+        store = repo.services.get("state_store")
+        if store is None:
+            store = StateStore(STATE_DIR, ID_COUNTERS, COUNTERS, STATE_SEGMENT_SIZE, STATE_SNAPSHOT_EVERY,
+                               STATE_KEEP_SNAPSHOTS, STATE_FSYNC)
+            store.restore(repo)
+            repo.services["state_store"] = store
+        return store
+
+def state_store() -> StateStore | None:
+    return get_repo().services.get("state_store")
+
+def durable(repo) -> bool:
+    # Estado que sobrevive ao reinício: logs em diretório fixo.
+    return repo.mode == "sqlite" or "state_store" in repo.services
+
+def scratch_dir(repo, name: str) -> str:
+    # Sem estado persistido: logs num único diretório temporário do
+    # repositório, removido por release_services (no modo memória, quando a
+    # sessão é descartada; nos demais, no fim do processo).
+    with repo.lock:
+        root = repo.services.get("scratch_dir")
+        if root is None:
+            root = repo.services["scratch_dir"] = tempfile.mkdtemp(prefix="erp-session-")
+            if repo.mode != "memory":
+                weakref.finalize(repo, release_services, repo.services)
+        return os.path.join(root, name)
+
+def release_services(services: dict):
+    # Chamado pelo coletor, em qualquer thread: na thread do despachante, o
+    # stop() esperaria o próprio loop, então a liberação segue em outra.
+    def release():
+        for name, method in (("webhooks", "stop"), ("consolidation", "close"), ("event_log", "close"),
+                             ("audit_store", "close")):
+            service = services.pop(name, None)
+            if service is not None:
+                try:
+                    getattr(service, method)()
+                except Exception:  # noqa: BLE001 – sessão já descartada; segue liberando
+                    pass
+        directory = services.pop("scratch_dir", None)
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    if threading.current_thread().name == "webhook-dispatcher":
+        threading.Thread(target=release, name="erp-release", daemon=True).start()
+    else:
+        release()
 
-def add_account(code: str, name: str, acc_type: str):
-    accs = get_list("accounts")
-    new_id = get_counter("account_id")
-    accs.append(Account(id=new_id, code=code, name=name, type=acc_type))
-    inc_counter("account_id")
-    log_event(f"Conta criada: {code} - {name}", "Account", new_id)
 
+def get_list(key: str):
+    return get_repo().fetch(key)
 
-def add_customer(name: str, doc: str, kind: str, company_id: int):
-    custs = get_list("customers")
-    new_id = get_counter("customer_id")
-    custs.append(Customer(id=new_id, name=name, doc=doc, kind=kind, company_id=company_id))
-    inc_counter("customer_id")
-    log_event(f"Cliente criado: {name}", "Customer", new_id)
+def get_counter(key: str):
+    return get_repo().get_counter(key)
 
+def inc_counter(key: str):
+    return get_repo().inc_counter(key)
+
+def list_frame(key: str, limit: int = LIST_LIMIT):
+    # Apenas as linhas mais recentes vão para a tela; o total vem de COUNT.
+    repo = get_repo()
+    if key in COLUMNAR:
+        store = repo.columnar(key)
+        n = len(store)
+        return store.frame(max(0, n - limit)).iloc[::-1], n
+    columns = [f.name for f in fields(ENTITIES[key])]
+
+    def rows_frame(rows):
+        with metrics.timer("dataframe.list_frame"):
+            return pd.DataFrame([asdict(r) for r in reversed(rows)], columns=columns)
+
+    df = frame_cache().get(
+        (key, limit), repo.version(key),
+        lambda: rows_frame(repo.fetch(key, limit=limit, desc=True)),
+        lambda last_id: rows_frame(repo.fetch(key, limit=limit, desc=True, after_id=last_id)),
+        limit,
+    )
+    return df.iloc[::-1], repo.count(key)
+
+def show_list(key: str):
+    df, total = list_frame(key)
+    if total:
+        st.dataframe(df)
+        if total > len(df):
+            st.caption(f"Exibindo os {len(df)} registros mais recentes de {total}.")
+
+GRID_PAGE_SIZES = [25, 50, 100, 250]
+GRID_LABELS = {
+    "company_id": "Empresa", "kind": "Tipo", "status": "Status", "due_date": "Vencimento",
+    "date": "Data", "timestamp": "Data", "account_code": "Conta (prefixo)",
+    "entity_type": "Entidade", "user_name": "Usuário",
+}
+GRID_CHOICES = {"kind": ["AP", "AR"], "status": ["Aberto", "Pago", "Cancelado"]}
+
+
+def cached_count(key: str, where: dict) -> int:
+    # Totais por combinação de filtros, válidos enquanto a entidade não muda.
+    repo = get_repo()
+    counts = get_view("grid_counts", lambda repo: {})
+    ck = (key, tuple(sorted(where.items(), key=lambda kv: kv[0])))
+    version = repo.version(key)
+    hit = counts.get(ck)
+    if hit is not None and hit[0] == version:
+        metrics.incr("cache.grid_counts.hit")
+        return hit[1]
+    metrics.incr("cache.grid_counts.miss")
+    if len(counts) > 1_000:
+        counts.clear()
+    n = repo.count(key, where)
+    counts[ck] = (version, n)
+    return n
+
+
+def grid_filter(key: str, col: str):
+    label = GRID_LABELS[col]
+    wkey = f"grid_{key}_{col}"
+    if col == "company_id":
+        options = {"(Todas)": None} | company_options()
+        return options[st.selectbox(label, list(options), key=wkey)]
+    if col in GRID_CHOICES:
+        value = st.selectbox(label, ["(Todos)"] + GRID_CHOICES[col], key=wkey)
+        return None if value == "(Todos)" else value
+    if col in ("due_date", "date", "timestamp"):
+        period = st.date_input(label, value=(), key=wkey)
+        if len(period) != 2:
+            return None
+        if col == "timestamp":
+            return Between(*ts_range(period[0], period[1]))
+        return Between(period[0], period[1])
+    value = st.text_input(label, key=wkey).strip()
+    if not value:
+        return None
+    return Prefix(value) if col == "account_code" else value
+
+
+def paginated_table(key: str, filters: list[str]):
+    # Filtros, ordenação e paginação resolvidos no repositório: só a página
+    # visível vira DataFrame e vai para o navegador.
+    repo = get_repo()
+    where = {}
+    for col, widget in zip(filters, st.columns(len(filters))):
+        with widget:
+            value = grid_filter(key, col)
+        if value is not None:
+            where[col] = value
+
+    columns = [f.name for f in fields(ENTITIES[key])]
+    c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
+    order_by = c1.selectbox("Ordenar por", columns, key=f"grid_{key}_order")
+    desc = c2.toggle("Decrescente", value=True, key=f"grid_{key}_desc")
+    size = c3.selectbox("Linhas por página", GRID_PAGE_SIZES, key=f"grid_{key}_size")
+
+    total = cached_count(key, where)
+    pages = max(1, -(-total // size))
+    page_key = f"grid_{key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = c4.number_input("Página", min_value=1, max_value=pages, step=1, key=page_key)
+
+    df = repo.fetch_frame(key, where, limit=size, offset=(int(page) - 1) * size,
+                          desc=desc, order_by=order_by)
+    if "timestamp" in df:
+        # Formatação só das linhas visíveis.
+        df["timestamp"] = df["timestamp"].map(format_ts)
+    st.dataframe(df, hide_index=True)
+    st.caption(f"Página {int(page)} de {pages} – {total:,} registro(s).")
+
+
+SEARCH_DISPLAY = {
+    "companies": lambda c: f"{c.name} – CNPJ {c.cnpj}",
+    "customers": lambda c: f"{c.name} – {c.kind} {c.doc}",
+    "products": lambda p: f"{p.sku} – {p.name} (NCM {p.ncm})",
+    "titles": lambda t: f"{t.kind} {t.doc_number} – {t.party_name} – {t.amount:,.2f} ({t.status})",
+}
+
+
+@metrics.timed("search.query")
+def search_records(query: str, entities: list[str] | None = None, k: int = SEARCH_TOP_K) -> pd.DataFrame:
+    # Top-k pelo índice; só os registros encontrados são lidos do repositório.
+    repo = get_repo()
+    hits = search_index().search(query, entities, k)
+    found = {}
+    for key in {h.entity for h in hits}:
+        rows = repo.fetch(key, {"id": In([h.id for h in hits if h.entity == key])})
+        found |= {(key, r.id): r for r in rows}
+    return pd.DataFrame(
+        [{"tipo": SEARCH_LABELS[h.entity], "id": h.id, "registro": SEARCH_DISPLAY[h.entity](found[h.entity, h.id]),
+          "relevância": h.score} for h in hits if (h.entity, h.id) in found],
+        columns=["tipo", "id", "registro", "relevância"],
+    )
 
-def add_product(name: str, sku: str, ncm: str, unit: str, company_id: int):
-    prods = get_list("products")
-    new_id = get_counter("product_id")
-    prods.append(Product(id=new_id, name=name, sku=sku, ncm=ncm, unit=unit, company_id=company_id))
-    inc_counter("product_id")
-    log_event(f"Produto criado: {name}", "Product", new_id)
 
+def search_box(key: str, entities: list[str]):
+    # Busca por nome ou documento: sem acento, por prefixo e tolerante a erro de digitação.
+    c1, c2 = st.columns([3, 1])
+    query = c1.text_input("Buscar", key=f"search_{key}",
+                          placeholder="nome, documento, código... (ex.: joao silv, 12.345.678)").strip()
+    scopes = {"(Todos)": entities} | {SEARCH_LABELS[e]: [e] for e in entities}
+    scope = c2.selectbox("Em", list(scopes), key=f"search_{key}_scope") if len(entities) > 1 else "(Todos)"
+    if not query:
+        return
+    found = search_records(query, scopes[scope])
+    if found.empty:
+        st.caption("Nenhum registro encontrado.")
+    else:
+        st.dataframe(found, hide_index=True)
+
+
+def show_dedup_warnings(matches: list[DedupMatch], doc: str = ""):
+    if doc and doc_status([doc])[0] == "inválido":
+        st.warning("CPF/CNPJ com dígito verificador inválido.")
+    for m in matches[:3]:
+        st.warning(f"Parecido com o id {m.id}: {m.status} ({m.reasons}; pontuação {m.score}).")
+
+
+def get_view(name: str, build):
+    # Visões materializadas vivem junto do repositório (por sessão no modo
+    # memória, por processo no SQLite) e são reconstruídas quando ausentes.
+    repo = get_repo()
+    with repo.lock:
+        view = repo.views.get(name)
+        if view is None:
+            view = repo.views[name] = build(repo)
+        return view
+
+def frame_cache() -> FrameCache:
+    return get_view("frame_cache", lambda repo: FrameCache())
+
+def trial_balance() -> TrialBalance:
+    return get_view("trial_balance", lambda repo: TrialBalance.from_ledger(repo.columnar("ledger")))
+
+def temporal_balances() -> TemporalBalances:
+    # Saldos por período: somas prefixadas do razão + meses já fechados.
+    def build(repo):
+        closed = [month_id(date.fromisoformat(f"{p.period}-01")) for p in repo.fetch("period_closes")]
+        return TemporalBalances.from_ledger(repo.columnar("ledger"), closed)
+    return get_view("temporal_balances", build)
+
+def aging_view() -> AgingView:
+    return get_view("aging", lambda repo: AgingView.from_titles(repo.fetch_frame("titles", {"status": "Aberto"})))
+
+def master_index() -> IndexRegistry:
+    return get_view("master_index", lambda repo: IndexRegistry.build(INDEX_SPECS, repo))
+
+def search_index() -> SearchIndex:
+    return get_view("search_index", lambda repo: SearchIndex.build(SEARCH_SPECS, repo))
+
+def search_add(key: str, obj):
+    # O índice de busca é montado na primeira consulta (lendo o repositório);
+    # antes disso as inclusões não precisam entrar nele.
+    search = get_repo().views.get("search_index")
+    if search is not None:
+        search.add(key, obj)
+
+def dedup_index() -> DedupIndex:
+    return get_view("dedup_index", lambda repo: DedupIndex.build(DEDUP_SPECS, repo))
+
+def dedup_check(key: str, allow_duplicate: bool, **values) -> list[DedupMatch]:
+    # Suspeitas na inclusão: "duplicado" bloqueia, salvo confirmação explícita.
+    matches = dedup_index().check(key, **values)
+    if matches and matches[0].status == "duplicado" and not allow_duplicate:
+        raise DuplicateRecordError(matches)
+    return matches
+
+def company_options() -> dict[str, int]:
+    return master_index().options("companies", "label", lambda c: f"{c.id} - {c.name}", lambda c: c.id)
+
+def workflow_router() -> WorkflowRouter:
+    # Recompilado sob demanda quando a versão das regras muda.
+    repo = get_repo()
+    version = repo.version("workflow_rules")
+    with repo.lock:
+        router = repo.views.get("workflow_router")
+        if router is None or router.version != version:
+            router = repo.views["workflow_router"] = WorkflowRouter(master_index().all("workflow_rules"), version)
+        return router
+
+def tax_engine() -> TaxEngine:
+    # Índice de regras fiscais, recompilado quando a versão das regras muda.
+    repo = get_repo()
+    version = repo.version("tax_rules")
+    with repo.lock:
+        engine = repo.views.get("tax_engine")
+        if engine is None or engine.version != version:
+            engine = repo.views["tax_engine"] = TaxEngine(master_index().all("tax_rules"), version)
+        return engine
+
+def get_service(name: str, build):
+    repo = get_repo()
+    with repo.lock:
+        service = repo.services.get(name)
+        if service is None:
+            service = repo.services[name] = build(repo)
+        return service
+
+def event_log() -> EventLog:
+    def build(repo):
+        # Sem estado persistido cada repositório tem seu próprio log em diretório temporário.
+        directory = EVENTS_DIR if durable(repo) else scratch_dir(repo, "events")
+        return EventLog(directory, EVENT_RING_SIZE, EVENT_SEGMENT_SIZE, EVENT_MAX_SEGMENTS)
+    return get_service("event_log", build)
+
+def audit_store() -> AuditStore:
+    def build(repo):
+        # Mesmo critério do log de eventos.
+        directory = AUDIT_DIR if durable(repo) else scratch_dir(repo, "audit")
+        store = AuditStore(directory, AuditLog, AUDIT_SEGMENT_SIZE, AUDIT_DURABILITY)
+        if not len(store) and repo.count("audit_logs"):
+            # Logs gravados antes do arquivo de auditoria (tabela audit_logs).
+            after = 0
+            while batch := repo.fetch("audit_logs", limit=50_000, after_id=after):
+                store.extend(batch)
+                after = batch[-1].id
+        return store
+    return get_service("audit_store", build)
+
+def webhook_subscriber(w: WebhookSubscription) -> Subscriber:
+    types = frozenset(t.strip() for t in w.entity_types.split(",") if t.strip())
+    return Subscriber(name=w.name, url=w.url, entity_types=types or None, batch_size=w.batch_size,
+                      secret=WEBHOOK_SECRET)
+
+def webhook_dispatcher() -> WebhookDispatcher:
+    def build(repo):
+        dispatcher = WebhookDispatcher()
+        for w in repo.fetch("webhooks"):
+            dispatcher.add_subscriber(webhook_subscriber(w))
+        event_log().subscribe(dispatcher.publish)
+        return dispatcher
+    return get_service("webhooks", build)
+
+def consolidation_engine() -> ConsolidationEngine:
+    # Pool de processos único no processo; o motor (bloco compartilhado e cópia
+    # do razão) é do repositório e, no modo memória, liberado com a sessão.
+    return get_service("consolidation",
+                       lambda repo: ConsolidationEngine(CONSOLIDATION_WORKERS, shared_pool=True))
+
+def company_ids() -> dict[str, int]:
+    # Nome -> id: o favorecido de um título intercompany é o nome da empresa.
+    return {c.name: c.id for c in master_index().all("companies")}
+
+@metrics.timed("event.log_event")
+def log_event(description: str, entity_type: str = "GENERIC", entity_id: int | None = None,
+              changes: list | None = None):
+    # changes: mutações aplicadas (erp.state_store), gravadas no diário de
+    # estado quando ele existe. Chamado dentro da transação da escrita.
+    store = state_store()
+    if store is not None and changes:
+        store.append(changes)
+    event_log().append(description, entity_type, entity_id)
 
+
+# ============================================================
+# FUNÇÕES DE CRUD SIMPLES
+# ============================================================
+
+@metrics.timed("write.add_company")
+def add_company(name: str, cnpj: str, regime: str, allow_duplicate: bool = False) -> list[DedupMatch]:
+    repo = get_repo()
+    with repo.transaction("companies"):
+        idx = master_index()
+        idx.check_unique("companies", cnpj=cnpj)
+        matches = dedup_check("companies", allow_duplicate, name=name, cnpj=cnpj)
+        new_id = repo.next_id("company_id")
+        company = Company(id=new_id, name=name, cnpj=cnpj, regime=regime)
+        repo.insert("companies", company)
+        idx.add("companies", company)
+        dedup_index().add("companies", company)
+        search_add("companies", company)
+        log_event(f"Empresa criada: {name}", "Company", new_id, [inserted("companies", [company])])
+    return matches
+
+
+@metrics.timed("write.add_cost_center")
+def add_cost_center(code: str, name: str):
+    repo = get_repo()
+    with repo.transaction("cost_centers"):
+        idx = master_index()
+        idx.check_unique("cost_centers", code=code)
+        new_id = repo.next_id("cost_center_id")
+        cc = CostCenter(id=new_id, code=code, name=name)
+        repo.insert("cost_centers", cc)
+        idx.add("cost_centers", cc)
+        log_event(f"Centro de custo criado: {code} - {name}", "CostCenter", new_id,
+                  [inserted("cost_centers", [cc])])
+
+
+@metrics.timed("write.add_account")
+def add_account(code: str, name: str, acc_type: str):
+    repo = get_repo()
+    with repo.transaction("accounts"):
+        idx = master_index()
+        idx.check_unique("accounts", code=code)
+        new_id = repo.next_id("account_id")
+        account = Account(id=new_id, code=code, name=name, type=acc_type)
+        repo.insert("accounts", account)
+        idx.add("accounts", account)
+        log_event(f"Conta criada: {code} - {name}", "Account", new_id, [inserted("accounts", [account])])
+
+
+@metrics.timed("write.add_customer")
+def add_customer(name: str, doc: str, kind: str, company_id: int, allow_duplicate: bool = False) -> list[DedupMatch]:
+    repo = get_repo()
+    with repo.transaction("customers"):
+        idx = master_index()
+        matches = dedup_check("customers", allow_duplicate, name=name, doc=doc, company_id=company_id)
+        new_id = repo.next_id("customer_id")
+        customer = Customer(id=new_id, name=name, doc=doc, kind=kind, company_id=company_id)
+        repo.insert("customers", customer)
+        idx.add("customers", customer)
+        dedup_index().add("customers", customer)
+        search_add("customers", customer)
+        log_event(f"Cliente criado: {name}", "Customer", new_id, [inserted("customers", [customer])])
+    return matches
+
+
+@metrics.timed("write.add_product")
+def add_product(name: str, sku: str, ncm: str, unit: str, company_id: int,
+                allow_duplicate: bool = False) -> list[DedupMatch]:
+    repo = get_repo()
+    with repo.transaction("products"):
+        idx = master_index()
+        idx.check_unique("products", company_id=company_id, sku=sku)
+        matches = dedup_check("products", allow_duplicate, name=name, sku=sku, ncm=ncm, company_id=company_id)
+        new_id = repo.next_id("product_id")
+        product = Product(id=new_id, name=name, sku=sku, ncm=ncm, unit=unit, company_id=company_id)
+        repo.insert("products", product)
+        idx.add("products", product)
+        dedup_index().add("products", product)
+        search_add("products", product)
+        log_event(f"Produto criado: {name}", "Product", new_id, [inserted("products", [product])])
+    return matches
+
+
+@metrics.timed("write.add_financial_title")
 def add_financial_title(company_id: int, kind: str, party_name: str, doc_number: str,
                         issue_date: date, due_date: date, amount: float,
                         cost_center_id: int | None, account_id: int | None):
-    titles = get_list("titles")
-    new_id = get_counter("title_id")
-    titles.append(FinancialTitle(
-        id=new_id,
-        company_id=company_id,
-        kind=kind,
-        party_name=party_name,
-        doc_number=doc_number,
-        issue_date=issue_date,
-        due_date=due_date,
-        amount=amount,
-        cost_center_id=cost_center_id,
-        account_id=account_id
-    ))
-    inc_counter("title_id")
-    log_event(f"Título financeiro criado: {kind} {doc_number} - {amount}", "FinancialTitle", new_id)
+    repo = get_repo()
+    with repo.transaction("titles"):
+        idx = master_index()
+        aging = aging_view()
+        new_id = repo.next_id("title_id")
+        title = FinancialTitle(
+            id=new_id,
+            company_id=company_id,
+            kind=kind,
+            party_name=party_name,
+            doc_number=doc_number,
+            issue_date=issue_date,
+            due_date=due_date,
+            amount=amount,
+            cost_center_id=cost_center_id,
+            account_id=account_id
+        )
+        repo.insert("titles", title)
+        idx.add("titles", title)
+        search_add("titles", title)
+        aging.add(kind, due_date, amount)
+        log_event(f"Título financeiro criado: {kind} {doc_number} - {amount}", "FinancialTitle", new_id,
+                  [inserted("titles", [title])])
     return new_id
 
 
+@metrics.timed("write.add_title_with_recognition")
+def add_title_with_recognition(company_id: int, kind: str, party_name: str, doc_number: str,
+                               issue_date: date, due_date: date, amount: float,
+                               cost_center_id: int | None, account_code: str, counterpart_code: str) -> int:
+    # Título + lançamento de reconhecimento em partidas dobradas: AR credita a
+    # conta padrão e debita a contrapartida; AP o inverso. As partidas são
+    # conferidas antes de gravar o título (no modo memória não há rollback).
+    repo = get_repo()
+    side = "receita" if kind == "AR" else "despesa"
+    own = (0.0, amount) if kind == "AR" else (amount, 0.0)
+    leg = {
+        "entry": 0,
+        "company_id": company_id,
+        "date": issue_date,
+        "cost_center_id": cost_center_id,
+        "history": f"Reconhecimento de {side} ref. título {doc_number}",
+        "origin_type": "FinancialTitle",
+        "origin_id": None,
+    }
+    legs = pd.DataFrame([
+        leg | {"account_code": account_code, "debit": own[0], "credit": own[1]},
+        leg | {"account_code": counterpart_code, "debit": own[1], "credit": own[0]},
+    ])
+    with repo.transaction("ledger", "titles"):
+        indexes = reference_indexes()
+        _, rejected = validate_journal(legs, indexes)
+        if len(rejected):
+            raise JournalError(f"Reconhecimento recusado: {rejected['motivo'].iloc[0]}", rejected)
+        title_id = add_financial_title(company_id, kind, party_name, doc_number, issue_date, due_date, amount,
+                                       cost_center_id, indexes.account_ids[account_code])
+        post_journal(legs.assign(origin_id=title_id))
+    return title_id
+
+
+@metrics.timed("write.add_ledger_entry")
 def add_ledger_entry(company_id: int, date_: date, account_code: str,
                      cost_center_id: int | None, debit: float, credit: float,
                      history: str, origin_type: str, origin_id: int | None):
-    entries = get_list("ledger")
-    new_id = get_counter("ledger_id")
-    entries.append(LedgerEntry(
-        id=new_id,
-        company_id=company_id,
-        date=date_,
-        account_code=account_code,
-        cost_center_id=cost_center_id,
-        debit=debit,
-        credit=credit,
-        history=history,
-        origin_type=origin_type,
-        origin_id=origin_id
-    ))
-    inc_counter("ledger_id")
-    log_event(f"Lançamento contábil criado: {account_code} D={debit} C={credit}", "LedgerEntry", new_id)
+    repo = get_repo()
+    with repo.transaction("ledger"):
+        # Materializa antes do insert para não contar o lançamento duas vezes.
+        tb = trial_balance()
+        tbal = temporal_balances()
+        tbal.ensure_open(date_)
+        new_id = repo.next_id("ledger_id")
+        entry = LedgerEntry(
+            id=new_id,
+            company_id=company_id,
+            date=date_,
+            account_code=account_code,
+            cost_center_id=cost_center_id,
+            debit=debit,
+            credit=credit,
+            history=history,
+            origin_type=origin_type,
+            origin_id=origin_id
+        )
+        repo.insert("ledger", entry)
+        tb.post(company_id, account_code, cost_center_id, debit, credit)
+        tbal.post(company_id, account_code, date_, debit, credit)
+        log_event(f"Lançamento contábil criado: {account_code} D={debit} C={credit}", "LedgerEntry", new_id,
+                  [inserted("ledger", [entry])])
+
+
+@metrics.timed("write.post_journal")
+def post_journal(legs: pd.DataFrame) -> JournalStats:
+    # Lote de lançamentos com partidas múltiplas (coluna `entry` agrupa as
+    # partidas). Tudo ou nada: qualquer lançamento desbalanceado ou inválido
+    # recusa o lote com JournalError (partidas rejeitadas em .rejected).
+    # Ids de lançamento e de razão saem em bloco; um único evento no log.
+    repo = get_repo()
+    t0 = time.perf_counter()
+    with repo.transaction("ledger"):
+        tb = trial_balance()
+        tbal = temporal_balances()
+        # Validado com a trava do razão: um fechamento de período concorrente
+        # não passa entre a validação e a gravação (memória sem rollback).
+        valid, rejected = validate_journal(legs, reference_indexes())
+        if len(rejected):
+            n = rejected["entry"].nunique(dropna=False)
+            raise JournalError(f"{n} lançamento(s) recusado(s): {rejected['motivo'].iloc[0]}", rejected)
+        stats = JournalStats(rejected=rejected)
+        if not len(valid):
+            return stats
+        entries = int(valid["entry_code"].iloc[-1]) + 1
+        first_journal = repo.next_ids("journal_id", entries)
+        first_ledger = repo.next_ids("ledger_id", len(valid))
+        ledger = journal_columns(valid, first_journal, first_ledger)
+        repo.insert_columns("ledger", ledger)
+        ledger_df = pd.DataFrame(ledger)
+        tb.post_frame(ledger_df)
+        tbal.post_frame(ledger_df)
+        stats.entries, stats.legs = entries, len(valid)
+        stats.journal_ids = (first_journal, first_journal + entries - 1)
+        stats.ledger_ids = (first_ledger, first_ledger + len(valid) - 1)
+        log_event(
+            f"Lançamentos de diário {stats.journal_ids[0]}-{stats.journal_ids[1]}: {entries} lançamento(s), "
+            f"{len(valid)} partidas (razão {stats.ledger_ids[0]}-{stats.ledger_ids[1]}), "
+            f"total {valid['debit'].sum():.2f}",
+            "JournalEntry", first_journal if entries == 1 else None,
+            [inserted_columns("ledger", ledger), counter("journal_id", first_journal + entries)],
+        )
+    stats.seconds = time.perf_counter() - t0
+    return stats
+
+
+def reference_indexes() -> ImportIndexes:
+    # Referências de cadastro para validação em lote (importação, diário).
+    idx = master_index()
+    return ImportIndexes(
+        company_ids=set(idx.by_id["companies"]),
+        account_ids={code: i for (code,), i in idx.unique[("accounts", ("code",))].items()},
+        cost_center_ids={code: i for (code,), i in idx.unique[("cost_centers", ("code",))].items()},
+        closed_through=temporal_balances().closed_through,
+        control_accounts=CONTROL_ACCOUNTS,
+    )
 
 
+@metrics.timed("write.import_titles")
+def import_titles(chunks, progress=None) -> ImportStats:
+    # Versão em lote do formulário de títulos: cada chunk válido vira um
+    # bloco de títulos + lançamentos de reconhecimento e um único evento.
+    repo = get_repo()
+    idx = master_index()
+    indexes = reference_indexes()
+    stats = ImportStats()
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        valid, rejected = validate_chunk(chunk, indexes)
+        stats.chunks += 1
+        stats.rows += len(chunk)
+        if len(valid):
+            with repo.transaction("ledger", "titles"):
+                tb = trial_balance()
+                tbal = temporal_balances()
+                aging = aging_view()
+                if tbal.closed_through != indexes.closed_through:
+                    # Período fechado durante a importação: revalida o chunk com a
+                    # trava do razão, antes de qualquer gravação (memória sem rollback).
+                    indexes.closed_through = tbal.closed_through
+                    valid, rejected = validate_chunk(chunk, indexes)
+                if len(valid):
+                    titles = title_columns(valid, repo.next_ids("title_id", len(valid)))
+                    ledger = recognition_columns(titles, valid, repo.next_ids("ledger_id", 2 * len(valid)))
+                    repo.insert_columns("titles", titles)
+                    idx.add_children("titles", titles["company_id"], titles["id"])
+                    search = repo.views.get("search_index")
+                    if search is not None:
+                        search.add_columns("titles", titles["id"], titles)
+                    aging.add_frame(titles["kind"], titles["due_date"], titles["amount"])
+                    repo.insert_columns("ledger", ledger)
+                    ledger_df = pd.DataFrame(ledger)
+                    tb.post_frame(ledger_df)
+                    tbal.post_frame(ledger_df)
+                    routed = workflow_router().route_frame(
+                        pd.DataFrame({"entity_type": "FinancialTitle", "value": titles["amount"]}))
+                    stats.pending_approval += int((routed["approvals_required"] > 0).sum())
+                    log_event(
+                        f"Importação em lote {stats.chunks}: {len(valid)} títulos "
+                        f"(ids {titles['id'][0]}-{titles['id'][-1]}) e lançamentos de reconhecimento",
+                        "FinancialTitle", None,
+                        [inserted_columns("titles", titles), inserted_columns("ledger", ledger)],
+                    )
+            stats.imported += len(valid)
+        stats.add_rejections(rejected)
+        stats.seconds = time.perf_counter() - t0
+        if progress:
+            progress(stats)
+    return stats
+
+
+@metrics.timed("write.close_period")
+def close_period(month: int) -> list[dict]:
+    # Fecha os meses abertos até `month`: congela o movimento e grava um
+    # registro por mês. Lançamentos com data até o fim do mês passam a ser
+    # recusados.
+    repo = get_repo()
+    with repo.transaction("ledger", "period_closes"):
+        summaries = temporal_balances().close_month(month)
+        closed_at = now_ts()
+        closes = [PeriodClose(id=repo.next_id("period_close_id"), period=s["period"], closed_at=closed_at,
+                              entries=s["entries"], debit=s["debit"], credit=s["credit"]) for s in summaries]
+        if closes:
+            repo.insert_many("period_closes", closes)
+            log_event(f"Período fechado até {summaries[-1]['period']} ({len(summaries)} mês(es))", "PeriodClose",
+                      None, [inserted("period_closes", closes)])
+    return summaries
+
+
+@metrics.timed("write.set_titles_status")
+def set_titles_status(title_ids: list[int], status: str) -> list[int]:
+    # Baixa/cancelamento/reabertura: ajusta o aging só para os títulos que
+    # entram ou saem de "Aberto". Devolve os ids que mudaram.
+    repo = get_repo()
+    with repo.transaction("titles"):
+        aging = aging_view()
+        titles = repo.fetch_frame("titles", {"id": In(title_ids)})
+        ids, changes = [], []
+        for old, group in titles[titles["status"] != status].groupby("status"):
+            # Compare-and-set: só muda quem ainda está no status lido; uma baixa
+            # concorrente do mesmo título não conta duas vezes no aging.
+            done = repo.update_many("titles", group["id"].tolist(), {"status": status},
+                                    where={"status": old})
+            changed = group[group["id"].isin(done)]
+            changes.append(updated("titles", done, {"status": status}))
+            if old == "Aberto":
+                aging.add_frame(changed["kind"], changed["due_date"], changed["amount"], sign=-1)
+            elif status == "Aberto":
+                aging.add_frame(changed["kind"], changed["due_date"], changed["amount"])
+            ids += changed["id"].tolist()
+        if not ids:
+            return []
+        frame_cache().invalidate("titles")
+        preview = ", ".join(map(str, ids[:20])) + ("..." if len(ids) > 20 else "")
+        log_event(f"Status de {len(ids)} título(s) alterado para {status}: {preview}",
+                  "FinancialTitle", ids[0] if len(ids) == 1 else None, changes)
+    return ids
+
+
+def open_titles_frame(company_id: int | None = None) -> pd.DataFrame:
+    where = {"status": "Aberto"} | ({"company_id": company_id} if company_id is not None else {})
+    return get_repo().fetch_frame("titles", where)[TITLE_COLUMNS]
+
+
+@metrics.timed("write.settle_titles")
+def settle_titles(matches: pd.DataFrame, bank_account: str, receivable_account: str,
+                  payable_account: str) -> tuple[list[int], JournalStats]:
+    # Baixa dos títulos conciliados: status "Pago" (compare-and-set) e um
+    # lançamento de liquidação por título num único lote do diário. As
+    # partidas são conferidas antes de mudar qualquer status (no modo memória
+    # não há rollback); título baixado por outra sessão no meio fica sem
+    # lançamento.
+    repo = get_repo()
+    legs = settlement_legs(matches, bank_account, receivable_account, payable_account)
+    _, rejected = validate_journal(legs, reference_indexes())
+    if len(rejected):
+        n = rejected["entry"].nunique()
+        raise JournalError(f"{n} baixa(s) recusada(s): {rejected['motivo'].iloc[0]}", rejected)
+    with repo.transaction("ledger", "titles"):
+        paid = set_titles_status(matches["title_id"].tolist(), "Pago")
+        stats = post_journal(legs[legs["origin_id"].isin(paid)])
+    return paid, stats
+
+
+def export_file(key: str, fmt: str, company_id: int | None = None,
+                period: tuple[date, date] | None = None, compress: bool = False) -> tuple[ChunkedFile, str, str]:
+    # Arquivo lido sob demanda, bloco a bloco: (arquivo, nome, mime).
+    company = master_index().get("companies", company_id) if company_id is not None else None
+    chunks = export_chunks(get_repo(), key, EXPORT_SPECS[key], fmt, company, period)
+    ext, mime = EXPORT_FORMATS[fmt]
+    name = f"{key}_{company_id or 'todas'}"
+    if period:
+        name += f"_{period[0]:%Y%m%d}_{period[1]:%Y%m%d}"
+    name += f".{ext}"
+    if compress:
+        chunks, name, mime = gzip_chunks(chunks), name + ".gz", "application/gzip"
+    return ChunkedFile(chunks), name, mime
+
+
+@metrics.timed("write.add_tax_rule")
 def add_tax_rule(name: str, tax_type: str, aliquot: float, cfop: str, cst: str):
-    rules = get_list("tax_rules")
-    new_id = get_counter("tax_rule_id")
-    rules.append(TaxRule(
-        id=new_id, name=name, tax_type=tax_type,
-        aliquot=aliquot, cfop=cfop, cst=cst
-    ))
-    inc_counter("tax_rule_id")
-    log_event(f"Regra fiscal criada: {name}", "TaxRule", new_id)
+    repo = get_repo()
+    with repo.transaction("tax_rules"):
+        idx = master_index()
+        new_id = repo.next_id("tax_rule_id")
+        rule = TaxRule(
+            id=new_id, name=name, tax_type=tax_type,
+            aliquot=aliquot, cfop=cfop, cst=cst
+        )
+        repo.insert("tax_rules", rule)
+        idx.add("tax_rules", rule)
+        log_event(f"Regra fiscal criada: {name}", "TaxRule", new_id, [inserted("tax_rules", [rule])])
 
 
+@metrics.timed("write.add_workflow_rule")
 def add_workflow_rule(name: str, entity_type: str, min_value: float, approvals_required: int):
-    rules = get_list("workflow_rules")
-    new_id = get_counter("workflow_rule_id")
-    rules.append(WorkflowRule(
-        id=new_id, name=name, entity_type=entity_type,
-        min_value=min_value, approvals_required=approvals_required
-    ))
-    inc_counter("workflow_rule_id")
-    log_event(f"Workflow criado: {name}", "WorkflowRule", new_id)
+    repo = get_repo()
+    with repo.transaction("workflow_rules"):
+        idx = master_index()
+        new_id = repo.next_id("workflow_rule_id")
+        rule = WorkflowRule(
+            id=new_id, name=name, entity_type=entity_type,
+            min_value=min_value, approvals_required=approvals_required
+        )
+        repo.insert("workflow_rules", rule)
+        idx.add("workflow_rules", rule)
+        log_event(f"Workflow criado: {name}", "WorkflowRule", new_id, [inserted("workflow_rules", [rule])])
 
 
+@metrics.timed("write.add_user")
 def add_user(name: str, role: str, is_admin: bool):
-    users = get_list("users")
-    new_id = get_counter("user_id")
-    users.append(User(id=new_id, name=name, role=role, is_admin=is_admin))
-    inc_counter("user_id")
-    log_event(f"Usuário criado: {name}", "User", new_id)
-
-
-def add_audit(user_name: str, action: str, entity_type: str, entity_id: int | None):
-    logs = get_list("audit_logs")
-    new_id = get_counter("audit_id")
-    logs.append(AuditLog(
-        id=new_id,
-        timestamp=datetime.now().isoformat(timespec="seconds"),
-        user_name=user_name,
-        action=action,
-        entity_type=entity_type,
-        entity_id=entity_id
-    ))
-    inc_counter("audit_id")
+    repo = get_repo()
+    with repo.transaction("users"):
+        idx = master_index()
+        new_id = repo.next_id("user_id")
+        user = User(id=new_id, name=name, role=role, is_admin=is_admin)
+        repo.insert("users", user)
+        idx.add("users", user)
+        log_event(f"Usuário criado: {name}", "User", new_id, [inserted("users", [user])])
+
+
+@metrics.timed("write.add_webhook")
+def add_webhook(name: str, url: str, entity_types: str, batch_size: int):
+    repo = get_repo()
+    with repo.transaction("webhooks"):
+        # O despachante identifica assinantes pelo nome: nome repetido substituiria o anterior.
+        idx = master_index()
+        idx.check_unique("webhooks", name=name)
+        new_id = repo.next_id("webhook_id")
+        sub = WebhookSubscription(id=new_id, name=name, url=url,
+                                  entity_types=entity_types, batch_size=batch_size)
+        repo.insert("webhooks", sub)
+        idx.add("webhooks", sub)
+        webhook_dispatcher().add_subscriber(webhook_subscriber(sub))
+        log_event(f"Webhook cadastrado: {name} -> {url}", "WebhookSubscription", new_id,
+                  [inserted("webhooks", [sub])])
+
+
+@metrics.timed("write.add_audit")
+def add_audit(user_name: str, action: str, entity_type: str, entity_id: int | None) -> AuditLog:
+    # Append-only em disco; retorna quando o modo de durabilidade permitir.
+    return audit_store().append(user_name, action, entity_type, entity_id, timestamp=now_ts())
 
 
 # ============================================================
@@ -283,20 +1113,25 @@ def add_audit(user_name: str, action: str, entity_type: str, entity_id: int | No
 
 def page_master_data():
     st.header("Núcleo 3 – Cadastros Mestre (MDM)")
+    search_box("master", ["companies", "customers", "products"])
 
     st.subheader("Empresas")
     with st.form("form_company"):
         c_name = st.text_input("Nome da empresa")
         c_cnpj = st.text_input("CNPJ")
         c_regime = st.selectbox("Regime tributário", ["Simples", "Presumido", "Real"])
+        c_force = st.checkbox("Cadastrar mesmo se parecer duplicada", key="company_force")
         submitted = st.form_submit_button("Cadastrar empresa")
         if submitted and c_name:
-            add_company(c_name, c_cnpj, c_regime)
-            st.success("Empresa cadastrada com sucesso.")
+            try:
+                matches = add_company(c_name, c_cnpj, c_regime, allow_duplicate=c_force)
+            except DuplicateKeyError as e:
+                st.error(str(e))
+            else:
+                st.success("Empresa cadastrada com sucesso.")
+                show_dedup_warnings(matches, c_cnpj)
 
-    companies = [asdict(c) for c in get_list("companies")]
-    if companies:
-        st.dataframe(pd.DataFrame(companies))
+    show_list("companies")
 
     st.markdown("---")
     st.subheader("Centros de Custo")
@@ -305,12 +1140,14 @@ def page_master_data():
         cc_name = st.text_input("Nome do centro de custo")
         submitted_cc = st.form_submit_button("Cadastrar CC")
         if submitted_cc and cc_code:
-            add_cost_center(cc_code, cc_name)
-            st.success("Centro de custo cadastrado.")
+            try:
+                add_cost_center(cc_code, cc_name)
+            except DuplicateKeyError as e:
+                st.error(str(e))
+            else:
+                st.success("Centro de custo cadastrado.")
 
-    ccs = [asdict(c) for c in get_list("cost_centers")]
-    if ccs:
-        st.dataframe(pd.DataFrame(ccs))
+    show_list("cost_centers")
 
     st.markdown("---")
     st.subheader("Plano de Contas (Core Contábil)")
@@ -320,52 +1157,102 @@ def page_master_data():
         acc_type = st.selectbox("Tipo", ["Ativo", "Passivo", "Receita", "Despesa", "Patrimônio"])
         submitted_acc = st.form_submit_button("Cadastrar conta")
         if submitted_acc and acc_code:
-            add_account(acc_code, acc_name, acc_type)
-            st.success("Conta cadastrada.")
+            try:
+                add_account(acc_code, acc_name, acc_type)
+            except DuplicateKeyError as e:
+                st.error(str(e))
+            else:
+                st.success("Conta cadastrada.")
 
-    accs = [asdict(a) for a in get_list("accounts")]
-    if accs:
-        st.dataframe(pd.DataFrame(accs))
+    show_list("accounts")
 
     st.markdown("---")
     st.subheader("Clientes")
-    companies_list = get_list("companies")
-    if not companies_list:
+    companies = company_options()
+    if not companies:
         st.info("Cadastre ao menos uma empresa antes de cadastrar clientes.")
         return
 
-    company_options = {f"{c.id} - {c.name}": c.id for c in companies_list}
-
     with st.form("form_customer"):
         cust_name = st.text_input("Nome do cliente")
         cust_doc = st.text_input("Doc (CPF/CNPJ)")
         cust_kind = st.selectbox("Tipo", ["PF", "PJ"])
-        cust_company = st.selectbox("Empresa", list(company_options.keys()))
+        cust_company = st.selectbox("Empresa", list(companies.keys()))
+        cust_force = st.checkbox("Cadastrar mesmo se parecer duplicado", key="customer_force")
         submitted_cust = st.form_submit_button("Cadastrar cliente")
         if submitted_cust and cust_name:
-            add_customer(cust_name, cust_doc, cust_kind, company_options[cust_company])
-            st.success("Cliente cadastrado.")
+            try:
+                matches = add_customer(cust_name, cust_doc, cust_kind, companies[cust_company],
+                                       allow_duplicate=cust_force)
+            except DuplicateKeyError as e:
+                st.error(str(e))
+            else:
+                st.success("Cliente cadastrado.")
+                show_dedup_warnings(matches, cust_doc)
 
-    customers = [asdict(c) for c in get_list("customers")]
-    if customers:
-        st.dataframe(pd.DataFrame(customers))
+    show_list("customers")
+
+    st.markdown("---")
+    st.subheader("Duplicatas (MDM)")
+    dedup_batch()
+
+
+def dedup_batch():
+    # Base inteira do cadastro escolhido: pares pontuados só dentro dos blocos.
+    c1, c2 = st.columns([1, 3])
+    label = c1.selectbox("Cadastro", list(DEDUP_LABELS), key="dedup_entity")
+    c2.caption("Blocos por documento (CPF/CNPJ sem máscara), SKU, nome fonético e nome parcial/NCM; "
+               "empresas e clientes com documentos diferentes nunca são pares.")
+    if st.button("Procurar duplicatas"):
+        key = DEDUP_LABELS[label]
+        repo = get_repo()
+        t0 = time.perf_counter()
+        with metrics.timer(f"dedup.batch.{key}"):
+            frame = repo.fetch_frame(key)
+            pairs = find_duplicates(DEDUP_SPECS[key], frame)
+        spec = DEDUP_SPECS[key]
+        invalid = int((doc_status(frame[spec.doc]) == "inválido").sum()) if spec.doc else None
+        st.session_state["dedup"] = (label, len(frame), invalid, pairs, time.perf_counter() - t0)
+
+    last = st.session_state.get("dedup")
+    if last is None:
+        return
+    label, total, invalid, pairs, seconds = last
+    key = DEDUP_LABELS[label]
+    counts = pairs["status"].value_counts()
+    cols = st.columns(5)
+    cols[0].metric("Registros", f"{total:,}")
+    for col, status in zip(cols[1:], DEDUP_STATUSES):
+        col.metric(f"Pares {status}", f"{int(counts.get(status, 0)):,}")
+    cols[4].metric("Grupos duplicados", f"{duplicate_groups(pairs)['group'].nunique():,}")
+    st.caption(f"{label}: {seconds:.2f}s" + (f"; {invalid:,} documento(s) com DV inválido." if invalid else "."))
+    statuses = st.multiselect("Situações", DEDUP_STATUSES, default=DEDUP_STATUSES[:2], key="dedup_statuses")
+    shown = pairs[pairs["status"].isin(statuses)].head(LIST_LIMIT)
+    if shown.empty:
+        st.info("Nenhum par nessas situações.")
+        return
+    ids = pd.unique(shown[["id_a", "id_b"]].to_numpy().ravel()).tolist()
+    names = {r.id: r.name for r in get_repo().fetch(key, {"id": In(ids)})}
+    st.dataframe(pd.DataFrame({
+        "id_a": shown["id_a"], "nome_a": shown["id_a"].map(names), "id_b": shown["id_b"],
+        "nome_b": shown["id_b"].map(names), "pontuação": shown["score"], "situação": shown["status"],
+        "motivos": shown["reasons"],
+    }), hide_index=True)
 
 
 def page_financial_core():
     st.header("Núcleo 1 – Financeiro-Contábil")
 
-    companies = get_list("companies")
-    accs = get_list("accounts")
-    ccs = get_list("cost_centers")
-
-    if not companies or not accs:
+    idx = master_index()
+    if not idx.count("companies") or not idx.count("accounts"):
         st.warning("Cadastre pelo menos uma empresa e o plano de contas no módulo de Cadastros Mestre.")
         return
 
-    companies_map = {f"{c.id} - {c.name}": c.id for c in companies}
-    acc_map = {f"{a.code} - {a.name}": a for a in accs}
-    cc_map: dict[str, int | None] = {"(Nenhum)": None}
-    cc_map.update({f"{c.code} - {c.name}": c.id for c in ccs})
+    # Mapas de opções mantidos pelo índice: só cadastros novos são formatados.
+    companies_map = company_options()
+    acc_map = idx.options("accounts", "label", lambda a: f"{a.code} - {a.name}")
+    cc_map: dict[str, int | None] = {"(Nenhum)": None} | idx.options(
+        "cost_centers", "label", lambda c: f"{c.code} - {c.name}", lambda c: c.id)
 
     st.subheader("Lançamento de Títulos (AP/AR)")
     with st.form("form_title"):
@@ -378,69 +1265,223 @@ def page_financial_core():
         amount = st.number_input("Valor", min_value=0.0, step=100.0)
         cc_label = st.selectbox("Centro de custo", list(cc_map.keys()))
         acc_label = st.selectbox("Conta contábil padrão", list(acc_map.keys()))
+        cp_label = st.selectbox("Contrapartida (clientes / fornecedores)",
+                                ["(Conta de controle AR/AP)"] + list(acc_map.keys()))
         submitted = st.form_submit_button("Criar título")
         if submitted and amount > 0:
-            title_id = add_financial_title(
-                company_id=companies_map[company_label],
-                kind=kind,
-                party_name=party,
-                doc_number=doc_number,
-                issue_date=issue,
-                due_date=due,
-                amount=amount,
-                cost_center_id=cc_map[cc_label],
-                account_id=acc_map[acc_label].id
-            )
-            acc = acc_map[acc_label]
-            if kind == "AR":
-                add_ledger_entry(
+            try:
+                add_title_with_recognition(
                     company_id=companies_map[company_label],
-                    date_=issue,
-                    account_code=acc.code,
+                    kind=kind,
+                    party_name=party,
+                    doc_number=doc_number,
+                    issue_date=issue,
+                    due_date=due,
+                    amount=amount,
                     cost_center_id=cc_map[cc_label],
-                    debit=0.0,
-                    credit=amount,
-                    history=f"Reconhecimento de receita ref. título {doc_number}",
-                    origin_type="FinancialTitle",
-                    origin_id=title_id
+                    account_code=acc_map[acc_label].code,
+                    counterpart_code=acc_map[cp_label].code if cp_label in acc_map else CONTROL_ACCOUNTS[kind],
                 )
+            except JournalError as e:
+                st.error(str(e))
             else:
-                add_ledger_entry(
-                    company_id=companies_map[company_label],
-                    date_=issue,
-                    account_code=acc.code,
-                    cost_center_id=cc_map[cc_label],
-                    debit=amount,
-                    credit=0.0,
-                    history=f"Reconhecimento de despesa ref. título {doc_number}",
-                    origin_type="FinancialTitle",
-                    origin_id=title_id
-                )
-            st.success("Título criado e lançamento contábil de reconhecimento registrado.")
+                st.success("Título criado e lançamento contábil de reconhecimento registrado.")
+
+    with st.expander("Importação em lote de títulos (CSV / Parquet)"):
+        st.caption(
+            "Colunas: company_id, kind (AP/AR), party_name, doc_number, issue_date, "
+            "due_date, amount, account_code, cost_center_code (opcional), counterpart_code "
+            "(opcional; padrão: conta de controle AR/AP)."
+        )
+        upload = st.file_uploader("Arquivo de títulos", type=["csv", "parquet"])
+        chunksize = st.number_input("Linhas por lote", min_value=1_000, max_value=500_000,
+                                    value=50_000, step=10_000)
+        if upload is not None and st.button("Importar títulos"):
+            fmt = "parquet" if upload.name.endswith(".parquet") else "csv"
+            status = st.empty()
+
+            def show_progress(s: ImportStats):
+                status.write(f"Lote {s.chunks}: {s.rows:,} linhas lidas, "
+                             f"{s.imported:,} importadas ({s.rows_per_sec:,.0f} linhas/s)")
+
+            try:
+                stats = import_titles(read_chunks(upload, fmt, int(chunksize)), show_progress)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"{stats.imported:,} títulos importados em {stats.seconds:.1f}s "
+                           f"({stats.rows_per_sec:,.0f} linhas/s); {stats.rejected:,} rejeitados.")
+                if stats.pending_approval:
+                    st.info(f"{stats.pending_approval:,} título(s) exigem aprovação de workflow.")
+                if stats.rejections:
+                    st.dataframe(pd.concat(stats.rejections, ignore_index=True))
+
+    with st.expander("Lançamentos de diário em lote (partidas múltiplas)"):
+        st.caption(
+            "Colunas: entry (agrupa as partidas de um lançamento), company_id, date, account_code, "
+            "debit, credit, cost_center_id, history, origin_type, origin_id (opcionais). "
+            "Cada lançamento precisa fechar débitos = créditos; o lote é gravado inteiro ou recusado."
+        )
+        journal_upload = st.file_uploader("Arquivo de partidas", type=["csv", "parquet"], key="journal_upload")
+        if journal_upload is not None and st.button("Lançar partidas"):
+            if journal_upload.name.endswith(".parquet"):
+                legs = pd.read_parquet(journal_upload)
+            else:
+                legs = pd.read_csv(journal_upload, dtype={"account_code": str, "history": str})
+            try:
+                stats = post_journal(legs)
+            except JournalError as e:
+                st.error(str(e))
+                st.dataframe(e.rejected.head(REJECTION_SAMPLE))
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"{stats.entries:,} lançamento(s), {stats.legs:,} partidas em {stats.seconds:.2f}s "
+                           f"({stats.legs_per_sec:,.0f} partidas/s).")
+
+    with st.expander("Conciliação bancária (extrato CSV / OFX)"):
+        st.caption(
+            "CSV: date, amount (crédito positivo, débito negativo), description, doc (opcional); "
+            "separador ';' para o formato 1.234,56 e dd/mm/aaaa. Créditos casam com títulos AR e "
+            "débitos com AP em aberto, pelo valor exato, vencimento na janela e documento ou nome no histórico."
+        )
+        statement = st.file_uploader("Extrato bancário", type=["csv", "ofx"], key="statement_upload")
+        c1, c2 = st.columns(2)
+        rec_company = c1.selectbox("Empresa dos títulos", ["(Todas)"] + list(companies_map), key="rec_company")
+        window = c2.number_input("Janela de datas (dias)", min_value=0, max_value=60, value=5, key="rec_window")
+        if statement is not None and st.button("Conciliar extrato"):
+            fmt = "ofx" if statement.name.lower().endswith(".ofx") else "csv"
+            try:
+                lines = read_statement(statement, fmt)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                with metrics.timer("reconciliation.match"):
+                    company_id = None if rec_company == "(Todas)" else companies_map[rec_company]
+                    matches, unmatched = match_statement(lines, open_titles_frame(company_id), int(window))
+                st.session_state["reconciliation"] = (matches, unmatched, len(lines))
+
+        if "reconciliation" in st.session_state:
+            matches, unmatched, n_lines = st.session_state["reconciliation"]
+            counts = matches["status"].value_counts()
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Linhas do extrato", f"{n_lines:,}")
+            m2.metric("Confirmadas", f"{counts.get(MATCH_STATUSES[0], 0):,}")
+            m3.metric("Sugeridas", f"{counts.get(MATCH_STATUSES[1], 0):,}")
+            m4.metric("Sem título", f"{len(unmatched):,}")
+            st.dataframe(matches.head(REJECTION_SAMPLE), hide_index=True)
+            if len(unmatched):
+                st.caption("Linhas sem título correspondente:")
+                st.dataframe(unmatched.head(REJECTION_SAMPLE))
+
+            with st.form("form_settle"):
+                accounts = list(acc_map)
+                c1, c2, c3 = st.columns(3)
+                bank_label = c1.selectbox("Conta banco", accounts)
+                ar_label = c2.selectbox("Clientes (AR)", accounts)
+                ap_label = c3.selectbox("Fornecedores (AP)", accounts)
+                with_suggested = st.checkbox("Incluir casamentos sugeridos (só valor e data)")
+                if st.form_submit_button("Baixar títulos conciliados"):
+                    chosen = matches if with_suggested else matches[matches["status"] == MATCH_STATUSES[0]]
+                    try:
+                        paid, stats = settle_titles(chosen, acc_map[bank_label].code, acc_map[ar_label].code,
+                                                    acc_map[ap_label].code)
+                    except JournalError as e:
+                        st.error(str(e))
+                        st.dataframe(e.rejected.head(REJECTION_SAMPLE))
+                    else:
+                        del st.session_state["reconciliation"]
+                        st.success(f"{len(paid):,} título(s) baixado(s) e {stats.entries:,} lançamento(s) de "
+                                   f"liquidação em {stats.seconds:.2f}s.")
+
+    with st.expander("Exportação para a contabilidade (CSV / Parquet / SPED)"):
+        st.caption("Gerado em blocos direto do armazenamento, sem carregar a base inteira. "
+                   "CSV com ';' e vírgula decimal; texto no leiaute SPED (I200/I250 para o razão).")
+        with st.form("form_export"):
+            c1, c2, c3 = st.columns(3)
+            exp_label = c1.selectbox("Dados", list(EXPORT_LABELS))
+            exp_company = c2.selectbox("Empresa", ["(Todas)"] + list(companies_map), key="exp_company")
+            exp_format = c3.selectbox("Formato", list(EXPORT_FORMAT_LABELS))
+            c1, c2 = st.columns(2)
+            exp_period = c1.date_input("Período (vazio = tudo)", value=(), key="exp_period")
+            exp_gzip = c2.checkbox("Compactar (.gz)", help="Não se aplica ao Parquet, que já é compactado.")
+            prepared = st.form_submit_button("Preparar arquivo")
+        if prepared:
+            fmt = EXPORT_FORMAT_LABELS[exp_format]
+            data, name, mime = export_file(
+                EXPORT_LABELS[exp_label], fmt,
+                None if exp_company == "(Todas)" else companies_map[exp_company],
+                tuple(exp_period) if len(exp_period) == 2 else None,
+                compress=exp_gzip and fmt != "parquet",
+            )
+            st.download_button(f"Baixar {name}", data, file_name=name, mime=mime)
 
     st.markdown("---")
     st.subheader("Títulos cadastrados")
-    titles = [asdict(t) for t in get_list("titles")]
-    if titles:
-        df_titles = pd.DataFrame(titles)
-        st.dataframe(df_titles)
+    if get_repo().count("titles"):
+        search_box("titles", ["titles"])
+        paginated_table("titles", ["company_id", "kind", "status", "due_date"])
+
+        with st.form("form_title_status"):
+            c1, c2 = st.columns(2)
+            ids_text = c1.text_input("IDs dos títulos (separados por vírgula)")
+            new_status = c2.selectbox("Novo status", GRID_CHOICES["status"])
+            if st.form_submit_button("Alterar status"):
+                try:
+                    ids = [int(x) for x in ids_text.replace(";", ",").split(",") if x.strip()]
+                except ValueError:
+                    st.error("Informe apenas números inteiros separados por vírgula.")
+                else:
+                    changed = len(set_titles_status(ids, new_status))
+                    st.success(f"{changed} título(s) alterado(s) para {new_status}.")
 
     st.markdown("---")
     st.subheader("Livro Razão (simplificado)")
-    ledger = [asdict(l) for l in get_list("ledger")]
-    if ledger:
-        df_ledger = pd.DataFrame(ledger)
-        st.dataframe(df_ledger)
+    repo = get_repo()
+    if repo.count("ledger"):
+        paginated_table("ledger", ["company_id", "date", "account_code"])
 
         st.markdown("### Balancete por conta")
-        bal = (
-            df_ledger
-            .groupby("account_code")[['debit', 'credit']]
-            .sum()
-            .reset_index()
-        )
-        bal["saldo"] = bal["debit"] - bal["credit"]
+        tb = trial_balance()
+        levels = ["Analítico"] + [f"Nível {i}" for i in range(1, tb.max_depth() + 1)]
+        c1, c2 = st.columns(2)
+        level = c1.selectbox("Agrupamento", levels)
+        period = c2.date_input("Período do balancete (vazio = acumulado)", value=())
+        depth = None if level == "Analítico" else levels.index(level)
+        if len(period) == 2:
+            bal = temporal_balances().by_account(period[0], period[1], depth=depth)
+        elif depth is None:
+            bal = tb.by_account()
+        else:
+            bal = tb.rollup(depth=depth)
         st.dataframe(bal)
+        if st.button("Conferir balancete com o razão"):
+            drift = tb.check(get_repo().columnar("ledger"))
+            if drift.empty:
+                st.success("Balancete consistente com o razão.")
+            else:
+                st.error(f"{len(drift)} saldo(s) divergente(s) do razão.")
+                st.dataframe(drift)
+
+        st.markdown("### Fechamento de período")
+        tbal = temporal_balances()
+        closed = tbal.closed_through
+        st.caption(f"Fechado até {closed.strftime('%d/%m/%Y')}." if closed else "Nenhum período fechado.")
+        today = month_id(date.today())
+        first = month_id(closed) + 1 if closed else today - 24
+        months = [month_label(m) for m in range(today, first - 1, -1)]
+        if months:
+            c1, c2 = st.columns([3, 1])
+            label = c1.selectbox("Fechar até o mês", months, index=min(1, len(months) - 1))
+            if c2.button("Fechar período"):
+                summaries = close_period(month_id(date.fromisoformat(f"{label}-01")))
+                if summaries:
+                    st.success(f"{len(summaries)} mês(es) fechado(s) até {label}.")
+                    st.dataframe(pd.DataFrame(summaries))
+        if repo.count("period_closes"):
+            closes = list_frame("period_closes")[0]
+            closes["closed_at"] = closes["closed_at"].map(format_ts)
+            st.dataframe(closes)
 
 
 def page_fiscal_core():
@@ -458,18 +1499,16 @@ def page_fiscal_core():
             add_tax_rule(name, tax_type, aliquot, cfop, cst)
             st.success("Regra fiscal cadastrada.")
 
-    rules = [asdict(r) for r in get_list("tax_rules")]
-    if rules:
-        st.dataframe(pd.DataFrame(rules))
+    show_list("tax_rules")
 
     st.markdown("---")
     st.subheader("Simulador tributário simples")
-    rules_objs = get_list("tax_rules")
-    if not rules_objs:
+    idx = master_index()
+    if not idx.count("tax_rules"):
         st.info("Cadastre ao menos uma regra para simular.")
         return
 
-    rule_map = {f"{r.id} - {r.name} ({r.tax_type} {r.aliquot}%)": r for r in rules_objs}
+    rule_map = idx.options("tax_rules", "label", lambda r: f"{r.id} - {r.name} ({r.tax_type} {r.aliquot}%)")
 
     base_value = st.number_input("Base de cálculo (R$)", min_value=0.0, step=100.0)
     rule_label = st.selectbox("Regra", list(rule_map.keys()))
@@ -479,6 +1518,40 @@ def page_fiscal_core():
         valor_fmt = f"R$ {tax_amount:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
         st.metric("Imposto calculado", valor_fmt)
 
+    st.markdown("---")
+    st.subheader("Cálculo em lote de itens de nota fiscal")
+    st.caption("CSV com as colunas base, cfop e cst; calcula todos os tributos com regras cadastradas.")
+    upload = st.file_uploader("Itens de nota (CSV)", type=["csv"], key="tax_batch_file")
+    if upload is not None:
+        try:
+            lines = pd.read_csv(upload, dtype={"cfop": str, "cst": str})
+        except (ValueError, pd.errors.ParserError) as e:  # EmptyDataError é ValueError
+            st.error(f"CSV inválido: {e}")
+            return
+        missing = [c for c in ("base", "cfop", "cst") if c not in lines.columns]
+        if missing:
+            st.error(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+            return
+        base = pd.to_numeric(lines["base"], errors="coerce")
+        bad = base.isna() | (base < 0)
+        if bad.any():
+            # Linha do arquivo = índice + 2 (cabeçalho); as demais seguem para o cálculo.
+            st.error(f"{int(bad.sum()):,} item(ns) com base vazia, não numérica ou negativa ignorado(s).")
+            st.dataframe(lines[bad].head(LIST_LIMIT).assign(linha=lines.index[bad][:LIST_LIMIT] + 2),
+                         hide_index=True)
+        lines = lines[~bad].assign(base=base[~bad]).reset_index(drop=True)
+        if lines.empty:
+            return
+        engine = tax_engine()
+        t0 = time.perf_counter()
+        result = engine.compute(lines)
+        seconds = time.perf_counter() - t0
+        st.dataframe(engine.totals(result), hide_index=True)
+        st.dataframe(engine.totals(result, lines["cfop"].fillna("").rename("cfop")), hide_index=True)
+        st.dataframe(pd.concat([lines, result.drop(columns="base")], axis=1).head(LIST_LIMIT))
+        st.caption(f"{len(lines):,} item(ns) calculados em {seconds * 1000:,.0f} ms "
+                   f"({engine.resolutions} resolução(ões) de regra memorizadas).")
+
 
 def page_workflow_core():
     st.header("Núcleo 4 – Processos / Workflow")
@@ -494,27 +1567,37 @@ def page_workflow_core():
             add_workflow_rule(name, entity_type, min_value, int(approvals_required))
             st.success("Workflow cadastrado.")
 
-    rules = [asdict(r) for r in get_list("workflow_rules")]
-    if rules:
-        st.dataframe(pd.DataFrame(rules))
+    show_list("workflow_rules")
 
     st.markdown("---")
     st.subheader("Simulador de roteamento (conceitual)")
-    rules_objs = get_list("workflow_rules")
-    if rules_objs:
+    router = workflow_router()
+    if router.routes:
         entity = st.text_input("Entidade (ex: PurchaseOrder)")
         value = st.number_input("Valor da operação", min_value=0.0, step=100.0)
         if value > 0 and entity:
-            applicable = [
-                r for r in rules_objs
-                if r.entity_type == entity and value >= r.min_value
-            ]
+            applicable = router.route(entity, value)
             if applicable:
                 st.write("Workflows aplicáveis:")
                 st.dataframe(pd.DataFrame([asdict(r) for r in applicable]))
+                st.caption(f"Aprovações exigidas: {router.approvals_for(entity, value)}")
             else:
                 st.info("Nenhum workflow aplicável para este cenário ainda.")
 
+        repo = get_repo()
+        if "FinancialTitle" in router.routes and repo.count("titles", {"status": "Aberto"}):
+            st.markdown("### Roteamento em lote – títulos em aberto")
+            if st.button("Rotear títulos em aberto"):
+                titles = repo.fetch_frame("titles", {"status": "Aberto"})
+                routed = router.route_frame(
+                    titles.assign(entity_type="FinancialTitle"), value_col="amount")
+                with metrics.timer("groupby.workflow_summary"):
+                    summary = (pd.concat([titles[["id", "amount"]], routed], axis=1)
+                               .groupby("approvals_required")
+                               .agg(titulos=("id", "size"), valor=("amount", "sum"))
+                               .reset_index())
+                st.dataframe(summary, hide_index=True)
+
 
 def page_security_core():
     st.header("Núcleo 5 – Segurança & Auditoria")
@@ -529,9 +1612,7 @@ def page_security_core():
             add_user(name, role, is_admin)
             st.success("Usuário cadastrado.")
 
-    users = [asdict(u) for u in get_list("users")]
-    if users:
-        st.dataframe(pd.DataFrame(users))
+    show_list("users")
 
     st.markdown("---")
     st.subheader("Logs de auditoria (conceito)")
@@ -552,40 +1633,144 @@ def page_security_core():
             )
             st.success("Log de auditoria registrado.")
 
-    audits = [asdict(a) for a in get_list("audit_logs")]
-    if audits:
-        st.dataframe(pd.DataFrame(audits))
+    if len(audit_store()):
+        audit_table()
+
+
+def audit_table():
+    # Consulta pelos índices do AuditStore: filtros exatos, mais recentes
+    # primeiro; só a página visível é lida do disco.
+    store = audit_store()
+    c1, c2, c3, c4 = st.columns(4)
+    user_name = c1.text_input("Usuário", key="audit_user").strip() or None
+    entity_type = c2.text_input("Entidade", key="audit_entity").strip() or None
+    entity_id = c3.number_input("ID da entidade (0 = todos)", min_value=0, step=1, key="audit_entity_id")
+    period = c4.date_input("Data", value=(), key="audit_period")
+    start_ts, end_ts = ts_range(period[0], period[1]) if len(period) == 2 else (None, None)
+    filters = dict(user_name=user_name, entity_type=entity_type, entity_id=int(entity_id) or None,
+                   start_ts=start_ts, end_ts=end_ts)
+
+    c1, c2 = st.columns(2)
+    size = c1.selectbox("Linhas por página", GRID_PAGE_SIZES, key="audit_size")
+    total = store.count(**filters)
+    pages = max(1, -(-total // size))
+    if st.session_state.get("audit_page", 1) > pages:
+        st.session_state["audit_page"] = pages
+    page = c2.number_input("Página", min_value=1, max_value=pages, step=1, key="audit_page")
+    rows = store.query(**filters, limit=size, offset=(int(page) - 1) * size)
+    df = pd.DataFrame([asdict(r) for r in rows], columns=[f.name for f in fields(AuditLog)])
+    df["timestamp"] = df["timestamp"].map(format_ts)
+    st.dataframe(df, hide_index=True)
+    st.caption(f"Página {int(page)} de {pages} – {total:,} registro(s).")
 
 
 def page_integration_core():
     st.header("Núcleo 6 – Integração & Eventos")
 
     st.subheader("Eventos gerados pelo core")
-    events = get_list("events")
-    if events:
-        st.dataframe(pd.DataFrame(events))
+    log = event_log()
+    if len(log):
+        c1, c2 = st.columns(2)
+        size = c2.selectbox("Eventos por leitura", [50, 100, 500])
+        cursor = c1.number_input("Ler eventos após o id", min_value=0,
+                                 value=max(log.next_id - 1 - size, 0), step=size)
+        events = pd.DataFrame(log.read_since(int(cursor), size),
+                              columns=["id", "timestamp", "entity_type", "entity_id", "description"])
+        events["timestamp"] = events["timestamp"].map(format_ts)
+        st.dataframe(events, hide_index=True)
+        st.caption(
+            f"{len(log):,} evento(s) retidos (ids {log.first_id}–{log.next_id - 1}) em "
+            f"{len(log.segments)} segmento(s); {len(log.ring)} em memória."
+        )
+        if st.button("Compactar log de eventos"):
+            stats = log.compact()
+            st.success(f"Segmentos: {stats['segmentos_antes']} → {stats['segmentos_depois']} "
+                       f"({stats['removidos_por_retencao']} removido(s) por retenção).")
     else:
         st.info("Nenhum evento registrado ainda. Crie empresas, títulos, etc. nos outros módulos.")
 
+    store = state_store()
+    if store is not None:
+        st.markdown("---")
+        st.subheader("Estado persistido (diário + snapshots)")
+        stats, opened = store.stats(), store.last_restore
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Registros no diário", f"{stats['seq']:,}")
+        c2.metric("Desde o último snapshot", f"{stats['desde_snapshot']:,}")
+        c3.metric("Diário em disco", f"{stats['diario_bytes'] / 2**20:,.1f} MiB")
+        c4.metric("Último snapshot", f"{stats['snapshot_bytes'] / 2**20:,.1f} MiB")
+        st.caption(
+            f"Abertura: snapshot até o registro {opened['snapshot']:,} em {opened['snapshot_s']:.2f}s + "
+            f"{opened['registros']:,} registro(s) do diário em {opened['diario_s']:.2f}s. "
+            f"Snapshot automático a cada {STATE_SNAPSHOT_EVERY:,} registros; {stats['segmentos']} segmento(s)."
+        )
+        if stats["erro"]:
+            st.warning(stats["erro"])
+        if st.button("Gerar snapshot agora", disabled=stats["snapshot_em_curso"]):
+            info = store.snapshot()
+            st.success(f"Snapshot até o registro {info['seq']:,}: {info['bytes'] / 2**20:,.1f} MiB em "
+                       f"{info['total_s']:.2f}s (entidades travadas por {info['captura_s'] * 1000:.0f} ms); "
+                       f"{info['segmentos_removidos']} segmento(s) do diário removido(s).")
+
     st.markdown("---")
-    st.subheader("Webhooks / APIs (conceitual)")
-    st.info(
-        "Neste MVP não estamos expondo APIs reais, mas o modelo de eventos "
-        "já está pronto para ser usado como base de webhooks e integrações externas."
-    )
+    st.subheader("Webhooks")
+    with st.form("form_webhook"):
+        wh_name = st.text_input("Nome do assinante")
+        wh_url = st.text_input("URL (POST JSON)", placeholder="https://exemplo.com/erp/eventos")
+        wh_types = st.text_input("Entidades (separadas por vírgula; vazio = todas)")
+        wh_batch = st.number_input("Eventos por lote", min_value=1, max_value=5_000, value=100, step=50)
+        submitted = st.form_submit_button("Cadastrar webhook")
+        if submitted and wh_name and wh_url.startswith(("http://", "https://")):
+            try:
+                add_webhook(wh_name, wh_url, wh_types, int(wh_batch))
+            except DuplicateKeyError as e:
+                st.error(str(e))
+            else:
+                st.success("Webhook cadastrado.")
+
+    if not get_repo().count("webhooks"):
+        st.info("Nenhum webhook cadastrado: os eventos acima ficam apenas no log.")
+        return
+
+    dispatcher = webhook_dispatcher()
+    pending = dispatcher.pending()
+    rows = []
+    for name, sub in list(dispatcher.subscribers.items()):
+        s = dispatcher.stats[name]
+        p50, p95, p99 = (s.percentile(p) for p in (50, 95, 99))
+        rows.append({
+            "assinante": name, "url": sub.url, "entregues": s.delivered, "lotes": s.batches,
+            "retentativas": s.retries, "lotes_falhos": s.failed_batches, "descartados": s.dropped,
+            "pendentes": pending.get(name, 0),
+            "p50_ms": None if p50 is None else p50 * 1000,
+            "p95_ms": None if p95 is None else p95 * 1000,
+            "p99_ms": None if p99 is None else p99 * 1000,
+            "eventos_s": s.throughput,
+        })
+    st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+    letters = list(dispatcher.dead_letters)
+    if letters:
+        st.markdown(f"**Dead-letter:** {len(letters)} lote(s) não entregues")
+        st.dataframe(pd.DataFrame([
+            {"assinante": d.subscriber, "eventos": len(d.events), "tentativas": d.attempts,
+             "erro": d.error, "quando": datetime.fromtimestamp(d.timestamp).isoformat(timespec="seconds")}
+            for d in letters[-50:]
+        ]), hide_index=True)
+        if st.button("Reenviar dead-letters"):
+            st.success(f"{dispatcher.retry_dead_letters()} lote(s) reenfileirado(s).")
 
 
 def page_analytics_core():
     st.header("Núcleo 7 – Analytics & Painel Estratégico")
 
-    titles = [asdict(t) for t in get_list("titles")]
-    ledger = [asdict(l) for l in get_list("ledger")]
+    repo = get_repo()
 
     col1, col2, col3 = st.columns(3)
-    if titles:
-        df_t = pd.DataFrame(titles)
-        total_ar = df_t[df_t["kind"] == "AR"]["amount"].sum()
-        total_ap = df_t[df_t["kind"] == "AP"]["amount"].sum()
+    if repo.count("titles"):
+        totals = {kind: amount for kind, amount in repo.aggregate("titles", "kind", ["amount"])}
+        total_ar = totals.get("AR", 0.0)
+        total_ap = totals.get("AP", 0.0)
         fmt_ar = f"R$ {total_ar:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
         fmt_ap = f"R$ {total_ap:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
         fmt_net = f"R$ {(total_ar - total_ap):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
@@ -598,33 +1783,201 @@ def page_analytics_core():
         col3.metric("Exposição líquida (AR - AP)", "R$ 0,00")
 
     st.markdown("---")
-    st.subheader("Análise por conta contábil")
-    if ledger:
-        df_l = pd.DataFrame(ledger)
-        bal = (
-            df_l
-            .groupby("account_code")[['debit', 'credit']]
-            .sum()
-            .reset_index()
+    st.subheader("Aging de títulos em aberto")
+    aging = aging_view()
+    c1, c2 = st.columns(2)
+    as_of = c1.date_input("Posição em", value=date.today())
+    horizon = c2.selectbox("Horizonte do fluxo de caixa (dias)", [30, 60, 90, 180], index=2)
+    buckets = aging.buckets(as_of)
+    if buckets[["qtd_AR", "qtd_AP"]].to_numpy().any():
+        st.dataframe(buckets, hide_index=True)
+        st.bar_chart(buckets.set_index("faixa")[["AR", "AP"]])
+
+        st.markdown("### Fluxo de caixa projetado (vencimentos em aberto)")
+        flow = aging.cash_flow(as_of, horizon)
+        st.line_chart(flow.set_index("data")[["entradas", "saidas", "saldo_acumulado"]])
+        overdue = buckets[buckets["faixa"].str.startswith("Vencidos")][["AR", "AP"]].sum()
+        st.caption(
+            f"Vencidos não recebidos: R$ {overdue['AR']:,.2f}; não pagos: R$ {overdue['AP']:,.2f} "
+            "(fora da projeção)."
         )
-        bal["saldo"] = bal["debit"] - bal["credit"]
+    else:
+        st.info("Nenhum título em aberto.")
+
+    st.markdown("---")
+    st.subheader("Análise por conta contábil")
+    if repo.count("ledger"):
+        bal = trial_balance().by_account()
         st.dataframe(bal)
         st.bar_chart(bal.set_index("account_code")["saldo"])
     else:
         st.info("Sem lançamentos contábeis ainda.")
 
+    st.markdown("---")
+    st.subheader("Consolidação do grupo")
+    consolidation_group()
+
+
+def consolidation_group():
+    # Títulos cujo favorecido é outra empresa do grupo são intercompany:
+    # saem dos saldos consolidados, assim como os lançamentos que geraram.
+    options = company_options()
+    if not options:
+        st.info("Cadastre empresas para consolidar.")
+        return
+    with st.form("form_consolidation"):
+        c1, c2 = st.columns([3, 1])
+        chosen = c1.multiselect("Empresas do grupo", list(options), default=list(options))
+        as_of = c2.date_input("Posição em", value=date.today(), key="consol_as_of")
+        submitted = st.form_submit_button("Consolidar")
+    if submitted:
+        if not chosen:
+            st.error("Escolha ao menos uma empresa.")
+        else:
+            perimeter = [options[label] for label in chosen]
+            st.session_state["consolidation"] = consolidation_engine().run(get_repo(), company_ids(), perimeter,
+                                                                           as_of)
+
+    result = st.session_state.get("consolidation")
+    if result is None:
+        return
+    t = result.totals
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("AR consolidado", f"R$ {t['AR_consolidado']:,.2f}", f"-{t['AR_eliminado']:,.2f} eliminado",
+              delta_color="off")
+    m2.metric("AP consolidado", f"R$ {t['AP_consolidado']:,.2f}", f"-{t['AP_eliminado']:,.2f} eliminado",
+              delta_color="off")
+    m3.metric("Lançamentos eliminados (D/C)", f"{t['debit_eliminado']:,.2f} / {t['credit_eliminado']:,.2f}")
+    m4.metric("Divergência intercompany", f"R$ {t['divergencia']:,.2f}")
+
+    st.markdown("### Por empresa")
+    st.dataframe(result.companies, hide_index=True)
+    st.markdown("### Balancete consolidado")
+    st.dataframe(result.trial_balance.head(LIST_LIMIT), hide_index=True)
+    if len(result.trial_balance) > LIST_LIMIT:
+        st.caption(f"Mostrando {LIST_LIMIT} de {len(result.trial_balance):,} contas.")
+    st.markdown("### Saldos intercompany")
+    if result.intercompany.empty:
+        st.info("Nenhum título em aberto entre empresas do grupo.")
+    else:
+        pairs = result.intercompany[result.intercompany["diferenca"].round(2) != 0]
+        st.caption(f"{len(result.intercompany):,} par(es) credor/devedor; {len(pairs):,} com divergência "
+                   "entre o a receber do credor e o a pagar do devedor.")
+        st.dataframe(result.intercompany.head(LIST_LIMIT), hide_index=True)
+
+    companies = result.companies
+    labels = {f"{cid} - {name}": int(cid) for cid, name in zip(companies["company_id"], companies["empresa"])}
+    company = st.selectbox("Balancete da empresa", list(labels), key="consol_company")
+    if company is not None:
+        st.dataframe(result.balance(labels[company]).head(LIST_LIMIT), hide_index=True)
+
+    mode = f"{result.workers} processo(s), {result.tasks} tarefa(s)" if result.workers else "no próprio processo"
+    st.caption(f"{mode}; " + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in result.seconds.items()))
+
+
+def page_diagnostics():
+    st.header("Diagnósticos")
+    registry = metrics.REGISTRY
+    repo = get_repo()
+
+    st.subheader("Tempo por operação")
+    if not registry.enabled:
+        st.info("Métricas desligadas (ERP_METRICS=0).")
+    ops = registry.snapshot()
+    if ops.empty:
+        st.info("Nenhuma operação cronometrada ainda.")
+    else:
+        c1, c2 = st.columns([1, 3])
+        kinds = sorted({name.split(".", 1)[0] for name in ops["operacao"]})
+        kind = c1.selectbox("Categoria", ["(Todas)"] + kinds, key="diag_kind")
+        text = c2.text_input("Filtrar operações", key="diag_filter").strip()
+        if kind != "(Todas)":
+            ops = ops[ops["operacao"].str.startswith(f"{kind}.")]
+        if text:
+            ops = ops[ops["operacao"].str.contains(text, regex=False)]
+        st.dataframe(ops.round(2), hide_index=True)
+        st.caption(
+            f"Coletado desde {datetime.fromtimestamp(registry.started).isoformat(timespec='seconds')} "
+            "(todas as sessões do processo). Percentis por histograma, erro relativo de até ~6%."
+        )
+    if st.button("Zerar métricas"):
+        registry.reset()
+        st.success("Métricas zeradas.")
+
+    st.subheader("Memória por entidade")
+    usage = repo.memory_usage()
+    cache = frame_cache().stats()
+    rows = [{"estrutura": k, "itens": repo.count(k), "MiB": v / 2**20} for k, v in usage.items()]
+    rows.append({"estrutura": "cache de tabelas", "itens": cache["entradas"], "MiB": cache["bytes"] / 2**20})
+    search = repo.views.get("search_index")
+    if search is not None:
+        rows.append({"estrutura": f"índice de busca ({len(search.segments)} segmentos)", "itens": len(search),
+                     "MiB": search.nbytes() / 2**20})
+    audit = repo.services.get("audit_store")
+    if audit is not None:
+        rows.append({"estrutura": "auditoria (índices do segmento ativo)", "itens": len(audit),
+                     "MiB": audit.nbytes() / 2**20})
+    st.dataframe(pd.DataFrame(rows).round(2), hide_index=True)
+    if repo.mode == "sqlite":
+        st.caption("No SQLite as tabelas ficam no arquivo; em memória só os espelhos colunares e caches.")
+
+    st.subheader("Caches")
+    engine = repo.views.get("tax_engine")
+    caches = [
+        {"cache": "tabelas (FrameCache)", "acertos": cache["acertos"],
+         "faltas": cache["faltas"] + cache["incrementais"], "taxa_acerto": cache["taxa_acerto"]},
+        {"cache": "totais das grades", "acertos": registry.counters["cache.grid_counts.hit"],
+         "faltas": registry.counters["cache.grid_counts.miss"],
+         "taxa_acerto": registry.ratio("cache.grid_counts.hit", "cache.grid_counts.miss")},
+    ]
+    if engine is not None:
+        caches.append({"cache": "resolução de regras fiscais", "acertos": engine.lookups - engine.resolutions,
+                       "faltas": engine.resolutions,
+                       "taxa_acerto": 1 - engine.resolutions / engine.lookups if engine.lookups else 0.0})
+    st.dataframe(pd.DataFrame(caches), hide_index=True)
+
+    st.subheader("Locks")
+    st.dataframe(pd.DataFrame(repo.lock_stats()), hide_index=True)
+
+    st.subheader("Perfilador por amostragem")
+    st.caption(
+        "Amostra a pilha a cada 1 ms durante uma única execução da próxima página aberta "
+        "(ou desta, ao clicar em Atualizar) e gera pilhas no formato folded para flame graphs."
+    )
+    c1, c2 = st.columns(2)
+    if c1.button("Perfilar a próxima execução"):
+        st.session_state["_profile_next"] = True
+    c2.button("Atualizar")
+    if st.session_state.get("_profile_next"):
+        st.info("A próxima execução será perfilada.")
+    last = st.session_state.get("_profile")
+    if last is not None:
+        page, profiler = last
+        st.markdown(f"**Última execução perfilada:** {page} – {profiler.seconds * 1000:,.0f} ms, "
+                    f"{profiler.samples} amostras")
+        st.dataframe(profiler.top(), hide_index=True)
+        st.download_button("Baixar pilhas (folded)", profiler.folded(), file_name="perfil.folded",
+                           mime="text/plain")
+
 
 # ============================================================
 # MAIN / LAYOUT
 # ============================================================
 
+PAGES = {
+    "Cadastros Mestre": page_master_data,
+    "Financeiro-Contábil": page_financial_core,
+    "Fiscal / Tributário": page_fiscal_core,
+    "Processos & Workflow": page_workflow_core,
+    "Segurança & Auditoria": page_security_core,
+    "Integração & Eventos": page_integration_core,
+    "Analytics & Painel": page_analytics_core,
+    "Diagnósticos": page_diagnostics,
+}
+
+
 def init_counters():
-    keys = [
-        "company_id", "cost_center_id", "account_id", "customer_id",
-        "product_id", "title_id", "ledger_id", "tax_rule_id",
-        "workflow_rule_id", "user_id", "audit_id", "event_id",
-    ]
-    for k in keys:
+    for k in COUNTERS:
         get_counter(k)
 
 
@@ -635,35 +1988,29 @@ def main():
     )
 
     init_counters()
+    if get_repo().count("webhooks"):
+        webhook_dispatcher()
 
     st.sidebar.title("ERP Core – Núcleos")
-    page = st.sidebar.radio(
-        "Selecione o núcleo",
-        [
-            "Cadastros Mestre",
-            "Financeiro-Contábil",
-            "Fiscal / Tributário",
-            "Processos & Workflow",
-            "Segurança & Auditoria",
-            "Integração & Eventos",
-            "Analytics & Painel",
-        ],
-    )
+    st.sidebar.caption(f"Armazenamento: {get_repo().mode}")
+    page = st.sidebar.radio("Selecione o núcleo", list(PAGES))
+    render = PAGES[page]
+
+    if st.session_state.pop("_profile_next", False):
+        with metrics.SamplingProfiler() as profiler:
+            with metrics.timer(f"page.{render.__name__}"):
+                render()
+        st.session_state["_profile"] = (page, profiler)
+        st.sidebar.info("Execução perfilada – veja em Diagnósticos.")
+    else:
+        with metrics.timer(f"page.{render.__name__}"):
+            render()
 
-    if page == "Cadastros Mestre":
-        page_master_data()
-    elif page == "Financeiro-Contábil":
-        page_financial_core()
-    elif page == "Fiscal / Tributário":
-        page_fiscal_core()
-    elif page == "Processos & Workflow":
-        page_workflow_core()
-    elif page == "Segurança & Auditoria":
-        page_security_core()
-    elif page == "Integração & Eventos":
-        page_integration_core()
-    elif page == "Analytics & Painel":
-        page_analytics_core()
+    cache = frame_cache().stats()
+    st.sidebar.caption(
+        f"Cache de tabelas: {cache['taxa_acerto']:.0%} de acertos, "
+        f"{cache['entradas']} entradas ({cache['bytes'] / 1024:,.0f} KiB)"
+    )
 
 
 if __name__ == "__main__":
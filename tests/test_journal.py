@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+import streamlit_app as app
+from erp import storage
+from erp.journal import JournalError
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    # Repositório compartilhado novo, sem diário de estado (logs em diretório temporário).
+    monkeypatch.setattr(app, "STORAGE_MODE", "shared")
+    monkeypatch.setattr(app, "STATE_DIR", "")
+    monkeypatch.setattr(storage, "_SHARED_REPOS", {})
+    app.add_company("Empresa A", "11.222.333/0001-81", "Real")
+    for code, name, kind in [("1.1.1.01", "Caixa", "Ativo"), ("1.1.2.01", "Clientes", "Ativo"),
+                             ("3.1.01", "Receita", "Receita"), ("2.1.01", "Impostos", "Passivo")]:
+        app.add_account(code, name, kind)
+    repo = app.get_repo()
+    yield repo
+    app.release_services(repo.services)
+
+
+def leg(entry, account_code: str, debit: float = 0.0, credit: float = 0.0, day: str = "2024-03-01") -> dict:
+    return {"entry": entry, "company_id": 1, "date": day, "account_code": account_code,
+            "debit": debit, "credit": credit}
+
+
+def assert_nothing_posted(repo):
+    assert repo.count("ledger") == 0
+    assert app.trial_balance().by_account().empty
+    assert app.post_journal(pd.DataFrame([leg("x", "1.1.1.01", 1.0), leg("x", "3.1.01", credit=1.0)])) \
+        .journal_ids == (1, 1)
+
+
+def test_rejects_unbalanced_entry(repo):
+    legs = pd.DataFrame([
+        leg("ok", "1.1.2.01", 100.0), leg("ok", "3.1.01", credit=100.0),
+        leg("torto", "1.1.2.01", 100.0), leg("torto", "3.1.01", credit=99.99),
+    ])
+    with pytest.raises(JournalError, match="débitos diferentes dos créditos") as err:
+        app.post_journal(legs)
+    # Tudo ou nada: o lançamento balanceado do lote também não entra.
+    assert err.value.rejected["entry"].tolist() == ["torto", "torto"]
+    assert_nothing_posted(repo)
+
+
+def test_rejects_blank_entry(repo):
+    legs = pd.DataFrame([
+        leg("a", "1.1.1.01", 50.0), leg("a", "3.1.01", credit=50.0),
+        leg(None, "1.1.1.01", 10.0), leg("  ", "3.1.01", credit=10.0),
+    ])
+    with pytest.raises(JournalError, match="lançamento não informado") as err:
+        app.post_journal(legs)
+    assert (err.value.rejected["motivo"] == "lançamento não informado").sum() == 2
+    assert_nothing_posted(repo)
+
+
+def test_allocates_contiguous_ids(repo):
+    # Partidas de lançamentos intercalados na entrada saem agrupadas.
+    first = app.post_journal(pd.DataFrame([
+        leg("a", "1.1.2.01", 120.0), leg("b", "1.1.1.01", 30.0), leg("a", "3.1.01", credit=100.0),
+        leg("b", "3.1.01", credit=30.0), leg("a", "2.1.01", credit=20.0),
+    ]))
+    second = app.post_journal(pd.DataFrame([leg(7, "1.1.1.01", 5.0, day="2024-03-02"),
+                                            leg(7, "3.1.01", credit=5.0, day="2024-03-02")]))
+    assert (first.entries, first.legs, first.journal_ids, first.ledger_ids) == (2, 5, (1, 2), (1, 5))
+    assert (second.entries, second.legs, second.journal_ids, second.ledger_ids) == (1, 2, (3, 3), (6, 7))
+    assert repo.get_counter("journal_id") == 4
+
+    ledger = repo.fetch_frame("ledger").sort_values("id", ignore_index=True)
+    assert ledger["id"].tolist() == list(range(1, 8))
+    assert ledger["origin_type"].eq("JournalEntry").all()
+    assert ledger["origin_id"].tolist() == [1, 1, 1, 2, 2, 3, 3]
+    assert ledger["account_code"].tolist()[:3] == ["1.1.2.01", "3.1.01", "2.1.01"]
+    assert app.trial_balance().check(repo.columnar("ledger")).empty
@@ -0,0 +1,36 @@
+from erp.search import SearchIndex, SearchSpec
+
+NAMES = ["silva ana", "silveira ana", "silvano bruno", "silva bruno", "silvestre ana"]
+
+
+def index_of(names, chunks=1):
+    index = SearchIndex({"customers": SearchSpec(text=("name",))})
+    step = -(-len(names) // chunks)
+    for start in range(0, len(names), step):
+        part = names[start:start + step]
+        index.add_columns("customers", range(start + 1, start + 1 + len(part)), {"name": part})
+    return index
+
+
+def ids(hits):
+    return sorted(h.id for h in hits)
+
+
+def test_prefix_over_several_terms_keeps_every_match():
+    # "sil" expande para silva/silvano/silveira/silvestre: a lista junta
+    # vários termos e precisa sair ordenada para a interseção com "ana".
+    index = index_of(NAMES)
+    assert ids(index.search("sil ana")) == [1, 2, 5]
+    assert ids(index.search("ana sil")) == [1, 2, 5]
+    assert ids(index.search("silv bruno")) == [3, 4]
+
+
+def test_prefix_query_matches_brute_force_across_segments():
+    names = [f"{first} {last}" for first in ("silva", "silveira", "silvano", "silvestre", "souza")
+             for last in ("ana", "bruno", "carla", "anabela")] * 5
+    index = index_of(names, chunks=7)
+    for query in ("sil an", "so an", "sil br", "so ca"):  # curtos: sem erro de digitação
+        first, last = query.split()
+        expected = [i for i, n in enumerate(names, 1)
+                    if any(t.startswith(first) for t in n.split()) and any(t.startswith(last) for t in n.split())]
+        assert ids(index.search(query, k=len(names))) == expected, query
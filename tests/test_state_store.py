@@ -0,0 +1,147 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import streamlit_app as app
+from erp.state_store import StateStore, counter, inserted, inserted_columns, updated
+from erp.storage import SharedMemoryRepository
+
+SEGMENT_SIZE = 10  # registros por segmento: vários segmentos com poucos eventos
+
+
+def open_store(directory, use_snapshot: bool = True, **kwargs):
+    options = {"snapshot_every": None, "prune": False} | kwargs
+    store = StateStore(str(directory), app.ID_COUNTERS, app.COUNTERS, SEGMENT_SIZE, **options)
+    repo = SharedMemoryRepository(app.ENTITIES, app.COLUMNAR)
+    store.restore(repo, use_snapshot)
+    return store, repo
+
+
+def write_events(store, repo, first: int, n: int):
+    # Um evento por iteração, como os add_*: aplica no repositório vivo e
+    # grava a mutação no diário (título avulso, lote do razão, baixa de
+    # título anterior, contador reservado).
+    for i in range(first, first + n):
+        day = date(2024, 1, 1) + timedelta(days=i)
+        if i % 4 == 0:
+            title = app.FinancialTitle(i // 4 + 1, 1, "AR", f"P{i}", f"NF-{i}", day, day + timedelta(days=30),
+                                       float(i), None, None)
+            repo.insert("titles", title)
+            repo.advance_counter("title_id", title.id + 1)
+            store.append([inserted("titles", [title])])
+        elif i % 4 == 1:
+            ledger = {
+                "id": np.arange(2 * i, 2 * i + 2), "company_id": np.ones(2, np.int64),
+                "date": np.full(2, np.datetime64(day)), "account_code": np.array(["1.1.1.01", "3.1.01"], dtype=object),
+                "cost_center_id": [None, None], "debit": np.array([float(i), 0.0]),
+                "credit": np.array([0.0, float(i)]), "history": np.array([f"Lançamento {i}"] * 2, dtype=object),
+                "origin_type": np.array(["JournalEntry"] * 2, dtype=object), "origin_id": [i, i],
+            }
+            repo.insert_columns("ledger", ledger)
+            repo.advance_counter("ledger_id", 2 * i + 2)
+            store.append([inserted_columns("ledger", ledger)])
+        elif i % 4 == 2:
+            repo.update_many("titles", [i // 4 + 1], {"status": "Pago"})
+            store.append([updated("titles", [i // 4 + 1], {"status": "Pago"})])
+        else:
+            repo.advance_counter("journal_id", i + 1)
+            store.append([counter("journal_id", i + 1)])
+
+
+def state(repo) -> dict:
+    frames = {key: repo.fetch_frame(key).reset_index(drop=True) for key in ("titles", "ledger")}
+    return {"frames": frames, "counters": {name: repo.get_counter(name) for name in app.COUNTERS}}
+
+
+def assert_same(a: dict, b: dict):
+    for key in a["frames"]:
+        pd.testing.assert_frame_equal(a["frames"][key], b["frames"][key], obj=key)
+    assert a["counters"] == b["counters"]
+
+
+def segments(directory) -> list[str]:
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.startswith("journal-"))
+
+
+def test_snapshot_plus_tail_matches_full_replay(tmp_path):
+    store, live = open_store(tmp_path)
+    write_events(store, live, 0, 35)
+    assert store.snapshot()["seq"] == 35
+    write_events(store, live, 35, 27)
+    store.close()
+
+    restored, repo = open_store(tmp_path)
+    assert restored.last_restore["snapshot"] == 35 and restored.last_restore["registros"] == 27
+    replayed, full = open_store(tmp_path, use_snapshot=False)
+    assert replayed.last_restore["registros"] == 62
+    assert_same(state(repo), state(full))
+    assert_same(state(repo), state(live))
+    assert repo.count("titles") == 16 and repo.count("ledger") == 32 and repo.get_counter("journal_id") == 60
+
+    # A escrita continua no seq seguinte e a próxima abertura a vê.
+    write_events(restored, repo, 62, 1)
+    restored.close()
+    replayed.close()
+    again, reopened = open_store(tmp_path)
+    assert again.seq == 63
+    assert_same(state(reopened), state(repo))
+    again.close()
+
+
+def test_torn_last_record_is_truncated(tmp_path):
+    store, live = open_store(tmp_path)
+    write_events(store, live, 0, 24)
+    expected = state(live)
+    write_events(store, live, 24, 1)
+    store.close()
+    last = segments(tmp_path)[-1]
+    size = os.path.getsize(last)
+    with open(last, "r+b") as fh:
+        fh.truncate(size - 3)  # queda no meio do último registro
+
+    store, repo = open_store(tmp_path)
+    assert store.seq == 24 and store.last_restore["registros"] == 24
+    assert_same(state(repo), expected)
+    assert os.path.getsize(last) < size - 3  # cauda incompleta descartada do arquivo
+    write_events(store, repo, 24, 1)
+    store.close()
+    store, reopened = open_store(tmp_path)
+    assert store.seq == 25
+    assert_same(state(reopened), state(live))
+    store.close()
+
+
+def test_corrupt_middle_segment_raises(tmp_path):
+    store, live = open_store(tmp_path)
+    write_events(store, live, 0, 25)
+    store.close()
+    middle = segments(tmp_path)[1]
+    with open(middle, "r+b") as fh:
+        fh.seek(os.path.getsize(middle) // 2)
+        byte = fh.read(1)
+        fh.seek(-1, os.SEEK_CUR)
+        fh.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="corrompido"):
+        open_store(tmp_path, use_snapshot=False)
+
+
+def test_unreadable_snapshot_falls_back_to_previous(tmp_path):
+    store, live = open_store(tmp_path, prune=True)
+    write_events(store, live, 0, 20)
+    first = store.snapshot()["seq"]
+    write_events(store, live, 20, 15)
+    newest = store.snapshot()["seq"]
+    write_events(store, live, 35, 5)
+    store.close()
+    name = f"snapshot-{newest:012d}.snap"
+    with open(tmp_path / name, "r+b") as fh:
+        fh.truncate(os.path.getsize(tmp_path / name) // 2)
+
+    restored, repo = open_store(tmp_path)
+    assert restored.last_restore["snapshot"] == first and restored.last_restore["registros"] == 20
+    assert restored.last_error.startswith(name)
+    assert_same(state(repo), state(live))
+    restored.close()
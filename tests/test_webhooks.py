@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from erp.webhooks import Subscriber, WebhookDispatcher, sign
+
+
+class StubServer:
+    # Servidor HTTP/1.1 local (keep-alive): responde com os status de
+    # `statuses` em ordem (o último se repete) e guarda cada requisição.
+    def __init__(self, statuses=(200,)):
+        self.statuses = list(statuses)
+        self.requests: list[dict] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests.append({"path": self.path, "headers": dict(self.headers), "body": body})
+                status = stub.statuses.pop(0) if len(stub.statuses) > 1 else stub.statuses[0]
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def events(self) -> list[dict]:
+        return [e for r in self.requests for e in json.loads(r["body"])["events"]]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def dispatcher():
+    d = WebhookDispatcher(max_retries=2, base_backoff=0.01, max_backoff=0.05, timeout=2.0)
+    yield d
+    d.stop()
+
+
+def event(i: int, entity_type: str = "FinancialTitle") -> dict:
+    return {"id": i, "message": f"evento {i}", "entity_type": entity_type, "entity_id": i}
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("tempo esgotado")
+        time.sleep(0.01)
+
+
+def test_delivers_batches_with_signature(dispatcher):
+    server = StubServer()
+    try:
+        dispatcher.add_subscriber(Subscriber("erp", server.url, frozenset({"FinancialTitle"}),
+                                             batch_size=3, max_wait=0.05, secret="s3gredo"))
+        for i in range(7):
+            dispatcher.publish(event(i))
+        dispatcher.publish(event(99, "Customer"))  # fora do filtro do assinante
+        stats = dispatcher.stats["erp"]
+        wait_for(lambda: stats.delivered == 7)
+        assert sorted(e["id"] for e in server.events()) == list(range(7))
+        assert all(len(json.loads(r["body"])["events"]) <= 3 for r in server.requests)
+        assert stats.batches == len(server.requests) and stats.retries == 0
+        for r in server.requests:
+            assert r["path"] == "/hook"
+            timestamp = r["headers"]["X-ERP-Timestamp"]
+            assert r["headers"]["X-ERP-Signature"] == sign("s3gredo", timestamp, r["body"])
+        assert stats.percentile(50) is not None and not dispatcher.dead_letters
+    finally:
+        server.close()
+
+
+def test_unsigned_without_secret(dispatcher):
+    server = StubServer()
+    try:
+        dispatcher.add_subscriber(Subscriber("erp", server.url, batch_size=1, max_wait=0.01))
+        dispatcher.publish(event(1))
+        wait_for(lambda: dispatcher.stats["erp"].delivered == 1)
+        assert "X-ERP-Signature" not in server.requests[0]["headers"]
+    finally:
+        server.close()
+
+
+def test_retries_server_errors_then_delivers(dispatcher):
+    server = StubServer([503, 500, 200])
+    try:
+        dispatcher.add_subscriber(Subscriber("erp", server.url, batch_size=5, max_wait=0.01))
+        dispatcher.publish(event(1))
+        stats = dispatcher.stats["erp"]
+        wait_for(lambda: stats.delivered == 1)
+        assert stats.retries == 2 and len(server.requests) == 3
+        assert not dispatcher.dead_letters
+    finally:
+        server.close()
+
+
+def test_exhausted_retries_go_to_dead_letter_and_can_be_resent(dispatcher):
+    server = StubServer([500])
+    try:
+        dispatcher.add_subscriber(Subscriber("erp", server.url, batch_size=5, max_wait=0.01))
+        dispatcher.publish(event(1))
+        stats = dispatcher.stats["erp"]
+        wait_for(lambda: stats.failed_batches == 1)
+        (letter,) = dispatcher.dead_letters
+        assert (letter.subscriber, letter.error, letter.attempts) == ("erp", "HTTP 500", 3)
+        assert [e["id"] for e in letter.events] == [1] and stats.dead_events == 1
+
+        server.statuses = [200]
+        assert dispatcher.retry_dead_letters() == 1
+        wait_for(lambda: stats.delivered == 1)
+        assert not dispatcher.dead_letters
+    finally:
+        server.close()
+
+
+def test_client_errors_are_not_retried(dispatcher):
+    server = StubServer([400])
+    try:
+        dispatcher.add_subscriber(Subscriber("erp", server.url, batch_size=5, max_wait=0.01))
+        dispatcher.publish(event(1))
+        wait_for(lambda: dispatcher.stats["erp"].failed_batches == 1)
+        assert len(server.requests) == 1 and dispatcher.stats["erp"].retries == 0
+        assert dispatcher.dead_letters[0].attempts == 1
+    finally:
+        server.close()
+
+
+def test_unreachable_endpoint_goes_to_dead_letter(dispatcher):
+    server = StubServer()
+    url = server.url
+    server.close()
+    dispatcher.add_subscriber(Subscriber("erp", url, batch_size=5, max_wait=0.01))
+    dispatcher.publish(event(1))
+    wait_for(lambda: dispatcher.stats["erp"].failed_batches == 1)
+    assert dispatcher.dead_letters[0].error.startswith("ConnectionRefusedError")